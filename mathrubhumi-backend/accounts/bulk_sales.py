@@ -0,0 +1,144 @@
+"""
+Bulk loading of sale bills collected offline (exhibition stalls, counters
+working without a connection), posted to sales/bulk/ as NDJSON - one
+create_sale payload per line.
+
+The view validates bills one by one and hands them over in chunks of
+BULK_SALE_CHUNK_SIZE; load_sales() writes one chunk inside the caller's
+transaction:
+
+  * sale ids for the whole chunk come from one nextval() query;
+  * lines without a batch are FIFO-allocated for the whole chunk in one query;
+  * headers and lines are COPYed into temporary staging tables and moved into
+    sales / sale_items with one INSERT ... SELECT each;
+  * stock is posted for the whole chunk with one update per table;
+  * bill numbers are reserved last, per (sale series, financial year) as one
+    contiguous block, and set with one UPDATE.
+
+Titles, then batches, then number series are locked in that order, as a
+single create_sale does, so a chunk and a bill cannot deadlock.
+"""
+import csv
+import io
+from collections import defaultdict
+
+from .numbering import fin_year, reserve_sale_bill_nos
+from .stock import DOC_SALE, allocate_fifo, apply_document_movements, net_movements
+
+SALE_COLUMNS = [
+    'id', 'customer_nm', 'billing_address', 'sale_date', 'mobile_number',
+    'type', 'mode', 'class', 'cancel',
+    'bill_discount', 'bill_discount_amount', 'gross', 'round_off', 'bill_amount',
+    'note_1', 'note_2', 'freight_postage', 'processing_charge',
+    'cr_customer_id', 'agent_id', 'branch_id',
+]
+SALE_TEXT_COLUMNS = ['customer_nm', 'billing_address', 'mobile_number', 'note_1', 'note_2']
+
+SALE_ITEM_COLUMNS = [
+    'sale_id', 'exchange_rate', 'quantity', 'rate', 'tax', 'discount_p', 'line_value', 'currency_id', 'title_id',
+    'allocated_bill_discount', 'purchase_company_id', 'purchase_id', 'purchase_item_id',
+]
+
+# ON COMMIT DELETE ROWS empties them for the next chunk; the TRUNCATE in
+# load_sales covers chunks that end in a savepoint rather than a commit
+CREATE_STAGING_SQL = """
+    CREATE TEMP TABLE IF NOT EXISTS bulk_sales_stage (LIKE sales INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+    CREATE TEMP TABLE IF NOT EXISTS bulk_sale_items_stage (LIKE sale_items INCLUDING DEFAULTS) ON COMMIT DELETE ROWS;
+    TRUNCATE bulk_sales_stage, bulk_sale_items_stage;
+"""
+
+
+def _copy_rows(cursor, table, columns, rows, force_not_null=()):
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator='\n').writerows(rows)
+    buf.seek(0)
+    options = 'FORMAT csv'
+    if force_not_null:
+        options += f", FORCE_NOT_NULL ({', '.join(force_not_null)})"
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH ({options})", buf)
+
+
+def load_sales(cursor, bills):
+    """
+    Write a chunk of normalised bills (views.normalise_sale output with the
+    numeric `type_code`, `mode_code`, `class_code` and `cancel_code` added).
+    Returns [(sale_id, bill_no)] in the order of `bills`.
+    """
+    if not bills:
+        return []
+
+    cursor.execute(
+        "SELECT nextval(pg_get_serial_sequence('sales', 'id')) FROM generate_series(1, %s)",
+        [len(bills)],
+    )
+    sale_ids = [row[0] for row in cursor.fetchall()]
+
+    # a cancelled bill moves no stock, so it takes no batch from the live ones
+    tagged = []
+    lines = defaultdict(list)
+    for n, bill in enumerate(bills):
+        if bill['cancel_code'] == 1:
+            lines[n] = list(bill['items'])
+        else:
+            tagged.extend(dict(item, _bill=n) for item in bill['items'])
+    for item in allocate_fifo(cursor, tagged):
+        lines[item.pop('_bill')].append(item)
+
+    cursor.execute(CREATE_STAGING_SQL)
+    _copy_rows(
+        cursor, 'bulk_sales_stage', SALE_COLUMNS,
+        (
+            [
+                sale_ids[n], bill['customer_nm'], bill.get('billing_address', ''), bill['sale_date'],
+                bill['mobile_number'], bill['type_code'], bill['mode_code'], bill['class_code'], bill['cancel_code'],
+                bill['bill_discount'], bill['bill_discount_amount'], bill['gross'], bill['round_off'],
+                bill['bill_amount'], bill['note_1'], bill['note_2'], bill['freight_postage'],
+                bill['processing_charge'], bill['customer_id'], bill['agent_id'], bill['branch_id'],
+            ]
+            for n, bill in enumerate(bills)
+        ),
+        SALE_TEXT_COLUMNS,
+    )
+    _copy_rows(
+        cursor, 'bulk_sale_items_stage', SALE_ITEM_COLUMNS,
+        (
+            [
+                sale_ids[n], item['exchangeRate'], item['quantity'], item['rate'], item['tax'], item['discount'],
+                item['value'], item['currencyIndex'], item['titleId'], item['allocatedBillDiscount'],
+                int(item.get('purchaseCompanyId') or 0), int(item.get('purchaseId') or 0),
+                int(item.get('purchaseItemId') or 0),
+            ]
+            for n in range(len(bills))
+            for item in lines[n]
+        ),
+    )
+    cursor.execute("INSERT INTO sales SELECT * FROM bulk_sales_stage ORDER BY id")
+    cursor.execute("INSERT INTO sale_items SELECT * FROM bulk_sale_items_stage ORDER BY id")
+
+    apply_document_movements(cursor, DOC_SALE, {
+        sale_ids[n]: net_movements(DOC_SALE, (), [
+            (item['titleId'], item.get('purchaseCompanyId'), item.get('purchaseItemId'), item['quantity'])
+            for item in lines[n]
+        ])
+        for n, bill in enumerate(bills)
+        if bill['cancel_code'] != 1
+    })
+
+    series = defaultdict(list)
+    for n, bill in enumerate(bills):
+        series[(bill['type_code'], fin_year(bill['sale_date'])[0])].append(n)
+    bill_nos = {}
+    for (type_code, _fy), members in sorted(series.items()):
+        numbers = reserve_sale_bill_nos(cursor, type_code, bills[members[0]]['sale_date'], len(members))
+        bill_nos.update(zip(members, numbers))
+    cursor.execute(
+        """
+        UPDATE sales S
+           SET bill_no = B.bill_no
+          FROM unnest(%s::int4[], %s::varchar[]) AS B(id, bill_no)
+         WHERE S.id = B.id
+        """,
+        [sale_ids, [bill_nos[n] for n in range(len(bills))]],
+    )
+
+    return [(sale_ids[n], bill_nos[n]) for n in range(len(bills))]
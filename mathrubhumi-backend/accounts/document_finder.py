@@ -0,0 +1,210 @@
+"""
+Finder over the document tables: sales, sales returns, purchases, PP
+receipts, remittances and credit realisations.
+
+Filters (all optional, combined with AND):
+
+  number    document number - a prefix of sales.bill_no / purchase.invoice_no,
+            or the exact running number of the numbered documents
+  mobile    sales.mobile_number (other documents carry no mobile)
+  customer  case-insensitive prefix of the customer / supplier name
+  date_from, date_to   document date range
+
+A document type that cannot satisfy a given filter is left out. Results run
+newest first by (date, type, company, id) and are paged with a keyset cursor
+taken from the last row, so page N costs the same as page 1. Every branch is
+a LIMIT query over an index from migration 0027; the branches are merged by
+one UNION ALL.
+"""
+import base64
+import datetime
+import json
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# type -> how to read it; `date` must be a plain column (keyset + index)
+SOURCES = {
+    'sales': {
+        'from': 'sales D',
+        'date': 'D.sale_date',
+        'number': 'D.bill_no',
+        'number_text': ['D.bill_no'],
+        'customer': 'D.customer_nm',
+        'customer_filter': "lower(D.customer_nm) LIKE %(customer)s",
+        'mobile': 'D.mobile_number',
+        'amount': 'D.bill_amount',
+    },
+    'sales_rt': {
+        'from': 'sales_rt D LEFT JOIN cr_customers C ON C.id = D.cr_customer_id AND D.cr_customer_id <> 0',
+        'date': 'D.entry_date',
+        'number': 'D.sales_rt_no',
+        'number_int': ['D.sales_rt_no'],
+        'customer': "COALESCE(C.customer_nm, D.cash_customer)",
+        'customer_filter': (
+            "(lower(D.cash_customer) LIKE %(customer)s OR D.cr_customer_id IN "
+            "(SELECT id FROM cr_customers WHERE lower(customer_nm) LIKE %(customer)s))"
+        ),
+        'amount': 'D.nett',
+    },
+    'purchase': {
+        'from': 'purchase D LEFT JOIN suppliers C ON C.id = D.supplier_id',
+        'date': 'D.entry_date',
+        'number': 'D.purchase_no',
+        'number_int': ['D.purchase_no'],
+        'number_text': ['D.invoice_no'],
+        'customer': 'C.supplier_nm',
+        'customer_filter': (
+            "D.supplier_id IN (SELECT id FROM suppliers WHERE lower(supplier_nm) LIKE %(customer)s)"
+        ),
+        'amount': 'D.nett',
+    },
+    'pp_receipts': {
+        'from': 'pp_receipts D LEFT JOIN pp_customers C ON C.id = D.pp_customer_id',
+        'date': 'D.entry_date',
+        'number': 'D.receipt_no',
+        'number_int': ['D.receipt_no'],
+        'customer': 'C.pp_customer_nm',
+        'customer_filter': (
+            "D.pp_customer_id IN (SELECT id FROM pp_customers WHERE lower(pp_customer_nm) LIKE %(customer)s)"
+        ),
+        'amount': 'D.amount',
+    },
+    'remittance': {
+        'from': 'remittance D',
+        'date': 'D.entry_date',
+        'number': 'D.remittance_no',
+        'number_int': ['D.remittance_no'],
+        'customer': 'D.c_name',
+        'customer_filter': "lower(D.c_name) LIKE %(customer)s",
+        'amount': 'D.amount',
+    },
+    'cr_realisation': {
+        'from': 'cr_realisation D LEFT JOIN cr_customers C ON C.id = D.customer_id',
+        'date': 'D.entry_date',
+        'number': 'D.receipt_no',
+        'number_int': ['D.receipt_no'],
+        'customer': 'C.customer_nm',
+        'customer_filter': (
+            "D.customer_id IN (SELECT id FROM cr_customers WHERE lower(customer_nm) LIKE %(customer)s)"
+        ),
+        'amount': 'D.amount',
+    },
+}
+
+INT4_MAX = 2147483647
+
+
+class FinderError(ValueError):
+    pass
+
+
+def _like_prefix(text):
+    escaped = text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+def encode_cursor(row):
+    doc_type, company_id, doc_id, _number, doc_date = row[:5]
+    raw = json.dumps([doc_date.isoformat(), doc_type, company_id, doc_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        doc_date, doc_type, company_id, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.date.fromisoformat(doc_date), str(doc_type), int(company_id), int(doc_id)
+    except (ValueError, TypeError):
+        raise FinderError('Invalid cursor')
+
+
+def _branch(doc_type, spec, filters, cursor):
+    """One type's LIMIT query, or None when the filters rule the type out."""
+    date = spec['date']
+    where = [f"{date} IS NOT NULL"]
+
+    number = filters.get('number')
+    if number:
+        matches = []
+        if number.isdigit() and int(number) <= INT4_MAX:
+            matches += [f"{col} = %(number_int)s" for col in spec.get('number_int', [])]
+        matches += [f"{col} LIKE %(number_text)s" for col in spec.get('number_text', [])]
+        if not matches:
+            return None
+        where.append('(' + ' OR '.join(matches) + ')')
+
+    if filters.get('mobile'):
+        if 'mobile' not in spec:
+            return None
+        where.append(f"{spec['mobile']} = %(mobile)s")
+
+    if filters.get('customer'):
+        where.append(spec['customer_filter'])
+    if filters.get('date_from'):
+        where.append(f"{date} >= %(date_from)s")
+    if filters.get('date_to'):
+        where.append(f"{date} <= %(date_to)s")
+
+    if cursor:
+        # (date, type, company, id) < cursor in newest-first order, with type fixed per branch
+        _c_date, c_type, _c_company, _c_id = cursor
+        if doc_type < c_type:
+            where.append(f"{date} <= %(c_date)s")
+        elif doc_type > c_type:
+            where.append(f"{date} < %(c_date)s")
+        else:
+            where.append(f"({date}, D.company_id, D.id) < (%(c_date)s, %(c_company)s, %(c_id)s)")
+
+    mobile = spec.get('mobile', 'NULL::text')
+    return f"""
+        (SELECT '{doc_type}'::text COLLATE "C", D.company_id, D.id, ({spec['number']})::text, {date},
+                ({spec['customer']})::text, ({mobile})::text, ({spec['amount']})::float8
+           FROM {spec['from']}
+          WHERE {' AND '.join(where)}
+          ORDER BY {date} DESC, D.company_id DESC, D.id DESC
+          LIMIT %(limit)s)
+    """
+
+
+def find_documents(db_cursor, types=None, number='', mobile='', customer='',
+                   date_from=None, date_to=None, cursor=None, limit=DEFAULT_LIMIT):
+    """Returns (rows, next_cursor); next_cursor is None on the last page."""
+    types = types or list(SOURCES)
+    unknown = [t for t in types if t not in SOURCES]
+    if unknown:
+        raise FinderError(f"Unknown document type(s): {', '.join(unknown)}")
+    limit = max(1, min(int(limit), MAX_LIMIT))
+
+    filters = {
+        'number': (number or '').strip(),
+        'mobile': (mobile or '').strip(),
+        'customer': (customer or '').strip().lower(),
+        'date_from': date_from,
+        'date_to': date_to,
+    }
+    keyset = decode_cursor(cursor) if cursor else None
+    params = {
+        'number_int': int(filters['number']) if filters['number'].isdigit() and int(filters['number']) <= INT4_MAX else None,
+        'number_text': _like_prefix(filters['number']),
+        'mobile': filters['mobile'],
+        'customer': _like_prefix(filters['customer']),
+        'date_from': date_from,
+        'date_to': date_to,
+        'limit': limit + 1,
+    }
+    if keyset:
+        params.update(dict(zip(('c_date', 'c_type', 'c_company', 'c_id'), keyset)))
+
+    branches = [b for b in (_branch(t, SOURCES[t], filters, keyset) for t in sorted(types)) if b]
+    if not branches:
+        return [], None
+
+    db_cursor.execute(
+        "SELECT * FROM (" + ' UNION ALL '.join(branches) + ") F"
+        " ORDER BY 5 DESC, 1 DESC, 2 DESC, 3 DESC LIMIT %(limit)s",
+        params,
+    )
+    rows = db_cursor.fetchall()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
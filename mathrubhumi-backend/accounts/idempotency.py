@@ -0,0 +1,170 @@
+"""
+Idempotency-Key support for document-creating POST endpoints.
+
+A client sends the same `Idempotency-Key` header on every retry of one
+submission. The first request claims the key (committed on its own, before
+the view's transaction starts), runs the view and stores a 2xx response
+against the key. Retries are answered from the idempotency_keys table with a
+single primary-key lookup and never reach the view, so they cannot create a
+second document or consume another number.
+
+* same key, different body     -> 422
+* same key, still in progress  -> 409 (the client should retry later)
+* non-2xx response             -> claim released, the retry runs again
+* claim older than IDEMPOTENCY_IN_PROGRESS_SECONDS and still unfinished
+  (its worker died before recording a response) -> the retry takes it over
+
+Keys are scoped per user and endpoint and live for IDEMPOTENCY_KEY_TTL_HOURS;
+expired keys are ignored on lookup, reused on claim and deleted by the
+`purge_idempotency_keys` management command.
+"""
+import functools
+import hashlib
+import logging
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, JsonResponse
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 100
+
+
+def ttl_hours():
+    return int(getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def lease_seconds():
+    return int(getattr(settings, 'IDEMPOTENCY_IN_PROGRESS_SECONDS', 300))
+
+
+def _lookup(cursor, user_id, endpoint, key):
+    """(request_hash, status_code, response_body, abandoned) of a live key, or None."""
+    cursor.execute(
+        """
+        SELECT request_hash, status_code, response_body,
+               status_code IS NULL AND created_at <= now() - make_interval(secs => %s)
+          FROM idempotency_keys
+         WHERE user_id = %s AND endpoint = %s AND idem_key = %s
+           AND created_at > now() - make_interval(hours => %s)
+        """,
+        [lease_seconds(), user_id, endpoint, key, ttl_hours()],
+    )
+    return cursor.fetchone()
+
+
+def _claim(cursor, user_id, endpoint, key, request_hash):
+    """
+    Insert an in-progress row, or take over an expired one or an unfinished
+    claim past its lease. True when this request owns the key.
+    """
+    cursor.execute(
+        """
+        INSERT INTO idempotency_keys (user_id, endpoint, idem_key, request_hash)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (user_id, endpoint, idem_key) DO UPDATE
+           SET request_hash = EXCLUDED.request_hash,
+               status_code = NULL,
+               response_body = NULL,
+               created_at = now()
+         WHERE idempotency_keys.created_at <= now() - make_interval(hours => %s)
+            OR (idempotency_keys.status_code IS NULL
+                AND idempotency_keys.request_hash = EXCLUDED.request_hash
+                AND idempotency_keys.created_at <= now() - make_interval(secs => %s))
+        RETURNING 1
+        """,
+        [user_id, endpoint, key, request_hash, ttl_hours(), lease_seconds()],
+    )
+    return cursor.fetchone() is not None
+
+
+def _replay(row, request_hash):
+    stored_hash, status_code, body, _abandoned = row
+    if stored_hash != request_hash:
+        return JsonResponse(
+            {'error': f'{HEADER} was already used with a different request body'}, status=422
+        )
+    if status_code is None:
+        return JsonResponse(
+            {'error': f'A request with this {HEADER} is still being processed'}, status=409
+        )
+    response = HttpResponse(body, status=status_code, content_type='application/json')
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def idempotent(endpoint):
+    """
+    Make a POST view replay-safe when the client sends an Idempotency-Key.
+    Apply below @api_view/@permission_classes so request.user is authenticated.
+    Requests without the header run unchanged.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = (request.headers.get(HEADER) or '').strip()
+            if request.method != 'POST' or not key:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return JsonResponse({'error': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters'}, status=400)
+
+            user_id = request.user.pk
+            request_hash = hashlib.sha256(request.body).hexdigest()
+
+            with connection.cursor() as cursor:
+                row = _lookup(cursor, user_id, endpoint, key)
+                if row is not None and row[3] and row[0] == request_hash:
+                    # the request holding the claim died before recording a response
+                    logger.warning(f"Taking over abandoned {HEADER} for {endpoint}: key {key}")
+                    row = None
+                if row is None and not _claim(cursor, user_id, endpoint, key, request_hash):
+                    # lost a race with a concurrent retry of the same submission
+                    row = _lookup(cursor, user_id, endpoint, key)
+            if row is not None:
+                logger.info(f"Idempotent replay for {endpoint}: key {key}")
+                return _replay(row, request_hash)
+
+            response = None
+            try:
+                response = view(request, *args, **kwargs)
+            finally:
+                with connection.cursor() as cursor:
+                    if response is not None and 200 <= response.status_code < 300:
+                        cursor.execute(
+                            """
+                            UPDATE idempotency_keys
+                               SET status_code = %s, response_body = %s
+                             WHERE user_id = %s AND endpoint = %s AND idem_key = %s
+                            """,
+                            [response.status_code, response.content.decode('utf-8'), user_id, endpoint, key],
+                        )
+                    else:
+                        cursor.execute(
+                            "DELETE FROM idempotency_keys WHERE user_id = %s AND endpoint = %s AND idem_key = %s",
+                            [user_id, endpoint, key],
+                        )
+            return response
+        return wrapper
+    return decorator
+
+
+def purge_expired(batch_size=5000):
+    """Delete expired keys in batches; returns the number of rows removed."""
+    removed = 0
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute(
+                """
+                DELETE FROM idempotency_keys
+                 WHERE ctid = ANY(ARRAY(
+                           SELECT ctid FROM idempotency_keys
+                            WHERE created_at <= now() - make_interval(hours => %s)
+                            LIMIT %s))
+                """,
+                [ttl_hours(), batch_size],
+            )
+            removed += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return removed
@@ -0,0 +1,511 @@
+"""
+Supplier invoice files (CSV or XLSX with ISBN, quantity, rate and discount
+columns) imported into a goods inward.
+
+  1. stage_file() reads the upload row by row - csv.reader over the stream,
+     or the first worksheet of an XLSX parsed with iterparse straight out of
+     the zip - and COPYes the lines into purchase_import_lines through a
+     file-like adapter, so no more than one row is held at a time. (XLSX
+     shared strings are the exception: they are read once, up front.)
+  2. match_titles() matches every staged line to titles by ISBN in one
+     UPDATE over the titles_isbn_idx index (migration 0029).
+  3. Lines left unmatched or in error are listed for correction;
+     correct_lines() sets their title (by id or another ISBN) or numbers, or
+     skips them. A line's error stays until the field it names is corrected.
+  4. posting_items() turns the lines into create_goods_inward items, and the
+     view posts them through the same path as a keyed-in inward.
+"""
+import csv
+import io
+import re
+import zipfile
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import iterparse
+
+# header text (lower case, spaces and punctuation dropped) -> line field
+COLUMN_ALIASES = {
+    'isbn': ('isbn', 'isbn13', 'isbn10', 'ean', 'barcode'),
+    'quantity': ('qty', 'quantity', 'copies', 'nos'),
+    'rate': ('rate', 'price', 'mrp', 'unitprice', 'listprice'),
+    'discount': ('discount', 'disc', 'discountp', 'discpercent', 'discountpercent', 'discpc'),
+}
+REQUIRED_COLUMNS = ('isbn', 'quantity', 'rate')
+
+STAGE_COLUMNS = ['import_id', 'line_no', 'isbn', 'quantity', 'rate', 'discount_p', 'error']
+
+UNMATCHED_LIMIT = 500
+
+# column limits of purchase_import_lines / purchase_items
+MAX_QUANTITY = Decimal('10000000')
+MAX_RATE = Decimal('1000000')
+
+# line error -> the field whose correction clears it
+ERROR_FIELDS = {
+    'no ISBN': 'isbn',
+    'bad quantity': 'quantity',
+    'quantity must be positive': 'quantity',
+    'quantity out of range': 'quantity',
+    'bad rate': 'rate',
+    'no rate': 'rate',
+    'rate out of range': 'rate',
+    'bad discount': 'discount',
+    'discount must be 0-100': 'discount',
+}
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+
+class InvoiceImportError(ValueError):
+    pass
+
+
+# ---------------------------------------------------------------- reading
+
+def _csv_rows(fileobj):
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()
+
+
+def _column_index(ref):
+    """'C12' -> 2"""
+    n = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        n = n * 26 + ord(ch.upper()) - 64
+    return n - 1
+
+
+def _first_sheet_path(book):
+    with book.open('xl/workbook.xml') as f:
+        sheet = next((el for _, el in iterparse(f) if el.tag == f'{_NS}sheet'), None)
+    if sheet is None:
+        raise InvoiceImportError('The workbook has no worksheets')
+    rel_id = sheet.get(f'{_REL_NS}id')
+    with book.open('xl/_rels/workbook.xml.rels') as f:
+        for _, el in iterparse(f):
+            if el.tag == f'{_PKG_REL_NS}Relationship' and el.get('Id') == rel_id:
+                target = el.get('Target').lstrip('/')
+                return target if target.startswith('xl/') else f'xl/{target}'
+    raise InvoiceImportError('The first worksheet is missing from the workbook')
+
+
+def _shared_strings(book):
+    if 'xl/sharedStrings.xml' not in book.namelist():
+        return []
+    strings = []
+    with book.open('xl/sharedStrings.xml') as f:
+        for _, el in iterparse(f):
+            if el.tag == f'{_NS}si':
+                strings.append(''.join(t.text or '' for t in el.iter(f'{_NS}t')))
+                el.clear()
+    return strings
+
+
+def _xlsx_rows(fileobj):
+    try:
+        book = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise InvoiceImportError('Not a valid XLSX file')
+    with book:
+        strings = _shared_strings(book)
+        with book.open(_first_sheet_path(book)) as f:
+            row_no = 0
+            for _, row in iterparse(f):
+                if row.tag != f'{_NS}row':
+                    continue
+                # rows with nothing in them are left out of the sheet; keep the numbering
+                row_no += 1
+                target = int(row.get('r') or row_no)
+                while row_no < target:
+                    yield []
+                    row_no += 1
+                values = []
+                for cell in row.iter(f'{_NS}c'):
+                    col = _column_index(cell.get('r', '')) if cell.get('r') else len(values)
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(t.text or '' for t in cell.iter(f'{_NS}t'))
+                    else:
+                        v = cell.find(f'{_NS}v')
+                        value = v.text if v is not None and v.text is not None else ''
+                        if kind == 's' and value:
+                            value = strings[int(value)]
+                    values.extend([''] * (col - len(values)))
+                    values.append(value)
+                yield values
+                row.clear()
+
+
+def read_rows(fileobj, file_name):
+    """Rows of an uploaded CSV or XLSX file as lists of strings."""
+    if file_name.lower().endswith('.xlsx'):
+        return _xlsx_rows(fileobj)
+    if file_name.lower().endswith(('.csv', '.txt')):
+        return _csv_rows(fileobj)
+    raise InvoiceImportError('Upload a .csv or .xlsx file')
+
+
+# ---------------------------------------------------------------- parsing
+
+def _header_key(text):
+    return re.sub(r'[^a-z0-9]', '', str(text).lower())
+
+
+def column_map(header):
+    """Line field -> column index, from the header row."""
+    found = {}
+    for index, text in enumerate(header):
+        key = _header_key(text)
+        for field, aliases in COLUMN_ALIASES.items():
+            if key in aliases and field not in found:
+                found[field] = index
+    missing = [f for f in REQUIRED_COLUMNS if f not in found]
+    if missing:
+        raise InvoiceImportError(f"Missing column(s): {', '.join(missing)}")
+    return found
+
+
+def normalise_isbn(value):
+    """Digits (and a trailing X) of an ISBN; spreadsheets often turn them into 9.78e12 floats."""
+    text = str(value or '').strip()
+    if re.fullmatch(r'\d+\.0+', text):
+        text = text.split('.')[0]
+    elif re.fullmatch(r'[\d.]+[eE]\+?\d+', text):
+        try:
+            text = str(int(Decimal(text)))
+        except InvalidOperation:
+            pass
+    return re.sub(r'[^0-9X]', '', text.upper())[:20]
+
+
+def _number(value, field, errors):
+    text = str(value or '').strip().replace(',', '').rstrip('%')
+    if not text:
+        return Decimal('0')
+    try:
+        return Decimal(text)
+    except InvalidOperation:
+        errors.append(f'bad {field}')
+        return Decimal('0')
+
+
+def _range_error(field, value):
+    """Why a quantity, rate or discount cannot be posted, or ''."""
+    if field == 'quantity':
+        if abs(value) >= MAX_QUANTITY:
+            return 'quantity out of range'
+        if value <= 0:
+            return 'quantity must be positive'
+    elif field == 'rate':
+        if not 0 <= value < MAX_RATE:
+            return 'rate out of range'
+    elif not 0 <= value <= 100:
+        return 'discount must be 0-100'
+    return ''
+
+
+def parse_lines(rows):
+    """
+    (line_no, isbn, quantity, rate, discount_p, error) for each data row;
+    line_no is the row number in the file. Blank rows are skipped.
+    """
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        raise InvoiceImportError('The file is empty')
+    columns = column_map(header)
+
+    def cell(row, field):
+        index = columns.get(field)
+        return row[index] if index is not None and index < len(row) else ''
+
+    for line_no, row in enumerate(rows, start=2):
+        if not any(str(v).strip() for v in row):
+            continue
+        errors = []
+        isbn = normalise_isbn(cell(row, 'isbn'))
+        quantity = _number(cell(row, 'quantity'), 'quantity', errors)
+        rate = _number(cell(row, 'rate'), 'rate', errors)
+        discount = _number(cell(row, 'discount'), 'discount', errors)
+        if not isbn:
+            errors.append('no ISBN')
+        if not str(cell(row, 'rate')).strip():
+            errors.append('no rate')
+        if quantity <= 0:
+            errors.append('quantity must be positive')
+        # values that would not fit the staging columns are stored as 0
+        if abs(quantity) >= MAX_QUANTITY:
+            errors.append('quantity out of range')
+            quantity = Decimal('0')
+        if _range_error('rate', rate):
+            errors.append(_range_error('rate', rate))
+            rate = Decimal('0')
+        if _range_error('discount', discount):
+            errors.append(_range_error('discount', discount))
+            discount = Decimal('0')
+        yield line_no, isbn, quantity, rate, discount, ', '.join(errors)
+
+
+# ---------------------------------------------------------------- staging
+
+class _CopySource(io.TextIOBase):
+    """Read-only text stream over CSV lines produced on demand, for COPY FROM STDIN."""
+
+    def __init__(self, rows):
+        self._lines = self._render(rows)
+        self._pending = ''
+
+    @staticmethod
+    def _render(rows):
+        buf = io.StringIO()
+        writer = csv.writer(buf, lineterminator='\n')
+        for row in rows:
+            writer.writerow(row)
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pending) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._pending += line
+        if size < 0:
+            size = len(self._pending)
+        out, self._pending = self._pending[:size], self._pending[size:]
+        return out
+
+
+def stage_file(cursor, fileobj, file_name, user_id=0):
+    """Create an import and COPY the file's lines into it. Returns the import id."""
+    rows = read_rows(fileobj, file_name)
+    lines = parse_lines(rows)
+    # the header is checked before anything is written
+    first = next(lines, None)
+
+    cursor.execute(
+        "INSERT INTO purchase_imports (file_name, user_id) VALUES (%s, %s) RETURNING id",
+        [file_name[:255], user_id or 0],
+    )
+    import_id = cursor.fetchone()[0]
+    if first is not None:
+        def staged():
+            yield (import_id, *first)
+            for line in lines:
+                yield (import_id, *line)
+
+        cursor.copy_expert(
+            f"COPY purchase_import_lines ({', '.join(STAGE_COLUMNS)}) FROM STDIN "
+            "WITH (FORMAT csv, FORCE_NOT_NULL (isbn, error))",
+            _CopySource(staged()),
+        )
+    return import_id
+
+
+MATCH_TITLES_SQL = """
+    UPDATE purchase_import_lines L
+       SET title_id = M.title_id
+      FROM (
+            SELECT S.line_no, T.id AS title_id
+              FROM purchase_import_lines S
+             CROSS JOIN LATERAL (
+                   SELECT id FROM titles WHERE isbn = S.isbn ORDER BY id LIMIT 1
+             ) T
+             WHERE S.import_id = %s
+               AND S.title_id IS NULL
+               AND S.isbn <> ''
+      ) M
+     WHERE L.import_id = %s
+       AND L.line_no = M.line_no
+"""
+
+
+def match_titles(cursor, import_id):
+    """Match the unmatched lines of an import to titles by ISBN; returns how many matched."""
+    cursor.execute(MATCH_TITLES_SQL, [import_id, import_id])
+    return cursor.rowcount
+
+
+def import_summary(cursor, import_id, limit=UNMATCHED_LIMIT):
+    cursor.execute(
+        "SELECT id, file_name, purchase_id FROM purchase_imports WHERE id = %s",
+        [import_id],
+    )
+    head = cursor.fetchone()
+    if not head:
+        return None
+    cursor.execute(
+        """
+        SELECT count(*),
+               count(*) FILTER (WHERE skipped),
+               count(*) FILTER (WHERE NOT skipped AND title_id IS NOT NULL AND error = ''),
+               COALESCE(sum(quantity) FILTER (WHERE NOT skipped), 0)
+          FROM purchase_import_lines
+         WHERE import_id = %s
+        """,
+        [import_id],
+    )
+    lines, skipped, matched, quantity = cursor.fetchone()
+    cursor.execute(
+        """
+        SELECT line_no, isbn, quantity, rate, discount_p, error
+          FROM purchase_import_lines
+         WHERE import_id = %s
+           AND NOT skipped
+           AND (title_id IS NULL OR error <> '')
+         ORDER BY line_no
+         LIMIT %s
+        """,
+        [import_id, limit],
+    )
+    problems = [
+        {
+            'line_no': r[0],
+            'isbn': r[1],
+            'quantity': float(r[2]),
+            'rate': float(r[3]),
+            'discount': float(r[4]),
+            'error': r[5] or 'no title with this ISBN',
+        }
+        for r in cursor.fetchall()
+    ]
+    return {
+        'import_id': head[0],
+        'file_name': head[1],
+        'purchase_id': head[2],
+        'lines': lines,
+        'skipped': skipped,
+        'matched': matched,
+        'unmatched': lines - skipped - matched,
+        'quantity': float(quantity),
+        'problems': problems,
+    }
+
+
+def correct_lines(cursor, import_id, corrections):
+    """
+    Apply corrections [{line_no, title_id | isbn, quantity?, rate?, discount?, skip?}]
+    in one UPDATE, then re-match lines given a new ISBN. Corrected numbers
+    must be valid; they clear the line errors of their field (ERROR_FIELDS),
+    and errors of fields left alone are kept.
+    """
+    rows, corrected = [], {}
+    for c in corrections:
+        try:
+            line_no = int(c['line_no'])
+        except (KeyError, TypeError, ValueError):
+            raise InvoiceImportError('Each correction needs a line_no')
+        errors = []
+        numbers = {
+            f: (_number(c[f], f, errors) if c.get(f) not in (None, '') else None)
+            for f in ('quantity', 'rate', 'discount')
+        }
+        for f, v in numbers.items():
+            if v is not None and _range_error(f, v):
+                errors.append(_range_error(f, v))
+        if errors:
+            raise InvoiceImportError(f"Line {line_no}: {', '.join(errors)}")
+        title_id = int(c['title_id']) if c.get('title_id') not in (None, '') else None
+        isbn = normalise_isbn(c['isbn']) if c.get('isbn') else None
+        corrected[line_no] = {f for f, v in numbers.items() if v is not None}
+        if title_id is not None or isbn:
+            corrected[line_no].add('isbn')
+        rows.append([
+            line_no, title_id, isbn or None,
+            numbers['quantity'], numbers['rate'], numbers['discount'],
+            bool(c.get('skip')),
+        ])
+    if not rows:
+        return 0
+
+    cursor.execute(
+        "SELECT line_no, error FROM purchase_import_lines WHERE import_id = %s AND line_no = ANY(%s)",
+        [import_id, list(corrected)],
+    )
+    kept = {
+        line_no: ', '.join(
+            e for e in (error or '').split(', ') if e and ERROR_FIELDS.get(e) not in corrected[line_no]
+        )
+        for line_no, error in cursor.fetchall()
+    }
+    for row in rows:
+        row.append(kept.get(row[0], ''))
+    cursor.execute(
+        """
+        UPDATE purchase_import_lines L
+           SET title_id = CASE WHEN C.title_id IS NOT NULL THEN T.id
+                               WHEN C.isbn IS NOT NULL THEN NULL
+                               ELSE L.title_id END,
+               isbn = COALESCE(C.isbn, L.isbn),
+               quantity = COALESCE(C.quantity, L.quantity),
+               rate = COALESCE(C.rate, L.rate),
+               discount_p = COALESCE(C.discount_p, L.discount_p),
+               skipped = C.skipped,
+               error = C.error
+          FROM unnest(%s::int4[], %s::int4[], %s::varchar[], %s::numeric[], %s::numeric[], %s::numeric[], %s::bool[],
+                      %s::text[])
+               AS C(line_no, title_id, isbn, quantity, rate, discount_p, skipped, error)
+          LEFT JOIN titles T ON T.id = C.title_id
+         WHERE L.import_id = %s
+           AND L.line_no = C.line_no
+        """,
+        [*(list(col) for col in zip(*rows)), import_id],
+    )
+    updated = cursor.rowcount
+    match_titles(cursor, import_id)
+    return updated
+
+
+def posting_items(cursor, import_id, currency_id, exchange_rate):
+    """
+    create_goods_inward items for the lines of an import, in file order.
+    Raises InvoiceImportError while any line that is not skipped is unmatched.
+    """
+    cursor.execute(
+        """
+        SELECT L.line_no, T.id, T.title, T.title_m, T.language_id, T.tax, L.isbn,
+               L.quantity, L.rate, L.discount_p, L.error
+          FROM purchase_import_lines L
+          LEFT JOIN titles T ON T.id = L.title_id
+         WHERE L.import_id = %s
+           AND NOT L.skipped
+         ORDER BY L.line_no
+        """,
+        [import_id],
+    )
+    items, pending = [], []
+    for line_no, title_id, title, title_m, language_id, tax, isbn, qty, rate, disc, error in cursor.fetchall():
+        if title_id is None or error:
+            pending.append(line_no)
+            continue
+        quantity, rate, discount, tax = float(qty), float(rate), float(disc), float(tax or 0)
+        items.append({
+            'itemName': title_m if language_id == 1 and title_m else (title or ''),
+            'isbn': isbn[:15],
+            'quantity': quantity,
+            'purchaseRate': rate,
+            'exchangeRate': exchange_rate,
+            'currency': '',
+            'currencyIndex': currency_id,
+            'tax': tax,
+            'discount': discount,
+            'discountAmount': 0.0,
+            'value': quantity * rate * exchange_rate * (1 - discount / 100) * (1 + tax / 100),
+            'titleId': title_id,
+        })
+    if pending:
+        shown = ', '.join(str(n) for n in pending[:20])
+        raise InvoiceImportError(f"{len(pending)} line(s) still need a title or a fix: {shown}")
+    if not items:
+        raise InvoiceImportError('The import has no lines to post')
+    return items
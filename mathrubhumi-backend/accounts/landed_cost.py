@@ -0,0 +1,91 @@
+"""
+Landed cost of inward lines: the freight / handling breakups of a purchase
+(p_breakup_amount1..4) are spread over its lines and folded into
+purchase_items.purchase_cost, the unit cost margin reporting reads.
+
+Each breakup is spread the way its master row says (purchase_breakups.allocate_by):
+
+* 'V' in proportion to line value, unit cost before breakups x quantity
+  (by quantity instead when the inward has no value, e.g. free copies)
+* 'Q' in proportion to quantity
+
+A line's purchase_cost is its unit cost (line_sync.unit_cost_sql) plus its
+share of every breakup over its quantity, recomputed from the stored lines
+each time, so allocating twice changes nothing. One UPDATE covers any number
+of inwards: saves allocate the inward they wrote,
+
+    allocate_purchases(cursor, [purchase_id])
+
+and the allocate_landed_costs command backfills ranges of purchase ids.
+"""
+from .line_sync import unit_cost_sql
+
+ALLOCATE_SQL = f"""
+    WITH lines AS (
+        SELECT PI.company_id, PI.id, PI.purchase_id, PI.quantity,
+               {unit_cost_sql('PI')} AS unit_cost
+          FROM purchase_items PI
+         WHERE PI.purchase_id {{scope}}
+    ),
+    weighted AS (
+        SELECT L.*,
+               L.unit_cost * L.quantity AS value,
+               SUM(L.unit_cost * L.quantity) OVER (PARTITION BY L.purchase_id) AS total_value,
+               SUM(L.quantity) OVER (PARTITION BY L.purchase_id) AS total_quantity
+          FROM lines L
+    ),
+    breakups AS (
+        SELECT P.id AS purchase_id, B.amount, COALESCE(PB.allocate_by, 'V') AS allocate_by
+          FROM purchase P
+         CROSS JOIN LATERAL (
+                VALUES (P.p_breakup_id1, P.p_breakup_amount1),
+                       (P.p_breakup_id2, P.p_breakup_amount2),
+                       (P.p_breakup_id3, P.p_breakup_amount3),
+                       (P.p_breakup_id4, P.p_breakup_amount4)
+         ) B (breakup_id, amount)
+          LEFT JOIN purchase_breakups PB ON PB.id = B.breakup_id
+         WHERE P.id {{scope}}
+           AND B.amount <> 0
+    ),
+    shares AS (
+        SELECT W.company_id, W.id,
+               SUM(CASE
+                       WHEN B.allocate_by = 'V' AND W.total_value > 0 THEN B.amount * W.value / W.total_value
+                       WHEN W.total_quantity > 0 THEN B.amount * W.quantity / W.total_quantity
+                       ELSE 0
+                   END) AS amount
+          FROM weighted W
+          JOIN breakups B ON B.purchase_id = W.purchase_id
+         GROUP BY W.company_id, W.id
+    ),
+    costs AS (
+        SELECT W.company_id, W.id,
+               GREATEST(round(W.unit_cost + CASE WHEN W.quantity > 0
+                                                 THEN COALESCE(S.amount, 0) / W.quantity
+                                                 ELSE 0 END, 2), 0) AS purchase_cost
+          FROM weighted W
+          LEFT JOIN shares S ON S.company_id = W.company_id AND S.id = W.id
+    )
+    UPDATE purchase_items PI
+       SET purchase_cost = C.purchase_cost
+      FROM costs C
+     WHERE PI.company_id = C.company_id AND PI.id = C.id
+       AND PI.purchase_cost IS DISTINCT FROM C.purchase_cost
+"""
+
+
+def allocate_purchases(cursor, purchase_ids):
+    """Recompute the landed purchase_cost of every line of the given inwards; returns the lines changed."""
+    if not purchase_ids:
+        return 0
+    cursor.execute(ALLOCATE_SQL.format(scope="= ANY(%(ids)s)"), {'ids': list(purchase_ids)})
+    return cursor.rowcount
+
+
+def allocate_range(cursor, first_id, last_id):
+    """As allocate_purchases() for every inward with first_id <= id <= last_id."""
+    cursor.execute(
+        ALLOCATE_SQL.format(scope="BETWEEN %(first)s AND %(last)s"),
+        {'first': first_id, 'last': last_id},
+    )
+    return cursor.rowcount
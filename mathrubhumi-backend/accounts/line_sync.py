@@ -0,0 +1,189 @@
+"""
+Set-based save of a document's lines: the edited lines of a purchase,
+purchase return or sales return are written with at most one UPDATE, one
+INSERT and one DELETE, whatever the number of lines.
+
+A payload line carrying the key of a stored line updates that line (only if
+something changed); any other payload line is inserted; stored lines the
+payload no longer has are deleted. The statements return the stock-relevant
+fields of every line they touched, before and after, in the shape of
+stock.document_lines(), so the caller can post the stock delta of the whole
+edit at once:
+
+    before, after = sync_lines(cur, 'purchase_rt_items', {'company_id': 1, 'parent_id': 7}, lines)
+    apply_movements(cur, DOC_PURCHASE_RT, 7, net_movements(DOC_PURCHASE_RT, before, after))
+"""
+
+
+def unit_cost_sql(alias):
+    """Unit cost in rupees of purchase line `alias` after both discounts, before tax and breakups."""
+    return (
+        f"GREATEST(round({alias}.rate * {alias}.exchange_rate * (1 - {alias}.discount_p / 100)"
+        f" - CASE WHEN {alias}.quantity > 0 THEN {alias}.discount_a / {alias}.quantity ELSE 0 END, 2), 0)"
+    )
+
+
+# SQL expressions over the payload row V for columns derived from it.
+# GST is split into sgst + cgst halves that add back to the rate; the
+# purchase cost starts as the unit cost, the inward's breakups are added
+# afterwards (landed_cost). landed_cost owns purchase_cost once a line is
+# stored, so an edit neither writes it nor counts it as a change.
+PURCHASE_ITEM_DERIVED = {
+    'sgst': "round(V.tax / 2, 2)",
+    'cgst': "V.tax - round(V.tax / 2, 2)",
+    'purchase_cost': unit_cost_sql('V'),
+}
+
+# table -> parent columns, key, how new keys are made, payload columns with
+# their types, derived columns (those in insert_only are not updated), and
+# the stock line (title, batch company, batch id, quantity) of a stored row
+LINE_TABLES = {
+    'purchase_items': {
+        'parent': ['purchase_id'],
+        'key': 'id',
+        'new_keys': 'serial',
+        'columns': {
+            'title_id': 'int4', 'rate': 'numeric', 'exchange_rate': 'numeric', 'discount_p': 'numeric',
+            'discount_a': 'numeric', 'quantity': 'numeric', 'currency_id': 'int2', 'isbn': 'varchar',
+        },
+        'inputs': {'tax': 'numeric'},
+        'derived': PURCHASE_ITEM_DERIVED,
+        'insert_only': ['purchase_cost'],
+        'stock': ['title_id', 'company_id', 'id', 'quantity'],
+    },
+    'purchase_rt_items': {
+        'parent': ['company_id', 'parent_id'],
+        'key': 'id',
+        'new_keys': 'max',
+        'columns': {
+            'title_id': 'int4', 'quantity': 'numeric', 'rate': 'numeric', 'exchange_rate': 'numeric',
+            'adjusted_amount': 'numeric', 'discount': 'numeric', 'line_value': 'numeric',
+            'purchase_det_id': 'int4', 'currency_id': 'int2', 'purchase_company_id': 'int2', 'purchase_id': 'int4',
+        },
+        'stock': ['title_id', 'purchase_company_id', 'purchase_det_id', 'quantity'],
+    },
+    'sale_rt_items': {
+        'parent': ['parent_id'],
+        'key': 'id',
+        'new_keys': 'serial',
+        'columns': {
+            'company_id': 'int2', 'title_id': 'int4', 'quantity': 'numeric', 'rate': 'numeric', 'tax': 'numeric',
+            'exchange_rate': 'numeric', 'discount_p': 'numeric', 'discount_a': 'numeric', 'discount': 'numeric',
+            'sale_det_id': 'int4', 'line_value': 'numeric', 'purchase_company_id': 'int2', 'purchase_id': 'int4',
+            'purchase_det_id': 'int4',
+        },
+        'stock': ['title_id', 'purchase_company_id', 'purchase_det_id', 'quantity'],
+    },
+}
+
+
+def _values_sql(spec, with_key):
+    """unnest() of the payload arrays as V(key?, columns..., inputs..., ord)."""
+    fields = dict(spec['columns'], **spec.get('inputs', {}))
+    if with_key:
+        fields = {spec['key']: 'int4', **fields}
+    arrays = ', '.join(f"%s::{t}[]" for t in fields.values())
+    return f"unnest({arrays}) WITH ORDINALITY AS V({', '.join(fields)}, ord)", list(fields)
+
+
+def _arrays(lines, names):
+    return [[line.get(name) for line in lines] for name in names]
+
+
+def _parent_where(spec, alias):
+    return ' AND '.join(f"{alias}.{c} = %s" for c in spec['parent'])
+
+
+def sync_lines(cursor, table, parent, lines):
+    """
+    Make the stored lines of one document match `lines` (dicts of column
+    values; the key column, when it names a stored line, selects it).
+    Returns (before, after): stock lines of the changed rows as they were and
+    as they are now.
+    """
+    spec = LINE_TABLES[table]
+    key = spec['key']
+    parent_values = [parent[c] for c in spec['parent']]
+    stock = ', '.join(spec['stock'])
+    derived = spec.get('derived', {})
+
+    cursor.execute(
+        f"SELECT {key} FROM {table} T WHERE {_parent_where(spec, 'T')} ORDER BY {key} FOR UPDATE",
+        parent_values,
+    )
+    stored = [row[0] for row in cursor.fetchall()]
+    stored_set = set(stored)
+
+    # a stored key claimed twice (a copied row) is updated by its first line;
+    # the others are new lines
+    updates, inserts, claimed = [], [], set()
+    for line in lines:
+        if line.get(key) in stored_set and line[key] not in claimed:
+            claimed.add(line[key])
+            updates.append(line)
+        else:
+            inserts.append(line)
+    deletes = sorted(stored_set - claimed)
+
+    before, after = [], []
+
+    if updates:
+        values, names = _values_sql(spec, with_key=True)
+        targets = {c: f"V.{c}" for c in spec['columns']}
+        targets.update((c, expr) for c, expr in derived.items() if c not in spec.get('insert_only', ()))
+        assignments = ', '.join(f"{c} = {expr}" for c, expr in targets.items())
+        changed = ' OR '.join(f"T.{c} IS DISTINCT FROM {expr}" for c, expr in targets.items())
+        old_stock = ', '.join(f"O.{c}" for c in spec['stock'])
+        new_stock = ', '.join(f"T.{c}" for c in spec['stock'])
+        same_row = ' AND '.join(f"O.{c} = T.{c}" for c in spec['parent'] + [key])
+        cursor.execute(
+            f"""
+            UPDATE {table} T
+               SET {assignments}
+              FROM {values}, {table} O
+             WHERE {_parent_where(spec, 'T')} AND T.{key} = V.{key}
+               AND {same_row}
+               AND ({changed})
+            RETURNING {old_stock}, {new_stock}
+            """,
+            _arrays(updates, names) + parent_values,
+        )
+        width = len(spec['stock'])
+        for row in cursor.fetchall():
+            before.append(row[:width])
+            after.append(row[width:])
+
+    if deletes:
+        cursor.execute(
+            f"DELETE FROM {table} T WHERE {_parent_where(spec, 'T')} AND T.{key} = ANY(%s) RETURNING {stock}",
+            parent_values + [deletes],
+        )
+        before.extend(cursor.fetchall())
+
+    if inserts:
+        with_key = spec['new_keys'] == 'max'
+        if with_key:
+            # keys run on from the highest stored one
+            first = max(stored, default=0) + 1
+            inserts = [dict(line, **{key: first + n}) for n, line in enumerate(inserts)]
+        values, names = _values_sql(spec, with_key=with_key)
+        columns = spec['parent'] + ([key] if with_key else []) + list(spec['columns']) + list(derived)
+        selects = (
+            ['%s'] * len(spec['parent'])
+            + [f"V.{key}"] * with_key
+            + [f"V.{c}" for c in spec['columns']]
+            + list(derived.values())
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            SELECT {', '.join(selects)}
+              FROM {values}
+             ORDER BY V.ord
+            RETURNING {stock}
+            """,
+            parent_values + _arrays(inserts, names),
+        )
+        after.extend(cursor.fetchall())
+
+    return before, after
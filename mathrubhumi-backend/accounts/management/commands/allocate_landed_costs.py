@@ -0,0 +1,76 @@
+"""
+Backfill the landed purchase_cost of historical inward lines
+(accounts.landed_cost).
+
+Purchase ids are cut into ranges of --chunk-size; --workers threads, each
+with its own connection, allocate one range per transaction, so a failure
+only rolls back its own range and locks are held briefly. Allocation is
+idempotent: rerunning, or running over ranges already done, is harmless.
+
+    python manage.py allocate_landed_costs --workers 4 --chunk-size 2000
+"""
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from accounts import landed_cost
+
+
+class Command(BaseCommand):
+    help = 'Spread purchase breakups over inward lines as landed cost, in parallel chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=2000, help='purchase ids per transaction')
+        parser.add_argument('--from-id', type=int, help='first purchase id (default: lowest)')
+        parser.add_argument('--to-id', type=int, help='last purchase id (default: highest)')
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        chunk_size = max(1, options['chunk_size'])
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT min(id), max(id) FROM purchase")
+            lowest, highest = cursor.fetchone()
+        if lowest is None:
+            self.stdout.write(self.style.SUCCESS('No purchases to allocate'))
+            return
+        first = max(lowest, options['from_id'] or lowest)
+        last = min(highest, options['to_id'] or highest)
+
+        chunks = [(start, min(start + chunk_size - 1, last)) for start in range(first, last + 1, chunk_size)]
+        lock = threading.Lock()
+        updated, errors = [0], []
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not chunks or errors:
+                            return
+                        start, end = chunks.pop(0)
+                    with transaction.atomic(), connection.cursor() as cursor:
+                        changed = landed_cost.allocate_range(cursor, start, end)
+                    with lock:
+                        updated[0] += changed
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(min(workers, len(chunks)))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        if errors:
+            # ranges already committed stay allocated; rerunning redoes the rest
+            raise CommandError(f"{len(errors)} worker(s) failed: {errors[0]}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Allocated purchases {first}-{last}: {updated[0]} lines changed "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
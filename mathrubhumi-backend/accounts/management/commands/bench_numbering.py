@@ -0,0 +1,125 @@
+"""
+Contention benchmark for document numbering (accounts.numbering).
+
+N worker threads, each with its own connection, save documents concurrently
+against one series. Every save is a transaction that allocates a number and
+does --hold-ms of other work (pg_sleep stands in for header/line inserts):
+
+  legacy        number taken first, last_values row locked for the whole save
+  gapless-late  same counter, number taken as the last statement of the save
+  block         block-allocated sequence, no row lock at all
+
+Uses fin_year '9999' and removes its counters/sequences afterwards.
+
+    python manage.py bench_numbering --workers 50 --docs 20 --hold-ms 5
+"""
+import statistics
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from accounts import numbering
+
+BENCH_YEAR = '9999'
+BENCH_CODE = 'BENCH_DOCNO'
+
+
+def _hold(cursor, hold_ms):
+    if hold_ms:
+        cursor.execute("SELECT pg_sleep(%s)", [hold_ms / 1000.0])
+
+
+def _legacy(cursor, hold_ms):
+    number = numbering.next_gapless(cursor, 1, BENCH_YEAR, BENCH_CODE)
+    _hold(cursor, hold_ms)
+    return number
+
+
+def _gapless_late(cursor, hold_ms):
+    _hold(cursor, hold_ms)
+    return numbering.next_gapless(cursor, 1, BENCH_YEAR, BENCH_CODE)
+
+
+def _block(cursor, hold_ms):
+    _hold(cursor, hold_ms)
+    return numbering.next_from_block(cursor, 1, BENCH_YEAR, BENCH_CODE)
+
+
+SCENARIOS = [('legacy', _legacy), ('gapless-late', _gapless_late), ('block', _block)]
+
+
+class Command(BaseCommand):
+    help = 'Measure document number allocation under concurrent saves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=50)
+        parser.add_argument('--docs', type=int, default=20, help='documents saved per worker')
+        parser.add_argument('--hold-ms', type=float, default=5.0, help='other work per save transaction')
+
+    def _cleanup(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM last_values WHERE company_id = 1 AND fin_year = %s AND code = %s",
+                [BENCH_YEAR, BENCH_CODE],
+            )
+            cursor.execute(f'DROP SEQUENCE IF EXISTS "{numbering._sequence_name(1, BENCH_YEAR, BENCH_CODE)}"')
+        numbering._blocks.pop((1, BENCH_YEAR, BENCH_CODE), None)
+
+    def _run(self, allocate, workers, docs, hold_ms):
+        latencies, numbers, errors = [], [], []
+        lock = threading.Lock()
+        barrier = threading.Barrier(workers)
+
+        def worker():
+            mine_lat, mine_num = [], []
+            try:
+                connection.ensure_connection()
+                barrier.wait()
+                for _ in range(docs):
+                    started = time.perf_counter()
+                    with transaction.atomic(), connection.cursor() as cursor:
+                        mine_num.append(allocate(cursor, hold_ms))
+                    mine_lat.append((time.perf_counter() - started) * 1000)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+                with lock:
+                    latencies.extend(mine_lat)
+                    numbers.extend(mine_num)
+
+        threads = [threading.Thread(target=worker) for _ in range(workers)]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+        return elapsed, latencies, numbers, errors
+
+    def handle(self, *args, **options):
+        workers = max(1, options['workers'])
+        docs = max(1, options['docs'])
+        hold_ms = max(0.0, options['hold_ms'])
+
+        self.stdout.write(
+            f"{workers} workers x {docs} docs, {hold_ms:g} ms of other work per save\n"
+            f"{'mode':<13} {'docs/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'unique':>7}"
+        )
+        for label, allocate in SCENARIOS:
+            self._cleanup()
+            elapsed, latencies, numbers, errors = self._run(allocate, workers, docs, hold_ms)
+            if errors:
+                self.stderr.write(f"{label}: {len(errors)} worker(s) failed: {errors[0]}")
+                continue
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            unique = 'yes' if len(set(numbers)) == len(numbers) else 'NO'
+            self.stdout.write(
+                f"{label:<13} {len(numbers) / elapsed:>9.0f} {statistics.median(latencies):>8.1f} "
+                f"{p95:>8.1f} {unique:>7}"
+            )
+        self._cleanup()
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,106 @@
+"""
+Benchmark sale line persistence: per-row INSERTs (the old create_sale loop)
+against the single-statement unnest() insert in accounts.sale_lines.
+
+Everything runs inside a transaction that is rolled back, so it is safe to
+point at a live database.
+
+    python manage.py bench_sale_save --lines 1 10 50 150 300 400 --repeat 20
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from accounts.sale_lines import insert_sale_items
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _sample_items(count):
+    return [
+        {
+            'exchangeRate': 1.0,
+            'quantity': 1.0 + (i % 3),
+            'rate': 100.0 + i,
+            'tax': 5.0,
+            'discount': 0.0,
+            'value': (1.0 + (i % 3)) * (100.0 + i),
+            'currencyIndex': 1,
+            'titleId': i + 1,
+            'allocatedBillDiscount': 0.0,
+            'purchaseCompanyId': 0,
+            'purchaseId': 0,
+            'purchaseItemId': 0,
+        }
+        for i in range(count)
+    ]
+
+
+def _insert_row_by_row(cursor, sale_id, items):
+    for item in items:
+        cursor.execute(
+            """
+            INSERT INTO sale_items (
+                sale_id, exchange_rate, quantity, rate, tax, discount_p, line_value, currency_id, title_id, allocated_bill_discount,
+                purchase_company_id, purchase_id, purchase_item_id
+            )
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            [
+                sale_id,
+                item['exchangeRate'],
+                item['quantity'],
+                item['rate'],
+                item['tax'],
+                item['discount'],
+                item['value'],
+                item['currencyIndex'],
+                item['titleId'],
+                item['allocatedBillDiscount'],
+                item['purchaseCompanyId'],
+                item['purchaseId'],
+                item['purchaseItemId'],
+            ]
+        )
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row and batched sale_items inserts across bill sizes (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, nargs='+', default=[1, 10, 50, 150, 300, 400])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def _time_save(self, writer, items):
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "INSERT INTO sales (customer_nm, sale_date, bill_no) VALUES (%s, CURRENT_DATE, %s) RETURNING id",
+                        ['BENCH', 'BENCH'],
+                    )
+                    sale_id = cursor.fetchone()[0]
+                    writer(cursor, sale_id, items)
+                raise _Rollback
+        except _Rollback:
+            pass
+        return (time.perf_counter() - started) * 1000
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        self.stdout.write(f"{'lines':>6} {'row-by-row ms':>14} {'batched ms':>11} {'speedup':>8}")
+        for count in options['lines']:
+            items = _sample_items(count)
+            # warm-up so plan caching / connection setup is not measured
+            self._time_save(_insert_row_by_row, items)
+            self._time_save(insert_sale_items, items)
+
+            legacy = statistics.median(self._time_save(_insert_row_by_row, items) for _ in range(repeat))
+            batched = statistics.median(self._time_save(insert_sale_items, items) for _ in range(repeat))
+            speedup = legacy / batched if batched else 0.0
+            self.stdout.write(f"{count:>6} {legacy:>14.2f} {batched:>11.2f} {speedup:>7.1f}x")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from accounts.idempotency import purge_expired, ttl_hours
+
+
+class Command(BaseCommand):
+    help = 'Delete Idempotency-Key records older than IDEMPOTENCY_KEY_TTL_HOURS (run from cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        removed = purge_expired(batch_size=max(1, options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} idempotency keys older than {ttl_hours()}h'))
@@ -0,0 +1,108 @@
+"""
+Change feed over the master tables counters keep in a local catalogue.
+
+Triggers (migration 0025) upsert one master_changes row per (table, key) on
+every insert, update or delete, stamped with the id of the writing
+transaction as its version; deletes leave a tombstone. A client pulls the
+rows changed since the `since` token it got last time and applies them to
+its copy, so product search and the dropdown lists can be served locally.
+
+The token returned after a complete pull is the xmin of the reading
+snapshot: every transaction below it has finished, so nothing committed
+later can carry a smaller version. Rows of transactions still running are
+sent again next time, which is harmless since applying a change is an
+upsert. A pull larger than `limit` is paged with a continuation token that
+keeps the original watermark.
+"""
+
+# table -> (key column, columns sent to the client)
+MASTER_TABLES = {
+    'titles': ('id', ['id', 'title', 'title_m', 'rate', 'tax', 'language_id', 'isbn', 'author_id', 'publisher_id']),
+    'currencies': ('id', ['id', 'currency_name', 'exchange_rate']),
+    'sale_types': ('sale_typeid', ['sale_typeid', 'sale_type']),
+    'agents': ('id', ['id', 'agent_nm']),
+    'cr_customers': ('id', [
+        'id', 'customer_nm', 'customer_type', 'address_1', 'address_2', 'city', 'telephone',
+        'gstin', 'credit_limit', 'credit_days', 'class',
+    ]),
+    'branches': ('id', ['id', 'branches_nm']),
+}
+
+DEFAULT_LIMIT = 5000
+MAX_LIMIT = 20000
+
+
+class FeedError(ValueError):
+    pass
+
+
+def _table_sql(table):
+    key, columns = MASTER_TABLES[table]
+    row = ', '.join(f"'{c}', M.\"{c}\"" for c in columns)
+    return f"""
+        SELECT C."version", C.table_name, C.row_id, C.deleted OR M.{key} IS NULL,
+               CASE WHEN M.{key} IS NULL THEN NULL ELSE json_build_object({row}) END
+          FROM master_changes C
+          LEFT JOIN {table} M ON M.{key} = C.row_id
+         WHERE C.table_name = '{table}'
+           AND C."version" >= %(floor)s
+           AND (C."version", C.table_name, C.row_id) > (%(version)s, %(table)s, %(row_id)s)
+    """
+
+
+def parse_token(token):
+    """
+    '' -> full pull; 'W' -> changes since watermark W;
+    'F:W:V:table:id' -> next page of a pull from F that will end at watermark W.
+    Returns (floor, watermark or None, last key sent).
+    """
+    start = (-1, '', -1)
+    if not token:
+        return 0, None, start
+    parts = str(token).split(':')
+    try:
+        if len(parts) == 1:
+            return int(parts[0]), None, start
+        if len(parts) == 5:
+            return int(parts[0]), int(parts[1]), (int(parts[2]), parts[3], int(parts[4]))
+    except ValueError:
+        pass
+    raise FeedError(f'Invalid since token: {token}')
+
+
+def changes_since(cursor, token=None, tables=None, limit=DEFAULT_LIMIT):
+    """
+    Changed rows of `tables` (default all) after `token`, oldest first.
+    Returns (changes, next_token, more).
+    """
+    tables = list(tables or MASTER_TABLES)
+    unknown = [t for t in tables if t not in MASTER_TABLES]
+    if unknown:
+        raise FeedError(f"Unknown table(s): {', '.join(unknown)}")
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    floor, watermark, (version, table, row_id) = parse_token(token)
+
+    if watermark is None:
+        # first page: fix the watermark the finished pull hands back
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::int8")
+        watermark = cursor.fetchone()[0]
+
+    sql = ' UNION ALL '.join(_table_sql(t) for t in tables)
+    cursor.execute(
+        f"SELECT * FROM ({sql}) AS changes ORDER BY 1, 2, 3 LIMIT %(limit)s",
+        {'floor': floor, 'version': version, 'table': table, 'row_id': row_id, 'limit': limit + 1},
+    )
+    rows = cursor.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+
+    changes = [
+        {'table': r[1], 'id': r[2], 'version': r[0], 'deleted': r[3], 'row': r[4]}
+        for r in rows
+    ]
+    if more:
+        last = rows[-1]
+        next_token = f"{floor}:{watermark}:{last[0]}:{last[1]}:{last[2]}"
+    else:
+        next_token = str(watermark)
+    return changes, next_token, more
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+FORWARD_SQL = r"""
+CREATE TABLE IF NOT EXISTS public.idempotency_keys (
+    user_id int8 NOT NULL,
+    endpoint varchar(40) NOT NULL,
+    idem_key varchar(100) NOT NULL,
+    request_hash bpchar(64) NOT NULL,
+    status_code int2 NULL,
+    response_body text NULL,
+    created_at timestamptz DEFAULT now() NOT NULL,
+    CONSTRAINT idempotency_keys_pk PRIMARY KEY (user_id, endpoint, idem_key)
+);
+
+CREATE INDEX IF NOT EXISTS idempotency_keys_created_at_idx
+    ON public.idempotency_keys (created_at);
+"""
+
+REVERSE_SQL = r"""
+DROP TABLE IF EXISTS public.idempotency_keys;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_add_sales_credit_customer_wise_function'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
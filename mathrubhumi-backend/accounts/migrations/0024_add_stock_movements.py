@@ -0,0 +1,48 @@
+from django.db import migrations
+
+FORWARD_SQL = r"""
+CREATE TABLE IF NOT EXISTS public.stock_movements (
+    id bigserial NOT NULL,
+    moved_at timestamptz DEFAULT now() NOT NULL,
+    doc_type varchar(4) NOT NULL,
+    doc_id int4 NOT NULL,
+    title_id int4 NOT NULL,
+    batch_company_id int2 DEFAULT 0 NOT NULL,
+    batch_item_id int4 DEFAULT 0 NOT NULL,
+    quantity numeric(12, 3) NOT NULL,
+    CONSTRAINT stock_movements_pkey PRIMARY KEY (id)
+);
+
+CREATE INDEX IF NOT EXISTS stock_movements_title_idx ON public.stock_movements (title_id, id);
+CREATE INDEX IF NOT EXISTS stock_movements_doc_idx ON public.stock_movements (doc_type, doc_id);
+
+CREATE OR REPLACE FUNCTION public.stock_movements_append_only()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    RAISE EXCEPTION 'stock_movements is append-only; post a correcting movement instead';
+END;
+$$;
+
+DROP TRIGGER IF EXISTS stock_movements_append_only ON public.stock_movements;
+CREATE TRIGGER stock_movements_append_only
+    BEFORE UPDATE OR DELETE ON public.stock_movements
+    FOR EACH STATEMENT EXECUTE FUNCTION public.stock_movements_append_only();
+"""
+
+REVERSE_SQL = r"""
+DROP TABLE IF EXISTS public.stock_movements;
+DROP FUNCTION IF EXISTS public.stock_movements_append_only();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0023_add_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
@@ -0,0 +1,95 @@
+from django.db import migrations
+
+# Master tables tracked for the counter-side catalogue feed, with their key column.
+TRACKED = [
+    ('titles', 'id'),
+    ('currencies', 'id'),
+    ('sale_types', 'sale_typeid'),
+    ('agents', 'id'),
+    ('cr_customers', 'id'),
+    ('branches', 'id'),
+]
+
+# titles.stock moves with every sale; only the catalogue columns bump the version
+TITLE_COLUMNS = (
+    'id, title, author_id, language_id, title_m, rate, tax, isbn, publisher_id, translator_id, '
+    'category_id, sub_category_id, sap_code, location_id'
+)
+
+FORWARD_SQL = r"""
+CREATE TABLE IF NOT EXISTS public.master_changes (
+    table_name varchar(20) NOT NULL,
+    row_id int4 NOT NULL,
+    "version" int8 NOT NULL,
+    deleted bool DEFAULT false NOT NULL,
+    changed_at timestamptz DEFAULT now() NOT NULL,
+    CONSTRAINT master_changes_pkey PRIMARY KEY (table_name, row_id)
+);
+
+CREATE INDEX IF NOT EXISTS master_changes_version_idx ON public.master_changes ("version", table_name, row_id);
+
+-- version = id of the writing transaction: 64-bit and increasing, so a
+-- reader can resume from the xmin of its snapshot without skipping rows
+-- committed late by transactions that started earlier
+CREATE OR REPLACE FUNCTION public.master_changes_track()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    old_id int4;
+    new_id int4;
+    xact int8 := pg_current_xact_id()::text::int8;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        old_id := (to_jsonb(OLD) ->> TG_ARGV[0])::int4;
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        new_id := (to_jsonb(NEW) ->> TG_ARGV[0])::int4;
+    END IF;
+
+    IF old_id IS NOT NULL AND old_id IS DISTINCT FROM new_id THEN
+        INSERT INTO public.master_changes (table_name, row_id, "version", deleted)
+        VALUES (TG_TABLE_NAME, old_id, xact, true)
+        ON CONFLICT (table_name, row_id) DO UPDATE
+           SET "version" = EXCLUDED."version", deleted = true, changed_at = now();
+    END IF;
+    IF new_id IS NOT NULL THEN
+        INSERT INTO public.master_changes (table_name, row_id, "version", deleted)
+        VALUES (TG_TABLE_NAME, new_id, xact, false)
+        ON CONFLICT (table_name, row_id) DO UPDATE
+           SET "version" = EXCLUDED."version", deleted = false, changed_at = now();
+    END IF;
+    RETURN NULL;
+END;
+$$;
+""" + "".join(
+    f"""
+DROP TRIGGER IF EXISTS master_changes_track ON public.{table};
+CREATE TRIGGER master_changes_track
+    AFTER INSERT OR DELETE OR UPDATE{' OF ' + TITLE_COLUMNS if table == 'titles' else ''} ON public.{table}
+    FOR EACH ROW EXECUTE FUNCTION public.master_changes_track('{key}');
+
+INSERT INTO public.master_changes (table_name, row_id, "version")
+SELECT '{table}', {key}, pg_current_xact_id()::text::int8 FROM public.{table}
+ON CONFLICT (table_name, row_id) DO NOTHING;
+"""
+    for table, key in TRACKED
+)
+
+REVERSE_SQL = "".join(
+    f"DROP TRIGGER IF EXISTS master_changes_track ON public.{table};\n" for table, _ in TRACKED
+) + r"""
+DROP FUNCTION IF EXISTS public.master_changes_track();
+DROP TABLE IF EXISTS public.master_changes;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0024_add_stock_movements'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
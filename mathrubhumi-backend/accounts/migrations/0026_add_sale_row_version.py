@@ -0,0 +1,85 @@
+from django.db import migrations
+
+FORWARD_SQL = r"""
+ALTER TABLE public.sales ADD COLUMN IF NOT EXISTS row_version int8 DEFAULT 1 NOT NULL;
+
+-- bill lookups are by sales.id / sale_items.sale_id; the unique keys lead with company_id
+CREATE INDEX IF NOT EXISTS sales_id_idx ON public.sales (id);
+CREATE INDEX IF NOT EXISTS sale_items_sale_id_idx ON public.sale_items (sale_id, id);
+
+CREATE OR REPLACE FUNCTION public.sales_bump_row_version()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.row_version := OLD.row_version + 1;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS sales_bump_row_version ON public.sales;
+CREATE TRIGGER sales_bump_row_version
+    BEFORE UPDATE ON public.sales
+    FOR EACH ROW
+    WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION public.sales_bump_row_version();
+
+-- a change to the lines is a change to the bill
+CREATE OR REPLACE FUNCTION public.sale_items_bump_sale_version()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE public.sales S SET row_version = S.row_version + 1
+         WHERE S.id IN (SELECT DISTINCT sale_id FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE public.sales S SET row_version = S.row_version + 1
+         WHERE S.id IN (SELECT DISTINCT sale_id FROM old_rows);
+    ELSE
+        UPDATE public.sales S SET row_version = S.row_version + 1
+         WHERE S.id IN (SELECT sale_id FROM new_rows UNION SELECT sale_id FROM old_rows);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS sale_items_bump_sale_version_ins ON public.sale_items;
+DROP TRIGGER IF EXISTS sale_items_bump_sale_version_upd ON public.sale_items;
+DROP TRIGGER IF EXISTS sale_items_bump_sale_version_del ON public.sale_items;
+CREATE TRIGGER sale_items_bump_sale_version_ins
+    AFTER INSERT ON public.sale_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.sale_items_bump_sale_version();
+CREATE TRIGGER sale_items_bump_sale_version_upd
+    AFTER UPDATE ON public.sale_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.sale_items_bump_sale_version();
+CREATE TRIGGER sale_items_bump_sale_version_del
+    AFTER DELETE ON public.sale_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.sale_items_bump_sale_version();
+"""
+
+REVERSE_SQL = r"""
+DROP TRIGGER IF EXISTS sale_items_bump_sale_version_ins ON public.sale_items;
+DROP TRIGGER IF EXISTS sale_items_bump_sale_version_upd ON public.sale_items;
+DROP TRIGGER IF EXISTS sale_items_bump_sale_version_del ON public.sale_items;
+DROP FUNCTION IF EXISTS public.sale_items_bump_sale_version();
+DROP TRIGGER IF EXISTS sales_bump_row_version ON public.sales;
+DROP FUNCTION IF EXISTS public.sales_bump_row_version();
+DROP INDEX IF EXISTS public.sale_items_sale_id_idx;
+DROP INDEX IF EXISTS public.sales_id_idx;
+ALTER TABLE public.sales DROP COLUMN IF EXISTS row_version;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0025_add_master_changes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
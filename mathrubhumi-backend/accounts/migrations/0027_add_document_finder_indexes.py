@@ -0,0 +1,55 @@
+from django.db import migrations
+
+# Indexes behind the document finder (accounts.document_finder) and the sale
+# return desk lookups. Built CONCURRENTLY so a live counter is not blocked
+# while a large table is indexed; that needs one statement per execute and a
+# non-atomic migration.
+INDEXES = [
+    # newest-first keyset scans per document type
+    ('sales_date_keyset_idx', 'sales (sale_date, company_id, id)'),
+    ('sales_rt_date_keyset_idx', 'sales_rt (entry_date, company_id, id)'),
+    ('purchase_date_keyset_idx', 'purchase (entry_date, company_id, id)'),
+    ('pp_receipts_date_keyset_idx', 'pp_receipts (entry_date, company_id, id)'),
+    ('remittance_date_keyset_idx', 'remittance (entry_date, company_id, id)'),
+    ('cr_realisation_date_keyset_idx', 'cr_realisation (entry_date, company_id, id)'),
+
+    # document numbers
+    ('sales_bill_no_idx', 'sales (bill_no text_pattern_ops)'),
+    ('sales_rt_no_idx', 'sales_rt (sales_rt_no)'),
+    ('purchase_no_idx', 'purchase (purchase_no)'),
+    ('purchase_invoice_no_idx', 'purchase (invoice_no text_pattern_ops)'),
+    ('pp_receipts_receipt_no_idx', 'pp_receipts (receipt_no)'),
+    ('remittance_no_idx', 'remittance (remittance_no)'),
+    ('cr_realisation_receipt_no_idx', 'cr_realisation (receipt_no)'),
+
+    # mobile and customer
+    ('sales_mobile_idx', 'sales (mobile_number, sale_date, company_id, id)'),
+    ('sales_customer_nm_idx', 'sales (customer_nm, id)'),
+    ('sales_customer_prefix_idx', 'sales (lower(customer_nm) text_pattern_ops)'),
+    ('sales_rt_cash_customer_prefix_idx', 'sales_rt (lower(cash_customer) text_pattern_ops)'),
+    ('sales_rt_cr_customer_idx', 'sales_rt (cr_customer_id, entry_date)'),
+    ('purchase_supplier_idx', 'purchase (supplier_id, entry_date)'),
+    ('pp_receipts_pp_customer_idx', 'pp_receipts (pp_customer_id, entry_date)'),
+    ('remittance_c_name_prefix_idx', 'remittance (lower(c_name) text_pattern_ops)'),
+    ('cr_realisation_customer_idx', 'cr_realisation (customer_id, entry_date)'),
+    ('cr_customers_name_prefix_idx', 'cr_customers (lower(customer_nm) text_pattern_ops)'),
+    ('pp_customers_name_prefix_idx', 'pp_customers (lower(pp_customer_nm) text_pattern_ops)'),
+    ('suppliers_name_prefix_idx', 'suppliers (lower(supplier_nm) text_pattern_ops)'),
+]
+
+FORWARD_SQL = [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON public.{target};" for name, target in INDEXES]
+
+REVERSE_SQL = [f"DROP INDEX CONCURRENTLY IF EXISTS public.{name};" for name, _ in INDEXES]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0026_add_sale_row_version'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
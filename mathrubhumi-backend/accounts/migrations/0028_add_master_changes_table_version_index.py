@@ -0,0 +1,22 @@
+from django.db import migrations
+
+# Screen bootstrap versions (accounts.screen_bootstrap) read the newest change
+# of one master table; the feed index leads with version, so give them their own.
+FORWARD_SQL = r"""
+CREATE INDEX IF NOT EXISTS master_changes_table_version_idx ON public.master_changes (table_name, "version");
+"""
+
+REVERSE_SQL = r"""
+DROP INDEX IF EXISTS public.master_changes_table_version_idx;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0027_add_document_finder_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+# Lookups behind resolve_title_ids(): a title by isbn, Malayalam title or
+# title, lowest id first. Built CONCURRENTLY so the catalogue stays writable.
+INDEXES = [
+    ('titles_isbn_idx', 'titles (isbn, id)'),
+    ('titles_title_m_idx', 'titles (title_m, id)'),
+    ('titles_title_idx', 'titles (title, id)'),
+]
+
+FORWARD_SQL = [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON public.{target};" for name, target in INDEXES]
+
+REVERSE_SQL = [f"DROP INDEX CONCURRENTLY IF EXISTS public.{name};" for name, _ in INDEXES]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0028_add_master_changes_table_version_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+# Supplier invoice files being imported into a goods inward
+# (accounts.invoice_import): one row per upload, one per invoice line.
+FORWARD_SQL = r"""
+CREATE TABLE IF NOT EXISTS public.purchase_imports (
+    id serial4 NOT NULL,
+    file_name varchar(255) DEFAULT '' NOT NULL,
+    user_id int4 DEFAULT 0 NOT NULL,
+    created_at timestamptz DEFAULT now() NOT NULL,
+    purchase_id int4 NULL,
+    posted_at timestamptz NULL,
+    CONSTRAINT purchase_imports_pkey PRIMARY KEY (id)
+);
+
+CREATE TABLE IF NOT EXISTS public.purchase_import_lines (
+    import_id int4 NOT NULL,
+    line_no int4 NOT NULL,
+    isbn varchar(20) DEFAULT '' NOT NULL,
+    quantity numeric(10, 3) DEFAULT 0 NOT NULL,
+    rate numeric(8, 2) DEFAULT 0 NOT NULL,
+    discount_p numeric(5, 2) DEFAULT 0 NOT NULL,
+    title_id int4 NULL,
+    skipped bool DEFAULT false NOT NULL,
+    error varchar(100) DEFAULT '' NOT NULL,
+    CONSTRAINT purchase_import_lines_pkey PRIMARY KEY (import_id, line_no),
+    CONSTRAINT purchase_import_lines_import_fk FOREIGN KEY (import_id)
+        REFERENCES public.purchase_imports (id) ON DELETE CASCADE
+);
+"""
+
+REVERSE_SQL = r"""
+DROP TABLE IF EXISTS public.purchase_import_lines;
+DROP TABLE IF EXISTS public.purchase_imports;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0029_add_title_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
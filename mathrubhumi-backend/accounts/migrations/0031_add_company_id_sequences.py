@@ -0,0 +1,49 @@
+from django.db import migrations
+
+# Per-company id sequences for the (company_id, id) tables that used to take
+# MAX(id) + 1 (accounts.numbering.next_id). Each sequence starts past the ids
+# already stored for its company; companies without rows get theirs on first use.
+FORWARD_SQL = r"""
+DO $$
+DECLARE
+    t text;
+    r record;
+BEGIN
+    FOREACH t IN ARRAY ARRAY['purchase_rt', 'remittance'] LOOP
+        FOR r IN EXECUTE format('SELECT company_id, MAX(id) AS last_id FROM public.%I GROUP BY company_id', t) LOOP
+            EXECUTE format(
+                'CREATE SEQUENCE IF NOT EXISTS public.%I AS int4 MINVALUE 1 START WITH %s',
+                'docid_' || t || '_' || r.company_id, r.last_id + 1
+            );
+        END LOOP;
+    END LOOP;
+END
+$$;
+"""
+
+REVERSE_SQL = r"""
+DO $$
+DECLARE
+    s text;
+BEGIN
+    FOR s IN
+        SELECT sequence_name FROM information_schema.sequences
+         WHERE sequence_schema = 'public'
+           AND (sequence_name LIKE 'docid\_purchase\_rt\_%' OR sequence_name LIKE 'docid\_remittance\_%')
+    LOOP
+        EXECUTE format('DROP SEQUENCE IF EXISTS public.%I', s);
+    END LOOP;
+END
+$$;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0030_add_purchase_imports'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
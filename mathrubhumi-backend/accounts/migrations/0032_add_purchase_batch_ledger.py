@@ -0,0 +1,70 @@
+from django.db import migrations
+
+# Running totals per purchase batch (purchase_items row), kept by the stock
+# engine (accounts.stock) on every save: received on the inward, sold on
+# bills, taken back on sales returns and returned to the supplier. The
+# goods inward return screen reads what is still returnable from here.
+# Existing documents are summed in once; batch company 0 means company 1,
+# as in the engine.
+FORWARD_SQL = r"""
+CREATE TABLE IF NOT EXISTS public.purchase_batch_ledger (
+    company_id int2 NOT NULL,
+    item_id int4 NOT NULL,
+    purchase_id int4 DEFAULT 0 NOT NULL,
+    title_id int4 DEFAULT 0 NOT NULL,
+    received numeric(12, 3) DEFAULT 0 NOT NULL,
+    sold numeric(12, 3) DEFAULT 0 NOT NULL,
+    sale_returned numeric(12, 3) DEFAULT 0 NOT NULL,
+    returned numeric(12, 3) DEFAULT 0 NOT NULL,
+    available numeric(12, 3) GENERATED ALWAYS AS (received - sold + sale_returned - returned) STORED,
+    CONSTRAINT purchase_batch_ledger_pkey PRIMARY KEY (company_id, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS purchase_batch_ledger_purchase_idx
+    ON public.purchase_batch_ledger (purchase_id);
+
+INSERT INTO public.purchase_batch_ledger
+       (company_id, item_id, purchase_id, title_id, received, sold, sale_returned, returned)
+SELECT M.company_id, M.item_id,
+       COALESCE(PI.purchase_id, 0), COALESCE(PI.title_id, 0),
+       sum(M.received), sum(M.sold), sum(M.sale_returned), sum(M.returned)
+  FROM (
+        SELECT company_id, id AS item_id, quantity AS received,
+               0 AS sold, 0 AS sale_returned, 0 AS returned
+          FROM public.purchase_items
+        UNION ALL
+        SELECT CASE WHEN SI.purchase_company_id = 0 THEN 1 ELSE SI.purchase_company_id END,
+               SI.purchase_item_id, 0, SI.quantity, 0, 0
+          FROM public.sale_items SI
+          JOIN public.sales S ON S.id = SI.sale_id
+         WHERE SI.purchase_item_id <> 0 AND COALESCE(S.cancel, 0) <> 1
+        UNION ALL
+        SELECT CASE WHEN purchase_company_id = 0 THEN 1 ELSE purchase_company_id END,
+               purchase_det_id, 0, 0, quantity, 0
+          FROM public.sale_rt_items
+         WHERE purchase_det_id <> 0
+        UNION ALL
+        SELECT CASE WHEN purchase_company_id = 0 THEN 1 ELSE purchase_company_id END,
+               purchase_det_id, 0, 0, 0, quantity
+          FROM public.purchase_rt_items
+         WHERE purchase_det_id <> 0
+  ) M
+  LEFT JOIN public.purchase_items PI ON PI.company_id = M.company_id AND PI.id = M.item_id
+ GROUP BY M.company_id, M.item_id, PI.purchase_id, PI.title_id
+ON CONFLICT (company_id, item_id) DO NOTHING;
+"""
+
+REVERSE_SQL = r"""
+DROP TABLE IF EXISTS public.purchase_batch_ledger;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0031_add_company_id_sequences'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
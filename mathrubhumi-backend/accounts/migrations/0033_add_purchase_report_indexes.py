@@ -0,0 +1,29 @@
+from django.db import migrations
+
+# Indexes behind the purchase-side registers (migration 0034): a company's
+# purchases / returns over a date range, optionally for one supplier, and the
+# lines of each purchase. Built CONCURRENTLY, like the finder indexes.
+INDEXES = [
+    ('purchase_company_date_idx', 'purchase (company_id, entry_date)'),
+    ('purchase_company_supplier_date_idx', 'purchase (company_id, supplier_id, entry_date)'),
+    ('purchase_items_purchase_idx', 'purchase_items (purchase_id)'),
+    ('purchase_rt_company_date_idx', 'purchase_rt (company_id, entry_date)'),
+    ('purchase_rt_company_supplier_date_idx', 'purchase_rt (company_id, supplier_id, entry_date)'),
+]
+
+FORWARD_SQL = [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON public.{target};" for name, target in INDEXES]
+
+REVERSE_SQL = [f"DROP INDEX CONCURRENTLY IF EXISTS public.{name};" for name, _ in INDEXES]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0032_add_purchase_batch_ledger'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
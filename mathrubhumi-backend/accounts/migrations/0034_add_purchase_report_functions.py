@@ -0,0 +1,189 @@
+from django.db import migrations
+
+# Purchase-side registers. A supplier / breakup id of 0 means all of them; the
+# filter is written as a range so the plan plpgsql caches stays an index range
+# scan on (company_id, supplier_id, entry_date) either way.
+
+# Function: get_purchase_supplier_wise
+PURCHASE_SUPPLIER_WISE_FUNCTION_SQL = r"""
+CREATE OR REPLACE FUNCTION public.get_purchase_supplier_wise(
+    p_company_id integer,
+    p_from_date date,
+    p_to_date date,
+    p_supplier_id integer
+)
+RETURNS TABLE(
+    o_supplier_id integer,
+    o_supplier character varying,
+    o_entry_date date,
+    o_purchase_no integer,
+    o_invoice_no character varying,
+    o_invoice_date date,
+    o_quantity numeric,
+    o_goods_value numeric,
+    o_tax numeric,
+    o_gross numeric,
+    o_nett numeric
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_supplier_from integer := CASE WHEN p_supplier_id > 0 THEN p_supplier_id ELSE -2147483648 END;
+    v_supplier_to integer := CASE WHEN p_supplier_id > 0 THEN p_supplier_id ELSE 2147483647 END;
+BEGIN
+    RETURN QUERY
+        SELECT
+            p.supplier_id,
+            COALESCE(s.supplier_nm, '')::varchar,
+            p.entry_date,
+            p.purchase_no::integer,
+            p.invoice_no,
+            p.invoice_date,
+            li.quantity,
+            li.goods_value,
+            li.tax,
+            p.gross,
+            p.nett
+         FROM purchase p
+         LEFT JOIN suppliers s ON s.id = p.supplier_id
+        CROSS JOIN LATERAL (
+              SELECT COALESCE(SUM(pi.quantity), 0)::numeric AS quantity,
+                     COALESCE(SUM(v.line_value), 0)::numeric(12, 2) AS goods_value,
+                     COALESCE(SUM(v.line_value * (pi.sgst + pi.cgst) / 100), 0)::numeric(12, 2) AS tax
+                FROM purchase_items pi
+               CROSS JOIN LATERAL (
+                     SELECT pi.quantity * pi.rate * pi.exchange_rate * (1 - pi.discount_p / 100) - pi.discount_a AS line_value
+               ) v
+               WHERE pi.purchase_id = p.id
+        ) li
+        WHERE p.company_id = p_company_id
+          AND p.supplier_id BETWEEN v_supplier_from AND v_supplier_to
+          AND p.entry_date BETWEEN p_from_date AND p_to_date
+        ORDER BY 2, p.entry_date, p.purchase_no, p.id;
+END;
+$$;
+"""
+
+# Function: get_purchase_breakup_wise
+PURCHASE_BREAKUP_WISE_FUNCTION_SQL = r"""
+CREATE OR REPLACE FUNCTION public.get_purchase_breakup_wise(
+    p_company_id integer,
+    p_from_date date,
+    p_to_date date,
+    p_breakup_id integer
+)
+RETURNS TABLE(
+    o_breakup_id integer,
+    o_breakup character varying,
+    o_entry_date date,
+    o_purchase_no integer,
+    o_invoice_no character varying,
+    o_supplier character varying,
+    o_amount numeric
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_breakup_from integer := CASE WHEN p_breakup_id > 0 THEN p_breakup_id ELSE 1 END;
+    v_breakup_to integer := CASE WHEN p_breakup_id > 0 THEN p_breakup_id ELSE 32767 END;
+BEGIN
+    RETURN QUERY
+        SELECT
+            x.breakup_id::integer,
+            COALESCE(b.breakup_nm, '')::varchar,
+            p.entry_date,
+            p.purchase_no::integer,
+            p.invoice_no,
+            COALESCE(s.supplier_nm, '')::varchar,
+            x.amount::numeric
+         FROM purchase p
+        CROSS JOIN LATERAL (
+              VALUES (p.p_breakup_id1, p.p_breakup_amount1),
+                     (p.p_breakup_id2, p.p_breakup_amount2),
+                     (p.p_breakup_id3, p.p_breakup_amount3),
+                     (p.p_breakup_id4, p.p_breakup_amount4)
+        ) AS x(breakup_id, amount)
+         LEFT JOIN purchase_breakups b ON b.id = x.breakup_id
+         LEFT JOIN suppliers s ON s.id = p.supplier_id
+        WHERE p.company_id = p_company_id
+          AND p.entry_date BETWEEN p_from_date AND p_to_date
+          AND x.breakup_id BETWEEN v_breakup_from AND v_breakup_to
+          AND x.amount <> 0
+        ORDER BY 2, p.entry_date, p.purchase_no, p.id;
+END;
+$$;
+"""
+
+# Function: get_purchase_return_register
+PURCHASE_RETURN_REGISTER_FUNCTION_SQL = r"""
+CREATE OR REPLACE FUNCTION public.get_purchase_return_register(
+    p_company_id integer,
+    p_from_date date,
+    p_to_date date,
+    p_supplier_id integer
+)
+RETURNS TABLE(
+    o_supplier_id integer,
+    o_supplier character varying,
+    o_entry_date date,
+    o_purchase_rt_no integer,
+    o_narration character varying,
+    o_quantity numeric,
+    o_gross numeric,
+    o_nett numeric
+)
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+    v_supplier_from integer := CASE WHEN p_supplier_id > 0 THEN p_supplier_id ELSE -2147483648 END;
+    v_supplier_to integer := CASE WHEN p_supplier_id > 0 THEN p_supplier_id ELSE 2147483647 END;
+BEGIN
+    RETURN QUERY
+        SELECT
+            pr.supplier_id,
+            COALESCE(s.supplier_nm, '')::varchar,
+            pr.entry_date,
+            pr.purchase_rt_no::integer,
+            pr.narration,
+            li.quantity,
+            pr.gross,
+            pr.nett
+         FROM purchase_rt pr
+         LEFT JOIN suppliers s ON s.id = pr.supplier_id
+        CROSS JOIN LATERAL (
+              SELECT COALESCE(SUM(pri.quantity), 0)::numeric AS quantity
+                FROM purchase_rt_items pri
+               WHERE pri.company_id = pr.company_id AND pri.parent_id = pr.id
+        ) li
+        WHERE pr.company_id = p_company_id
+          AND pr.supplier_id BETWEEN v_supplier_from AND v_supplier_to
+          AND pr.entry_date BETWEEN p_from_date AND p_to_date
+        ORDER BY 2, pr.entry_date, pr.purchase_rt_no, pr.id;
+END;
+$$;
+"""
+
+PURCHASE_REPORT_FUNCTIONS_REVERSE_SQL = r"""
+DROP FUNCTION IF EXISTS public.get_purchase_supplier_wise(integer, date, date, integer);
+DROP FUNCTION IF EXISTS public.get_purchase_breakup_wise(integer, date, date, integer);
+DROP FUNCTION IF EXISTS public.get_purchase_return_register(integer, date, date, integer);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0033_add_purchase_report_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=PURCHASE_SUPPLIER_WISE_FUNCTION_SQL
+            + PURCHASE_BREAKUP_WISE_FUNCTION_SQL
+            + PURCHASE_RETURN_REGISTER_FUNCTION_SQL,
+            reverse_sql=PURCHASE_REPORT_FUNCTIONS_REVERSE_SQL,
+        ),
+    ]
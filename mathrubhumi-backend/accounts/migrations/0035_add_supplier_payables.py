@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# Supplier payables (accounts.payables): one ledger row per inward / purchase
+# return and running totals per supplier, filled from the existing documents.
+FORWARD_SQL = r"""
+CREATE TABLE IF NOT EXISTS public.supplier_ledger (
+    doc_type varchar(4) NOT NULL,
+    company_id int2 NOT NULL,
+    doc_id int4 NOT NULL,
+    supplier_id int4 NOT NULL,
+    entry_date date NOT NULL,
+    due_date date NOT NULL,
+    credit numeric(12, 2) DEFAULT 0 NOT NULL,
+    debit numeric(12, 2) DEFAULT 0 NOT NULL,
+    CONSTRAINT supplier_ledger_pkey PRIMARY KEY (doc_type, company_id, doc_id)
+);
+
+CREATE INDEX IF NOT EXISTS supplier_ledger_supplier_due_idx
+    ON public.supplier_ledger (supplier_id, due_date);
+
+CREATE TABLE IF NOT EXISTS public.supplier_balances (
+    supplier_id int4 NOT NULL,
+    credit numeric(14, 2) DEFAULT 0 NOT NULL,
+    debit numeric(14, 2) DEFAULT 0 NOT NULL,
+    CONSTRAINT supplier_balances_pkey PRIMARY KEY (supplier_id)
+);
+
+INSERT INTO public.supplier_ledger (doc_type, company_id, doc_id, supplier_id, entry_date, due_date, credit, debit)
+SELECT 'PUR', P.company_id, P.id, P.supplier_id, P.entry_date, P.invoice_date + COALESCE(S.credit_days, 0), P.nett, 0
+  FROM public.purchase P
+  LEFT JOIN public.suppliers S ON S.id = P.supplier_id
+ON CONFLICT DO NOTHING;
+
+INSERT INTO public.supplier_ledger (doc_type, company_id, doc_id, supplier_id, entry_date, due_date, credit, debit)
+SELECT 'PRT', PR.company_id, PR.id, PR.supplier_id, PR.entry_date, PR.entry_date, 0, PR.nett
+  FROM public.purchase_rt PR
+ON CONFLICT DO NOTHING;
+
+INSERT INTO public.supplier_balances (supplier_id, credit, debit)
+SELECT supplier_id, SUM(credit), SUM(debit)
+  FROM public.supplier_ledger
+ GROUP BY supplier_id
+ON CONFLICT DO NOTHING;
+"""
+
+REVERSE_SQL = r"""
+DROP TABLE IF EXISTS public.supplier_balances;
+DROP TABLE IF EXISTS public.supplier_ledger;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0034_add_purchase_report_functions'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
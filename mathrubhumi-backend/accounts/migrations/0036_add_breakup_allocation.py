@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# How each purchase breakup is spread over the lines of an inward for their
+# landed cost (accounts.landed_cost): 'V' by line value, 'Q' by quantity.
+# Historical inwards are allocated by the allocate_landed_costs command.
+FORWARD_SQL = r"""
+ALTER TABLE public.purchase_breakups
+    ADD COLUMN IF NOT EXISTS allocate_by char(1) DEFAULT 'V' NOT NULL;
+
+ALTER TABLE public.purchase_breakups
+    DROP CONSTRAINT IF EXISTS purchase_breakups_allocate_by_check;
+
+ALTER TABLE public.purchase_breakups
+    ADD CONSTRAINT purchase_breakups_allocate_by_check CHECK (allocate_by IN ('V', 'Q'));
+"""
+
+REVERSE_SQL = r"""
+ALTER TABLE public.purchase_breakups DROP COLUMN IF EXISTS allocate_by;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0035_add_supplier_payables'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
@@ -0,0 +1,137 @@
+from django.db import migrations
+
+# Directory of the cash-bill customer names on sales, for the sales return
+# customer search: one row per distinct name with its newest bill and that
+# bill's mobile number. name_key is the trimmed, lower-cased name in the "C"
+# collation, so one btree serves both the prefix match and the ordering.
+# Statement triggers on sales queue the names a statement touched in
+# sales_customers_pending, which has no key, so a bill takes no lock on a
+# shared directory row (every cash bill is "Cash" or "."). The app runs
+# sales_customers_flush() after commit and before a search: it takes the
+# queued names and brings their rows up to date in its own short
+# transaction. Names whose bills are all renamed or deleted drop out.
+FORWARD_SQL = r"""
+CREATE TABLE IF NOT EXISTS public.sales_customers (
+    customer_nm varchar(100) NOT NULL,
+    name_key varchar(100) COLLATE "C" NOT NULL,
+    last_bill_id int4 NOT NULL,
+    mobile_number varchar(20) NULL,
+    CONSTRAINT sales_customers_pkey PRIMARY KEY (customer_nm)
+);
+
+CREATE INDEX IF NOT EXISTS sales_customers_name_key_idx ON public.sales_customers (name_key);
+
+CREATE TABLE IF NOT EXISTS public.sales_customers_pending (
+    customer_nm varchar(100) NOT NULL
+);
+
+INSERT INTO public.sales_customers (customer_nm, name_key, last_bill_id, mobile_number)
+SELECT DISTINCT ON (customer_nm) customer_nm, lower(btrim(customer_nm)), id, mobile_number
+  FROM public.sales
+ WHERE btrim(customer_nm) <> ''
+ ORDER BY customer_nm, id DESC
+ON CONFLICT DO NOTHING;
+
+CREATE OR REPLACE FUNCTION public.sales_customers_sync()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    names text[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT customer_nm) INTO names FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT customer_nm) INTO names FROM old_rows;
+    ELSE
+        -- only bills whose name or mobile changed
+        SELECT array_agg(DISTINCT V.customer_nm) INTO names
+          FROM old_rows O
+          JOIN new_rows N ON N.company_id = O.company_id AND N.id = O.id
+         CROSS JOIN LATERAL (VALUES (O.customer_nm), (N.customer_nm)) V (customer_nm)
+         WHERE (O.customer_nm, O.mobile_number) IS DISTINCT FROM (N.customer_nm, N.mobile_number);
+    END IF;
+    IF names IS NOT NULL THEN
+        INSERT INTO public.sales_customers_pending (customer_nm) SELECT unnest(names);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- flushes run one at a time, so each reads every bill committed before it
+-- and a slower flush cannot overwrite a newer one's result
+CREATE OR REPLACE FUNCTION public.sales_customers_flush()
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    names text[];
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('sales_customers_flush'));
+    WITH taken AS (
+        DELETE FROM public.sales_customers_pending RETURNING customer_nm
+    )
+    SELECT array_agg(DISTINCT customer_nm) INTO names FROM taken;
+    IF names IS NULL THEN
+        RETURN;
+    END IF;
+
+    INSERT INTO public.sales_customers (customer_nm, name_key, last_bill_id, mobile_number)
+    SELECT L.customer_nm, lower(btrim(L.customer_nm)), L.id, L.mobile_number
+      FROM unnest(names) N (customer_nm)
+     CROSS JOIN LATERAL (
+            SELECT S.customer_nm, S.id, S.mobile_number
+              FROM public.sales S
+             WHERE S.customer_nm = N.customer_nm
+             ORDER BY S.id DESC
+             LIMIT 1
+     ) L
+     WHERE btrim(N.customer_nm) <> ''
+     ORDER BY L.customer_nm
+    ON CONFLICT (customer_nm) DO UPDATE
+       SET last_bill_id = EXCLUDED.last_bill_id,
+           mobile_number = EXCLUDED.mobile_number;
+
+    DELETE FROM public.sales_customers C
+     WHERE C.customer_nm = ANY(names)
+       AND NOT EXISTS (SELECT 1 FROM public.sales S WHERE S.customer_nm = C.customer_nm);
+END;
+$$;
+
+DROP TRIGGER IF EXISTS sales_customers_sync_ins ON public.sales;
+DROP TRIGGER IF EXISTS sales_customers_sync_upd ON public.sales;
+DROP TRIGGER IF EXISTS sales_customers_sync_del ON public.sales;
+CREATE TRIGGER sales_customers_sync_ins
+    AFTER INSERT ON public.sales
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.sales_customers_sync();
+CREATE TRIGGER sales_customers_sync_upd
+    AFTER UPDATE ON public.sales
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.sales_customers_sync();
+CREATE TRIGGER sales_customers_sync_del
+    AFTER DELETE ON public.sales
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.sales_customers_sync();
+"""
+
+REVERSE_SQL = r"""
+DROP TRIGGER IF EXISTS sales_customers_sync_ins ON public.sales;
+DROP TRIGGER IF EXISTS sales_customers_sync_upd ON public.sales;
+DROP TRIGGER IF EXISTS sales_customers_sync_del ON public.sales;
+DROP FUNCTION IF EXISTS public.sales_customers_flush();
+DROP FUNCTION IF EXISTS public.sales_customers_sync();
+DROP TABLE IF EXISTS public.sales_customers_pending;
+DROP TABLE IF EXISTS public.sales_customers;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0036_add_breakup_allocation'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
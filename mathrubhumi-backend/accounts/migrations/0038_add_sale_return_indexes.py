@@ -0,0 +1,27 @@
+from django.db import migrations
+
+# Returned quantity per bill line (accounts.sale_returns): the sale_rt_items
+# of a sale line summed from the index alone, and sale lines found by id
+# (the unique key leads with company_id). Built CONCURRENTLY, like the
+# finder indexes.
+INDEXES = [
+    ('sale_rt_items_sale_det_idx', 'sale_rt_items (sale_det_id) INCLUDE (quantity)'),
+    ('sale_items_id_idx', 'sale_items (id)'),
+]
+
+FORWARD_SQL = [f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON public.{target};" for name, target in INDEXES]
+
+REVERSE_SQL = [f"DROP INDEX CONCURRENTLY IF EXISTS public.{name};" for name, _ in INDEXES]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0037_add_sales_customers'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
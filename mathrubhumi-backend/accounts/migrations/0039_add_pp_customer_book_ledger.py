@@ -0,0 +1,261 @@
+from django.db import migrations
+
+# Running state of each PP (pre-publication) subscription, one row per
+# pp_customer_books row: copies, installments paid, amount paid, balance
+# (face value x copies - paid) and the agent of the latest receipt. The
+# installment prefill reads it by reg_no instead of joining the receipts.
+#
+# pp_customer_books.id defaults to 0 and is not unique, so a subscription is
+# keyed by (company_id, reg_no) (unq_pp_customer_books), and receipts,
+# customer books and books are matched within their own company.
+#
+# pp_receipts_insert_update_delete lives outside the migrations, so the
+# ledger is kept by statement triggers on the tables it writes; they run
+# inside the procedure's own statements and transaction. A receipt belongs
+# to a book through pp_customer_book_id or, where that was left 0 (installments),
+# through the same pp_customer_id + pp_book_id. Cancelled receipts do not count.
+FORWARD_SQL = r"""
+CREATE TABLE IF NOT EXISTS public.pp_customer_book_ledger (
+    company_id int2 NOT NULL,
+    reg_no varchar(10) NOT NULL,
+    pp_customer_book_id int4 DEFAULT 0 NOT NULL,
+    pp_customer_id int4 DEFAULT 0 NOT NULL,
+    pp_book_id int2 DEFAULT 0 NOT NULL,
+    copies int2 DEFAULT 0 NOT NULL,
+    installments_paid int4 DEFAULT 0 NOT NULL,
+    amount_paid numeric(12, 2) DEFAULT 0 NOT NULL,
+    balance numeric(12, 2) DEFAULT 0 NOT NULL,
+    last_receipt_id int4 NULL,
+    last_agent_id int2 NULL,
+    CONSTRAINT pp_customer_book_ledger_pkey PRIMARY KEY (company_id, reg_no)
+);
+
+CREATE INDEX IF NOT EXISTS pp_customer_book_ledger_reg_no_idx ON public.pp_customer_book_ledger (reg_no, company_id);
+CREATE INDEX IF NOT EXISTS pp_customer_books_company_id_idx ON public.pp_customer_books (company_id, id);
+CREATE INDEX IF NOT EXISTS pp_customer_books_customer_book_idx ON public.pp_customer_books (pp_customer_id, pp_book_id);
+-- receipts of a customer book, and installments (pp_customer_book_id 0) of a customer + book
+CREATE INDEX IF NOT EXISTS pp_receipts_company_customer_book_idx
+    ON public.pp_receipts (company_id, pp_customer_book_id, pp_customer_id, pp_book_id);
+-- cheque / DD receipts of a customer, newest first (remittance entry)
+CREATE INDEX IF NOT EXISTS pp_receipts_customer_cheque_idx ON public.pp_receipts (pp_customer_id, id) WHERE a_type = 2;
+
+CREATE OR REPLACE FUNCTION public.pp_customer_book_ledger_refresh(company_ids int2[], reg_nos varchar[])
+RETURNS void
+LANGUAGE sql
+AS $$
+    INSERT INTO public.pp_customer_book_ledger AS L
+           (company_id, reg_no, pp_customer_book_id, pp_customer_id, pp_book_id, copies,
+            installments_paid, amount_paid, balance, last_receipt_id, last_agent_id)
+    SELECT CB.company_id, CB.reg_no, CB.id, CB.pp_customer_id, CB.pp_book_id, CB.copies,
+           P.installments, P.amount, COALESCE(PB.face_value, 0) * CB.copies - P.amount,
+           P.last_receipt_id, P.last_agent_id
+      FROM (SELECT DISTINCT company_id, reg_no FROM unnest(company_ids, reg_nos) K (company_id, reg_no)) K
+      JOIN public.pp_customer_books CB ON CB.company_id = K.company_id AND CB.reg_no = K.reg_no
+      LEFT JOIN public.pp_books PB ON PB.company_id = CB.company_id AND PB.id = CB.pp_book_id
+     CROSS JOIN LATERAL (
+            SELECT count(*) AS installments,
+                   COALESCE(sum(R.amount), 0) AS amount,
+                   (array_agg(R.id ORDER BY R.entry_date DESC NULLS LAST, R.id DESC))[1] AS last_receipt_id,
+                   (array_agg(R.agent_id ORDER BY R.entry_date DESC NULLS LAST, R.id DESC))[1] AS last_agent_id
+              FROM (
+                    SELECT id, entry_date, amount, agent_id, cancelled
+                      FROM public.pp_receipts
+                     WHERE company_id = CB.company_id
+                       AND pp_customer_book_id = CB.id
+                       AND CB.id <> 0
+                    UNION ALL
+                    SELECT id, entry_date, amount, agent_id, cancelled
+                      FROM public.pp_receipts
+                     WHERE company_id = CB.company_id
+                       AND pp_customer_book_id = 0
+                       AND pp_customer_id = CB.pp_customer_id
+                       AND pp_book_id = CB.pp_book_id
+              ) R
+             WHERE R.cancelled = 0
+     ) P
+    ON CONFLICT (company_id, reg_no) DO UPDATE
+       SET pp_customer_book_id = EXCLUDED.pp_customer_book_id,
+           pp_customer_id = EXCLUDED.pp_customer_id,
+           pp_book_id = EXCLUDED.pp_book_id,
+           copies = EXCLUDED.copies,
+           installments_paid = EXCLUDED.installments_paid,
+           amount_paid = EXCLUDED.amount_paid,
+           balance = EXCLUDED.balance,
+           last_receipt_id = EXCLUDED.last_receipt_id,
+           last_agent_id = EXCLUDED.last_agent_id;
+
+    DELETE FROM public.pp_customer_book_ledger L
+     USING unnest(company_ids, reg_nos) K (company_id, reg_no)
+     WHERE L.company_id = K.company_id
+       AND L.reg_no = K.reg_no
+       AND NOT EXISTS (
+            SELECT 1 FROM public.pp_customer_books CB WHERE CB.company_id = L.company_id AND CB.reg_no = L.reg_no
+       );
+$$;
+
+CREATE OR REPLACE FUNCTION public.pp_receipts_ledger_sync()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    company_ids int2[];
+    customer_book_ids int4[];
+    customer_ids int4[];
+    pp_book_ids int4[];
+    book_company_ids int2[];
+    book_reg_nos varchar[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(company_id), array_agg(pp_customer_book_id), array_agg(pp_customer_id), array_agg(pp_book_id)
+          INTO company_ids, customer_book_ids, customer_ids, pp_book_ids
+          FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(company_id), array_agg(pp_customer_book_id), array_agg(pp_customer_id), array_agg(pp_book_id)
+          INTO company_ids, customer_book_ids, customer_ids, pp_book_ids
+          FROM old_rows;
+    ELSE
+        SELECT array_agg(company_id), array_agg(pp_customer_book_id), array_agg(pp_customer_id), array_agg(pp_book_id)
+          INTO company_ids, customer_book_ids, customer_ids, pp_book_ids
+          FROM (
+                SELECT company_id, pp_customer_book_id, pp_customer_id, pp_book_id FROM new_rows
+                UNION
+                SELECT company_id, pp_customer_book_id, pp_customer_id, pp_book_id FROM old_rows
+          ) R;
+    END IF;
+
+    SELECT array_agg(B.company_id), array_agg(B.reg_no) INTO book_company_ids, book_reg_nos
+      FROM (
+            SELECT CB.company_id, CB.reg_no
+              FROM unnest(company_ids, customer_book_ids) R (company_id, customer_book_id)
+              JOIN public.pp_customer_books CB ON CB.company_id = R.company_id AND CB.id = R.customer_book_id
+             WHERE R.customer_book_id <> 0
+            UNION
+            SELECT CB.company_id, CB.reg_no
+              FROM unnest(company_ids, customer_book_ids, customer_ids, pp_book_ids)
+                   R (company_id, customer_book_id, customer_id, pp_book_id)
+              JOIN public.pp_customer_books CB
+                ON CB.company_id = R.company_id AND CB.pp_customer_id = R.customer_id AND CB.pp_book_id = R.pp_book_id
+             WHERE R.customer_book_id = 0
+      ) B;
+    IF book_reg_nos IS NOT NULL THEN
+        PERFORM public.pp_customer_book_ledger_refresh(book_company_ids, book_reg_nos);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.pp_customer_books_ledger_sync()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    book_company_ids int2[];
+    book_reg_nos varchar[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(company_id), array_agg(reg_no) INTO book_company_ids, book_reg_nos FROM new_rows;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(company_id), array_agg(reg_no) INTO book_company_ids, book_reg_nos FROM old_rows;
+    ELSE
+        SELECT array_agg(company_id), array_agg(reg_no) INTO book_company_ids, book_reg_nos
+          FROM (SELECT company_id, reg_no FROM new_rows UNION SELECT company_id, reg_no FROM old_rows) B;
+    END IF;
+    IF book_reg_nos IS NOT NULL THEN
+        PERFORM public.pp_customer_book_ledger_refresh(book_company_ids, book_reg_nos);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+-- the balance follows the book's face value
+CREATE OR REPLACE FUNCTION public.pp_books_ledger_sync()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    book_company_ids int2[];
+    book_reg_nos varchar[];
+BEGIN
+    SELECT array_agg(CB.company_id), array_agg(CB.reg_no) INTO book_company_ids, book_reg_nos
+      FROM new_rows N
+      JOIN old_rows O ON O.company_id = N.company_id AND O.id = N.id
+      JOIN public.pp_customer_books CB ON CB.company_id = N.company_id AND CB.pp_book_id = N.id
+     WHERE N.face_value IS DISTINCT FROM O.face_value;
+    IF book_reg_nos IS NOT NULL THEN
+        PERFORM public.pp_customer_book_ledger_refresh(book_company_ids, book_reg_nos);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS pp_receipts_ledger_sync_ins ON public.pp_receipts;
+DROP TRIGGER IF EXISTS pp_receipts_ledger_sync_upd ON public.pp_receipts;
+DROP TRIGGER IF EXISTS pp_receipts_ledger_sync_del ON public.pp_receipts;
+CREATE TRIGGER pp_receipts_ledger_sync_ins
+    AFTER INSERT ON public.pp_receipts
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.pp_receipts_ledger_sync();
+CREATE TRIGGER pp_receipts_ledger_sync_upd
+    AFTER UPDATE ON public.pp_receipts
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.pp_receipts_ledger_sync();
+CREATE TRIGGER pp_receipts_ledger_sync_del
+    AFTER DELETE ON public.pp_receipts
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.pp_receipts_ledger_sync();
+
+DROP TRIGGER IF EXISTS pp_customer_books_ledger_sync_ins ON public.pp_customer_books;
+DROP TRIGGER IF EXISTS pp_customer_books_ledger_sync_upd ON public.pp_customer_books;
+DROP TRIGGER IF EXISTS pp_customer_books_ledger_sync_del ON public.pp_customer_books;
+CREATE TRIGGER pp_customer_books_ledger_sync_ins
+    AFTER INSERT ON public.pp_customer_books
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.pp_customer_books_ledger_sync();
+CREATE TRIGGER pp_customer_books_ledger_sync_upd
+    AFTER UPDATE ON public.pp_customer_books
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.pp_customer_books_ledger_sync();
+CREATE TRIGGER pp_customer_books_ledger_sync_del
+    AFTER DELETE ON public.pp_customer_books
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.pp_customer_books_ledger_sync();
+
+DROP TRIGGER IF EXISTS pp_books_ledger_sync_upd ON public.pp_books;
+CREATE TRIGGER pp_books_ledger_sync_upd
+    AFTER UPDATE ON public.pp_books
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.pp_books_ledger_sync();
+
+SELECT public.pp_customer_book_ledger_refresh(array_agg(company_id), array_agg(reg_no))
+  FROM public.pp_customer_books;
+"""
+
+REVERSE_SQL = r"""
+DROP TRIGGER IF EXISTS pp_books_ledger_sync_upd ON public.pp_books;
+DROP TRIGGER IF EXISTS pp_customer_books_ledger_sync_ins ON public.pp_customer_books;
+DROP TRIGGER IF EXISTS pp_customer_books_ledger_sync_upd ON public.pp_customer_books;
+DROP TRIGGER IF EXISTS pp_customer_books_ledger_sync_del ON public.pp_customer_books;
+DROP TRIGGER IF EXISTS pp_receipts_ledger_sync_ins ON public.pp_receipts;
+DROP TRIGGER IF EXISTS pp_receipts_ledger_sync_upd ON public.pp_receipts;
+DROP TRIGGER IF EXISTS pp_receipts_ledger_sync_del ON public.pp_receipts;
+DROP FUNCTION IF EXISTS public.pp_books_ledger_sync();
+DROP FUNCTION IF EXISTS public.pp_customer_books_ledger_sync();
+DROP FUNCTION IF EXISTS public.pp_receipts_ledger_sync();
+DROP FUNCTION IF EXISTS public.pp_customer_book_ledger_refresh(int2[], varchar[]);
+DROP INDEX IF EXISTS public.pp_receipts_customer_cheque_idx;
+DROP INDEX IF EXISTS public.pp_receipts_company_customer_book_idx;
+DROP INDEX IF EXISTS public.pp_customer_books_customer_book_idx;
+DROP INDEX IF EXISTS public.pp_customer_books_company_id_idx;
+DROP TABLE IF EXISTS public.pp_customer_book_ledger;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0038_add_sale_return_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=REVERSE_SQL),
+    ]
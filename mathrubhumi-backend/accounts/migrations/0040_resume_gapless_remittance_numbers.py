@@ -0,0 +1,30 @@
+from django.db import migrations
+
+# remittance_no is a printed money receipt number and is gapless again
+# (accounts.numbering). Numbers issued from blocks never reached the
+# last_values counter, so carry each company / financial year counter past
+# the highest remittance_no already used. Fin year codes as numbering.fin_year:
+# April-March, e.g. '2526'.
+FORWARD_SQL = r"""
+INSERT INTO public.last_values (company_id, fin_year, code, last_value)
+SELECT R.company_id,
+       to_char(R.entry_date - interval '3 months', 'YY') || to_char(R.entry_date + interval '9 months', 'YY'),
+       'REMITTANCE',
+       max(R.remittance_no)
+  FROM public.remittance R
+ WHERE R.entry_date IS NOT NULL
+ GROUP BY 1, 2
+ON CONFLICT (company_id, fin_year, code)
+DO UPDATE SET last_value = GREATEST(last_values.last_value, EXCLUDED.last_value);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0039_add_pp_customer_book_ledger'),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=FORWARD_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,219 @@
+"""
+Document number allocation.
+
+Two modes are supported per series code:
+
+* gapless - the classic `last_values` counter. The row is bumped with an
+  upsert inside the caller's transaction, so a rolled back document never
+  consumes a number. The row stays locked until commit, so callers should
+  allocate as late in the transaction as they can.
+* block   - a Postgres sequence per (company, fin year, code) hands out block
+  indexes; each worker caches one block of DOCUMENT_NUMBER_BLOCK_SIZE numbers
+  and serves it from memory. No row lock is taken, so concurrent saves never
+  queue, at the cost of gaps (unused tail of a block when a worker restarts)
+  and numbers that are unique but not strictly increasing across workers.
+
+Statutory series (tax invoices, credit/debit notes, money receipts such as
+remittance_no) must stay gapless. Anything listed in BLOCK_SERIES is
+allocated in blocks.
+
+Internal row ids of the tables keyed (company_id, id) without an identity
+column come from next_id(): one Postgres sequence per (table, company),
+seeded from the existing rows by migration 0031. Like block numbers they
+may have gaps, but nothing is scanned or locked.
+"""
+import datetime
+import re
+import threading
+
+from django.conf import settings
+from django.db import transaction, DatabaseError
+
+# sale type (see views.sale_type_mapping) -> (last_values code, bill prefix)
+# Credit Sale keeps the historical counter and the unprefixed bill format.
+SALE_SERIES = {
+    0: ('CREDIT_SALE', ''),
+    1: ('CASH_SALE', 'CS'),
+    2: ('PP_SALE', 'PP'),
+    3: ('STOCK_TRANSF', 'ST'),
+    4: ('APPROVAL', 'AP'),
+    5: ('GIFT_VOUCHER', 'GV'),
+    6: ('GIFT_BILL', 'GB'),
+    7: ('CASH_MEMO', 'CM'),
+}
+
+# Internal, high-volume series that do not need to be gapless.
+BLOCK_SERIES = {'PP_CSBK_ID'}
+
+# Tables whose per-company ids come from next_id() (see migration 0031).
+ID_TABLES = {'purchase_rt', 'remittance'}
+
+# Series that run across financial years use this fin_year key.
+NO_FIN_YEAR = '0000'
+
+_blocks = {}
+_blocks_lock = threading.Lock()
+
+
+def _as_date(doc_date):
+    if isinstance(doc_date, datetime.datetime):
+        return doc_date.date()
+    if isinstance(doc_date, datetime.date):
+        return doc_date
+    if doc_date:
+        return datetime.date.fromisoformat(str(doc_date)[:10])
+    return datetime.date.today()
+
+
+def fin_year(doc_date=None):
+    """
+    Indian financial year (April-March) of a document date.
+    Returns (code, label), e.g. ('2526', '2025-26') for 2026-01-19.
+    Missing dates fall back to today.
+    """
+    d = _as_date(doc_date)
+    start = d.year if d.month >= 4 else d.year - 1
+    return f"{start % 100:02d}{(start + 1) % 100:02d}", f"{start}-{(start + 1) % 100:02d}"
+
+
+def sale_series(sale_type_code):
+    return SALE_SERIES.get(sale_type_code, SALE_SERIES[0])
+
+
+def format_bill_no(prefix, fin_year_label, number):
+    return f"{prefix}{fin_year_label}/{number:05d}"
+
+
+def next_gapless(cursor, company_id, fin_year_code, code):
+    """
+    Bump and return the last_values counter inside the current transaction.
+    The row is created on first use, so a new financial year needs no setup.
+    """
+    return reserve_gapless(cursor, company_id, fin_year_code, code, 1)
+
+
+def reserve_gapless(cursor, company_id, fin_year_code, code, count):
+    """
+    Take `count` consecutive numbers of a gapless series in one statement and
+    return the first. The caller must use all of them before committing.
+    """
+    cursor.execute(
+        """
+        INSERT INTO last_values (company_id, fin_year, code, last_value)
+        VALUES (%s, %s, %s, %s)
+        ON CONFLICT (company_id, fin_year, code)
+        DO UPDATE SET last_value = last_values.last_value + EXCLUDED.last_value
+        RETURNING last_value
+        """,
+        [company_id, fin_year_code, code, count],
+    )
+    return cursor.fetchone()[0] - count + 1
+
+
+def _sequence_name(company_id, fin_year_code, code):
+    raw = f"docno_{company_id}_{fin_year_code}_{code}".lower()
+    return re.sub(r'[^a-z0-9_]', '_', raw)
+
+
+def _block_size():
+    return max(1, int(getattr(settings, 'DOCUMENT_NUMBER_BLOCK_SIZE', 50)))
+
+
+def _fetch_block(cursor, company_id, fin_year_code, code, size):
+    """
+    Claim the next block index from the series sequence. Returns
+    (block_index, cacheable); a block claimed by the call that created the
+    sequence is not cached, because that CREATE rolls back with the caller.
+    """
+    name = _sequence_name(company_id, fin_year_code, code)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    created = False
+    if cursor.fetchone()[0] is None:
+        # start past anything the gapless counter has already issued
+        cursor.execute(
+            "SELECT last_value FROM last_values WHERE company_id = %s AND fin_year = %s AND code = %s",
+            [company_id, fin_year_code, code],
+        )
+        row = cursor.fetchone()
+        issued = row[0] if row else 0
+        first_block = (issued + size - 1) // size
+        try:
+            with transaction.atomic():
+                cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{name}" MINVALUE 0 START WITH {first_block}')
+            created = True
+        except DatabaseError:
+            # another worker created it concurrently
+            pass
+    cursor.execute("SELECT nextval(%s::regclass)", [name])
+    return cursor.fetchone()[0], not created
+
+
+def next_from_block(cursor, company_id, fin_year_code, code):
+    """Serve the next number from this worker's cached block, claiming a new block when exhausted."""
+    key = (company_id, fin_year_code, code)
+    size = _block_size()
+    with _blocks_lock:
+        block = _blocks.get(key)
+        if block and block[0] <= block[1]:
+            value = block[0]
+            block[0] += 1
+            return value
+        index, cacheable = _fetch_block(cursor, company_id, fin_year_code, code, size)
+        first, last = index * size + 1, (index + 1) * size
+        if cacheable:
+            _blocks[key] = [first + 1, last]
+        return first
+
+
+def next_number(cursor, code, doc_date=None, company_id=1, per_year=True):
+    """
+    Allocate the next number of `code` for the financial year of `doc_date`
+    (or the cross-year NO_FIN_YEAR series when per_year is False), using the
+    mode configured for the code.
+    """
+    fin_year_code = fin_year(doc_date)[0] if per_year else NO_FIN_YEAR
+    if code in BLOCK_SERIES:
+        return next_from_block(cursor, company_id, fin_year_code, code)
+    return next_gapless(cursor, company_id, fin_year_code, code)
+
+
+def next_sale_bill_no(cursor, sale_type_code, sale_date, company_id=1):
+    """Gapless bill number for a sale, e.g. '2025-26/00042' or 'CS2025-26/00007'."""
+    code, prefix = sale_series(sale_type_code)
+    fin_year_code, label = fin_year(sale_date)
+    return format_bill_no(prefix, label, next_gapless(cursor, company_id, fin_year_code, code))
+
+
+def reserve_sale_bill_nos(cursor, sale_type_code, sale_date, count, company_id=1):
+    """`count` consecutive bill numbers of one sale series and financial year, as one block."""
+    code, prefix = sale_series(sale_type_code)
+    fin_year_code, label = fin_year(sale_date)
+    first = reserve_gapless(cursor, company_id, fin_year_code, code, count)
+    return [format_bill_no(prefix, label, first + n) for n in range(count)]
+
+
+def id_sequence_name(table, company_id):
+    return f"docid_{table}_{int(company_id)}"
+
+
+def next_id(cursor, table, company_id):
+    """
+    Next id of `table` for `company_id`. The sequence of a company that had
+    no rows when migration 0031 ran is created on first use, starting past
+    the ids already stored for it.
+    """
+    if table not in ID_TABLES:
+        raise ValueError(f"No id sequence for table: {table}")
+    name = id_sequence_name(table, company_id)
+    cursor.execute("SELECT to_regclass(%s)", [name])
+    if cursor.fetchone()[0] is None:
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table} WHERE company_id = %s", [company_id])
+        start = cursor.fetchone()[0]
+        try:
+            with transaction.atomic():
+                cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS "{name}" AS int4 MINVALUE 1 START WITH {start}')
+        except DatabaseError:
+            # another worker created it concurrently
+            pass
+    cursor.execute("SELECT nextval(%s::regclass)", [name])
+    return cursor.fetchone()[0]
@@ -0,0 +1,155 @@
+"""
+Supplier payables: what is owed to each supplier and how overdue it is,
+kept up to date by the documents that change it instead of being summed
+from purchase / purchase_rt on demand.
+
+* supplier_ledger holds one row per inward (credit = nett, due on
+  invoice_date + the supplier's credit_days) and per purchase return
+  (debit = nett), keyed by the document.
+* supplier_balances holds each supplier's running credit / debit totals.
+
+Every save calls post_supplier_document() once the document header is
+written; a single statement replaces the document's ledger row and moves
+the balances of the old and new supplier by the difference.
+
+The opening balance typed into the supplier master (suppliers.credit -
+suppliers.debit) is added on top and treated as the oldest amount owed.
+Aging settles returns and the opening balance against the oldest inwards
+first, so only inwards due within the last 90 days need to be read; what
+is left of the balance is 90+ days overdue.
+"""
+import datetime
+
+DOC_PURCHASE = 'PUR'
+DOC_PURCHASE_RT = 'PRT'
+
+# (supplier_id, entry_date, due_date, credit, debit) of a stored document
+DOCUMENT_SQL = {
+    DOC_PURCHASE: """
+        SELECT P.supplier_id, P.entry_date, P.invoice_date + COALESCE(S.credit_days, 0), P.nett, 0
+          FROM purchase P
+          LEFT JOIN suppliers S ON S.id = P.supplier_id
+         WHERE P.company_id = %(company_id)s AND P.id = %(doc_id)s
+    """,
+    DOC_PURCHASE_RT: """
+        SELECT PR.supplier_id, PR.entry_date, PR.entry_date, 0, PR.nett
+          FROM purchase_rt PR
+         WHERE PR.company_id = %(company_id)s AND PR.id = %(doc_id)s
+    """,
+}
+
+POST_DOCUMENT_SQL = """
+    WITH doc AS (
+        {document}
+    ),
+    old AS (
+        SELECT supplier_id, credit, debit
+          FROM supplier_ledger
+         WHERE doc_type = %(doc_type)s AND company_id = %(company_id)s AND doc_id = %(doc_id)s
+           FOR UPDATE
+    ),
+    new AS (
+        INSERT INTO supplier_ledger AS L
+               (doc_type, company_id, doc_id, supplier_id, entry_date, due_date, credit, debit)
+        SELECT %(doc_type)s, %(company_id)s, %(doc_id)s, doc.*
+          FROM doc
+        ON CONFLICT (doc_type, company_id, doc_id) DO UPDATE
+           SET supplier_id = EXCLUDED.supplier_id,
+               entry_date = EXCLUDED.entry_date,
+               due_date = EXCLUDED.due_date,
+               credit = EXCLUDED.credit,
+               debit = EXCLUDED.debit
+        RETURNING L.supplier_id, L.credit, L.debit
+    ),
+    delta AS (
+        SELECT supplier_id, SUM(credit) AS credit, SUM(debit) AS debit
+          FROM (
+                SELECT supplier_id, -credit AS credit, -debit AS debit FROM old
+                UNION ALL
+                SELECT supplier_id, credit, debit FROM new
+          ) D
+         GROUP BY supplier_id
+    )
+    INSERT INTO supplier_balances AS B (supplier_id, credit, debit)
+    SELECT supplier_id, credit, debit
+      FROM delta
+     WHERE credit <> 0 OR debit <> 0
+     ORDER BY supplier_id
+    ON CONFLICT (supplier_id) DO UPDATE
+       SET credit = B.credit + EXCLUDED.credit,
+           debit = B.debit + EXCLUDED.debit
+"""
+
+# Balance per supplier, spread over the overdue buckets. The balance covers
+# the newest inwards first; inwards due more than 90 days ago are never read,
+# their share is whatever the recent ones leave over.
+AGING_SQL = """
+    WITH bal AS (
+        SELECT S.id AS supplier_id,
+               S.supplier_nm,
+               COALESCE(B.credit, 0) - COALESCE(B.debit, 0) + S.credit - S.debit AS balance
+          FROM suppliers S
+          LEFT JOIN supplier_balances B ON B.supplier_id = S.id
+         WHERE %(supplier_id)s = 0 OR S.id = %(supplier_id)s
+    ),
+    recent AS (
+        SELECT bal.supplier_id,
+               %(as_of)s::date - L.due_date AS days,
+               L.credit,
+               SUM(L.credit) OVER (
+                   PARTITION BY bal.supplier_id
+                   ORDER BY L.due_date DESC, L.doc_type, L.company_id, L.doc_id
+               ) AS newer,
+               bal.balance
+          FROM bal
+          JOIN supplier_ledger L
+            ON L.supplier_id = bal.supplier_id
+           AND L.due_date >= %(as_of)s::date - 90
+           AND L.credit > 0
+         WHERE bal.balance > 0
+    ),
+    allocated AS (
+        SELECT supplier_id, days, LEAST(credit, GREATEST(balance - (newer - credit), 0)) AS amount
+          FROM recent
+    )
+    SELECT bal.supplier_id,
+           bal.supplier_nm,
+           bal.balance,
+           COALESCE(SUM(A.amount) FILTER (WHERE A.days < 0), 0),
+           COALESCE(SUM(A.amount) FILTER (WHERE A.days BETWEEN 0 AND 30), 0),
+           COALESCE(SUM(A.amount) FILTER (WHERE A.days BETWEEN 31 AND 60), 0),
+           COALESCE(SUM(A.amount) FILTER (WHERE A.days BETWEEN 61 AND 90), 0),
+           GREATEST(bal.balance - COALESCE(SUM(A.amount), 0), 0)
+      FROM bal
+      LEFT JOIN allocated A ON A.supplier_id = bal.supplier_id
+     GROUP BY bal.supplier_id, bal.supplier_nm, bal.balance
+    HAVING bal.balance <> 0
+     ORDER BY bal.supplier_nm
+"""
+
+AGING_BUCKETS = ['not_due', 'days_0_30', 'days_31_60', 'days_61_90', 'days_90_plus']
+
+
+def post_supplier_document(cursor, doc_type, company_id, doc_id):
+    """Bring the supplier ledger and balances in line with a stored inward or purchase return."""
+    cursor.execute(
+        POST_DOCUMENT_SQL.format(document=DOCUMENT_SQL[doc_type]),
+        {'doc_type': doc_type, 'company_id': company_id, 'doc_id': doc_id},
+    )
+
+
+def supplier_aging(cursor, as_of=None, supplier_id=0):
+    """Balance and overdue buckets per supplier with a non-zero balance, as of `as_of` (default today)."""
+    cursor.execute(
+        AGING_SQL,
+        {'as_of': as_of or datetime.date.today(), 'supplier_id': int(supplier_id or 0)},
+    )
+    return [
+        {
+            'supplier_id': row[0],
+            'supplier_nm': row[1],
+            'balance': float(row[2]),
+            **{bucket: float(value) for bucket, value in zip(AGING_BUCKETS, row[3:])},
+        }
+        for row in cursor.fetchall()
+    ]
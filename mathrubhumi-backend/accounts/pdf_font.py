@@ -0,0 +1,291 @@
+"""
+A TrueType font embedded in receipt PDFs (accounts.receipts) for the text
+Courier cannot show, e.g. Malayalam titles.
+
+The file named by settings.RECEIPT_PDF_FONT is read once per worker and, on
+receipts that need it, embedded as a Type0 / CIDFontType2 font with
+Identity-H encoding: text is written as glyph ids looked up in the font's
+cmap, with a ToUnicode map so the PDF stays searchable.
+
+Only the outlines of the glyphs a receipt draws are embedded (subset()): the
+other glyphs keep their ids but are left empty, and tables a PDF viewer does
+not read are dropped, so a receipt carries a few KB of font instead of the
+whole file (100-400 KB for a Malayalam font).
+
+There is no OpenType shaping. Conjuncts print as consonant + virama +
+consonant, and pre-base vowel signs are moved ahead of their consonant
+cluster (visual_order), which keeps a Malayalam title readable.
+"""
+import functools
+import os
+import struct
+import zlib
+
+from django.conf import settings
+
+VIRAMA = '്'
+# vowel signs written before the consonant cluster, split into (pre-base, post-base)
+_VOWEL_PARTS = {
+    'െ': ('െ', ''),
+    'േ': ('േ', ''),
+    'ൈ': ('ൈ', ''),
+    'ൊ': ('െ', 'ാ'),
+    'ോ': ('േ', 'ാ'),
+    'ൌ': ('െ', 'ൗ'),
+}
+
+
+def _is_consonant(ch):
+    return 'ക' <= ch <= 'ഺ'
+
+
+def visual_order(text):
+    """Logical Malayalam text in the order its glyphs are drawn, pre-base vowel signs first."""
+    out, cluster = [], 0
+    for ch in text:
+        pre, post = _VOWEL_PARTS.get(ch, ('', ''))
+        if pre:
+            out.insert(cluster, pre)
+            if post:
+                out.append(post)
+            continue
+        if not (_is_consonant(ch) and out and out[-1] == VIRAMA):
+            cluster = len(out)
+        out.append(ch)
+    return ''.join(out)
+
+
+# tables a PDF viewer reads from an embedded TrueType font (PDF 32000-1, 9.9)
+SUBSET_TABLES = ('cvt ', 'fpgm', 'glyf', 'head', 'hhea', 'hmtx', 'loca', 'maxp', 'prep')
+
+# composite glyph component flags
+ARG_1_AND_2_ARE_WORDS = 0x0001
+WE_HAVE_A_SCALE = 0x0008
+MORE_COMPONENTS = 0x0020
+WE_HAVE_AN_X_AND_Y_SCALE = 0x0040
+WE_HAVE_A_TWO_BY_TWO = 0x0080
+
+
+def _checksum(data):
+    data += bytes(-len(data) % 4)
+    return sum(struct.unpack(f'>{len(data) // 4}I', data)) & 0xFFFFFFFF
+
+
+class TrueTypeFont:
+    """The parts of a .ttf file a PDF needs: metrics, advance widths and the Unicode cmap."""
+
+    def __init__(self, data, name='ReceiptUnicode'):
+        self.data = data
+        self.name = ''.join(ch for ch in name if ch.isalnum() or ch in '-_') or 'ReceiptUnicode'
+        tables = {}
+        for i in range(struct.unpack_from('>H', data, 4)[0]):
+            tag, _checksum, offset, length = struct.unpack_from('>4sIII', data, 12 + 16 * i)
+            tables[tag.decode('latin-1')] = (offset, length)
+        self.tables = tables
+        head, hhea = tables['head'][0], tables['hhea'][0]
+        self.units_per_em = struct.unpack_from('>H', data, head + 18)[0]
+        self.bbox = struct.unpack_from('>4h', data, head + 36)
+        self.ascent, self.descent = struct.unpack_from('>hh', data, hhea + 4)
+        metrics = struct.unpack_from('>H', data, hhea + 34)[0]
+        self.advances = [struct.unpack_from('>H', data, tables['hmtx'][0] + 4 * i)[0] for i in range(metrics)]
+        self.cmap = self._read_cmap(tables['cmap'][0])
+
+    def _read_cmap(self, base):
+        data = self.data
+        subtables = {}
+        for i in range(struct.unpack_from('>H', data, base + 2)[0]):
+            platform, encoding, offset = struct.unpack_from('>HHI', data, base + 4 + 8 * i)
+            subtables[(platform, encoding)] = base + offset
+        for key in ((3, 10), (0, 4), (3, 1), (0, 3)):
+            offset = subtables.get(key)
+            if offset is None:
+                continue
+            fmt = struct.unpack_from('>H', data, offset)[0]
+            if fmt == 12:
+                return self._cmap_12(offset)
+            if fmt == 4:
+                return self._cmap_4(offset)
+        raise ValueError('font has no Unicode cmap')
+
+    def _cmap_4(self, offset):
+        data, cmap = self.data, {}
+        segments = struct.unpack_from('>H', data, offset + 6)[0] // 2
+        ends = offset + 14
+        starts = ends + 2 * segments + 2
+        deltas = starts + 2 * segments
+        range_offsets = deltas + 2 * segments
+        for i in range(segments):
+            end, start, delta, range_offset = (
+                struct.unpack_from('>H', data, array + 2 * i)[0] for array in (ends, starts, deltas, range_offsets)
+            )
+            for code in range(start, min(end, 0xFFFE) + 1):
+                if range_offset:
+                    glyph = struct.unpack_from('>H', data, range_offsets + 2 * i + range_offset + 2 * (code - start))[0]
+                    glyph = (glyph + delta) & 0xFFFF if glyph else 0
+                else:
+                    glyph = (code + delta) & 0xFFFF
+                if glyph:
+                    cmap[code] = glyph
+        return cmap
+
+    def _cmap_12(self, offset):
+        data, cmap = self.data, {}
+        for i in range(struct.unpack_from('>I', data, offset + 12)[0]):
+            start, end, glyph = struct.unpack_from('>III', data, offset + 16 + 12 * i)
+            for code in range(start, end + 1):
+                cmap[code] = glyph + code - start
+        return cmap
+
+    def _table(self, tag):
+        offset, length = self.tables[tag]
+        return self.data[offset:offset + length]
+
+    def _glyph_offsets(self):
+        """Start of each glyph's outline in glyf, plus the end of the last one."""
+        count = struct.unpack_from('>H', self.data, self.tables['maxp'][0] + 4)[0]
+        loca = self.tables['loca'][0]
+        if struct.unpack_from('>h', self.data, self.tables['head'][0] + 50)[0]:
+            return struct.unpack_from(f'>{count + 1}I', self.data, loca)
+        return [2 * v for v in struct.unpack_from(f'>{count + 1}H', self.data, loca)]
+
+    @staticmethod
+    def _components(outline):
+        """Glyph ids a composite outline is built from (none for a simple glyph)."""
+        if len(outline) < 10 or struct.unpack_from('>h', outline, 0)[0] >= 0:
+            return []
+        glyphs, pos = [], 10
+        while True:
+            flags, glyph = struct.unpack_from('>HH', outline, pos)
+            glyphs.append(glyph)
+            pos += 4 + (4 if flags & ARG_1_AND_2_ARE_WORDS else 2)
+            if flags & WE_HAVE_A_SCALE:
+                pos += 2
+            elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+                pos += 4
+            elif flags & WE_HAVE_A_TWO_BY_TWO:
+                pos += 8
+            if not flags & MORE_COMPONENTS:
+                return glyphs
+
+    def subset(self, used):
+        """
+        The font file with outlines only for the glyphs in `used` (and .notdef
+        and the parts of composite glyphs). Glyph ids are kept, so the PDF's
+        Identity CIDToGIDMap still holds. A font without glyf / loca (CFF
+        outlines) is returned whole.
+        """
+        if 'glyf' not in self.tables or 'loca' not in self.tables or 'maxp' not in self.tables:
+            return self.data
+        offsets = self._glyph_offsets()
+        glyf = self._table('glyf')
+        keep, pending = set(), [0, *used]
+        while pending:
+            glyph = pending.pop()
+            if glyph in keep or glyph >= len(offsets) - 1:
+                continue
+            keep.add(glyph)
+            pending.extend(self._components(glyf[offsets[glyph]:offsets[glyph + 1]]))
+
+        outlines, loca = [], [0]
+        for glyph in range(len(offsets) - 1):
+            outline = glyf[offsets[glyph]:offsets[glyph + 1]] if glyph in keep else b''
+            outlines.append(outline + bytes(-len(outline) % 4))
+            loca.append(loca[-1] + len(outlines[-1]))
+
+        head = bytearray(self._table('head'))
+        struct.pack_into('>I', head, 8, 0)
+        struct.pack_into('>h', head, 50, 1)  # long loca offsets
+        tables = {tag: self._table(tag) for tag in SUBSET_TABLES if tag in self.tables}
+        tables.update({
+            'head': bytes(head),
+            'glyf': b''.join(outlines),
+            'loca': struct.pack(f'>{len(loca)}I', *loca),
+        })
+
+        count = len(tables)
+        power = 1 << (count.bit_length() - 1)
+        header = self.data[:4] + struct.pack('>HHHH', count, 16 * power, power.bit_length() - 1, 16 * (count - power))
+        directory, body, positions = b'', b'', {}
+        for tag, data in sorted(tables.items()):
+            positions[tag] = 12 + 16 * count + len(body)
+            directory += struct.pack('>4sIII', tag.encode('latin-1'), _checksum(data), positions[tag], len(data))
+            body += data + bytes(-len(data) % 4)
+        font = bytearray(header + directory + body)
+        struct.pack_into('>I', font, positions['head'] + 8, (0xB1B0AFBA - _checksum(bytes(font))) & 0xFFFFFFFF)
+        return bytes(font)
+
+    def covers(self, text):
+        return all(ord(ch) in self.cmap for ch in visual_order(text))
+
+    def _scaled(self, value):
+        return round(value * 1000 / self.units_per_em)
+
+    def encode(self, text, used):
+        """Hex glyph string for a PDF Tj; glyphs drawn are recorded in `used` (glyph id -> text)."""
+        glyphs = []
+        for ch in visual_order(text):
+            glyph = self.cmap.get(ord(ch), 0)
+            used.setdefault(glyph, ch)
+            glyphs.append(f"{glyph:04X}")
+        return '<' + ''.join(glyphs) + '>'
+
+    def pdf_objects(self, first, used):
+        """
+        Bodies of the Type0 font (object `first`), its CIDFont, descriptor,
+        font file and ToUnicode map, numbered consecutively from `first`.
+        """
+        widths = ' '.join(
+            f"{glyph} [{self._scaled(self.advances[min(glyph, len(self.advances) - 1)])}]" for glyph in sorted(used)
+        )
+        bbox = ' '.join(str(self._scaled(v)) for v in self.bbox)
+        subset = self.subset(used)
+        font_file = zlib.compress(subset)
+        mappings = [
+            f"<{glyph:04X}> <{text.encode('utf-16-be').hex().upper()}>" for glyph, text in sorted(used.items())
+        ]
+        blocks = [
+            f"{len(chunk)} beginbfchar\n" + '\n'.join(chunk) + "\nendbfchar"
+            for chunk in (mappings[i:i + 100] for i in range(0, len(mappings), 100))
+        ]
+        to_unicode = '\n'.join([
+            "/CIDInit /ProcSet findresource begin",
+            "12 dict begin",
+            "begincmap",
+            "/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def",
+            "/CMapName /Adobe-Identity-UCS def",
+            "/CMapType 2 def",
+            "1 begincodespacerange",
+            "<0000> <FFFF>",
+            "endcodespacerange",
+            *blocks,
+            "endcmap",
+            "CMapName currentdict /CMap defineresource pop",
+            "end",
+            "end",
+        ]).encode('latin-1')
+        return [
+            (f"<< /Type /Font /Subtype /Type0 /BaseFont /{self.name} /Encoding /Identity-H "
+             f"/DescendantFonts [{first + 1} 0 R] /ToUnicode {first + 4} 0 R >>").encode('latin-1'),
+            (f"<< /Type /Font /Subtype /CIDFontType2 /BaseFont /{self.name} "
+             f"/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> "
+             f"/FontDescriptor {first + 2} 0 R /W [{widths}] /CIDToGIDMap /Identity >>").encode('latin-1'),
+            (f"<< /Type /FontDescriptor /FontName /{self.name} /Flags 32 /FontBBox [{bbox}] /ItalicAngle 0 "
+             f"/Ascent {self._scaled(self.ascent)} /Descent {self._scaled(self.descent)} "
+             f"/CapHeight {self._scaled(self.ascent)} /StemV 80 /FontFile2 {first + 3} 0 R >>").encode('latin-1'),
+            (f"<< /Length {len(font_file)} /Length1 {len(subset)} /Filter /FlateDecode >>\nstream\n").encode()
+            + font_file + b"\nendstream",
+            f"<< /Length {len(to_unicode)} >>\nstream\n".encode() + to_unicode + b"\nendstream",
+        ]
+
+
+@functools.lru_cache(maxsize=4)
+def _load(path):
+    if not path or not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as f:
+        return TrueTypeFont(f.read(), os.path.splitext(os.path.basename(path))[0])
+
+
+def receipt_font():
+    """The configured Unicode font, or None when RECEIPT_PDF_FONT is unset or missing."""
+    return _load(getattr(settings, 'RECEIPT_PDF_FONT', ''))
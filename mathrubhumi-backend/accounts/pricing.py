@@ -0,0 +1,213 @@
+"""
+Sale pricing engine shared by the quote endpoint and create_sale.
+
+Rates are tax-inclusive, as on the SaleBill screen:
+
+    line value = quantity x rate x exchange rate x (1 - line discount %)
+
+A bill discount (percent of gross, or a fixed amount) is only allowed when no
+line carries its own discount, and is shared out over the lines in proportion
+to their value using largest remainders, so the allocated paise always add up
+to the bill discount exactly. All money is Decimal, rounded half-up to paise.
+
+Title rate / tax / name come from a per-worker cache of the titles table that
+is refreshed after TITLE_PRICE_CACHE_SECONDS and dropped for a title whenever
+it is edited through the title master endpoints.
+"""
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP, ROUND_FLOOR
+
+from django.conf import settings
+
+PAISE = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+_title_cache = {}
+_title_cache_lock = threading.Lock()
+
+
+class PricingError(ValueError):
+    pass
+
+
+def money(value):
+    return Decimal(str(value or 0)).quantize(PAISE, rounding=ROUND_HALF_UP)
+
+
+def dec(value, default='0'):
+    if value in (None, ''):
+        return Decimal(default)
+    return Decimal(str(value))
+
+
+def _cache_seconds():
+    return int(getattr(settings, 'TITLE_PRICE_CACHE_SECONDS', 300))
+
+
+def invalidate_titles(title_ids=None):
+    """Forget cached prices for the given titles, or for all titles."""
+    with _title_cache_lock:
+        if title_ids is None:
+            _title_cache.clear()
+        else:
+            for title_id in title_ids:
+                _title_cache.pop(int(title_id), None)
+
+
+def title_prices(cursor, title_ids):
+    """
+    {title_id: {'rate', 'tax', 'itemName', 'language'}} for the requested
+    titles, loading every missing or expired entry in one query.
+    """
+    now = time.monotonic()
+    wanted = {int(t) for t in title_ids}
+    with _title_cache_lock:
+        found = {t: _title_cache[t] for t in wanted if t in _title_cache and _title_cache[t]['expires'] > now}
+    missing = sorted(wanted - found.keys())
+    if missing:
+        cursor.execute(
+            """
+            SELECT id, rate, tax, CASE WHEN language_id = 1 THEN title_m ELSE title END, language_id
+              FROM titles
+             WHERE id = ANY(%s)
+            """,
+            [missing],
+        )
+        expires = now + _cache_seconds()
+        loaded = {
+            row[0]: {
+                'rate': dec(row[1]),
+                'tax': dec(row[2]),
+                'itemName': row[3] or '',
+                'language': int(row[4] or 0),
+                'expires': expires,
+            }
+            for row in cursor.fetchall()
+        }
+        with _title_cache_lock:
+            _title_cache.update(loaded)
+        found.update(loaded)
+    return found
+
+
+def allocate(total, weights):
+    """Split `total` paise over `weights` proportionally; the parts sum to `total` exactly."""
+    total = money(total)
+    weight_sum = sum(weights)
+    if not weights or total == 0 or weight_sum <= 0:
+        return [Decimal('0.00')] * len(weights)
+    exact = [total * w / weight_sum for w in weights]
+    parts = [e.quantize(PAISE, rounding=ROUND_FLOOR) for e in exact]
+    left = int((total - sum(parts)) / PAISE)
+    by_remainder = sorted(range(len(exact)), key=lambda i: exact[i] - parts[i], reverse=True)
+    for i in by_remainder[:left]:
+        parts[i] += PAISE
+    return parts
+
+
+def line_value(quantity, rate, exchange_rate, discount_p):
+    """Unrounded line value; gross is summed from these before rounding, like the screen does."""
+    return quantity * rate * exchange_rate * (1 - discount_p / HUNDRED)
+
+
+def price_lines(lines, bill_discount_p=0, bill_discount_amount=0, round_off=None):
+    """
+    Price normalised lines (dicts with Decimal quantity, rate, exchangeRate,
+    discount, tax) and the bill totals. round_off=None suggests the round-off
+    to the nearest rupee. Returns (priced_lines, totals).
+    """
+    bill_discount_p = dec(bill_discount_p)
+    bill_discount_amount = money(bill_discount_amount)
+    has_item_discount = any(line['discount'] > 0 for line in lines)
+    if sum(1 for flag in (has_item_discount, bill_discount_p > 0, bill_discount_amount > 0) if flag) > 1:
+        raise PricingError('Only one of item discount, bill discount %, or bill discount amount can be applied')
+
+    values = [
+        line_value(line['quantity'], line['rate'], line['exchangeRate'], line['discount'])
+        for line in lines
+    ]
+    gross = money(sum(values, Decimal('0')))
+    if bill_discount_p > 0:
+        bill_discount = money(gross * bill_discount_p / HUNDRED)
+    else:
+        bill_discount = bill_discount_amount
+    shares = allocate(bill_discount, values)
+
+    priced = []
+    tax_total = Decimal('0.00')
+    for line, value, share in zip(lines, values, shares):
+        value = money(value)
+        net = value - share
+        tax_amount = money(net - net / (1 + line['tax'] / HUNDRED))
+        tax_total += tax_amount
+        priced.append(dict(line, value=value, allocatedBillDiscount=share, taxAmount=tax_amount))
+
+    net_total = gross - bill_discount
+    if round_off is None:
+        round_off = net_total.quantize(Decimal('1'), rounding=ROUND_HALF_UP) - net_total
+    else:
+        round_off = money(round_off)
+
+    totals = {
+        'gross': gross,
+        'bill_discount_total': bill_discount,
+        'tax_total': tax_total,
+        'round_off': round_off,
+        'bill_amount': net_total + round_off,
+    }
+    return priced, totals
+
+
+def quote(cursor, items, bill_discount_p=0, bill_discount_amount=0, round_off=None):
+    """
+    Price a cart of {titleId, quantity[, rate, exchangeRate, discount]} items
+    with rate and tax taken from the title cache unless the line overrides the rate.
+    """
+    prices = title_prices(cursor, [item.get('titleId') for item in items])
+    lines = []
+    for n, item in enumerate(items):
+        title_id = int(item.get('titleId') or 0)
+        price = prices.get(title_id)
+        if price is None:
+            raise PricingError(f'Unknown title at line {n + 1}: {title_id}')
+        lines.append({
+            'titleId': title_id,
+            'itemName': price['itemName'],
+            'language': price['language'],
+            'quantity': dec(item.get('quantity')),
+            'rate': dec(item.get('rate'), price['rate']),
+            'exchangeRate': dec(item.get('exchangeRate'), '1'),
+            'discount': dec(item.get('discount')),
+            'tax': price['tax'],
+        })
+    return price_lines(lines, bill_discount_p, bill_discount_amount, round_off)
+
+
+def check_sale_totals(items, gross, bill_discount_p, bill_discount_amount, round_off, bill_amount, tolerance='0.05'):
+    """
+    Recompute a posted sale with the pricing engine. Returns the per-line
+    allocated bill discounts (Decimal) or raises PricingError when the posted
+    line values or totals disagree with the recomputed ones by more than
+    `tolerance`.
+    """
+    tolerance = Decimal(tolerance)
+    lines = [
+        {
+            'quantity': dec(item['quantity']),
+            'rate': dec(item['rate']),
+            'exchangeRate': dec(item['exchangeRate'], '1'),
+            'discount': dec(item.get('discount')),
+            'tax': dec(item.get('tax')),
+        }
+        for item in items
+    ]
+    priced, totals = price_lines(lines, bill_discount_p, bill_discount_amount, round_off)
+
+    for n, (item, line) in enumerate(zip(items, priced)):
+        if abs(dec(item['value']) - line['value']) > tolerance:
+            raise PricingError(f"Line {n + 1}: value {item['value']} does not match {line['value']}")
+    for field, posted in (('gross', gross), ('bill_amount', bill_amount)):
+        if abs(dec(posted) - totals[field]) > tolerance:
+            raise PricingError(f'{field} {posted} does not match {totals[field]}')
+    return [line['allocatedBillDiscount'] for line in priced]
@@ -0,0 +1,427 @@
+"""
+Bill receipts rendered on the server: ESC/POS byte streams for thermal
+printers and compact single-page PDFs, both from the bill JSON that
+get_sale_by_id serves.
+
+Layout lives in RECEIPT_TEMPLATE, a small line-oriented template:
+
+    =            rule of '-' across the paper ('==' for '=')
+    @items       the bill lines
+    @totals      gross / discount / round off / net
+    <flags> text one printed line; text may use {fields} and a '|' that
+                 splits it into a left and a right justified part
+
+Flags, written before a space: '^' centre, '>' right, '*' bold, '!' double
+size, '?' skip the line when every field in it is empty.
+
+A template is compiled once per (template, paper width) per worker into a
+list of render steps. Rendered receipts are cached per (sale, row_version,
+format, width), so a reprint of an unchanged bill costs one version lookup.
+The company header block is read once per company per worker. Both caches
+keep entries for COMPANY_HEADER_CACHE_SECONDS, so an edit to the company
+table reaches every worker's receipts within that time;
+clear_company_header_cache() makes it immediate in the calling worker.
+
+An item whose name the output cannot show (a Malayalam title on a cp437
+printer, or in a PDF without settings.RECEIPT_PDF_FONT) prints under its
+Latin title instead; see accounts.pdf_font for the embedded Unicode font.
+"""
+import datetime
+import functools
+import re
+import string
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .pdf_font import receipt_font
+
+FORMAT_ESCPOS = 'escpos'
+FORMAT_PDF = 'pdf'
+CONTENT_TYPES = {
+    FORMAT_ESCPOS: 'application/octet-stream',
+    FORMAT_PDF: 'application/pdf',
+}
+
+# characters per line: 80 mm and 58 mm rolls in font A
+PAPER_WIDTHS = (48, 32)
+DEFAULT_WIDTH = 48
+ESCPOS_ENCODING = 'cp437'
+
+RECEIPT_TEMPLATE = """
+^*! {company_name}
+^? {address1}
+^? {address2}
+^? {city_with_pin}
+^? Ph: {contact_nos}
+^? GSTIN: {gstin}
+=
+^*! {bill_title}
+Bill No: {bill_no}|{date}
+? Customer: {customer_nm}
+? Mobile: {mobile_number}
+? Agent: {agent_nm}
+=
+Item|Amount
+=
+@items
+=
+@totals
+=
+^? {note_1}
+^? {note_2}
+^ Thank you. Visit again!
+"""
+
+RENDERED_CACHE_SIZE = 256
+
+_rendered = OrderedDict()
+_rendered_lock = threading.Lock()
+_company_headers = {}
+_company_lock = threading.Lock()
+
+_FIELD_FORMATTER = string.Formatter()
+
+
+# ---------------------------------------------------------------- template
+
+def _fields(text):
+    return [name for _, name, _, _ in _FIELD_FORMATTER.parse(text) if name]
+
+
+def _fit(left, right, width):
+    """
+    Left and right parts on one line when both fit; otherwise the left part
+    (wrapped, never cut) followed by the right part right-aligned on its own line.
+    """
+    if not right:
+        return _wrap(left, width)
+    room = width - len(right) - 1
+    if len(left) <= room:
+        return [f"{left:<{room}} {right}"]
+    return _wrap(left, width) + [right[:width].rjust(width)]
+
+
+def _wrap(text, width):
+    lines = []
+    while len(text) > width:
+        cut = text.rfind(' ', 0, width + 1)
+        cut = cut if cut > 0 else width
+        lines.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    lines.append(text)
+    return lines
+
+
+def _text_step(flags, text, width):
+    center, right = '^' in flags, '>' in flags
+    bold, double, optional = '*' in flags, '!' in flags, '?' in flags
+    cols = width // 2 if double else width
+    fields = _fields(text)
+    left_text, _, right_text = text.partition('|')
+
+    def step(ctx):
+        if optional and not any(str(ctx.get(f) or '').strip() for f in fields):
+            return []
+        left = left_text.format_map(ctx).strip()
+        rest = right_text.format_map(ctx).strip()
+        if rest:
+            return [(line, bold, double) for line in _fit(left, rest, cols)]
+        out = []
+        for piece in _wrap(left, cols):
+            if center:
+                line = piece.center(cols).rstrip()
+            elif right:
+                line = piece.rjust(cols)
+            else:
+                line = piece
+            out.append((line, bold, double))
+        return out
+    return step
+
+
+def _items_step(width):
+    def step(ctx):
+        out = []
+        for item in ctx['items']:
+            for piece in _wrap(str(item.get('itemName') or ''), width):
+                out.append((piece, False, False))
+            detail = f"  {_qty(item.get('quantity'))} x {_money(item.get('rate'))}"
+            if item.get('discount'):
+                detail += f" less {_qty(item['discount'])}%"
+            out.extend((line, False, False) for line in _fit(detail, _money(item.get('value')), width))
+        return out
+    return step
+
+
+def _totals_step(width):
+    def step(ctx):
+        rows = [(f"Gross ({ctx['item_count']} items)", _money(ctx['gross']))]
+        if ctx['discount'] >= 0.005:
+            rows.append(('Bill discount', '-' + _money(ctx['discount'])))
+        if abs(ctx['round_off']) >= 0.005:
+            rows.append(('Round off', _money(ctx['round_off'])))
+        out = [(line, False, False) for left, right in rows for line in _fit(left, right, width)]
+        out.extend((line, True, True) for line in _fit('NET', _money(ctx['bill_amount']), width // 2))
+        if ctx['cancelled']:
+            out.append(('*** CANCELLED ***'.center(width // 2).rstrip(), True, True))
+        return out
+    return step
+
+
+@functools.lru_cache(maxsize=16)
+def compile_template(template, width):
+    """Turn a receipt template into render steps for a paper width; cached per worker."""
+    steps = []
+    for raw in template.strip('\n').splitlines():
+        if raw.startswith('=='):
+            steps.append(lambda ctx, w=width: [('=' * w, False, False)])
+        elif raw.startswith('='):
+            steps.append(lambda ctx, w=width: [('-' * w, False, False)])
+        elif raw.strip() == '@items':
+            steps.append(_items_step(width))
+        elif raw.strip() == '@totals':
+            steps.append(_totals_step(width))
+        else:
+            match = re.match(r'^([\^>*!?]+) (.*)$', raw)
+            flags, text = (match.group(1), match.group(2)) if match else ('', raw)
+            steps.append(_text_step(flags, text, width))
+    return tuple(steps)
+
+
+# ---------------------------------------------------------------- data
+
+def _num(value):
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _money(value):
+    return f"{_num(value):.2f}"
+
+
+def _qty(value):
+    return f"{_num(value):g}"
+
+
+def _cache_seconds():
+    return int(getattr(settings, 'COMPANY_HEADER_CACHE_SECONDS', 300))
+
+
+def company_header(cursor, company_id):
+    """Header fields of a company, read once per worker and refreshed after COMPANY_HEADER_CACHE_SECONDS."""
+    now = time.monotonic()
+    with _company_lock:
+        cached = _company_headers.get(company_id)
+        if cached and cached[0] > now:
+            return cached[1]
+    cursor.execute(
+        """
+        SELECT company_name, address1, address2, city_with_pin, email, contact_nos, gstin
+          FROM company
+         WHERE id = %s
+        """,
+        [company_id],
+    )
+    row = cursor.fetchone()
+    keys = ('company_name', 'address1', 'address2', 'city_with_pin', 'email', 'contact_nos', 'gstin')
+    header = dict(zip(keys, (v or '' for v in row))) if row else dict.fromkeys(keys, '')
+    with _company_lock:
+        _company_headers[company_id] = (now + _cache_seconds(), header)
+    return header
+
+
+def clear_company_header_cache():
+    """Forget cached company headers and the receipts rendered under them."""
+    with _company_lock:
+        _company_headers.clear()
+    with _rendered_lock:
+        _rendered.clear()
+
+
+class _Context(dict):
+    """Template fields; a field the bill does not carry prints empty."""
+    def __missing__(self, key):
+        return ''
+
+
+def _item_name(item, printable):
+    """The item name, or its Latin title when the output cannot show the name."""
+    name = str(item.get('itemName') or '')
+    if printable is None or printable(name):
+        return name
+    return str(item.get('title') or name)
+
+
+def receipt_context(bill, header, printable=None):
+    """
+    Template fields for a bill (get_sale_by_id JSON) under a company header;
+    printable(text) says whether the output can show an item name as it is.
+    """
+    sale_date = bill.get('sale_date') or ''
+    try:
+        date = datetime.date.fromisoformat(str(sale_date)[:10]).strftime('%d-%m-%Y')
+    except ValueError:
+        date = str(sale_date)
+    gross = _num(bill.get('gross'))
+    round_off = _num(bill.get('round_off'))
+    bill_amount = _num(bill.get('bill_amount'))
+    ctx = _Context(header)
+    ctx.update({k: '' if v is None else v for k, v in bill.items() if not isinstance(v, (list, dict))})
+    ctx.update({
+        'bill_title': f"{bill.get('type') or 'Sale'} Bill",
+        'date': date,
+        'items': [dict(item, itemName=_item_name(item, printable)) for item in bill.get('items') or []],
+        'item_count': len(bill.get('items') or []),
+        'gross': gross,
+        'round_off': round_off,
+        'bill_amount': bill_amount,
+        'discount': gross + round_off - bill_amount,
+        'cancelled': bill.get('cancel') == 'Yes',
+    })
+    return ctx
+
+
+def layout(bill, header, width=DEFAULT_WIDTH, template=RECEIPT_TEMPLATE, printable=None):
+    """Printed lines of a receipt as (text, bold, double_size)."""
+    ctx = receipt_context(bill, header, printable)
+    return [line for step in compile_template(template, width) for line in step(ctx)]
+
+
+# ---------------------------------------------------------------- output
+
+ESC, GS = b'\x1b', b'\x1d'
+
+
+def _encodes(encoding):
+    def printable(text):
+        try:
+            text.encode(encoding)
+        except UnicodeEncodeError:
+            return False
+        return True
+    return printable
+
+
+def to_escpos(lines):
+    """ESC/POS bytes: init, code page 437, one line per entry, feed and partial cut."""
+    out = [ESC + b'@', ESC + b't\x00']
+    for text, bold, double in lines:
+        out.append(ESC + b'E' + (b'\x01' if bold else b'\x00'))
+        out.append(GS + b'!' + (b'\x11' if double else b'\x00'))
+        out.append(text.encode(ESCPOS_ENCODING, errors='replace') + b'\n')
+    out.append(ESC + b'E\x00' + GS + b'!\x00')
+    out.append(ESC + b'd\x04' + GS + b'V\x42\x00')
+    return b''.join(out)
+
+
+PDF_FONT_SIZE = 8
+PDF_MARGIN = 10
+
+
+_is_latin1 = _encodes('latin-1')
+
+
+def _pdf_text(text):
+    raw = text.encode('latin-1', errors='replace').decode('latin-1')
+    return raw.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def _pdf_printable(font):
+    """Whether a PDF set in Courier, plus `font` when there is one, can show a text."""
+    return lambda text: all(_is_latin1(ch) or (font is not None and font.covers(ch)) for ch in text)
+
+
+def to_pdf(lines, width=DEFAULT_WIDTH, font=None):
+    """
+    A one-page PDF as long as the receipt, set in Courier so columns line up
+    as on paper; runs Courier cannot show are set in the Unicode `font`.
+    """
+    size = PDF_FONT_SIZE
+    page_w = width * size * 0.6 + 2 * PDF_MARGIN
+    page_h = sum(size * (2 if double else 1) * 1.25 for _, _, double in lines) + 2 * PDF_MARGIN
+
+    ops, y, used = [], page_h - PDF_MARGIN, {}
+    for text, bold, double in lines:
+        font_size = size * (2 if double else 1)
+        y -= font_size * 1.25
+        latin = '/F2' if bold else '/F1'
+        shows = []
+        for is_latin, run in _runs(text, font):
+            if is_latin:
+                shows.append(f"{latin} {font_size} Tf ({_pdf_text(run)}) Tj")
+            else:
+                shows.append(f"/F3 {font_size} Tf {font.encode(run, used)} Tj")
+        ops.append(f"BT {PDF_MARGIN} {y:.2f} Td {' '.join(shows)} ET")
+    stream = '\n'.join(ops).encode('latin-1')
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_w:.2f} {page_h:.2f}] "
+         f"/Resources << /Font << /F1 4 0 R /F2 5 0 R{' /F3 7 0 R' if used else ''} >> >> "
+         f"/Contents 6 0 R >>").encode('latin-1'),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+    ]
+    if used:
+        objects += font.pdf_objects(len(objects) + 1, used)
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{n} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b''.join(f"{off:010d} 00000 n \n".encode() for off in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def _runs(text, font):
+    """(is_latin, run) pieces of a line; without a font everything goes to Courier."""
+    if font is None:
+        return [(True, text)] if text else []
+    runs = []
+    for ch in text:
+        is_latin = _is_latin1(ch) or not font.covers(ch)
+        if runs and runs[-1][0] == is_latin:
+            runs[-1][1] += ch
+        else:
+            runs.append([is_latin, ch])
+    return [tuple(run) for run in runs]
+
+
+def render(bill, header, fmt=FORMAT_ESCPOS, width=DEFAULT_WIDTH):
+    if fmt == FORMAT_PDF:
+        font = receipt_font()
+        return to_pdf(layout(bill, header, width, printable=_pdf_printable(font)), width, font)
+    return to_escpos(layout(bill, header, width, printable=_encodes(ESCPOS_ENCODING)))
+
+
+def cached_render(key, load, fmt=FORMAT_ESCPOS, width=DEFAULT_WIDTH):
+    """
+    Rendered receipt for `key` (which must change whenever the bill does),
+    calling load() -> (bill, header) only on a cache miss or once the entry
+    is older than COMPANY_HEADER_CACHE_SECONDS.
+    """
+    key = (key, fmt, width)
+    now = time.monotonic()
+    with _rendered_lock:
+        cached = _rendered.get(key)
+        if cached and cached[0] > now:
+            _rendered.move_to_end(key)
+            return cached[1]
+    bill, header = load()
+    body = render(bill, header, fmt, width)
+    with _rendered_lock:
+        _rendered[key] = (now + _cache_seconds(), body)
+        _rendered.move_to_end(key)
+        while len(_rendered) > RENDERED_CACHE_SIZE:
+            _rendered.popitem(last=False)
+    return body
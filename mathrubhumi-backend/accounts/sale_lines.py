@@ -0,0 +1,146 @@
+"""
+Set-based writers for sale_items.
+
+Exhibition and wholesale bills routinely carry a few hundred lines, so the
+line rows are shipped to Postgres as parallel arrays and expanded with
+unnest() - one statement and one round trip per save, whatever the bill size.
+"""
+
+INSERT_SALE_ITEMS_SQL = """
+    INSERT INTO sale_items (
+        sale_id, exchange_rate, quantity, rate, tax, discount_p, line_value, currency_id, title_id,
+        allocated_bill_discount, purchase_company_id, purchase_id, purchase_item_id
+    )
+    SELECT %s, u.exchange_rate, u.quantity, u.rate, u.tax, u.discount_p, u.line_value, u.currency_id, u.title_id,
+           u.allocated_bill_discount, u.purchase_company_id, u.purchase_id, u.purchase_item_id
+      FROM unnest(
+               %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[],
+               %s::int2[], %s::int4[], %s::numeric[], %s::int2[], %s::int4[], %s::int4[]
+           ) WITH ORDINALITY AS u(
+               exchange_rate, quantity, rate, tax, discount_p, line_value,
+               currency_id, title_id, allocated_bill_discount, purchase_company_id, purchase_id, purchase_item_id,
+               ord
+           )
+     ORDER BY u.ord
+    RETURNING id
+"""
+
+
+def sale_item_arrays(items):
+    """
+    Column-wise view of normalised sale line dicts (the camelCase shape used by
+    create_sale / get_sale_by_id), in the parameter order of INSERT_SALE_ITEMS_SQL.
+    """
+    return [
+        [item['exchangeRate'] for item in items],
+        [item['quantity'] for item in items],
+        [item['rate'] for item in items],
+        [item['tax'] for item in items],
+        [item['discount'] for item in items],
+        [item['value'] for item in items],
+        [item['currencyIndex'] for item in items],
+        [item['titleId'] for item in items],
+        [item['allocatedBillDiscount'] for item in items],
+        [int(item.get('purchaseCompanyId') or 0) for item in items],
+        [int(item.get('purchaseId') or 0) for item in items],
+        [int(item.get('purchaseItemId') or 0) for item in items],
+    ]
+
+
+def insert_sale_items(cursor, sale_id, items):
+    """
+    Insert every line of a bill in one statement.
+    Returns the new sale_items ids in the same order as `items`.
+    """
+    if not items:
+        return []
+    cursor.execute(INSERT_SALE_ITEMS_SQL, [sale_id, *sale_item_arrays(items)])
+    return [row[0] for row in cursor.fetchall()]
+
+
+UPDATE_SALE_ITEMS_SQL = """
+    UPDATE sale_items si
+       SET exchange_rate = u.exchange_rate,
+           quantity = u.quantity,
+           rate = u.rate,
+           tax = u.tax,
+           discount_p = u.discount_p,
+           line_value = u.line_value,
+           currency_id = u.currency_id,
+           title_id = u.title_id,
+           allocated_bill_discount = u.allocated_bill_discount,
+           purchase_company_id = u.purchase_company_id,
+           purchase_id = u.purchase_id,
+           purchase_item_id = u.purchase_item_id
+      FROM unnest(
+               %s::int4[],
+               %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[],
+               %s::int2[], %s::int4[], %s::numeric[], %s::int2[], %s::int4[], %s::int4[]
+           ) AS u(
+               id, exchange_rate, quantity, rate, tax, discount_p, line_value,
+               currency_id, title_id, allocated_bill_discount, purchase_company_id, purchase_id, purchase_item_id
+           ),
+           sale_items old
+     WHERE si.id = u.id
+       AND si.sale_id = %s
+       AND old.id = si.id
+       AND (si.exchange_rate, si.quantity, si.rate, si.tax, si.discount_p, si.line_value,
+            si.currency_id, si.title_id, si.allocated_bill_discount, si.purchase_company_id, si.purchase_id, si.purchase_item_id)
+           IS DISTINCT FROM
+           (u.exchange_rate, u.quantity, u.rate, u.tax, u.discount_p, u.line_value,
+            u.currency_id, u.title_id, u.allocated_bill_discount, u.purchase_company_id, u.purchase_id, u.purchase_item_id)
+    RETURNING si.id, old.quantity, si.quantity
+"""
+
+
+def sync_sale_items(cursor, sale_id, items):
+    """
+    Bring the stored lines of a bill in line with `items` without touching
+    rows that did not change.
+
+    Lines carrying an `itemId` that belongs to this sale are updated in place
+    (only when some column actually differs), lines without one are inserted,
+    and stored lines absent from the payload are deleted - one statement each.
+    A second line with the same `itemId` (a copied row) is inserted as a new
+    line, as stock._split_line does for the pieces of a split line.
+    Existing sale_items ids therefore survive an edit, which keeps
+    sale_rt_items.sale_det_id references valid.
+
+    Returns (sale_item_id, old_quantity, new_quantity) for every line that was
+    inserted (old 0), updated or deleted (new 0).
+    """
+    cursor.execute("SELECT id FROM sale_items WHERE sale_id = %s", [sale_id])
+    existing_ids = {row[0] for row in cursor.fetchall()}
+
+    kept, added, kept_ids = [], [], []
+    for item in items:
+        item_id = int(item.get('itemId') or 0)
+        if item_id in existing_ids:
+            existing_ids.discard(item_id)
+            kept.append(item)
+            kept_ids.append(item_id)
+        else:
+            item.pop('itemId', None)
+            added.append(item)
+
+    changes = []
+    # stored lines the payload did not claim
+    removed_ids = sorted(existing_ids)
+    if removed_ids:
+        cursor.execute(
+            "DELETE FROM sale_items WHERE sale_id = %s AND id = ANY(%s) RETURNING id, quantity",
+            [sale_id, removed_ids],
+        )
+        changes.extend((row[0], row[1], 0) for row in cursor.fetchall())
+
+    if kept:
+        cursor.execute(UPDATE_SALE_ITEMS_SQL, [kept_ids, *sale_item_arrays(kept), sale_id])
+        changes.extend((row[0], row[1], row[2]) for row in cursor.fetchall())
+
+    if added:
+        new_ids = insert_sale_items(cursor, sale_id, added)
+        for item, new_id in zip(added, new_ids):
+            item['itemId'] = new_id
+            changes.append((new_id, 0, item['quantity']))
+
+    return changes
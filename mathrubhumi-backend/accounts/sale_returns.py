@@ -0,0 +1,77 @@
+"""
+How much of each bill line has already come back on sales returns, and the
+check that keeps a line from being returned beyond what was sold.
+
+The returned quantity of a sale_items row is the sum of the sale_rt_items
+pointing at it through sale_det_id. A covering index on
+sale_rt_items (sale_det_id) INCLUDE (quantity) makes that an index-only
+probe per line, so it is summed on read rather than stored.
+
+A save calls check_returnable() once its lines are written, with the
+returned quantity per bill line of the document as it was (nothing for a
+new return) and as it is now. Only lines whose returned quantity went up are
+checked: they are locked in id order, so concurrent returns of the same line
+are checked one after the other, and then re-summed in a single statement.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+# returned quantity of each bill line, as a LATERAL over sale_items SI
+RETURNED_SQL = """
+    SELECT COALESCE(SUM(RI.quantity), 0) AS returned
+      FROM sale_rt_items RI
+     WHERE RI.sale_det_id = SI.id
+"""
+
+LOCK_SALE_LINES_SQL = "SELECT id FROM sale_items WHERE id = ANY(%s) ORDER BY id FOR UPDATE"
+
+OVER_RETURNED_SQL = f"""
+    SELECT SI.id, SI.quantity, R.returned
+      FROM sale_items SI
+     CROSS JOIN LATERAL ({RETURNED_SQL}) R
+     WHERE SI.id = ANY(%s)
+       AND R.returned > SI.quantity
+     ORDER BY SI.id
+"""
+
+DOCUMENT_RETURNS_SQL = """
+    SELECT sale_det_id, quantity
+      FROM sale_rt_items
+     WHERE parent_id = %s AND sale_det_id <> 0
+"""
+
+
+class SaleReturnError(ValueError):
+    pass
+
+
+def document_returns(cursor, sales_rt_id):
+    """(sale_det_id, quantity) of the lines of a stored sales return that point at a bill line."""
+    cursor.execute(DOCUMENT_RETURNS_SQL, [sales_rt_id])
+    return cursor.fetchall()
+
+
+def _per_line(lines):
+    totals = defaultdict(Decimal)
+    for sale_det_id, quantity in lines:
+        if sale_det_id:
+            totals[int(sale_det_id)] += Decimal(str(quantity or 0))
+    return totals
+
+
+def check_returnable(cursor, after, before=()):
+    """
+    Refuse a save that returns a bill line beyond its sold quantity.
+    `after` / `before`: (sale_det_id, quantity) of the document's lines now
+    and before the change.
+    """
+    old, new = _per_line(before), _per_line(after)
+    increased = sorted(line for line, quantity in new.items() if quantity > old.get(line, 0))
+    if not increased:
+        return
+    cursor.execute(LOCK_SALE_LINES_SQL, [increased])
+    cursor.execute(OVER_RETURNED_SQL, [increased])
+    over = cursor.fetchall()
+    if over:
+        shown = ', '.join(f"{i} ({returned - sold:.3f} over)" for i, sold, returned in over[:10])
+        raise SaleReturnError(f"Return exceeds the sold quantity of bill line {shown}")
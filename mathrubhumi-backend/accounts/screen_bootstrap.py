@@ -0,0 +1,108 @@
+"""
+Reference data a transaction screen needs when it opens, in one payload.
+
+SCREENS lists the sections of each screen. A section is either a master
+table tracked by the change feed (migration 0025) or a fixed list the
+caller passes in (the sale type / payment mode / class mappings in views).
+
+The payload is versioned by the newest master_changes entry and the entry
+count of each table it reads, plus a digest of the fixed lists. Checking
+the version is one index-only query per table, so a client revalidating
+with If-None-Match gets a 304 without the lists being read, and a worker
+builds each (screen, version) payload once.
+"""
+import hashlib
+import json
+import threading
+
+# section -> (master table, SQL returning one json object per row in display order)
+TABLE_SECTIONS = {
+    'currencies': ('currencies', """
+        SELECT json_build_object('id', id, 'name', currency_name, 'exchange_rate', exchange_rate)
+          FROM currencies
+         ORDER BY currency_name
+    """),
+    'agents': ('agents', """
+        SELECT json_build_object('id', id, 'agent_nm', COALESCE(agent_nm, ''))
+          FROM agents
+         ORDER BY agent_nm
+    """),
+    'branches': ('branches', """
+        SELECT json_build_object('id', id, 'branches_nm', COALESCE(branches_nm, ''))
+          FROM branches
+         ORDER BY branches_nm
+    """),
+}
+
+SCREENS = {
+    'sale_bill': ['currencies', 'sale_types', 'payment_modes', 'class_types', 'agents', 'branches'],
+    'goods_inward': ['currencies', 'branches'],
+    'sale_bill_return': ['currencies', 'sale_types', 'payment_modes'],
+}
+
+CACHE_SIZE = 32
+
+_payloads = {}
+_lock = threading.Lock()
+
+
+class BootstrapError(ValueError):
+    pass
+
+
+def _static_digest(static):
+    raw = json.dumps(static, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha1(raw).hexdigest()[:12]
+
+
+def _tables(sections):
+    return sorted({TABLE_SECTIONS[s][0] for s in sections if s in TABLE_SECTIONS})
+
+
+def screen_version(cursor, screen, static):
+    """Version string of a screen's payload; changes whenever any of its sections can."""
+    if screen not in SCREENS:
+        raise BootstrapError(f'Unknown screen: {screen}')
+    tables = _tables(SCREENS[screen])
+    parts = [_static_digest({s: static[s] for s in SCREENS[screen] if s in static})]
+    if tables:
+        cursor.execute(
+            """
+            SELECT T.name, COALESCE(V.version, 0), V.entries
+              FROM unnest(%s::text[]) AS T(name)
+             CROSS JOIN LATERAL (
+                   SELECT max(C."version") AS version, count(*) AS entries
+                     FROM master_changes C
+                    WHERE C.table_name = T.name
+             ) V
+             ORDER BY T.name
+            """,
+            [tables],
+        )
+        parts += [f"{version}.{entries}" for _name, version, entries in cursor.fetchall()]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:16]
+
+
+def _load(cursor, screen, static):
+    payload = {}
+    for section in SCREENS[screen]:
+        if section in TABLE_SECTIONS:
+            cursor.execute(TABLE_SECTIONS[section][1])
+            payload[section] = [row[0] for row in cursor.fetchall()]
+        else:
+            payload[section] = static.get(section, [])
+    return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def screen_payload(cursor, screen, version, static):
+    """JSON text of a screen's reference data at `version`, built once per worker."""
+    key = (screen, version)
+    with _lock:
+        if key in _payloads:
+            return _payloads[key]
+    body = _load(cursor, screen, static)
+    with _lock:
+        if len(_payloads) >= CACHE_SIZE:
+            _payloads.clear()
+        _payloads[key] = body
+    return body
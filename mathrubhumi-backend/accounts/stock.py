@@ -0,0 +1,435 @@
+"""
+Stock engine: keeps titles.stock and purchase_items.closing in step with the
+documents that move stock, and appends every change to stock_movements.
+
+Each save calls post_document() with the document's stored lines as they
+were before the change (nothing for a new document). The engine re-reads
+the lines as stored now, nets old against new per (title, batch), and applies
+only the differences:
+
+  * one UPDATE of titles and one UPDATE of purchase_items per document, each
+    locking its rows in primary-key order (titles first, then batches) so
+    concurrent saves touching the same titles cannot deadlock;
+  * one INSERT of the net movements into the append-only ledger;
+  * one statement adding to the per-batch totals in purchase_batch_ledger (received,
+    sold, sale_returned, returned, available), in the same batch order.
+
+Purchase returns, whose ids are per company, post the before / after lines
+of line_sync.sync_lines() with apply_movements() instead.
+
+Reading current stock stays a single-row lookup on titles / purchase_items;
+the ledger is there to audit and reconcile those figures. What a batch can
+still give back to its supplier is one row of purchase_batch_ledger, and a
+purchase return that would take a batch below zero is refused.
+
+A batch is a purchase_items row, referenced by (company_id, id). Lines that
+leave the batch company at 0 refer to the default company 1.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+DOC_SALE = 'SALE'
+DOC_SALE_RT = 'SRT'
+DOC_PURCHASE = 'PUR'
+DOC_PURCHASE_RT = 'PRT'
+
+# effect of one unit on a line of each document type on stock
+DIRECTION = {
+    DOC_SALE: -1,
+    DOC_SALE_RT: 1,
+    DOC_PURCHASE: 1,
+    DOC_PURCHASE_RT: -1,
+}
+
+# purchase_batch_ledger column each document type adds its line quantities to
+BATCH_LEDGER_COLUMN = {
+    DOC_SALE: 'sold',
+    DOC_SALE_RT: 'sale_returned',
+    DOC_PURCHASE: 'received',
+    DOC_PURCHASE_RT: 'returned',
+}
+
+DEFAULT_COMPANY_ID = 1
+QTY_STEP = Decimal('0.001')
+
+# (title_id, batch_company_id, batch_item_id, quantity) of each stored line
+DOCUMENT_LINES_SQL = {
+    # cancelled bills hold no stock
+    DOC_SALE: """
+        SELECT SI.title_id, SI.purchase_company_id, SI.purchase_item_id, SI.quantity
+          FROM sale_items SI
+          JOIN sales S ON S.id = SI.sale_id
+         WHERE SI.sale_id = %s AND COALESCE(S.cancel, 0) <> 1
+    """,
+    DOC_SALE_RT: """
+        SELECT title_id, purchase_company_id, purchase_det_id, quantity
+          FROM sale_rt_items
+         WHERE parent_id = %s
+    """,
+    DOC_PURCHASE: """
+        SELECT title_id, company_id, id, quantity
+          FROM purchase_items
+         WHERE purchase_id = %s
+    """,
+    # no DOC_PURCHASE_RT: purchase return ids are per company, so its saves post
+    # the lines line_sync.sync_lines() returns through apply_movements()
+}
+
+UPDATE_TITLES_SQL = """
+    WITH d AS (
+        SELECT * FROM unnest(%s::int4[], %s::numeric[]) AS d(id, delta)
+    ),
+    locked AS MATERIALIZED (
+        SELECT T.id
+          FROM titles T
+          JOIN d ON d.id = T.id
+         ORDER BY T.id
+           FOR UPDATE OF T
+    )
+    UPDATE titles T
+       SET stock = T.stock + d.delta
+      FROM d
+      JOIN locked L ON L.id = d.id
+     WHERE T.id = d.id
+"""
+
+UPDATE_BATCHES_SQL = """
+    WITH d AS (
+        SELECT * FROM unnest(%s::int2[], %s::int4[], %s::numeric[]) AS d(company_id, id, delta)
+    ),
+    locked AS MATERIALIZED (
+        SELECT PI.company_id, PI.id
+          FROM purchase_items PI
+          JOIN d ON d.company_id = PI.company_id AND d.id = PI.id
+         ORDER BY PI.company_id, PI.id
+           FOR UPDATE OF PI
+    )
+    UPDATE purchase_items PI
+       SET closing = PI.closing + d.delta
+      FROM d
+      JOIN locked L ON L.company_id = d.company_id AND L.id = d.id
+     WHERE PI.company_id = d.company_id AND PI.id = d.id
+"""
+
+INSERT_MOVEMENTS_SQL = """
+    INSERT INTO stock_movements (doc_type, doc_id, title_id, batch_company_id, batch_item_id, quantity)
+    SELECT %s, m.doc_id, m.title_id, m.batch_company_id, m.batch_item_id, m.quantity
+      FROM unnest(%s::int4[], %s::int4[], %s::int2[], %s::int4[], %s::numeric[])
+           AS m(doc_id, title_id, batch_company_id, batch_item_id, quantity)
+"""
+
+
+# Existing ledger rows add the quantities to the document type's column. A
+# batch without a row yet (written outside the engine) gets one that starts
+# from the batch as stored: received is its quantity - which for an inward
+# already includes this save - plus this document's quantities.
+POST_BATCH_LEDGER_SQL = """
+    WITH d AS (
+        SELECT * FROM unnest(%s::int2[], %s::int4[], %s::int4[], %s::numeric[]) AS d(company_id, id, title_id, qty)
+    ),
+    updated AS (
+        UPDATE purchase_batch_ledger L
+           SET {column} = L.{column} + d.qty
+          FROM d
+         WHERE L.company_id = d.company_id AND L.item_id = d.id
+        RETURNING L.company_id, L.item_id, L.available
+    ),
+    inserted AS (
+        INSERT INTO purchase_batch_ledger (company_id, item_id, purchase_id, title_id, received{other_column})
+        SELECT d.company_id, d.id, COALESCE(PI.purchase_id, 0), COALESCE(PI.title_id, d.title_id),
+               COALESCE(PI.quantity, 0){other_value}
+          FROM d
+          LEFT JOIN purchase_items PI ON PI.company_id = d.company_id AND PI.id = d.id
+         WHERE NOT EXISTS (
+               SELECT 1 FROM purchase_batch_ledger X WHERE X.company_id = d.company_id AND X.item_id = d.id
+         )
+         ORDER BY d.company_id, d.id
+        ON CONFLICT (company_id, item_id) DO NOTHING
+        RETURNING company_id, item_id, available
+    )
+    SELECT * FROM updated
+    UNION ALL
+    SELECT * FROM inserted
+"""
+
+
+def _batch_ledger_sql(doc_type):
+    column = BATCH_LEDGER_COLUMN[doc_type]
+    other = column != 'received'
+    return POST_BATCH_LEDGER_SQL.format(
+        column=column,
+        other_column=f", {column}" if other else '',
+        other_value=", d.qty" if other else '',
+    )
+
+
+class StockError(ValueError):
+    pass
+
+
+def _qty(value):
+    return Decimal(str(value or 0)).quantize(QTY_STEP)
+
+
+def _batch(company_id, item_id):
+    item_id = int(item_id or 0)
+    if not item_id:
+        return 0, 0
+    return int(company_id or 0) or DEFAULT_COMPANY_ID, item_id
+
+
+def document_lines(cursor, doc_type, doc_id):
+    """Stock-relevant lines of a document as currently stored."""
+    if doc_type not in DOCUMENT_LINES_SQL:
+        raise ValueError(f"No stored lines query for document type: {doc_type}")
+    cursor.execute(DOCUMENT_LINES_SQL[doc_type], [doc_id])
+    return cursor.fetchall()
+
+
+def net_movements(doc_type, before=(), after=()):
+    """
+    Stock deltas that turn the effect of `before` lines into that of `after`
+    lines, netted per (title, batch) and sorted; unchanged lines cancel out.
+    """
+    sign = DIRECTION[doc_type]
+    net = defaultdict(Decimal)
+    for lines, factor in ((before, -sign), (after, sign)):
+        for title_id, batch_company_id, batch_item_id, quantity in lines:
+            key = (int(title_id or 0), *_batch(batch_company_id, batch_item_id))
+            net[key] += factor * _qty(quantity)
+    return [(*key, delta) for key, delta in sorted(net.items()) if delta and key[0]]
+
+
+def apply_movements(cursor, doc_type, doc_id, movements, batches=True):
+    """
+    Apply net movements to titles.stock / purchase_items.closing and append
+    them to the ledger. batches=False leaves closing alone, for purchase
+    lines that were inserted with their closing already set.
+    """
+    apply_document_movements(cursor, doc_type, {doc_id: movements}, batches)
+
+
+def apply_document_movements(cursor, doc_type, movements_by_doc, batches=True):
+    """
+    apply_movements() for several documents of one type at once, e.g. a chunk
+    of bulk-loaded bills: still one UPDATE per table and one ledger INSERT.
+    """
+    rows = [(doc_id, *m) for doc_id, movements in movements_by_doc.items() for m in movements]
+    if not rows:
+        return
+
+    per_title = defaultdict(Decimal)
+    per_batch = defaultdict(Decimal)
+    for _doc_id, title_id, batch_company_id, batch_item_id, delta in rows:
+        per_title[title_id] += delta
+        if batch_item_id:
+            per_batch[(batch_company_id, batch_item_id)] += delta
+
+    titles = sorted((k, v) for k, v in per_title.items() if v)
+    if titles:
+        cursor.execute(UPDATE_TITLES_SQL, [[k for k, _ in titles], [v for _, v in titles]])
+
+    batch_deltas = sorted((k, v) for k, v in per_batch.items() if v) if batches else []
+    if batch_deltas:
+        cursor.execute(
+            UPDATE_BATCHES_SQL,
+            [[k[0] for k, _ in batch_deltas], [k[1] for k, _ in batch_deltas], [v for _, v in batch_deltas]],
+        )
+
+    cursor.execute(INSERT_MOVEMENTS_SQL, [doc_type, *(list(col) for col in zip(*rows))])
+
+    _post_batch_ledger(cursor, doc_type, rows)
+
+
+def _post_batch_ledger(cursor, doc_type, rows):
+    """Add the line quantities of `rows` to purchase_batch_ledger; refuse returns beyond what a batch holds."""
+    sign = DIRECTION[doc_type]
+    per_batch = defaultdict(Decimal)
+    titles = {}
+    for _doc_id, title_id, batch_company_id, batch_item_id, delta in rows:
+        if batch_item_id:
+            per_batch[(batch_company_id, batch_item_id)] += sign * delta
+            titles[(batch_company_id, batch_item_id)] = title_id
+    batches = sorted((k, v) for k, v in per_batch.items() if v)
+    if not batches:
+        return
+    cursor.execute(
+        _batch_ledger_sql(doc_type),
+        [
+            [k[0] for k, _ in batches],
+            [k[1] for k, _ in batches],
+            [titles[k] for k, _ in batches],
+            [v for _, v in batches],
+        ],
+    )
+    if doc_type != DOC_PURCHASE_RT:
+        return
+    increased = {k for k, v in batches if v > 0}
+    over = [(c, i, a) for c, i, a in cursor.fetchall() if (c, i) in increased and a < 0]
+    if over:
+        shown = ', '.join(f"{c}/{i} ({-a} over)" for c, i, a in over[:10])
+        raise StockError(f"Return exceeds the returnable quantity of batch {shown}")
+
+
+def post_document(cursor, doc_type, doc_id, before=()):
+    """
+    Bring stock in line with the stored lines of a document. `before` is the
+    result of document_lines() taken before the document was changed; leave it
+    empty for a new document. Call inside the document's transaction, after
+    its lines are written (or deleted). Returns the applied movements.
+    """
+    after = document_lines(cursor, doc_type, doc_id)
+    movements = net_movements(doc_type, before, after)
+    apply_movements(cursor, doc_type, doc_id, movements)
+    return movements
+
+
+LOCK_TITLES_SQL = """
+    SELECT T.id
+      FROM titles T
+     WHERE T.id = ANY(%s::int4[])
+     ORDER BY T.id
+       FOR UPDATE OF T
+"""
+
+FIFO_ALLOCATION_SQL = """
+    WITH need AS (
+        SELECT * FROM unnest(%s::int4[], %s::int4[], %s::numeric[]) AS n(ord, title_id, qty)
+    ),
+    demand AS (
+        SELECT ord, title_id,
+               SUM(qty) OVER (PARTITION BY title_id ORDER BY ord) - qty AS d_from,
+               SUM(qty) OVER (PARTITION BY title_id ORDER BY ord) AS d_to
+          FROM need
+    ),
+    held AS (
+        SELECT * FROM unnest(%s::int2[], %s::int4[], %s::numeric[]) AS h(company_id, id, qty)
+    ),
+    locked_titles AS MATERIALIZED (
+        SELECT T.id
+          FROM titles T
+         WHERE T.id IN (SELECT title_id FROM need)
+         ORDER BY T.id
+           FOR UPDATE OF T
+    ),
+    batches AS MATERIALIZED (
+        SELECT PI.company_id, PI.purchase_id, PI.id, PI.title_id, P.entry_date,
+               PI.closing - COALESCE(H.qty, 0) AS open_qty
+          FROM locked_titles LT
+          JOIN purchase_items PI ON PI.title_id = LT.id
+          JOIN purchase P ON P.id = PI.purchase_id
+          -- a batch the bill's previous version emptied (held < 0) is open again
+          LEFT JOIN held H ON H.company_id = PI.company_id AND H.id = PI.id
+         WHERE PI.closing - COALESCE(H.qty, 0) > 0
+         ORDER BY PI.company_id, PI.id
+           FOR UPDATE OF PI
+    ),
+    supply AS (
+        SELECT B.company_id, B.purchase_id, B.id, B.title_id, B.entry_date, B.open_qty,
+               SUM(B.open_qty) OVER (PARTITION BY B.title_id ORDER BY B.entry_date, B.id) AS s_to
+          FROM batches B
+    )
+    SELECT D.ord, S.company_id, S.purchase_id, S.id,
+           LEAST(D.d_to, S.s_to) - GREATEST(D.d_from, S.s_to - S.open_qty) AS qty
+      FROM demand D
+      JOIN supply S
+        ON S.title_id = D.title_id
+       AND S.s_to - S.open_qty < D.d_to
+       AND S.s_to > D.d_from
+     ORDER BY D.ord, S.entry_date, S.id
+"""
+
+
+def _split_line(item, pieces):
+    """Copies of a sale line, one per (company_id, purchase_id, item_id, qty) piece, sharing out value and bill discount."""
+    quantity = _qty(item['quantity'])
+    lines = []
+    value_left = item['value']
+    discount_left = item.get('allocatedBillDiscount', 0.0)
+    for n, (company_id, purchase_id, item_id, qty) in enumerate(pieces):
+        line = dict(item)
+        if n:
+            line.pop('itemId', None)
+        if n == len(pieces) - 1:
+            value, discount = value_left, discount_left
+        else:
+            share = float(qty / quantity)
+            value = round(item['value'] * share, 2)
+            discount = round(item.get('allocatedBillDiscount', 0.0) * share, 2)
+        value_left -= value
+        discount_left -= discount
+        line.update({
+            'quantity': float(qty),
+            'value': value,
+            'allocatedBillDiscount': discount,
+            'purchaseCompanyId': company_id,
+            'purchaseId': purchase_id,
+            'purchaseItemId': item_id,
+        })
+        lines.append(line)
+    return lines
+
+
+def allocate_fifo(cursor, items, before=()):
+    """
+    Give sale lines that carry no batch (purchaseItemId 0) batches from open
+    purchase_items of their title, oldest purchase.entry_date first, splitting
+    a line over several batches when one does not cover it. Any quantity
+    without open stock stays on an unallocated (batch 0) line.
+
+    Every title of the bill - those of lines naming their batch and of
+    `before` included - is locked first, in primary-key order, and only then
+    the candidate batches: a save holds all its title locks before any batch
+    or number lock, so bills with crossing titles cannot deadlock. The whole
+    bill is allocated by one query. Stock already taken by lines of this bill
+    that name their batch is held back; `before` (document_lines() of the bill
+    before an edit) releases what the bill held until now.
+    """
+    wanted = [
+        (n, item) for n, item in enumerate(items)
+        if not int(item.get('purchaseItemId') or 0) and int(item.get('titleId') or 0) and _qty(item['quantity']) > 0
+    ]
+    if not wanted:
+        return items
+
+    held = defaultdict(Decimal)
+    for item in items:
+        batch = _batch(item.get('purchaseCompanyId'), item.get('purchaseItemId'))
+        if batch[1]:
+            held[batch] += _qty(item['quantity'])
+    for _title_id, batch_company_id, batch_item_id, quantity in before:
+        batch = _batch(batch_company_id, batch_item_id)
+        if batch[1]:
+            held[batch] -= _qty(quantity)
+    held = sorted((k, v) for k, v in held.items() if v)
+
+    title_ids = {int(item.get('titleId') or 0) for item in items}
+    title_ids.update(int(line[0] or 0) for line in before)
+    cursor.execute(LOCK_TITLES_SQL, [sorted(t for t in title_ids if t)])
+
+    cursor.execute(
+        FIFO_ALLOCATION_SQL,
+        [
+            [n for n, _ in wanted],
+            [int(item['titleId']) for _, item in wanted],
+            [_qty(item['quantity']) for _, item in wanted],
+            [k[0] for k, _ in held],
+            [k[1] for k, _ in held],
+            [v for _, v in held],
+        ],
+    )
+    pieces = defaultdict(list)
+    for ord_, company_id, purchase_id, item_id, qty in cursor.fetchall():
+        pieces[ord_].append((company_id, purchase_id, item_id, qty))
+
+    allocated = []
+    for n, item in enumerate(items):
+        if n not in pieces:
+            allocated.append(item)
+            continue
+        parts = pieces[n]
+        short = _qty(item['quantity']) - sum(p[3] for p in parts)
+        if short > 0:
+            parts.append((0, 0, 0, short))
+        allocated.extend(_split_line(item, parts))
+    return allocated
@@ -0,0 +1,87 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+
+
+class DocumentFinderTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='counter')
+        cls.user = CustomUser.objects.create_user(
+            email='finder@example.com',
+            password='testpass123',
+            name='Finder User',
+            role=role,
+        )
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM sales")
+            cur.execute("DELETE FROM remittance")
+            cur.executemany(
+                """
+                INSERT INTO sales (company_id, id, sale_date, bill_no, customer_nm, mobile_number, bill_amount)
+                VALUES (1, %s, %s, %s, %s, %s, %s)
+                """,
+                [
+                    (1, '2026-01-10', 'CS2025-26/00001', 'Anil Kumar', '9847000001', 100),
+                    (2, '2026-01-11', 'CS2025-26/00002', 'Beena Thomas', '9847000002', 200),
+                    (3, '2026-01-11', 'CR2025-26/00001', 'Anitha Menon', '9847000001', 300),
+                    (4, '2026-01-12', 'CS2025-26/00003', 'Anil Kumar', '9847000003', 400),
+                ],
+            )
+            cur.executemany(
+                """
+                INSERT INTO remittance (company_id, id, remittance_no, entry_date, c_name, amount)
+                VALUES (1, %s, %s, %s, %s, %s)
+                """,
+                [
+                    (1, 1, '2026-01-11', 'Anil Kumar', 50),
+                    (2, 2, '2026-01-13', 'Chandran', 75),
+                ],
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('find_documents')
+
+    def _find(self, **params):
+        res = self.client.get(self.url, params)
+        self.assertEqual(res.status_code, 200, res.content)
+        return res.json()
+
+    def test_bill_number_prefix_matches_sales(self):
+        body = self._find(types='sales', number='CS2025-26/')
+        self.assertEqual([r['number'] for r in body['results']],
+                         ['CS2025-26/00003', 'CS2025-26/00002', 'CS2025-26/00001'])
+
+    def test_mobile_leaves_out_documents_without_one(self):
+        body = self._find(mobile='9847000001')
+        self.assertEqual([(r['type'], r['id']) for r in body['results']], [('sales', 3), ('sales', 1)])
+
+    def test_customer_prefix_and_date_range_span_document_types(self):
+        body = self._find(customer='anil', date_from='2026-01-11', date_to='2026-01-12')
+        self.assertEqual([(r['type'], r['id']) for r in body['results']], [('sales', 4), ('remittance', 1)])
+        self.assertEqual(body['results'][1]['amount'], 50.0)
+
+    def test_keyset_pages_return_every_document_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {'types': 'sales,remittance', 'limit': 1}
+            if cursor:
+                params['cursor'] = cursor
+            body = self._find(**params)
+            seen += [(r['date'], r['type'], r['id']) for r in body['results']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+        self.assertEqual(seen, sorted(seen, reverse=True))
+
+    def test_bad_input_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'types': 'vouchers'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'cursor': 'not-a-cursor'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'date_from': '11-01-2026'}).status_code, 400)
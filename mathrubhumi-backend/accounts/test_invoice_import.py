@@ -0,0 +1,177 @@
+import io
+import zipfile
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+
+
+def _xlsx(rows):
+    """A minimal one-sheet workbook; text cells use shared strings."""
+    strings = []
+
+    def cell(ref, value):
+        if isinstance(value, str):
+            strings.append(value)
+            return f'<c r="{ref}" t="s"><v>{len(strings) - 1}</v></c>'
+        return f'<c r="{ref}"><v>{value}</v></c>'
+
+    sheet_rows = []
+    for n, row in enumerate(rows, start=1):
+        cells = ''.join(cell(f"{chr(65 + i)}{n}", v) for i, v in enumerate(row))
+        sheet_rows.append(f'<row r="{n}">{cells}</row>')
+    ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    rel_ns = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, 'w') as z:
+        z.writestr('xl/workbook.xml',
+                   f'<workbook xmlns="{ns}" xmlns:r="{rel_ns}"><sheets>'
+                   f'<sheet name="Invoice" sheetId="1" r:id="rId1"/></sheets></workbook>')
+        z.writestr('xl/_rels/workbook.xml.rels',
+                   '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+                   '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+                   'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+                   '</Relationships>')
+        z.writestr('xl/worksheets/sheet1.xml',
+                   f'<worksheet xmlns="{ns}"><sheetData>{"".join(sheet_rows)}</sheetData></worksheet>')
+        z.writestr('xl/sharedStrings.xml',
+                   f'<sst xmlns="{ns}">' + ''.join(f'<si><t>{s}</t></si>' for s in strings) + '</sst>')
+    return buf.getvalue()
+
+
+class InvoiceImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='purchase')
+        cls.user = CustomUser.objects.create_user(
+            email='import@example.com',
+            password='testpass123',
+            name='Import User',
+            role=role,
+        )
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM titles WHERE id IN (501, 502, 503)")
+            cur.executemany(
+                "INSERT INTO titles (id, title, isbn, rate, stock, tax) VALUES (%s, %s, %s, %s, 0, %s)",
+                [
+                    (501, 'Randamoozham', '9788122613672', 350, 0),
+                    (502, 'Aadujeevitham', '9788126419889', 250, 5),
+                    (503, 'Khasakkinte Itihasam', '9788171300785', 300, 0),
+                ],
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _upload(self, name, content):
+        res = self.client.post(
+            reverse('goods_inward_import'),
+            {'file': SimpleUploadedFile(name, content)},
+            format='multipart',
+        )
+        self.assertEqual(res.status_code, 201, res.content)
+        return res.json()
+
+    def _post(self, import_id):
+        return self.client.post(
+            reverse('goods_inward_import_post', kwargs={'import_id': import_id}),
+            {'supplier_id': 1, 'bill_no': 'INV-77', 'bill_date': '2026-02-01',
+             'user_id': 1, 'branches_id': 1},
+            format='json',
+        )
+
+    def test_csv_lines_are_matched_by_isbn(self):
+        csv_text = (
+            "ISBN,Qty,Price,Disc %\n"
+            "978-81-226-1367-2,3,350,25\n"
+            "9788126419889,2,250,\n"
+            "9780000000000,1,100,10\n"
+        )
+        body = self._upload('invoice.csv', csv_text.encode())
+        self.assertEqual((body['lines'], body['matched'], body['unmatched']), (3, 2, 1))
+        self.assertEqual(body['quantity'], 6.0)
+        self.assertEqual([p['line_no'] for p in body['problems']], [4])
+
+    def test_xlsx_file_is_read(self):
+        content = _xlsx([
+            ['ISBN', 'Quantity', 'Rate', 'Discount'],
+            ['9788171300785', 4, 300, 30],
+            ['9788122613672', 1, 350, 'x'],
+        ])
+        body = self._upload('invoice.xlsx', content)
+        self.assertEqual((body['lines'], body['matched'], body['unmatched']), (2, 1, 1))
+        self.assertIn('discount', body['problems'][0]['error'])
+
+    def test_missing_isbn_column_is_rejected(self):
+        res = self.client.post(
+            reverse('goods_inward_import'),
+            {'file': SimpleUploadedFile('invoice.csv', b"Title,Qty\nSomething,1\n")},
+            format='multipart',
+        )
+        self.assertEqual(res.status_code, 400)
+
+    def test_corrected_import_posts_a_goods_inward_once(self):
+        body = self._upload('invoice.csv', b"isbn,qty,rate\n9788122613672,3,350\n9780000000000,2,100\n")
+        import_id = body['import_id']
+        self.assertEqual(self._post(import_id).status_code, 400)
+
+        detail = reverse('goods_inward_import_detail', kwargs={'import_id': import_id})
+        res = self.client.patch(detail, {'lines': [{'line_no': 3, 'title_id': 502}]}, format='json')
+        self.assertEqual(res.status_code, 200, res.content)
+        self.assertEqual(res.json()['unmatched'], 0)
+
+        res = self._post(import_id)
+        self.assertEqual(res.status_code, 201, res.content)
+        purchase_id = res.json()['purchase_id']
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT title_id, quantity, closing FROM purchase_items WHERE purchase_id = %s ORDER BY id",
+                [purchase_id],
+            )
+            self.assertEqual([(r[0], float(r[1]), float(r[2])) for r in cur.fetchall()],
+                             [(501, 3.0, 3.0), (502, 2.0, 2.0)])
+            cur.execute("SELECT stock FROM titles WHERE id = 501")
+            self.assertEqual(float(cur.fetchone()[0]), 3.0)
+
+        again = self._post(import_id)
+        self.assertEqual(again.status_code, 200)
+        self.assertEqual(again.json()['purchase_id'], purchase_id)
+        self.assertEqual(self.client.patch(detail, {'lines': []}, format='json').status_code, 400)
+
+    def test_corrections_keep_errors_until_their_field_is_fixed(self):
+        body = self._upload('invoice.csv', b"isbn,qty,rate\n9780000000000,2,abc\n9788122613672,1,\n")
+        import_id = body['import_id']
+        self.assertEqual([p['error'] for p in body['problems']], ['bad rate', 'no rate'])
+
+        detail = reverse('goods_inward_import_detail', kwargs={'import_id': import_id})
+        res = self.client.patch(detail, {'lines': [{'line_no': 2, 'title_id': 502}]}, format='json')
+        self.assertEqual(res.status_code, 200, res.content)
+        # the title is set, but the line is not posted at rate 0
+        self.assertEqual([p['error'] for p in res.json()['problems']], ['bad rate', 'no rate'])
+        self.assertEqual(self._post(import_id).status_code, 400)
+
+        res = self.client.patch(detail, {'lines': [{'line_no': 2, 'rate': 1000000}]}, format='json')
+        self.assertEqual(res.status_code, 400)
+        res = self.client.patch(detail, {'lines': [{'line_no': 3, 'rate': -5}]}, format='json')
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client.patch(
+            detail, {'lines': [{'line_no': 2, 'rate': 250}, {'line_no': 3, 'rate': 350}]}, format='json'
+        )
+        self.assertEqual(res.status_code, 200, res.content)
+        self.assertEqual((res.json()['matched'], res.json()['problems']), (2, []))
+        self.assertEqual(self._post(import_id).status_code, 201)
+
+    def test_missing_rate_column_is_rejected(self):
+        res = self.client.post(
+            reverse('goods_inward_import'),
+            {'file': SimpleUploadedFile('invoice.csv', b"ISBN,Qty\n9788122613672,1\n")},
+            format='multipart',
+        )
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('rate', res.json()['error'])
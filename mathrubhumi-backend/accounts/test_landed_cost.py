@@ -0,0 +1,151 @@
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+from . import landed_cost
+from .line_sync import sync_lines
+
+
+class LandedCostTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='accounts')
+        cls.user = CustomUser.objects.create_user(
+            email='landed-cost@example.com',
+            password='testpass123',
+            name='Landed Cost User',
+            role=role,
+        )
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM suppliers WHERE id = 91")
+            cur.execute("INSERT INTO suppliers (id, supplier_nm) VALUES (91, 'Kerala Sahitya')")
+            cur.execute("DELETE FROM titles WHERE id IN (1, 2)")
+            cur.execute(
+                "INSERT INTO titles (id, title, rate, stock, tax) VALUES (1, 'Book A', 100, 0, 0), (2, 'Book B', 200, 0, 0)"
+            )
+            cur.execute("DELETE FROM purchase_breakups")
+            cur.execute(
+                "INSERT INTO purchase_breakups (breakup_nm, allocate_by) VALUES ('Freight', 'V'), ('Handling', 'Q') "
+                "RETURNING id"
+            )
+            cls.freight_id, cls.handling_id = (row[0] for row in cur.fetchall())
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _item(self, title_id, quantity, rate):
+        return {
+            'itemName': f'Book {title_id}', 'isbn': '', 'quantity': quantity, 'purchaseRate': rate,
+            'exchangeRate': 1, 'currency': 'Indian Rupees', 'currencyIndex': 1, 'tax': 0, 'discount': 0,
+            'discountAmount': 0, 'value': quantity * rate, 'titleId': title_id,
+        }
+
+    def _costs(self, purchase_id):
+        with connection.cursor() as cur:
+            cur.execute("SELECT purchase_cost FROM purchase_items WHERE purchase_id = %s ORDER BY id", [purchase_id])
+            return [float(row[0]) for row in cur.fetchall()]
+
+    def test_breakups_reach_line_cost_on_save_and_edit(self):
+        # 300 + 200 of goods; freight 50 by value (30 / 20), handling 20 by quantity (5 a copy)
+        payload = {
+            'supplier_id': 91, 'bill_no': 'KS-1', 'bill_date': '2026-06-01', 'user_id': 1, 'branches_id': 1,
+            'gross': 500, 'nett': 570, 'is_cash': 'No', 'type': 'Purchase', 'notes': '',
+            'p_breakup_id1': self.freight_id, 'p_breakup_amt1': 50,
+            'p_breakup_id2': self.handling_id, 'p_breakup_amt2': 20,
+            'p_breakup_id3': 0, 'p_breakup_amt3': 0, 'p_breakup_id4': 0, 'p_breakup_amt4': 0,
+            'items': [self._item(1, 3, 100), self._item(2, 1, 200)],
+        }
+        res = self.client.post(reverse('create_goods_inward'), payload, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        created = res.json()
+        self.assertEqual(self._costs(created['purchase_id']), [115.0, 225.0])
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT id FROM purchase_items WHERE purchase_id = %s ORDER BY id", [created['purchase_id']])
+            item_ids = [row[0] for row in cur.fetchall()]
+        payload.update({
+            'id': created['purchase_id'], 'srl_no': created['purchase_no'], 'entry_date': '2026-06-01',
+            'p_breakup_id2': 0, 'p_breakup_amt2': 0, 'nett': 550,
+            'items': [dict(item, itemId=item_id) for item, item_id in zip(payload['items'], item_ids)],
+        })
+        url = reverse('get_goods_inward', kwargs={'goods_inward_purchase_no': created['purchase_no']})
+        res = self.client.put(url, payload, format='json')
+        self.assertEqual(res.status_code, 200, res.content)
+        self.assertEqual(self._costs(created['purchase_id']), [110.0, 220.0])
+
+    def test_unchanged_lines_are_not_rewritten_over_their_landed_cost(self):
+        payload = {
+            'supplier_id': 91, 'bill_no': 'KS-2', 'bill_date': '2026-06-01', 'user_id': 1, 'branches_id': 1,
+            'gross': 300, 'nett': 330, 'is_cash': 'No', 'type': 'Purchase', 'notes': '',
+            'p_breakup_id1': self.freight_id, 'p_breakup_amt1': 30,
+            'p_breakup_id2': 0, 'p_breakup_amt2': 0, 'p_breakup_id3': 0, 'p_breakup_amt3': 0,
+            'p_breakup_id4': 0, 'p_breakup_amt4': 0,
+            'items': [self._item(1, 3, 100)],
+        }
+        res = self.client.post(reverse('create_goods_inward'), payload, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        purchase_id = res.json()['purchase_id']
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                SELECT id, title_id, rate, exchange_rate, discount_p, discount_a, quantity, currency_id, isbn,
+                       sgst + cgst AS tax
+                  FROM purchase_items
+                 WHERE purchase_id = %s
+                """,
+                [purchase_id],
+            )
+            names = [c[0] for c in cur.description]
+            lines = [dict(zip(names, row)) for row in cur.fetchall()]
+            self.assertEqual(sync_lines(cur, 'purchase_items', {'purchase_id': purchase_id}, lines), ([], []))
+        self.assertEqual(self._costs(purchase_id), [110.0])
+
+    def test_range_allocation_backfills_and_is_idempotent(self):
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO purchase (company_id, entry_date, supplier_id, purchase_no, invoice_no, gross, nett,
+                                      p_breakup_id1, p_breakup_amount1)
+                VALUES (1, '2024-01-05', 91, 1, 'OLD-1', 400, 440, %s, 40)
+                RETURNING id
+                """,
+                [self.handling_id],
+            )
+            purchase_id = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO purchase_items (purchase_id, title_id, rate, exchange_rate, discount_p, quantity)
+                VALUES (%s, 1, 100, 1, 0, 2), (%s, 2, 100, 1, 50, 4)
+                """,
+                [purchase_id, purchase_id],
+            )
+            self.assertEqual(landed_cost.allocate_range(cur, purchase_id, purchase_id), 2)
+            self.assertEqual(landed_cost.allocate_range(cur, purchase_id, purchase_id), 0)
+        # handling 40 over 6 copies
+        self.assertEqual(self._costs(purchase_id), [106.67, 56.67])
+
+    def test_breakup_master_round_trips_allocation(self):
+        res = self.client.post(
+            reverse('purchase_breakup_create'), {'breakup_nm': 'Octroi', 'allocate_by': 'Q'}, format='json'
+        )
+        self.assertEqual(res.status_code, 201, res.content)
+        rows = self.client.get(reverse('purchase_breakups_master_search'), {'q': 'Oct'}).json()
+        self.assertEqual([(r['breakup_nm'], r['allocate_by']) for r in rows], [('Octroi', 'Q')])
+        res = self.client.put(
+            reverse('purchase_breakup_update', kwargs={'id': res.json()['id']}),
+            {'breakup_nm': 'Octroi', 'allocate_by': 'X'}, format='json',
+        )
+        self.assertEqual(res.status_code, 400)
+
+    def test_backfill_command_fails_when_a_worker_fails(self):
+        with connection.cursor() as cur:
+            cur.execute("INSERT INTO purchase (company_id, entry_date, supplier_id, purchase_no) VALUES (1, '2024-01-05', 91, 1)")
+        with mock.patch.object(landed_cost, 'allocate_range', side_effect=RuntimeError('deadlock detected')):
+            with self.assertRaisesMessage(CommandError, 'deadlock detected'):
+                call_command('allocate_landed_costs', workers=1)
@@ -0,0 +1,72 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+
+
+class MasterFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='cashier')
+        cls.user = CustomUser.objects.create_user(
+            email='feed@example.com',
+            password='testpass123',
+            name='Feed User',
+            role=role,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM titles WHERE id IN (1, 2)")
+            cur.execute(
+                "INSERT INTO titles (id, title, rate, stock, tax) VALUES (1, 'Test Book', 100, 0, 5), (2, 'Second Book', 250, 0, 0)"
+            )
+
+    def _pull(self, since='', **params):
+        res = self.client.get(reverse('master_changes'), {'since': since, **params})
+        self.assertEqual(res.status_code, 200)
+        return res.json()
+
+    def _titles(self, body):
+        return {c['id']: c for c in body['changes'] if c['table'] == 'titles'}
+
+    def test_full_pull_pages_through_every_change_once(self):
+        seen, since = [], ''
+        while True:
+            body = self._pull(since, tables='titles', limit=1)
+            seen.extend((c['table'], c['id']) for c in body['changes'])
+            since = body['since']
+            if not body['more']:
+                break
+
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertIn(('titles', 1), seen)
+        self.assertIn(('titles', 2), seen)
+        self.assertNotIn(':', since)
+
+    def test_updates_and_deletes_are_sent_as_rows_and_tombstones(self):
+        since = self._pull(tables='titles')['since']
+        with connection.cursor() as cur:
+            cur.execute("UPDATE titles SET rate = 120 WHERE id = 1")
+            cur.execute("DELETE FROM titles WHERE id = 2")
+
+        titles = self._titles(self._pull(since, tables='titles'))
+        self.assertEqual(titles[1]['row']['rate'], 120)
+        self.assertFalse(titles[1]['deleted'])
+        self.assertTrue(titles[2]['deleted'])
+        self.assertIsNone(titles[2]['row'])
+
+    def test_stock_movements_do_not_bump_title_version(self):
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM master_changes WHERE table_name = 'titles' AND row_id = 1")
+            cur.execute("UPDATE titles SET stock = stock - 1 WHERE id = 1")
+            cur.execute("SELECT count(*) FROM master_changes WHERE table_name = 'titles' AND row_id = 1")
+            self.assertEqual(cur.fetchone()[0], 0)
+
+    def test_rejects_unknown_tables(self):
+        res = self.client.get(reverse('master_changes'), {'tables': 'users'})
+        self.assertEqual(res.status_code, 400)
@@ -0,0 +1,64 @@
+import datetime
+
+from django.test import TestCase, override_settings
+from django.db import connection
+
+from . import numbering
+
+
+class NumberingTests(TestCase):
+    def tearDown(self):
+        numbering._blocks.clear()
+
+    def test_fin_year_follows_april_to_march(self):
+        self.assertEqual(numbering.fin_year('2026-01-19'), ('2526', '2025-26'))
+        self.assertEqual(numbering.fin_year(datetime.date(2026, 4, 1)), ('2627', '2026-27'))
+        self.assertEqual(numbering.fin_year('2099-03-31'), ('9899', '2098-99'))
+
+    def test_gapless_series_starts_itself_for_a_new_year(self):
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM last_values WHERE fin_year = %s", ['3132'])
+            first = numbering.next_number(cur, 'SALE_RT', '2031-06-01')
+            second = numbering.next_number(cur, 'SALE_RT', '2032-02-29')
+        self.assertEqual((first, second), (1, 2))
+
+    def test_sale_bill_numbers_are_per_sale_type(self):
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM last_values WHERE fin_year = %s", ['3132'])
+            credit = numbering.next_sale_bill_no(cur, 0, '2031-06-01')
+            cash = numbering.next_sale_bill_no(cur, 1, '2031-06-01')
+            cash_2 = numbering.next_sale_bill_no(cur, 1, '2031-06-02')
+        self.assertEqual(credit, '2031-32/00001')
+        self.assertEqual([cash, cash_2], ['CS2031-32/00001', 'CS2031-32/00002'])
+
+    @override_settings(DOCUMENT_NUMBER_BLOCK_SIZE=10)
+    def test_block_series_continues_after_gapless_counter(self):
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM last_values WHERE fin_year = %s AND code = %s", [numbering.NO_FIN_YEAR, 'PP_CSBK_ID'])
+            cur.execute(
+                "INSERT INTO last_values (company_id, fin_year, code, last_value) VALUES (7, %s, %s, 23)",
+                [numbering.NO_FIN_YEAR, 'PP_CSBK_ID'],
+            )
+            numbers = [numbering.next_number(cur, 'PP_CSBK_ID', company_id=7, per_year=False) for _ in range(12)]
+
+        self.assertEqual(len(set(numbers)), 12)
+        self.assertGreater(min(numbers), 23)
+
+    def test_remittance_numbers_are_gapless(self):
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM last_values WHERE fin_year = %s", ['3132'])
+            numbers = [numbering.next_number(cur, 'REMITTANCE', '2031-06-01') for _ in range(3)]
+        self.assertEqual(numbers, [1, 2, 3])
+
+    def test_company_ids_continue_past_stored_rows(self):
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM remittance WHERE company_id IN (7, 8)")
+            cur.execute(
+                "INSERT INTO remittance (company_id, id, remittance_no, entry_date) VALUES (7, 40, 1, '2026-01-10')"
+            )
+            ids_7 = [numbering.next_id(cur, 'remittance', 7) for _ in range(3)]
+            ids_8 = numbering.next_id(cur, 'remittance', 8)
+            with self.assertRaises(ValueError):
+                numbering.next_id(cur, 'sales', 7)
+        self.assertEqual(ids_7, [41, 42, 43])
+        self.assertEqual(ids_8, 1)
@@ -0,0 +1,88 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+
+
+class SupplierPayablesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='accounts')
+        cls.user = CustomUser.objects.create_user(
+            email='payables@example.com',
+            password='testpass123',
+            name='Payables User',
+            role=role,
+        )
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM suppliers WHERE id IN (81, 82)")
+            cur.execute(
+                """
+                INSERT INTO suppliers (id, supplier_nm, credit, debit, credit_days)
+                VALUES (81, 'Poorna Publications', 100, 0, 30), (82, 'Green Books', 0, 0, 0)
+                """
+            )
+            cur.execute("DELETE FROM titles WHERE id = 1")
+            cur.execute("INSERT INTO titles (id, title, rate, stock, tax) VALUES (1, 'Test Book', 100, 0, 0)")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _inward(self, supplier_id, bill_date, nett):
+        payload = {
+            'supplier_id': supplier_id, 'bill_no': f'B-{bill_date}', 'bill_date': bill_date,
+            'user_id': 1, 'branches_id': 1, 'gross': nett, 'nett': nett, 'is_cash': 'No', 'type': 'Purchase',
+            'notes': '', 'p_breakup_id1': 0, 'p_breakup_amt1': 0, 'p_breakup_id2': 0, 'p_breakup_amt2': 0,
+            'p_breakup_id3': 0, 'p_breakup_amt3': 0, 'p_breakup_id4': 0, 'p_breakup_amt4': 0,
+            'items': [{
+                'itemName': 'Test Book', 'isbn': '', 'quantity': 1, 'purchaseRate': nett, 'exchangeRate': 1,
+                'currency': 'Indian Rupees', 'currencyIndex': 1, 'tax': 0, 'discount': 0, 'discountAmount': 0,
+                'value': nett, 'titleId': 1,
+            }],
+        }
+        res = self.client.post(reverse('create_goods_inward'), payload, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        return payload, res.json()
+
+    def _aging(self, **params):
+        res = self.client.get(reverse('supplier_aging'), {'as_of': '2026-06-30', **params})
+        self.assertEqual(res.status_code, 200, res.content)
+        return {r['supplier_id']: r for r in res.json()['results']}
+
+    def test_inwards_and_returns_keep_balances_and_aging(self):
+        self._inward(81, '2026-01-10', 500)   # due 2026-02-09, 141 days overdue
+        self._inward(81, '2026-05-01', 300)   # due 2026-05-31, 30 days overdue
+        self._inward(81, '2026-06-20', 200)   # due 2026-07-20, not due
+        res = self.client.post(reverse('goods_inward'), {
+            'purchase_rt': {'company_id': 1, 'entry_date': '2026-06-25', 'supplier_id': 81, 'nett': 150},
+            'purchase_rt_items': [],
+        }, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT credit, debit FROM supplier_balances WHERE supplier_id = 81")
+            self.assertEqual(tuple(float(v) for v in cur.fetchone()), (1000.0, 150.0))
+
+        row = self._aging(supplier_id=81)[81]
+        # opening 100 + 1000 purchased - 150 returned, newest inwards first
+        self.assertEqual(row['balance'], 950.0)
+        self.assertEqual(
+            [row[k] for k in ('not_due', 'days_0_30', 'days_31_60', 'days_61_90', 'days_90_plus')],
+            [200.0, 300.0, 0.0, 0.0, 450.0],
+        )
+
+    def test_edit_moves_the_amount_between_suppliers(self):
+        payload, created = self._inward(81, '2026-06-01', 400)
+        payload.update({'id': created['purchase_id'], 'srl_no': created['purchase_no'], 'entry_date': '2026-06-01',
+                        'supplier_id': 82, 'nett': 250})
+        url = reverse('get_goods_inward', kwargs={'goods_inward_purchase_no': created['purchase_no']})
+        self.assertEqual(self.client.put(url, payload, format='json').status_code, 200)
+
+        aging = self._aging()
+        self.assertEqual(aging[81]['balance'], 100.0)
+        self.assertEqual(aging[81]['days_90_plus'], 100.0)
+        self.assertEqual(aging[82]['balance'], 250.0)
+        self.assertEqual(aging[82]['days_0_30'], 250.0)
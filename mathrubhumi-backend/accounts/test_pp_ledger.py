@@ -0,0 +1,160 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+
+
+class PPCustomerBookLedgerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='pp')
+        cls.user = CustomUser.objects.create_user(
+            email='pp-ledger@example.com',
+            password='testpass123',
+            name='PP User',
+            role=role,
+        )
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM titles WHERE id IN (1, 2)")
+            cur.execute(
+                "INSERT INTO titles (id, title, rate, stock, tax) VALUES (1, 'Malayalam Encyclopaedia', 500, 0, 0), "
+                "(2, 'Khasakkinte Ithihasam', 250, 0, 0)"
+            )
+            cur.execute(
+                """
+                INSERT INTO pp_books (company_id, code, nos, face_value, closed, pp_book_firm_id, product_id)
+                VALUES (1, 'ENC', 1, 500, 0, 1, 1)
+                RETURNING id
+                """
+            )
+            cls.pp_book_id = cur.fetchone()[0]
+            cur.execute(
+                "INSERT INTO pp_customers (company_id, pp_customer_nm, city) VALUES (1, 'Radha Menon', 'Kozhikode') RETURNING id"
+            )
+            cls.customer_id = cur.fetchone()[0]
+            cur.execute("INSERT INTO agents (agent_nm) VALUES ('Counter'), ('Field Agent') RETURNING id")
+            cls.counter_id, cls.field_id = (row[0] for row in cur.fetchall())
+            cur.execute(
+                """
+                INSERT INTO pp_customer_books (company_id, id, pp_customer_id, pp_book_id, reg_no, copies)
+                VALUES (1, 501, %s, %s, 'ENC-1', 2)
+                """,
+                [cls.customer_id, cls.pp_book_id],
+            )
+            # registration carries the customer book; installments leave it 0
+            cur.execute(
+                """
+                INSERT INTO pp_receipts (company_id, receipt_no, entry_date, pp_customer_id, pp_book_id, amount,
+                                         r_type, a_type, agent_id, cancelled, pp_customer_book_id)
+                VALUES (1, 1, '2026-01-05', %(c)s, %(b)s, 400, 0, 0, %(counter)s, 0, 501),
+                       (1, 2, '2026-03-05', %(c)s, %(b)s, 300, 2, 2, %(field)s, 0, 0),
+                       (1, 3, '2026-04-05', %(c)s, %(b)s, 100, 2, 0, %(counter)s, 1, 0)
+                RETURNING id
+                """,
+                {'c': cls.customer_id, 'b': cls.pp_book_id, 'counter': cls.counter_id, 'field': cls.field_id},
+            )
+            cls.receipt_ids = [row[0] for row in cur.fetchall()]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _prefill(self, reg_no='ENC-1'):
+        return self.client.get(reverse('pp_installment_prefill'), {'reg_no': reg_no})
+
+    def test_prefill_reads_paid_and_balance_from_the_ledger(self):
+        res = self._prefill()
+        self.assertEqual(res.status_code, 200, res.content)
+        data = res.json()
+        self.assertEqual(
+            [data[k] for k in ('title', 'copies', 'pp_customer_nm', 'installments_paid', 'amount_paid', 'balance',
+                               'agent_nm', 'pp_customer_book_id')],
+            ['Malayalam Encyclopaedia', 2, 'Radha Menon', 2, 700.0, 300.0, 'Field Agent', 501],
+        )
+        self.assertEqual(self._prefill('ENC-404').status_code, 404)
+
+    def test_ledger_follows_cancellations_copies_and_face_value(self):
+        with connection.cursor() as cur:
+            cur.execute("UPDATE pp_receipts SET cancelled = 1 WHERE id = %s", [self.receipt_ids[1]])
+            cur.execute("UPDATE pp_customer_books SET copies = 3 WHERE id = 501")
+            cur.execute("UPDATE pp_books SET face_value = 600 WHERE id = %s", [self.pp_book_id])
+        data = self._prefill().json()
+        # 3 copies at 600, only the registration receipt of 400 counts
+        self.assertEqual(
+            [data[k] for k in ('copies', 'installments_paid', 'amount_paid', 'balance', 'agent_nm')],
+            [3, 1, 400.0, 1400.0, 'Counter'],
+        )
+
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM pp_customer_books WHERE id = 501")
+            cur.execute("SELECT count(*) FROM pp_customer_book_ledger WHERE company_id = 1 AND reg_no = 'ENC-1'")
+            self.assertEqual(cur.fetchone()[0], 0)
+
+    def test_companies_sharing_a_customer_book_id_keep_separate_ledgers(self):
+        # customer book ids are not unique: company 2 reuses 501 and the reg no
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO pp_books (company_id, id, code, nos, face_value, closed, pp_book_firm_id, product_id)
+                OVERRIDING SYSTEM VALUE
+                VALUES (2, %s, 'ENC', 1, 1000, 0, 1, 1)
+                """,
+                [self.pp_book_id],
+            )
+            cur.execute(
+                """
+                INSERT INTO pp_customer_books (company_id, id, pp_customer_id, pp_book_id, reg_no, copies)
+                VALUES (2, 501, %s, %s, 'ENC-1', 1)
+                """,
+                [self.customer_id, self.pp_book_id],
+            )
+            cur.execute(
+                """
+                INSERT INTO pp_receipts (company_id, receipt_no, entry_date, pp_customer_id, pp_book_id, amount,
+                                         r_type, a_type, agent_id, cancelled, pp_customer_book_id)
+                VALUES (2, 1, '2026-02-01', %(c)s, %(b)s, 250, 0, 0, %(counter)s, 0, 501)
+                """,
+                {'c': self.customer_id, 'b': self.pp_book_id, 'counter': self.counter_id},
+            )
+            cur.execute(
+                """
+                SELECT company_id, pp_customer_book_id, copies, installments_paid, amount_paid, balance
+                  FROM pp_customer_book_ledger
+                 WHERE reg_no = 'ENC-1'
+                 ORDER BY company_id
+                """
+            )
+            self.assertEqual(
+                [(r[0], r[1], r[2], r[3], float(r[4]), float(r[5])) for r in cur.fetchall()],
+                [(1, 501, 2, 2, 700.0, 300.0), (2, 501, 1, 1, 250.0, 750.0)],
+            )
+
+    def test_prefill_takes_customer_and_book_from_the_ledger_company(self):
+        # company 2 has a book with the same id for another title, and its own customer
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO pp_books (company_id, id, code, nos, face_value, closed, pp_book_firm_id, product_id)
+                OVERRIDING SYSTEM VALUE
+                VALUES (2, %s, 'KHS', 1, 250, 0, 1, 2)
+                """,
+                [self.pp_book_id],
+            )
+            cur.execute(
+                "INSERT INTO pp_customers (company_id, pp_customer_nm, city) VALUES (2, 'Ravi Nair', 'Thrissur') RETURNING id"
+            )
+            customer_id = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO pp_customer_books (company_id, id, pp_customer_id, pp_book_id, reg_no, copies)
+                VALUES (2, 601, %s, %s, 'KHS-1', 1)
+                """,
+                [customer_id, self.pp_book_id],
+            )
+        data = self._prefill('KHS-1').json()
+        self.assertEqual(
+            [data[k] for k in ('title', 'pp_customer_nm', 'copies', 'balance')],
+            ['Khasakkinte Ithihasam', 'Ravi Nair', 1, 250.0],
+        )
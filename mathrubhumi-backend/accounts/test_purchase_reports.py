@@ -0,0 +1,83 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+
+
+class PurchaseReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='accounts')
+        cls.user = CustomUser.objects.create_user(
+            email='purchase-reports@example.com',
+            password='testpass123',
+            name='Reports User',
+            role=role,
+        )
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM suppliers WHERE id IN (71, 72)")
+            cur.execute("INSERT INTO suppliers (id, supplier_nm) VALUES (71, 'DC Books'), (72, 'Current Books')")
+            cur.execute("DELETE FROM purchase_breakups")
+            cur.execute("INSERT INTO purchase_breakups (breakup_nm) VALUES ('Freight') RETURNING id")
+            cls.freight_id = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO purchase (company_id, entry_date, supplier_id, purchase_no, invoice_no, gross, nett,
+                                      p_breakup_id1, p_breakup_amount1)
+                VALUES (1, '2025-05-02', 71, 1, 'DC-1', 1100, 1150, %s, 50),
+                       (1, '2025-06-10', 72, 2, 'CB-9', 500, 500, 0, 0),
+                       (1, '2026-04-01', 71, 3, 'DC-2', 300, 300, 0, 0)
+                RETURNING id
+                """,
+                [cls.freight_id],
+            )
+            first = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO purchase_items (purchase_id, title_id, rate, exchange_rate, discount_p, quantity, sgst, cgst)
+                VALUES (%s, 1, 100, 1, 10, 10, 2.5, 2.5),
+                       (%s, 2, 200, 1, 0, 1, 0, 0)
+                """,
+                [first, first],
+            )
+            cur.execute(
+                """
+                INSERT INTO purchase_rt (company_id, id, purchase_rt_no, entry_date, supplier_id, gross, nett)
+                VALUES (1, 1, 1, '2025-07-01', 71, 200, 200)
+                """
+            )
+            cur.execute(
+                "INSERT INTO purchase_rt_items (company_id, parent_id, id, title_id, quantity) VALUES (1, 1, 1, 1, 2)"
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.year = {'branch_id': 1, 'date_from': '2025-04-01', 'date_to': '2026-03-31'}
+
+    def _report(self, name, **params):
+        res = self.client.get(reverse(name), {**self.year, **params})
+        self.assertEqual(res.status_code, 200, res.content)
+        return res.json()['report_data']
+
+    def test_supplier_wise_register_totals_lines_per_purchase(self):
+        rows = self._report('supplier_wise_purchase_register_report', supplier_id=71)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(
+            [rows[0][k] for k in ('supplier', 'invoice_no', 'quantity', 'goods_value', 'tax', 'nett')],
+            ['DC Books', 'DC-1', 11.0, 1100.0, 45.0, 1150.0],
+        )
+        rows = self._report('supplier_wise_purchase_register_report')
+        self.assertEqual([r['supplier'] for r in rows], ['Current Books', 'DC Books'])
+
+    def test_breakup_register_lists_each_breakup_amount(self):
+        rows = self._report('purchase_breakup_register_report')
+        self.assertEqual([(r['breakup'], r['invoice_no'], r['amount']) for r in rows], [('Freight', 'DC-1', 50.0)])
+
+    def test_return_register_and_validation(self):
+        rows = self._report('purchase_return_register_report', supplier_id=71)
+        self.assertEqual([(r['purchase_rt_no'], r['quantity'], r['nett']) for r in rows], [(1, 2.0, 200.0)])
+        res = self.client.get(reverse('purchase_return_register_report'), {'branch_id': 1, 'date_from': '2025-04-01'})
+        self.assertEqual(res.status_code, 400)
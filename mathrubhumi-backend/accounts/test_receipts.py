@@ -0,0 +1,212 @@
+import os
+import random
+import re
+import string
+import struct
+import tempfile
+import zlib
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from . import pdf_font, receipts
+from .models import CustomUser, Role
+
+
+def _tiny_font(text, outline_size=16):
+    """
+    A TrueType file with just head / hhea / hmtx / cmap / maxp / loca / glyf,
+    mapping each character of text to a glyph whose outline carries
+    `outline_size` bytes of noise after its header.
+    """
+    codes = sorted({ord(ch) for ch in text})
+    segments = [(code, (i + 1 - code) & 0xFFFF) for i, code in enumerate(codes)] + [(0xFFFF, 1)]
+    n = len(segments)
+    cmap = struct.pack('>HHHHI', 0, 1, 3, 1, 12) + struct.pack('>7H', 4, 16 + 8 * n, 0, 2 * n, 0, 0, 0)
+    cmap += struct.pack(f'>{n}H', *(code for code, _ in segments)) + b'\0\0'
+    cmap += struct.pack(f'>{n}H', *(code for code, _ in segments))
+    cmap += struct.pack(f'>{n}H', *(delta for _, delta in segments)) + bytes(2 * n)
+    head = struct.pack('>IIIIHH16x4h10x', 0x10000, 0x10000, 0, 0x5F0F3CF5, 0, 1000, 0, -300, 1000, 900)
+    hhea = struct.pack('>Ihhh7h8xhH', 0x10000, 900, -300, 0, 600, 0, 0, 0, 1, 0, 0, 0, len(codes) + 1)
+    hmtx = struct.pack('>hh', 600, 0) * (len(codes) + 1)
+    maxp = struct.pack('>IH', 0x5000, len(codes) + 1)
+    outlines = [
+        struct.pack('>5h', 1, 0, 0, 600, 700) + random.Random(g).randbytes(outline_size) for g in range(len(codes) + 1)
+    ]
+    loca = struct.pack(f'>{len(outlines) + 1}H', *(sum(map(len, outlines[:g])) // 2 for g in range(len(outlines) + 1)))
+    tables = sorted({
+        'cmap': cmap, 'head': head, 'hhea': hhea, 'hmtx': hmtx, 'maxp': maxp, 'loca': loca, 'glyf': b''.join(outlines),
+    }.items())
+    offset = 12 + 16 * len(tables)
+    directory, body = b'', b''
+    for tag, data in tables:
+        directory += struct.pack('>4sIII', tag.encode(), 0, offset + len(body), len(data))
+        body += data + bytes(-len(data) % 4)
+    return struct.pack('>IHHHH', 0x10000, len(tables), 64, 2, 0) + directory + body
+
+
+class ReceiptTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='cashier')
+        cls.user = CustomUser.objects.create_user(
+            email='receipt@example.com',
+            password='testpass123',
+            name='Receipt User',
+            role=role,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        receipts.clear_company_header_cache()
+        receipts._rendered.clear()
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM company WHERE id = 1")
+            cur.execute(
+                """
+                INSERT INTO company (id, company_name, address1, address2, city_with_pin, email, contact_nos, for_whom)
+                VALUES (1, 'Mathrubhumi Books', 'M.M. Press', 'K.P. Kesava Menon Road', 'Kozhikode 673001',
+                        'books@example.com', '0495 2366', 'Mathrubhumi')
+                """
+            )
+            cur.execute("DELETE FROM currencies WHERE id = 1")
+            cur.execute("INSERT INTO currencies (id, currency_name, exchange_rate) VALUES (1, 'Indian Rupees', 1)")
+            cur.execute("DELETE FROM titles WHERE id = 1")
+            cur.execute(
+                "INSERT INTO titles (id, title, title_m, language_id, rate, stock, tax) VALUES (1, 'Randamoozham', 'രണ്ടാമൂഴം', 1, 350, 0, 0)"
+            )
+        res = self.client.post(reverse('create_sale'), {
+            'customer_nm': 'Walk-in',
+            'billing_address': '.',
+            'sale_date': '2026-01-19',
+            'mobile_number': '9999999999',
+            'type': 'Cash Sale',
+            'mode': 'Cash',
+            'class': 'Individual',
+            'cancel': 'No',
+            'gross': 700,
+            'bill_amount': 700,
+            'items': [{
+                'itemName': 'Randamoozham', 'quantity': 2, 'rate': 350, 'exchangeRate': 1,
+                'currency': 'Indian Rupees', 'tax': 0, 'discount': 0, 'value': 700,
+                'currencyIndex': 1, 'titleId': 1,
+            }],
+        }, format='json')
+        self.sale_id = res.json()['sale_id']
+        self.bill_no = res.json()['bill_no']
+        self.url = reverse('sale_receipt', kwargs={'sale_id': self.sale_id})
+
+    def test_escpos_receipt_has_header_lines_and_cut(self):
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, 200)
+        body = res.content
+        self.assertTrue(body.startswith(b'\x1b@'))
+        self.assertTrue(body.endswith(b'\x1dVB\x00'))
+        self.assertIn(b'Mathrubhumi Books', body)
+        self.assertIn(self.bill_no.encode(), body)
+        self.assertIn(b'2 x 350.00', body)
+        self.assertIn(b'700.00', body)
+
+    def test_pdf_receipt_is_a_complete_document(self):
+        res = self.client.get(self.url, {'output': 'pdf', 'width': 32})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res['Content-Type'], 'application/pdf')
+        self.assertTrue(res.content.startswith(b'%PDF-1.4'))
+        self.assertTrue(res.content.rstrip().endswith(b'%%EOF'))
+
+    def test_reprint_is_served_from_cache_until_the_bill_changes(self):
+        first = self.client.get(self.url).content
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).content, first)
+
+        with connection.cursor() as cur:
+            cur.execute("UPDATE sales SET customer_nm = 'Exhibition Buyer' WHERE id = %s", [self.sale_id])
+        self.assertIn(b'Exhibition Buyer', self.client.get(self.url).content)
+
+    def test_company_edits_reach_reprints_after_the_cache_ttl(self):
+        self.assertIn(b'Mathrubhumi Books', self.client.get(self.url).content)
+        with connection.cursor() as cur:
+            cur.execute("UPDATE company SET company_name = 'MBI Books' WHERE id = 1")
+        self.assertIn(b'Mathrubhumi Books', self.client.get(self.url).content)
+
+        with override_settings(COMPANY_HEADER_CACHE_SECONDS=0):
+            receipts.clear_company_header_cache()
+            self.assertIn(b'MBI Books', self.client.get(self.url).content)
+            with connection.cursor() as cur:
+                cur.execute("UPDATE company SET company_name = 'Mathrubhumi Books' WHERE id = 1")
+            self.assertIn(b'Mathrubhumi Books', self.client.get(self.url).content)
+
+    def test_layout_fits_the_paper_width(self):
+        bill = {'bill_no': 'CS2025-26/00001', 'sale_date': '2026-01-19', 'type': 'Cash Sale', 'gross': 10,
+                'bill_amount': 10, 'round_off': 0, 'items': [{'itemName': 'A very long title ' * 5, 'quantity': 1,
+                                                               'rate': 10, 'value': 10}]}
+        for width in receipts.PAPER_WIDTHS:
+            for text, _bold, double in receipts.layout(bill, {}, width):
+                self.assertLessEqual(len(text), width // 2 if double else width)
+
+    def test_bill_number_is_never_cut_on_narrow_paper(self):
+        for bill_no in ('CS2025-26/00001', '2025-26/0001234567'):
+            bill = {'bill_no': bill_no, 'sale_date': '2026-01-19', 'type': 'Credit Sale', 'gross': 10,
+                    'bill_amount': 10, 'round_off': 0, 'items': []}
+            texts = [text for text, _bold, _double in receipts.layout(bill, {}, 32)]
+            self.assertIn(f'Bill No: {bill_no}', texts)
+            self.assertIn('19-01-2026'.rjust(32), texts)
+        # room for both: still one line at 48 columns
+        self.assertIn(
+            'Bill No: CS2025-26/00001'.ljust(37) + ' 19-01-2026',
+            [text for text, _bold, _double in receipts.layout(dict(bill, bill_no='CS2025-26/00001'), {}, 48)],
+        )
+
+    def test_malayalam_title_prints_latin_on_escpos(self):
+        body = self.client.get(self.url).content
+        self.assertIn(b'Randamoozham', body)
+        self.assertNotIn(b'?', body)
+
+    def test_pdf_embeds_a_unicode_font_for_malayalam(self):
+        with tempfile.NamedTemporaryFile(suffix='.ttf', delete=False) as f:
+            f.write(_tiny_font('രണ്ടാമൂഴംകെ'))
+        self.addCleanup(os.unlink, f.name)
+
+        with override_settings(RECEIPT_PDF_FONT=f.name):
+            pdf = self.client.get(self.url, {'output': 'pdf'}).content
+        self.assertIn(b'/Identity-H', pdf)
+        self.assertIn(b'/FontFile2', pdf)
+        content = pdf[pdf.index(b'6 0 obj'):pdf.index(b'endstream')]
+        # the tiny font numbers its glyphs in code point order
+        self.assertIn(b'/F3 8 Tf <00060004000B000300080005000900070001> Tj', content)
+        self.assertNotIn(b'?', content)
+        self.assertEqual(pdf_font.visual_order('കൊ'), 'െകാ')
+
+        # no font configured: the Latin title rather than question marks
+        with override_settings(RECEIPT_PDF_FONT=''):
+            receipts._rendered.clear()
+            pdf = self.client.get(self.url, {'output': 'pdf'}).content
+        self.assertIn(b'(Randamoozham) Tj', pdf)
+        self.assertNotIn(b'/FontFile2', pdf)
+
+    def test_pdf_embeds_only_the_glyphs_it_draws(self):
+        # a font with the whole Malayalam and Latin alphabets, 1 KB per glyph
+        alphabet = ''.join(chr(c) for c in range(0x0D05, 0x0D4E)) + 'രണ്ടാമൂഴം' + string.ascii_letters
+        font = _tiny_font(alphabet, outline_size=1000)
+        with tempfile.NamedTemporaryFile(suffix='.ttf', delete=False) as f:
+            f.write(font)
+        self.addCleanup(os.unlink, f.name)
+
+        with override_settings(RECEIPT_PDF_FONT=f.name):
+            pdf = self.client.get(self.url, {'output': 'pdf'}).content
+        self.assertGreater(len(font), 100_000)
+        self.assertLess(len(pdf), 20_000)
+
+        length, length1 = map(int, re.search(rb'/Length (\d+) /Length1 (\d+) /Filter /FlateDecode', pdf).groups())
+        start = pdf.index(b'stream\n', pdf.index(b'/Length1')) + len(b'stream\n')
+        embedded = zlib.decompress(pdf[start:start + length])
+        self.assertEqual(len(embedded), length1)
+        parsed = pdf_font.TrueTypeFont(font)
+        offsets = parsed._glyph_offsets()
+        glyf = font[parsed.tables['glyf'][0]:]
+        for ch, drawn in (('ര', True), ('ഹ', False), ('Z', False)):
+            glyph = parsed.cmap[ord(ch)]
+            self.assertEqual(glyf[offsets[glyph]:offsets[glyph + 1]] in embedded, drawn, ch)
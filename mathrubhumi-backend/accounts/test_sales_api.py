@@ -0,0 +1,345 @@
+import hashlib
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+from .pricing import invalidate_titles
+
+
+class SaleBillApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='cashier')
+        cls.user = CustomUser.objects.create_user(
+            email='salebill@example.com',
+            password='testpass123',
+            name='Sale Bill User',
+            role=role,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self._seed_reference_data()
+        invalidate_titles()
+
+    def _seed_reference_data(self):
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM currencies WHERE id = %s", [1])
+            cur.execute(
+                "INSERT INTO currencies (id, currency_name, exchange_rate) VALUES (%s, %s, %s)",
+                [1, 'Indian Rupees', 1],
+            )
+
+            cur.execute("DELETE FROM titles WHERE id IN (%s, %s)", [1, 2])
+            cur.execute(
+                "INSERT INTO titles (id, title, rate, stock, tax) VALUES (%s, %s, %s, %s, %s), (%s, %s, %s, %s, %s)",
+                [1, 'Test Book', 100, 0, 5, 2, 'Second Book', 250, 0, 0],
+            )
+
+            cur.execute(
+                "DELETE FROM last_values WHERE company_id = %s AND fin_year = %s AND code = %s",
+                [1, '2526', 'CREDIT_SALE'],
+            )
+            cur.execute(
+                "INSERT INTO last_values (company_id, fin_year, code, last_value) VALUES (%s, %s, %s, %s)",
+                [1, '2526', 'CREDIT_SALE', 0],
+            )
+
+    def _item(self, title_id=1, qty=1, rate=100, name='Test Book'):
+        return {
+            'itemName': name,
+            'quantity': qty,
+            'rate': rate,
+            'exchangeRate': 1,
+            'currency': 'Indian Rupees',
+            'tax': 5,
+            'discount': 0,
+            'value': qty * rate,
+            'currencyIndex': 1,
+            'titleId': title_id,
+            'purchaseCompanyId': 0,
+            'purchaseId': 0,
+            'purchaseItemId': 0,
+        }
+
+    def _build_payload(self, items, bill_discount_amount=0):
+        gross = sum(i['value'] for i in items)
+        return {
+            'customer_nm': 'Walk-in',
+            'billing_address': '.',
+            'sale_date': '2026-01-19',
+            'mobile_number': '9999999999',
+            'type': 'Cash Sale',
+            'mode': 'Cash',
+            'class': 'Individual',
+            'cancel': 'No',
+            'bill_discount': 0,
+            'bill_discount_amount': bill_discount_amount,
+            'gross': gross,
+            'round_off': 0,
+            'bill_amount': gross - bill_discount_amount,
+            'items': items,
+        }
+
+    def _stored_lines(self, sale_id):
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT title_id, quantity, allocated_bill_discount FROM sale_items WHERE sale_id = %s ORDER BY id",
+                [sale_id],
+            )
+            return [(r[0], float(r[1]), float(r[2])) for r in cur.fetchall()]
+
+    def test_create_sale_writes_all_lines(self):
+        items = [self._item(title_id=1 + (i % 2), qty=1 + i) for i in range(150)]
+        res = self.client.post(reverse('create_sale'), self._build_payload(items), format='json')
+        self.assertEqual(res.status_code, 201)
+
+        lines = self._stored_lines(res.json()['sale_id'])
+        self.assertEqual(len(lines), 150)
+        self.assertEqual([l[1] for l in lines], [float(1 + i) for i in range(150)])
+
+    def test_create_sale_allocates_bill_discount(self):
+        items = [self._item(title_id=1, qty=1, rate=100), self._item(title_id=2, qty=1, rate=300)]
+        res = self.client.post(reverse('create_sale'), self._build_payload(items, bill_discount_amount=40), format='json')
+        self.assertEqual(res.status_code, 201)
+
+        lines = self._stored_lines(res.json()['sale_id'])
+        self.assertAlmostEqual(lines[0][2], 10.0, places=2)
+        self.assertAlmostEqual(lines[1][2], 30.0, places=2)
+
+    def test_update_sale_replaces_lines(self):
+        create_res = self.client.post(
+            reverse('create_sale'), self._build_payload([self._item(), self._item(title_id=2)]), format='json'
+        )
+        sale_id = create_res.json()['sale_id']
+        url = reverse('get_sale_by_id', kwargs={'sale_id': sale_id})
+
+        loaded = self.client.get(url).json()
+        self.assertEqual(len(loaded['items']), 2)
+
+        payload = self._build_payload([self._item(qty=3)])
+        res = self.client.put(url, payload, format='json')
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self._stored_lines(sale_id), [(1, 3.0, 0.0)])
+
+    def test_update_sale_keeps_ids_of_edited_lines(self):
+        create_res = self.client.post(
+            reverse('create_sale'),
+            self._build_payload([self._item(), self._item(title_id=2), self._item(qty=2)]),
+            format='json',
+        )
+        sale_id = create_res.json()['sale_id']
+        url = reverse('get_sale_by_id', kwargs={'sale_id': sale_id})
+
+        first, second, third = self.client.get(url).json()['items']
+        edited = dict(first, quantity=5, value=500)
+        payload = self._build_payload([edited, second, self._item(title_id=2, qty=4)])
+        res = self.client.put(url, payload, format='json')
+        self.assertEqual(res.status_code, 200)
+
+        stored = self.client.get(url).json()['items']
+        self.assertEqual([i['itemId'] for i in stored[:2]], [first['itemId'], second['itemId']])
+        self.assertEqual([i['quantity'] for i in stored], [5.0, 1.0, 4.0])
+        self.assertNotIn(third['itemId'], [i['itemId'] for i in stored])
+
+    def test_update_sale_inserts_a_copied_line_as_a_new_one(self):
+        create_res = self.client.post(reverse('create_sale'), self._build_payload([self._item()]), format='json')
+        url = reverse('get_sale_by_id', kwargs={'sale_id': create_res.json()['sale_id']})
+        (line,) = self.client.get(url).json()['items']
+
+        # the same row twice, e.g. duplicated on screen: both lines are kept
+        payload = self._build_payload([dict(line, quantity=2, value=200), dict(line, quantity=3, value=300)])
+        self.assertEqual(self.client.put(url, payload, format='json').status_code, 200)
+
+        stored = self.client.get(url).json()['items']
+        self.assertEqual([i['quantity'] for i in stored], [2.0, 3.0])
+        self.assertEqual(stored[0]['itemId'], line['itemId'])
+        self.assertNotEqual(stored[1]['itemId'], line['itemId'])
+
+    def test_create_sale_replays_with_idempotency_key(self):
+        payload = self._build_payload([self._item(), self._item(title_id=2)])
+        first = self.client.post(reverse('create_sale'), payload, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(first.status_code, 201)
+
+        with self.assertNumQueries(1):
+            retry = self.client.post(reverse('create_sale'), payload, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT COUNT(*) FROM sales WHERE customer_nm = %s", ['Walk-in'])
+            self.assertEqual(cur.fetchone()[0], 1)
+
+        other = self._build_payload([self._item(qty=2)])
+        res = self.client.post(reverse('create_sale'), other, format='json', HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(res.status_code, 422)
+
+    def test_retry_takes_over_a_claim_whose_request_died(self):
+        body = json.dumps(self._build_payload([self._item()]))
+        body_hash = hashlib.sha256(body.encode()).hexdigest()
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO idempotency_keys (user_id, endpoint, idem_key, request_hash, created_at)
+                VALUES (%s, 'create_sale', 'crashed-1', %s, now() - interval '1 minute'),
+                       (%s, 'create_sale', 'crashed-2', %s, now() - interval '10 minutes')
+                """,
+                [self.user.pk, body_hash, self.user.pk, body_hash],
+            )
+
+        # a claim within its lease may still be running
+        res = self.client.post(
+            reverse('create_sale'), body, content_type='application/json', HTTP_IDEMPOTENCY_KEY='crashed-1'
+        )
+        self.assertEqual(res.status_code, 409)
+
+        res = self.client.post(
+            reverse('create_sale'), body, content_type='application/json', HTTP_IDEMPOTENCY_KEY='crashed-2'
+        )
+        self.assertEqual(res.status_code, 201)
+        with connection.cursor() as cur:
+            cur.execute("SELECT status_code FROM idempotency_keys WHERE idem_key = 'crashed-2'")
+            self.assertEqual(cur.fetchone()[0], 201)
+
+    def test_quote_prices_cart_from_title_rates(self):
+        items = [{'titleId': 1 + (i % 2), 'quantity': 1} for i in range(300)]
+        res = self.client.post(
+            reverse('sales_quote'), {'items': items, 'bill_discount_amount': 100}, format='json'
+        )
+        self.assertEqual(res.status_code, 200)
+        body = res.json()
+
+        self.assertEqual(len(body['items']), 300)
+        self.assertEqual(body['items'][0]['rate'], 100.0)
+        self.assertEqual(body['items'][1]['rate'], 250.0)
+        self.assertEqual(body['gross'], 150 * 350.0)
+        # the shares of the bill discount add up to it exactly
+        allocated = sum(round(i['allocatedBillDiscount'] * 100) for i in body['items'])
+        self.assertEqual(allocated, 100 * 100)
+        self.assertEqual(body['bill_amount'], 150 * 350.0 - 100)
+
+    def test_quote_uses_cached_rates_until_invalidated(self):
+        url = reverse('sales_quote')
+        payload = {'items': [{'titleId': 1, 'quantity': 2}]}
+        self.assertEqual(self.client.post(url, payload, format='json').json()['gross'], 200.0)
+
+        with connection.cursor() as cur:
+            cur.execute("UPDATE titles SET rate = 120 WHERE id = 1")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.post(url, payload, format='json').json()['gross'], 200.0)
+
+        invalidate_titles([1])
+        self.assertEqual(self.client.post(url, payload, format='json').json()['gross'], 240.0)
+
+    def test_create_sale_rejects_totals_that_do_not_match_lines(self):
+        payload = self._build_payload([self._item(qty=2)])
+        payload['bill_amount'] = 150
+        res = self.client.post(reverse('create_sale'), payload, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('bill_amount', res.json()['error'])
+
+    def test_bulk_load_numbers_bills_contiguously_and_reports_each_line(self):
+        bills = [dict(self._build_payload([self._item(qty=1 + n)]), client_ref=f'X{n}') for n in range(5)]
+        bills[2]['bill_amount'] = 1
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM last_values WHERE fin_year = '2526' AND code = 'CASH_SALE'")
+        body = '\n'.join(json.dumps(b) for b in bills) + '\nnot json\n'
+
+        res = self.client.generic(
+            'POST', reverse('sales_bulk') + '?chunk_size=2', body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(res.status_code, 200)
+        results = [json.loads(l) for l in b''.join(res.streaming_content).decode().splitlines()]
+
+        self.assertEqual(results[-1], {'summary': {'created': 4, 'failed': 2}})
+        by_ref = {r['client_ref']: r for r in results[:-1] if r.get('client_ref')}
+        self.assertEqual(by_ref['X2']['status'], 'error')
+        created = [by_ref[f'X{n}'] for n in (0, 1, 3, 4)]
+        self.assertEqual(
+            [r['bill_no'] for r in created],
+            ['CS2025-26/00001', 'CS2025-26/00002', 'CS2025-26/00003', 'CS2025-26/00004'],
+        )
+        self.assertEqual(self._stored_lines(created[3]['sale_id']), [(1, 5.0, 0.0)])
+        with connection.cursor() as cur:
+            cur.execute("SELECT stock FROM titles WHERE id = 1")
+            self.assertEqual(float(cur.fetchone()[0]), -(1 + 2 + 4 + 5))
+
+    def test_bulk_load_leaves_batches_to_bills_that_are_not_cancelled(self):
+        with connection.cursor() as cur:
+            cur.execute("INSERT INTO purchase (supplier_id, entry_date) VALUES (0, '2025-12-01') RETURNING id")
+            cur.execute(
+                """
+                INSERT INTO purchase_items (purchase_id, title_id, rate, exchange_rate, quantity, closing, currency_id)
+                VALUES (%s, 1, 100, 1, 2, 2, 1)
+                RETURNING id
+                """,
+                [cur.fetchone()[0]],
+            )
+            batch_id = cur.fetchone()[0]
+        cancelled = dict(self._build_payload([self._item(qty=2)]), cancel='Yes', client_ref='C')
+        live = dict(self._build_payload([self._item(qty=2)]), client_ref='L')
+        body = '\n'.join(json.dumps(b) for b in (cancelled, live))
+
+        res = self.client.generic('POST', reverse('sales_bulk'), body, content_type='application/x-ndjson')
+        self.assertEqual(res.status_code, 200)
+        results = [json.loads(l) for l in b''.join(res.streaming_content).decode().splitlines()]
+        by_ref = {r['client_ref']: r['sale_id'] for r in results[:-1]}
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT sale_id, purchase_item_id, quantity FROM sale_items WHERE sale_id IN (%s, %s) ORDER BY id",
+                [by_ref['C'], by_ref['L']],
+            )
+            self.assertEqual(
+                [(r[0], r[1], float(r[2])) for r in cur.fetchall()],
+                [(by_ref['C'], 0, 2.0), (by_ref['L'], batch_id, 2.0)],
+            )
+            cur.execute("SELECT closing FROM purchase_items WHERE id = %s", [batch_id])
+            self.assertEqual(float(cur.fetchone()[0]), 0.0)
+
+    def test_customer_directory_is_refreshed_after_the_bill_commits(self):
+        payload = dict(self._build_payload([self._item()]), customer_nm='Directory Customer')
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.post(reverse('create_sale'), payload, format='json')
+        self.assertEqual(res.status_code, 201)
+
+        # the bill only queued its name; it wrote no directory row
+        with connection.cursor() as cur:
+            cur.execute("SELECT count(*) FROM sales_customers WHERE customer_nm = 'Directory Customer'")
+            self.assertEqual(cur.fetchone()[0], 0)
+            cur.execute("SELECT count(*) FROM sales_customers_pending WHERE customer_nm = 'Directory Customer'")
+            self.assertEqual(cur.fetchone()[0], 1)
+
+        for callback in callbacks:
+            callback()
+        with connection.cursor() as cur:
+            cur.execute("SELECT last_bill_id FROM sales_customers WHERE customer_nm = 'Directory Customer'")
+            self.assertEqual(cur.fetchone()[0], res.json()['sale_id'])
+            cur.execute("SELECT count(*) FROM sales_customers_pending")
+            self.assertEqual(cur.fetchone()[0], 0)
+
+    def test_get_sale_revalidates_with_etag(self):
+        create_res = self.client.post(
+            reverse('create_sale'), self._build_payload([self._item(), self._item(title_id=2)]), format='json'
+        )
+        url = reverse('get_sale_by_id', kwargs={'sale_id': create_res.json()['sale_id']})
+
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([i['titleId'] for i in first.json()['items']], [1, 2])
+        etag = first['ETag']
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        payload = self._build_payload([self._item(qty=3)])
+        self.assertEqual(self.client.put(url, payload, format='json').status_code, 200)
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertEqual(changed.json()['items'][0]['quantity'], 3)
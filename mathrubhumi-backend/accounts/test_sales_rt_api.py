@@ -77,9 +77,9 @@ class SalesReturnApiTests(TestCase):
                 """,
                 [
                     sale_id,
-                    1,
-                    100,
+                    2,
                     100,
+                    200,
                     0,
                     1,
                     1,
@@ -136,6 +136,53 @@ class SalesReturnApiTests(TestCase):
         self.assertEqual(res.json()[0]['id'], self.sale_item_id)
         self.assertEqual(res.json()[0]['currency_name'], 'Indian Rupees')
 
+    def test_sales_rt_returned_quantity_is_shown_and_enforced(self):
+        items_url = reverse('sales_rt_bill_items', kwargs={'sale_id': self.sale_id})
+        create_url = reverse('sales_rt_create')
+
+        create_res = self.client.post(create_url, self._build_payload(qty=1), format='json')
+        self.assertEqual(create_res.status_code, 201)
+        self.assertEqual(self.client.get(items_url).json()[0]['r_qty'], 1.0)
+
+        # 2 sold, 1 already back
+        over = self.client.post(create_url, self._build_payload(qty=2, line_value=200), format='json')
+        self.assertEqual(over.status_code, 400)
+        self.assertIn('exceeds the sold quantity', over.json()['error'])
+
+        detail_url = reverse('sales_rt_detail', kwargs={'id': create_res.json()['id']})
+        self.assertEqual(self.client.put(detail_url, self._build_payload(qty=2), format='json').status_code, 200)
+        self.assertEqual(self.client.put(detail_url, self._build_payload(qty=3), format='json').status_code, 400)
+        self.assertEqual(self.client.get(items_url).json()[0]['r_qty'], 2.0)
+
+    def test_sales_rt_customers_directory(self):
+        url = reverse('sales_rt_customers')
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO sales (customer_nm, mobile_number, bill_no, sale_date, company_id)
+                VALUES ('Test Customer', '9847000001', 'BILL-002', CURRENT_DATE, 1),
+                       ('Tessy Joseph', '9847000002', 'BILL-003', CURRENT_DATE, 1),
+                       ('Anil', NULL, 'BILL-004', CURRENT_DATE, 1)
+                RETURNING id
+                """
+            )
+            latest, tessy, anil = (row[0] for row in cur.fetchall())
+
+        res = self.client.get(url, {'q': 'tes'})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            [(r['customer_nm'], r['id'], r['mobile_number']) for r in res.json()],
+            [('Tessy Joseph', tessy, '9847000002'), ('Test Customer', latest, '9847000001')],
+        )
+
+        # renaming a customer's only bill moves it to the new name
+        with connection.cursor() as cur:
+            cur.execute("UPDATE sales SET customer_nm = 'Anil Kumar' WHERE id = %s", [anil])
+        self.assertEqual(
+            [r['customer_nm'] for r in self.client.get(url).json()],
+            ['Anil Kumar', 'Tessy Joseph', 'Test Customer'],
+        )
+
     def test_sales_rt_crud(self):
         create_url = reverse('sales_rt_create')
         create_res = self.client.post(create_url, self._build_payload(), format='json')
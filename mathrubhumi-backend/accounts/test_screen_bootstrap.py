@@ -0,0 +1,63 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.db import connection
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+
+
+class ScreenBootstrapTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='cashier')
+        cls.user = CustomUser.objects.create_user(
+            email='bootstrap@example.com',
+            password='testpass123',
+            name='Bootstrap User',
+            role=role,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM currencies WHERE id IN (1, 2)")
+            cur.execute(
+                "INSERT INTO currencies (id, currency_name, exchange_rate) VALUES (1, 'Indian Rupees', 1), (2, 'US Dollar', 83)"
+            )
+            cur.execute("DELETE FROM branches WHERE id = 1")
+            cur.execute("INSERT INTO branches (id, branches_nm) VALUES (1, 'Kozhikode')")
+
+    def _url(self, screen='sale_bill'):
+        return reverse('screen_bootstrap', kwargs={'screen': screen})
+
+    def test_sale_bill_payload_carries_every_section(self):
+        res = self.client.get(self._url())
+        self.assertEqual(res.status_code, 200)
+        body = res.json()
+        self.assertEqual(
+            set(body), {'currencies', 'sale_types', 'payment_modes', 'class_types', 'agents', 'branches'}
+        )
+        self.assertIn({'id': 1, 'name': 'Cash Sale'}, body['sale_types'])
+        self.assertIn({'id': 0, 'name': 'Individual'}, body['class_types'])
+        self.assertIn('Indian Rupees', [c['name'] for c in body['currencies']])
+        self.assertIn({'id': 1, 'branches_nm': 'Kozhikode'}, body['branches'])
+
+    def test_unchanged_payload_revalidates_with_304(self):
+        etag = self.client.get(self._url())['ETag']
+        res = self.client.get(self._url(), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_master_change_moves_the_etag(self):
+        etag = self.client.get(self._url('goods_inward'))['ETag']
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM branches WHERE id = 2")
+            cur.execute("INSERT INTO branches (id, branches_nm) VALUES (2, 'Thrissur')")
+        res = self.client.get(self._url('goods_inward'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertIn('Thrissur', [b['branches_nm'] for b in res.json()['branches']])
+
+    def test_unknown_screen_is_rejected(self):
+        self.assertEqual(self.client.get(self._url('ledger')).status_code, 400)
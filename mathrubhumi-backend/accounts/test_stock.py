@@ -0,0 +1,465 @@
+import threading
+import time
+
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.db import connection, connections, transaction, DatabaseError
+from rest_framework.test import APIClient
+
+from .models import CustomUser, Role
+
+
+class StockEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        role = Role.objects.create(name='cashier')
+        cls.user = CustomUser.objects.create_user(
+            email='stock@example.com',
+            password='testpass123',
+            name='Stock User',
+            role=role,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.batch_id = self._seed_reference_data()
+
+    def _seed_reference_data(self):
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM currencies WHERE id = %s", [1])
+            cur.execute(
+                "INSERT INTO currencies (id, currency_name, exchange_rate) VALUES (%s, %s, %s)",
+                [1, 'Indian Rupees', 1],
+            )
+            cur.execute("DELETE FROM titles WHERE id = %s", [1])
+            cur.execute(
+                "INSERT INTO titles (id, title, rate, stock, tax) VALUES (%s, %s, %s, %s, %s)",
+                [1, 'Test Book', 100, 10, 0],
+            )
+            cur.execute("INSERT INTO purchase (supplier_id, entry_date) VALUES (0, '2025-12-01') RETURNING id")
+            purchase_id = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO purchase_items (purchase_id, title_id, rate, exchange_rate, quantity, closing, currency_id)
+                VALUES (%s, 1, 100, 1, 10, 10, 1)
+                RETURNING id
+                """,
+                [purchase_id],
+            )
+            return cur.fetchone()[0]
+
+    def _stock(self):
+        with connection.cursor() as cur:
+            cur.execute("SELECT stock FROM titles WHERE id = 1")
+            title_stock = float(cur.fetchone()[0])
+            cur.execute("SELECT closing FROM purchase_items WHERE id = %s", [self.batch_id])
+            return title_stock, float(cur.fetchone()[0])
+
+    def _sale_payload(self, qty, cancel='No'):
+        return {
+            'customer_nm': 'Walk-in',
+            'billing_address': '.',
+            'sale_date': '2026-01-19',
+            'mobile_number': '9999999999',
+            'type': 'Cash Sale',
+            'mode': 'Cash',
+            'class': 'Individual',
+            'cancel': cancel,
+            'gross': qty * 100,
+            'bill_amount': qty * 100,
+            'items': [{
+                'itemName': 'Test Book',
+                'quantity': qty,
+                'rate': 100,
+                'exchangeRate': 1,
+                'currency': 'Indian Rupees',
+                'tax': 0,
+                'discount': 0,
+                'value': qty * 100,
+                'currencyIndex': 1,
+                'titleId': 1,
+                'purchaseCompanyId': 1,
+                'purchaseId': 0,
+                'purchaseItemId': self.batch_id,
+            }],
+        }
+
+    def test_sale_create_edit_and_cancel_move_stock(self):
+        res = self.client.post(reverse('create_sale'), self._sale_payload(3), format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self._stock(), (7.0, 7.0))
+
+        url = reverse('get_sale_by_id', kwargs={'sale_id': res.json()['sale_id']})
+        self.assertEqual(self.client.put(url, self._sale_payload(1), format='json').status_code, 200)
+        self.assertEqual(self._stock(), (9.0, 9.0))
+
+        self.assertEqual(self.client.put(url, self._sale_payload(1, cancel='Yes'), format='json').status_code, 200)
+        self.assertEqual(self._stock(), (10.0, 10.0))
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT quantity FROM stock_movements WHERE doc_type = 'SALE' ORDER BY id")
+            self.assertEqual([float(r[0]) for r in cur.fetchall()], [-3.0, 2.0, 1.0])
+
+    def test_sales_return_adds_back_and_delete_reverses(self):
+        payload = {
+            'header': {'date': '2026-01-19', 'type': 'Cash Sale', 'pay': 'Cash', 'customer': 'Walk-in'},
+            'items': [{
+                'title_id': 1, 'qty': 2, 'rate': 100, 'line_value': 200,
+                'purchase_company_id': 1, 'purchase_id': 0, 'purchase_det_id': self.batch_id,
+            }],
+        }
+        res = self.client.post(reverse('sales_rt_create'), payload, format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self._stock(), (12.0, 12.0))
+
+        res = self.client.delete(reverse('sales_rt_detail', kwargs={'id': res.json()['id']}))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(self._stock(), (10.0, 10.0))
+
+    def test_ledger_is_append_only(self):
+        self.client.post(reverse('create_sale'), self._sale_payload(1), format='json')
+        with self.assertRaises(DatabaseError), transaction.atomic(), connection.cursor() as cur:
+            cur.execute("DELETE FROM stock_movements")
+
+    def _add_batch(self, entry_date, closing):
+        with connection.cursor() as cur:
+            cur.execute("INSERT INTO purchase (supplier_id, entry_date) VALUES (0, %s) RETURNING id", [entry_date])
+            purchase_id = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO purchase_items (purchase_id, title_id, rate, exchange_rate, quantity, closing, currency_id)
+                VALUES (%s, 1, 100, 1, %s, %s, 1)
+                RETURNING id
+                """,
+                [purchase_id, closing, closing],
+            )
+            return cur.fetchone()[0]
+
+    def test_sale_without_batch_is_allocated_fifo(self):
+        older = self._add_batch('2025-06-01', 2)
+        payload = self._sale_payload(15)
+        payload['items'][0].update({'purchaseCompanyId': 0, 'purchaseItemId': 0})
+        res = self.client.post(reverse('create_sale'), payload, format='json')
+        self.assertEqual(res.status_code, 201)
+
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT purchase_item_id, quantity, line_value FROM sale_items WHERE sale_id = %s ORDER BY id",
+                [res.json()['sale_id']],
+            )
+            lines = [(r[0], float(r[1]), float(r[2])) for r in cur.fetchall()]
+        self.assertEqual(lines, [(older, 2.0, 200.0), (self.batch_id, 10.0, 1000.0), (0, 3.0, 300.0)])
+        self.assertEqual(self._stock(), (-5.0, 0.0))
+
+    def test_edit_reallocates_the_batch_the_bill_emptied(self):
+        payload = self._sale_payload(10)
+        payload['items'][0].update({'purchaseCompanyId': 0, 'purchaseItemId': 0})
+        res = self.client.post(reverse('create_sale'), payload, format='json')
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(self._stock(), (0.0, 0.0))
+
+        # the edit still sends no batch; the batch it emptied is its own to take again
+        url = reverse('get_sale_by_id', kwargs={'sale_id': res.json()['sale_id']})
+        self.assertEqual(self.client.put(url, payload, format='json').status_code, 200)
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT purchase_item_id, quantity FROM sale_items WHERE sale_id = %s ORDER BY id",
+                [res.json()['sale_id']],
+            )
+            self.assertEqual([(r[0], float(r[1])) for r in cur.fetchall()], [(self.batch_id, 10.0)])
+        self.assertEqual(self._stock(), (0.0, 0.0))
+
+    INWARD_ITEM = {
+        'itemName': 'Test Book', 'isbn': '', 'currency': 'Indian Rupees', 'currencyIndex': 1,
+        'titleId': 1, 'exchangeRate': 1, 'value': 0,
+    }
+
+    def _inward_payload(self, items):
+        return {
+            'supplier_id': 1, 'bill_no': 'INV-7', 'bill_date': '2026-01-19', 'user_id': 1, 'branches_id': 1,
+            'gross': 0, 'nett': 0, 'is_cash': 'No', 'type': 'Purchase', 'notes': '',
+            'p_breakup_id1': 0, 'p_breakup_amt1': 0, 'p_breakup_id2': 0, 'p_breakup_amt2': 0,
+            'p_breakup_id3': 0, 'p_breakup_amt3': 0, 'p_breakup_id4': 0, 'p_breakup_amt4': 0,
+            'items': [{**self.INWARD_ITEM, **item} for item in items],
+        }
+
+    def _inward_lines(self, purchase_id):
+        with connection.cursor() as cur:
+            cur.execute(
+                "SELECT id, quantity, closing, purchase_cost FROM purchase_items WHERE purchase_id = %s ORDER BY id",
+                [purchase_id],
+            )
+            return [(r[0], float(r[1]), float(r[2]), float(r[3])) for r in cur.fetchall()]
+
+    def test_goods_inward_writes_lines_with_closing_tax_split_and_cost(self):
+        payload = self._inward_payload([
+            {'quantity': 4, 'purchaseRate': 100, 'tax': 5, 'discount': 25, 'discountAmount': 20},
+            {'quantity': 6, 'purchaseRate': 50, 'tax': 0.05, 'discount': 0, 'discountAmount': 0},
+        ])
+        res = self.client.post(reverse('create_goods_inward'), payload, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+
+        with connection.cursor() as cur:
+            cur.execute(
+                """
+                SELECT quantity, closing, sgst, cgst, purchase_cost
+                  FROM purchase_items
+                 WHERE purchase_id = %s
+                 ORDER BY id
+                """,
+                [res.json()['purchase_id']],
+            )
+            lines = [tuple(float(v) for v in r) for r in cur.fetchall()]
+            cur.execute(
+                "SELECT SUM(quantity) FROM stock_movements WHERE doc_type = 'PUR' AND doc_id = %s",
+                [res.json()['purchase_id']],
+            )
+            ledger = float(cur.fetchone()[0])
+        # 100 less 25% is 75, less 20 spread over 4 copies
+        self.assertEqual(lines, [(4.0, 4.0, 2.5, 2.5, 70.0), (6.0, 6.0, 0.03, 0.02, 50.0)])
+        self.assertEqual(ledger, 10.0)
+        self.assertEqual(self._stock(), (20.0, 10.0))
+
+    def test_goods_inward_edit_syncs_lines_and_moves_stock_by_the_difference(self):
+        payload = self._inward_payload([
+            {'quantity': 4, 'purchaseRate': 100, 'tax': 0, 'discount': 0, 'discountAmount': 0},
+            {'quantity': 6, 'purchaseRate': 50, 'tax': 0, 'discount': 0, 'discountAmount': 0},
+        ])
+        res = self.client.post(reverse('create_goods_inward'), payload, format='json')
+        purchase_id, purchase_no = res.json()['purchase_id'], res.json()['purchase_no']
+        first, second = [line[0] for line in self._inward_lines(purchase_id)]
+
+        payload = self._inward_payload([
+            {'itemId': first, 'quantity': 3, 'purchaseRate': 100, 'tax': 0, 'discount': 10, 'discountAmount': 0},
+            {'quantity': 5, 'purchaseRate': 80, 'tax': 0, 'discount': 0, 'discountAmount': 0},
+        ])
+        payload.update({'id': purchase_id, 'srl_no': purchase_no, 'entry_date': '2026-01-19'})
+        res = self.client.put(
+            reverse('get_goods_inward', kwargs={'goods_inward_purchase_no': purchase_no}), payload, format='json'
+        )
+        self.assertEqual(res.status_code, 200, res.content)
+
+        lines = self._inward_lines(purchase_id)
+        self.assertEqual(lines[0], (first, 3.0, 3.0, 90.0))
+        self.assertNotIn(second, [line[0] for line in lines])
+        self.assertEqual(lines[1][1:], (5.0, 5.0, 80.0))
+        self.assertEqual(self._stock(), (18.0, 10.0))
+
+    def test_sales_return_edit_keeps_line_ids(self):
+        item = {
+            'title_id': 1, 'rate': 100, 'purchase_company_id': 1, 'purchase_id': 0, 'purchase_det_id': self.batch_id,
+        }
+        payload = {
+            'header': {'date': '2026-01-19', 'type': 'Cash Sale', 'pay': 'Cash', 'customer': 'Walk-in'},
+            'items': [{**item, 'qty': 2, 'line_value': 200}],
+        }
+        res = self.client.post(reverse('sales_rt_create'), payload, format='json')
+        url = reverse('sales_rt_detail', kwargs={'id': res.json()['id']})
+        line_id = self.client.get(url).json()['items'][0]['id']
+
+        payload['items'] = [{**item, 'id': line_id, 'qty': 3, 'line_value': 300}, {**item, 'qty': 1, 'line_value': 100}]
+        res = self.client.put(url, payload, format='json')
+        self.assertEqual(res.status_code, 200, res.content)
+
+        items = self.client.get(url).json()['items']
+        self.assertEqual([(i['id'] == line_id, i['quantity']) for i in items], [(True, 3.0), (False, 1.0)])
+        self.assertEqual(self._stock(), (14.0, 14.0))
+
+    def test_sales_return_edit_inserts_a_copied_line_as_a_new_one(self):
+        item = {
+            'title_id': 1, 'rate': 100, 'purchase_company_id': 1, 'purchase_id': 0, 'purchase_det_id': self.batch_id,
+        }
+        payload = {
+            'header': {'date': '2026-01-19', 'type': 'Cash Sale', 'pay': 'Cash', 'customer': 'Walk-in'},
+            'items': [{**item, 'qty': 2, 'line_value': 200}],
+        }
+        res = self.client.post(reverse('sales_rt_create'), payload, format='json')
+        url = reverse('sales_rt_detail', kwargs={'id': res.json()['id']})
+        line_id = self.client.get(url).json()['items'][0]['id']
+
+        payload['items'] = [
+            {**item, 'id': line_id, 'qty': 3, 'line_value': 300}, {**item, 'id': line_id, 'qty': 1, 'line_value': 100},
+        ]
+        res = self.client.put(url, payload, format='json')
+        self.assertEqual(res.status_code, 200, res.content)
+
+        items = self.client.get(url).json()['items']
+        self.assertEqual([(i['id'] == line_id, i['quantity']) for i in items], [(True, 3.0), (False, 1.0)])
+        self.assertEqual(self._stock(), (14.0, 14.0))
+
+    def test_purchase_return_edit_numbers_new_lines_after_the_stored_ones(self):
+        item = {'title_id': 1, 'rate': 100, 'purchase_company_id': 1, 'purchase_id': 0, 'purchase_det_id': self.batch_id}
+        payload = {
+            'purchase_rt': {'company_id': 1, 'entry_date': '2026-01-19', 'supplier_id': 0},
+            'purchase_rt_items': [{**item, 'quantity': 2}, {**item, 'quantity': 1}],
+        }
+        res = self.client.post(reverse('goods_inward'), payload, format='json')
+        self.assertEqual(res.status_code, 201, res.content)
+        self.assertEqual(self._stock(), (7.0, 7.0))
+
+        url = reverse('goods_inward_detail', kwargs={'id': res.json()['id']})
+        payload['purchase_rt_items'] = [{**item, 'id': 2, 'quantity': 4}, {**item, 'quantity': 1}]
+        res = self.client.put(url, payload, format='json')
+        self.assertEqual(res.status_code, 200, res.content)
+
+        items = self.client.get(url).json()['items']
+        self.assertEqual([(i['row_id'], i['quantity']) for i in items], [(2, 4.0), (3, 1.0)])
+        self.assertEqual(self._stock(), (5.0, 5.0))
+
+    def test_batch_ledger_tracks_returnable_quantity(self):
+        self.client.post(reverse('create_sale'), self._sale_payload(3), format='json')
+        self.client.post(reverse('sales_rt_create'), {
+            'header': {'date': '2026-01-19', 'type': 'Cash Sale', 'pay': 'Cash', 'customer': 'Walk-in'},
+            'items': [{'title_id': 1, 'qty': 1, 'rate': 100, 'line_value': 100,
+                       'purchase_company_id': 1, 'purchase_id': 0, 'purchase_det_id': self.batch_id}],
+        }, format='json')
+        item = {'title_id': 1, 'rate': 100, 'purchase_company_id': 1, 'purchase_id': 0, 'purchase_det_id': self.batch_id}
+        payload = {
+            'purchase_rt': {'company_id': 1, 'entry_date': '2026-01-19', 'supplier_id': 0},
+            'purchase_rt_items': [{**item, 'quantity': 2}],
+        }
+        self.assertEqual(self.client.post(reverse('goods_inward'), payload, format='json').status_code, 201)
+
+        with connection.cursor() as cur:
+            cur.execute("SELECT purchase_id FROM purchase_items WHERE id = %s", [self.batch_id])
+            purchase_id = cur.fetchone()[0]
+        res = self.client.get(reverse('get_purchase_items_by_id', kwargs={'purchase_id': purchase_id}))
+        line = res.json()[0]
+        self.assertEqual(
+            [line[k] for k in ('received', 'sold', 'sale_returned', 'returned', 'returnable')],
+            [10.0, 3.0, 1.0, 2.0, 6.0],
+        )
+
+        payload['purchase_rt_items'] = [{**item, 'quantity': 4}, {**item, 'quantity': 3}]
+        res = self.client.post(reverse('goods_inward'), payload, format='json')
+        self.assertEqual(res.status_code, 400)
+        self.assertIn('returnable', res.json()['error'])
+        self.assertEqual(self._stock(), (6.0, 6.0))
+
+    def test_titles_of_every_line_resolve_in_one_query(self):
+        from .views import resolve_title_ids
+
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM titles WHERE id IN (2, 3)")
+            cur.execute(
+                """
+                INSERT INTO titles (id, title, title_m, language_id, isbn, rate, stock, tax)
+                VALUES (2, 'Aadujeevitham', 'ആടുജീവിതം', 1, '9788126421374', 200, 0, 0),
+                       (3, 'Khasakkinte Ithihasam', NULL, 0, NULL, 250, 0, 0)
+                """
+            )
+            items = [
+                {'title_id': 1},
+                {'title_id': 999, 'isbn': '9788126421374'},
+                {'itemName': 'ആടുജീവിതം', 'language_id': 1},
+                {'itemName': 'Khasakkinte Ithihasam'},
+                {'itemName': 'Khasakkinte Ithihasam'},
+                {'title': 'Unknown'},
+            ]
+        with self.assertNumQueries(1), connection.cursor() as cur:
+            self.assertEqual(resolve_title_ids(cur, items), [1, 2, 2, 3, 3, 0])
+
+
+class ConcurrentSaleTests(TransactionTestCase):
+    """Bills saved in parallel from separate connections; rows are committed, so tearDown removes them."""
+
+    def setUp(self):
+        role = Role.objects.create(name='cashier')
+        self.user = CustomUser.objects.create_user(
+            email='concurrent@example.com',
+            password='testpass123',
+            name='Concurrent User',
+            role=role,
+        )
+        with connection.cursor() as cur:
+            cur.execute("DELETE FROM currencies WHERE id = 1")
+            cur.execute("INSERT INTO currencies (id, currency_name, exchange_rate) VALUES (1, 'Indian Rupees', 1)")
+            cur.execute("DELETE FROM titles WHERE id IN (1, 2)")
+            cur.execute(
+                "INSERT INTO titles (id, title, rate, stock, tax) VALUES (1, 'First Book', 100, 10, 0), "
+                "(2, 'Second Book', 100, 10, 0)"
+            )
+            cur.execute("INSERT INTO purchase (supplier_id, entry_date) VALUES (0, '2025-12-01') RETURNING id")
+            self.purchase_id = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO purchase_items (purchase_id, title_id, rate, exchange_rate, quantity, closing, currency_id)
+                VALUES (%s, 1, 100, 1, 10, 10, 1), (%s, 2, 100, 1, 10, 10, 1)
+                RETURNING id
+                """,
+                [self.purchase_id, self.purchase_id],
+            )
+            self.batches = [row[0] for row in cur.fetchall()]
+
+    def tearDown(self):
+        with transaction.atomic(), connection.cursor() as cur:
+            cur.execute("SELECT id FROM sales WHERE customer_nm LIKE 'Concurrent %%'")
+            sale_ids = [r[0] for r in cur.fetchall()]
+            # the ledger refuses deletes; this test's rows go with the rest
+            cur.execute("ALTER TABLE stock_movements DISABLE TRIGGER stock_movements_append_only")
+            cur.execute("DELETE FROM stock_movements WHERE doc_type = 'SALE' AND doc_id = ANY(%s)", [sale_ids])
+            cur.execute("ALTER TABLE stock_movements ENABLE TRIGGER stock_movements_append_only")
+            cur.execute("DELETE FROM sale_items WHERE sale_id = ANY(%s)", [sale_ids])
+            cur.execute("DELETE FROM sales WHERE id = ANY(%s)", [sale_ids])
+            cur.execute("DELETE FROM sales_customers_pending WHERE customer_nm LIKE 'Concurrent %%'")
+            cur.execute("DELETE FROM sales_customers WHERE customer_nm LIKE 'Concurrent %%'")
+            cur.execute("DELETE FROM purchase_batch_ledger WHERE purchase_id = %s", [self.purchase_id])
+            cur.execute("DELETE FROM purchase_items WHERE purchase_id = %s", [self.purchase_id])
+            cur.execute("DELETE FROM purchase WHERE id = %s", [self.purchase_id])
+            cur.execute("DELETE FROM titles WHERE id IN (1, 2)")
+            cur.execute("DELETE FROM last_values WHERE code = 'CASH_SALE' AND fin_year = '2526'")
+
+    def _line(self, title_id, batch_id):
+        return {
+            'itemName': 'Book', 'quantity': 1, 'rate': 100, 'exchangeRate': 1, 'currency': 'Indian Rupees',
+            'tax': 0, 'discount': 0, 'value': 100, 'currencyIndex': 1, 'titleId': title_id,
+            'purchaseCompanyId': 1 if batch_id else 0, 'purchaseId': 0, 'purchaseItemId': batch_id,
+        }
+
+    def _payload(self, customer, items):
+        return {
+            'customer_nm': customer, 'billing_address': '.', 'sale_date': '2026-01-19',
+            'mobile_number': '9999999999', 'type': 'Cash Sale', 'mode': 'Cash', 'class': 'Individual',
+            'cancel': 'No', 'gross': 200, 'bill_amount': 200, 'items': items,
+        }
+
+    def _post(self, payload, results):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        try:
+            results.append(client.post(reverse('create_sale'), payload, format='json'))
+        finally:
+            connections.close_all()
+
+    def test_bills_with_crossing_titles_do_not_deadlock(self):
+        # each bill names the batch of one title and leaves the other to FIFO
+        payloads = [
+            self._payload('Concurrent A', [self._line(1, self.batches[0]), self._line(2, 0)]),
+            self._payload('Concurrent B', [self._line(1, 0), self._line(2, self.batches[1])]),
+        ]
+        results = []
+        with transaction.atomic():
+            with connection.cursor() as cur:
+                # hold both titles so the two saves queue up and then start together
+                cur.execute("SELECT id FROM titles WHERE id IN (1, 2) FOR UPDATE")
+                threads = [threading.Thread(target=self._post, args=(p, results)) for p in payloads]
+                for thread in threads:
+                    thread.start()
+                for _ in range(100):
+                    cur.execute(
+                        "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() "
+                        "AND wait_event_type = 'Lock'"
+                    )
+                    if cur.fetchone()[0] == 2:
+                        break
+                    time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([r.status_code for r in results], [201, 201], [r.content for r in results])
+        with connection.cursor() as cur:
+            cur.execute("SELECT id, stock FROM titles WHERE id IN (1, 2) ORDER BY id")
+            self.assertEqual([(r[0], float(r[1])) for r in cur.fetchall()], [(1, 8.0), (2, 8.0)])
+            cur.execute("SELECT bill_no FROM sales WHERE customer_nm LIKE 'Concurrent %%' ORDER BY bill_no")
+            self.assertEqual(len({r[0] for r in cur.fetchall()}), 2)
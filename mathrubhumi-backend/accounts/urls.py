@@ -23,7 +23,10 @@ urlpatterns = [
     path('branches-name-search/', views.branches_name_search, name='branches_name_search'),
     # Sale Bill
     path('sales/', views.create_sale, name='create_sale'),
+    path('sales/quote/', views.sales_quote, name='sales_quote'),
+    path('sales/bulk/', views.sales_bulk, name='sales_bulk'),
     path('sales/<int:sale_id>/', views.get_sale_by_id, name='get_sale_by_id'),
+    path('sales/<int:sale_id>/receipt/', views.sale_receipt, name='sale_receipt'),
     path('product-search/', views.product_search),
     path('customer-search/', views.customer_search, name='customer_search'),
     path('batch-select/', views.batch_select),
@@ -33,6 +36,9 @@ urlpatterns = [
     path('branches-search/', views.branches_search, name='branches_search'),
     path('goods_inward/', views.create_goods_inward, name='create_goods_inward'),
     re_path(r'^goods_inward/(?P<goods_inward_purchase_no>-?\d+)/$', views.get_goods_inward_by_id, name='get_goods_inward'),
+    path('goods_inward/import/', views.goods_inward_import, name='goods_inward_import'),
+    path('goods_inward/import/<int:import_id>/', views.goods_inward_import_detail, name='goods_inward_import_detail'),
+    path('goods_inward/import/<int:import_id>/post/', views.goods_inward_import_post, name='goods_inward_import_post'),
     path('breakup-search/', views.breakup_search, name='breakup_search'),
     path('author-search/', views.author_search, name='author_search'),
     path('publisher-search/', views.publisher_search, name='publisher_search'),
@@ -54,6 +60,7 @@ urlpatterns = [
     path('supplier-create/', views.supplier_create, name='supplier_create'),
     path('supplier-master-search/', views.supplier_master_search, name='supplier_master_search'),
     path('supplier-update/<int:id>/', views.supplier_update, name='supplier_update'),
+    path('supplier-aging/', views.supplier_aging, name='supplier_aging'),
     path('credit-customer-create/', views.credit_customer_create, name='credit_customer_create'),
     path('credit-customer-master-search/', views.credit_customer_master_search, name='credit_customer_master_search'),
     path('credit-customer-update/<int:id>/', views.credit_customer_update, name='credit_customer_update'),
@@ -109,6 +116,8 @@ urlpatterns = [
     path('purchase/<int:purchase_id>/items/', views.get_purchase_items_by_id, name='get_purchase_items_by_id'),
     path('goods-inward/', views.goods_inward, name='goods_inward'),
     path('goods-inward/<int:id>/', views.goods_inward_detail, name='goods_inward_detail'),
+    # Document finder
+    path('documents/find/', views.find_documents, name='find_documents'),
     # Sale Bill Return routes
     path('sales-rt/customers/', views.sales_rt_customers, name='sales_rt_customers'),
     path('sales-rt/bills/', views.sales_rt_bills, name='sales_rt_bills'),
@@ -129,6 +138,8 @@ urlpatterns = [
     path('cr-realisation-by-no/', views.cr_realisation_by_no, name='cr_realisation_by_no'),
     # Reports routes
     path('sale-types/', views.sale_types_list, name='sale_types_list'),
+    path('master-changes/', views.master_changes, name='master_changes'),
+    path('bootstrap/<str:screen>/', views.screen_bootstrap_view, name='screen_bootstrap'),
     path('reports/bill-wise-sale-register/', views.bill_wise_sale_register_report, name='bill_wise_sale_register_report'),
     path('reports/date-wise-sale-register/', views.date_wise_sale_register_report, name='date_wise_sale_register_report'),
     path('reports/credit-customer-wise-sales/', views.credit_customer_wise_sales_report, name='credit_customer_wise_sales_report'),
@@ -144,4 +155,7 @@ urlpatterns = [
     path('reports/author-publisher-sales/', views.author_publisher_sales_report, name='author_publisher_sales_report'),
     path('reports/category-publisher-author-wise-sales/', views.category_publisher_author_wise_sales_report, name='category_publisher_author_wise_sales_report'),
     path('reports/author-wise-title-sales/', views.author_wise_title_sales_report, name='author_wise_title_sales_report'),
+    path('reports/supplier-wise-purchase-register/', views.supplier_wise_purchase_register_report, name='supplier_wise_purchase_register_report'),
+    path('reports/purchase-breakup-register/', views.purchase_breakup_register_report, name='purchase_breakup_register_report'),
+    path('reports/purchase-return-register/', views.purchase_return_register_report, name='purchase_return_register_report'),
 ]
@@ -11,10 +11,24 @@ from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
 from .models import CustomUser, Role
 from django.db import transaction, connection, IntegrityError
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.conf import settings
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.dateparse import parse_date
 from .permissions import is_admin_user
+from .sale_lines import insert_sale_items, sync_sale_items
+from .numbering import next_id, next_number, next_sale_bill_no
+from .idempotency import idempotent
+from .stock import (
+    DOC_SALE, DOC_SALE_RT, DOC_PURCHASE, DOC_PURCHASE_RT, document_lines, post_document, allocate_fifo,
+    apply_movements, net_movements,
+)
+from .pricing import PricingError, check_sale_totals, invalidate_titles, quote
+from .bulk_sales import load_sales
+from .line_sync import PURCHASE_ITEM_DERIVED, sync_lines
+from . import (
+    document_finder, invoice_import, landed_cost, master_feed, payables, receipts, sale_returns, screen_bootstrap,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -62,17 +76,6 @@ class_type_mapping = {
 }
 class_type_reverse_mapping = {v: k for k, v in class_type_mapping.items()}
 
-def get_next_value(company_id: int, fin_year: str, code: str) -> int:
-    query = """
-           UPDATE public."last_values" SET last_value = last_value + 1
-            WHERE company_id = %s AND fin_year = %s AND code = %s
-        RETURNING last_value;
-    """
-    with connection.cursor() as cursor:
-        cursor.execute(query, [company_id, fin_year, code])
-        result = cursor.fetchone()
-        return result[0] if result else -1
-
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def protected_view(request):
@@ -314,8 +317,91 @@ def branches_name_search(request):
 
 ################### SALE BILL ###################
 
+def normalise_sale(data):
+    """
+    Validate a create_sale payload and normalise it in place: numeric header
+    and line fields become numbers, cr customer is cleared for non-credit
+    sales and each line gets its allocatedBillDiscount from the pricing
+    engine. Raises ValueError with the message for the client.
+    """
+    required_fields = ['customer_nm', 'sale_date', 'mobile_number', 'type', 'mode', 'class', 'cancel']
+    for field in required_fields:
+        if field not in data or data[field] is None or data[field] == '':
+            raise ValueError(f'Missing or null field: {field}')
+
+    optional_fields = {
+        'bill_discount': 0.0,
+        'bill_discount_amount': 0.0,
+        'gross': 0.0,
+        'round_off': 0.0,
+        'bill_amount': 0.0,
+        'note_1': '',
+        'note_2': '',
+        'freight_postage': 0.0,
+        'processing_charge': 0.0
+    }
+    for field, default in optional_fields.items():
+        data[field] = data.get(field, default) if data.get(field) is not None else default
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError('Items must be a non-empty list')
+
+    required_item_fields = ['itemName', 'quantity', 'exchangeRate', 'rate', 'value', 'currency', 'tax', 'currencyIndex', 'titleId']
+    for item in items:
+        for field in required_item_fields:
+            if field not in item or item[field] is None:
+                raise ValueError(f'Missing item field: {field}')
+
+    try:
+        data['branch_id'] = int(data.get('branch_id') or 0)
+        data['agent_id'] = int(data.get('agent_id') or 0)
+        for field in ('bill_discount', 'bill_discount_amount', 'gross', 'round_off', 'bill_amount'):
+            data[field] = float(data[field]) if data[field] else 0.0
+        for item in items:
+            item['quantity'] = float(item['quantity'])
+            item['rate'] = float(item['rate'])
+            item['exchangeRate'] = float(item['exchangeRate'])
+            item['tax'] = float(item['tax']) if item.get('tax') is not None else 0.0
+            item['discount'] = float(item['discount']) if item.get('discount') else 0.0
+            item['value'] = float(item['value'])
+            item['currencyIndex'] = int(item['currencyIndex'])
+            item['titleId'] = int(item['titleId'])
+            item['purchaseItemId'] = int(item.get('purchaseItemId') or 0)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Invalid data type: {str(e)}')
+
+    # If not credit sale, set the cr_customer_id to 0
+    # (0 is "Credit Sale" in your sale_type_reverse_mapping)
+    data['customer_id'] = (
+        0 if sale_type_reverse_mapping.get(data['type'], -1) != 0
+        else data.get('customer_id', 0)
+    )
+
+    # Reprice with the pricing engine: rejects an item discount combined with
+    # a bill discount and totals that disagree with the lines, and shares the
+    # bill discount out to the paisa
+    shares = check_sale_totals(
+        items, data['gross'], data['bill_discount'], data['bill_discount_amount'], data['round_off'], data['bill_amount']
+    )
+    for item, share in zip(items, shares):
+        item['allocatedBillDiscount'] = float(share)
+    return data
+
+
+def flush_sales_customers():
+    """
+    Fold the names queued by committed bills into the sales_customers
+    directory (migration 0037). Runs after commit, in its own transaction,
+    so a bill never waits on a directory row.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sales_customers_flush()")
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('create_sale')
 def create_sale(request):
     if request.method == 'POST':
         try:
@@ -323,88 +409,14 @@ def create_sale(request):
             data = json.loads(request.body)
             logger.debug(f"Parsed data: {data}")
 
-            required_fields = ['customer_nm', 'sale_date', 'mobile_number', 'type', 'mode', 'class', 'cancel']
-            for field in required_fields:
-                if field not in data or data[field] is None or data[field] == '':
-                    logger.error(f"Validation failed: Missing or null field: {field}")
-                    return JsonResponse({'error': f'Missing or null field: {field}'}, status=400)
-
-            optional_fields = {
-                'bill_discount': 0.0,
-                'bill_discount_amount': 0.0,
-                'gross': 0.0,
-                'round_off': 0.0,
-                'bill_amount': 0.0,
-                'note_1': '',
-                'note_2': '',
-                'freight_postage': 0.0,
-                'processing_charge': 0.0
-            }
-            for field, default in optional_fields.items():
-                data[field] = data.get(field, default) if data.get(field) is not None else default
-
-            # NEW: normalize branch_id & agent_id
-            data['branch_id'] = int(data.get('branch_id') or 0)
-            data['agent_id'] = int(data.get('agent_id') or 0)
-
-            if not isinstance(data['items'], list) or not data['items']:
-                logger.error("Validation failed: Items must be a non-empty list")
-                return JsonResponse({'error': 'Items must be a non-empty list'}, status=400)
-
-            has_item_discount = any(float(item.get('discount', 0)) > 0 for item in data['items'])
-            bill_discount = float(data['bill_discount'] or 0)
-            bill_discount_amount = float(data['bill_discount_amount'] or 0)
-            discount_count = (1 if has_item_discount else 0) + (1 if bill_discount > 0 else 0) + (1 if bill_discount_amount > 0 else 0)
-            if discount_count > 1:
-                logger.error("Validation failed: Only one of item discount, bill discount %, or bill discount amount can be applied")
-                return JsonResponse({'error': 'Only one of item discount, bill discount %, or bill discount amount can be applied'}, status=400)
-
             try:
-                bill_discount = float(data['bill_discount']) if data['bill_discount'] else 0.0
-                bill_discount_amount = float(data['bill_discount_amount']) if data['bill_discount_amount'] else 0.0
-                gross = float(data['gross']) if data['gross'] else 0.0
-                round_off = float(data['round_off']) if data['round_off'] else 0.0
-                bill_amount = float(data['bill_amount']) if data['bill_amount'] else 0.0
-                for item in data['items']:
-                    required_item_fields = ['itemName', 'quantity', 'exchangeRate', 'rate', 'value', 'currency', 'tax', 'currencyIndex', 'titleId']
-                    for field in required_item_fields:
-                        if field not in item or item[field] is None:
-                            logger.error(f"Validation failed: Missing item field: {field}")
-                            return JsonResponse({'error': f'Missing item field: {field}'}, status=400)
-                    item['quantity'] = float(item['quantity'])
-                    item['rate'] = float(item['rate'])
-                    item['exchangeRate'] = float(item['exchangeRate'])
-                    item['tax'] = float(item['tax']) if item.get('tax') is not None else 0.0
-                    item['discount'] = float(item['discount']) if item.get('discount') else 0.0
-                    item['value'] = float(item['value'])
-                    item['currencyIndex'] = int(item['currencyIndex'])
-                    item['titleId'] = int(item['titleId'])
-                    item['purchaseItemId'] = int(item.get('purchaseItemId') or 0)
-            except (ValueError, TypeError) as e:
-                logger.error(f"Invalid data type: {str(e)}")
-                return JsonResponse({'error': f'Invalid data type: {str(e)}'}, status=400)
-
-            # If not credit sale, set the cr_customer_id to 0
-            # (0 is "Credit Sale" in your sale_type_reverse_mapping)
-            data['customer_id'] = (
-                0 if sale_type_reverse_mapping.get(data['type'], -1) != 0
-                else data.get('customer_id', 0)
-            )
-
-            # Calculate allocated bill discount for each item
-            total_value = sum(item['value'] for item in data['items'])
-            for item in data['items']:
-                item['allocatedBillDiscount'] = 0.0
-                if not has_item_discount and total_value > 0:
-                    if bill_discount > 0:
-                        total_discount = gross * bill_discount / 100
-                        item['allocatedBillDiscount'] = (item['value'] / total_value) * total_discount
-                    elif bill_discount_amount > 0:
-                        item['allocatedBillDiscount'] = (item['value'] / total_value) * bill_discount_amount
+                normalise_sale(data)
+            except ValueError as e:
+                logger.error(f"Validation failed: {str(e)}")
+                return JsonResponse({'error': str(e)}, status=400)
 
+            sale_type_code = sale_type_reverse_mapping.get(data['type'], -1)
             with transaction.atomic():
-                bill_no = get_next_value(1, '2526', 'CREDIT_SALE')
-                bill_no = '2025-26/' + f"{bill_no:05d}"
                 with connection.cursor() as cursor:
                     cursor.execute(
                         """
@@ -413,13 +425,13 @@ def create_sale(request):
                             type, mode, class, cancel,
                             bill_discount, bill_discount_amount, gross, round_off, bill_amount,
                             note_1, note_2, freight_postage, processing_charge,
-                            bill_no, cr_customer_id, agent_id, branch_id
+                            cr_customer_id, agent_id, branch_id
                         )
                         VALUES (%s, %s, %s, %s,
                                 %s, %s, %s, %s,
                                 %s, %s, %s, %s, %s,
                                 %s, %s, %s, %s,
-                                %s, %s, %s, %s)
+                                %s, %s, %s)
                         RETURNING id
                         """,
                         [
@@ -427,20 +439,19 @@ def create_sale(request):
                             data['billing_address'],
                             data['sale_date'],
                             data['mobile_number'],
-                            sale_type_reverse_mapping.get(data['type'], -1),
+                            sale_type_code,
                             payment_type_reverse_mapping.get(data['mode'], -1),
                             class_type_reverse_mapping.get(data['class'], -1),
                             1 if data['cancel'] == 'Yes' else 0,
-                            bill_discount,
-                            bill_discount_amount,
-                            gross,
-                            round_off,
-                            bill_amount,
+                            data['bill_discount'],
+                            data['bill_discount_amount'],
+                            data['gross'],
+                            data['round_off'],
+                            data['bill_amount'],
                             data['note_1'],
                             data['note_2'],
                             data['freight_postage'],
                             data['processing_charge'],
-                            bill_no,
                             data['customer_id'],       # cr_customer_id
                             int(data.get('agent_id') or 0),
                             int(data.get('branch_id') or 0),
@@ -448,34 +459,23 @@ def create_sale(request):
                     )
                     sale_id = cursor.fetchone()[0]
 
-                    for item in data['items']:
-                        cursor.execute(
-                            """
-                            INSERT INTO sale_items (
-                                sale_id, exchange_rate, quantity, rate, tax, discount_p, line_value, currency_id, title_id, allocated_bill_discount,
-                                purchase_company_id, purchase_id, purchase_item_id
-                            )
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            """,
-                            [
-                                sale_id,
-                                item['exchangeRate'],
-                                item['quantity'],
-                                item['rate'],
-                                item['tax'],
-                                item['discount'],
-                                item['value'],
-                                item['currencyIndex'],
-                                item['titleId'],
-                                item['allocatedBillDiscount'],
-                                item['purchaseCompanyId'],
-                                item['purchaseId'],
-                                item['purchaseItemId'],
-                            ]
-                        )
+                    # lines without a chosen batch are split over open batches, oldest first
+                    data['items'] = allocate_fifo(cursor, data['items'])
+
+                    # all lines in one statement (see sale_lines.insert_sale_items)
+                    insert_sale_items(cursor, sale_id, data['items'])
+
+                    post_document(cursor, DOC_SALE, sale_id)
+
+                    # number last, after every title and batch lock: the series
+                    # row is then held only from here to commit
+                    bill_no = next_sale_bill_no(cursor, sale_type_code, data['sale_date'])
+                    cursor.execute("UPDATE sales SET bill_no = %s WHERE id = %s", [bill_no, sale_id])
+
+                transaction.on_commit(flush_sales_customers, robust=True)
 
             logger.info(f"Sale created successfully with ID: {sale_id}")
-            return JsonResponse({'message': 'Sale saved successfully', 'sale_id': sale_id}, status=201)
+            return JsonResponse({'message': 'Sale saved successfully', 'sale_id': sale_id, 'bill_no': bill_no}, status=201)
 
         except Exception as e:
             logger.error(f"Error in create_sale: {str(e)}")
@@ -484,8 +484,241 @@ def create_sale(request):
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 
+def _ndjson(obj):
+    return json.dumps(obj, ensure_ascii=False) + '\n'
+
+
+def _load_sale_chunk(chunk):
+    """Write one chunk of validated bills in its own transaction; returns the per-bill results."""
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            saved = load_sales(cursor, [data for _, _, data in chunk])
+            transaction.on_commit(flush_sales_customers, robust=True)
+    except Exception as e:
+        logger.error(f"Error in sales_bulk chunk of {len(chunk)} bills: {str(e)}")
+        return [{'line': line_no, 'client_ref': ref, 'status': 'error', 'error': str(e)} for line_no, ref, _ in chunk]
+    return [
+        {'line': line_no, 'client_ref': ref, 'status': 'created', 'sale_id': sale_id, 'bill_no': bill_no}
+        for (line_no, ref, _), (sale_id, bill_no) in zip(chunk, saved)
+    ]
+
+
+def _bulk_sale_results(lines, chunk_size):
+    """Validate NDJSON bills as they arrive, load them chunk by chunk and yield one result line per bill."""
+    counts = {'created': 0, 'failed': 0}
+    chunk = []
+
+    def flush():
+        results = _load_sale_chunk(chunk)
+        chunk.clear()
+        for result in results:
+            counts['created' if result['status'] == 'created' else 'failed'] += 1
+        return results
+
+    for line_no, raw in enumerate(lines, 1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        ref = None
+        try:
+            data = json.loads(raw)
+            if not isinstance(data, dict):
+                raise ValueError('Each line must be a JSON object')
+            ref = data.get('client_ref')
+            normalise_sale(data)
+            data['type_code'] = sale_type_reverse_mapping.get(data['type'], -1)
+            data['mode_code'] = payment_type_reverse_mapping.get(data['mode'], -1)
+            data['class_code'] = class_type_reverse_mapping.get(data['class'], -1)
+            data['cancel_code'] = 1 if data['cancel'] == 'Yes' else 0
+        except (ValueError, TypeError, AttributeError) as e:
+            counts['failed'] += 1
+            yield _ndjson({'line': line_no, 'client_ref': ref, 'status': 'error', 'error': str(e)})
+            continue
+
+        chunk.append((line_no, ref, data))
+        if len(chunk) >= chunk_size:
+            for result in flush():
+                yield _ndjson(result)
+
+    if chunk:
+        for result in flush():
+            yield _ndjson(result)
+    logger.info(f"sales_bulk finished: {counts['created']} created, {counts['failed']} failed")
+    yield _ndjson({'summary': counts})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def sales_bulk(request):
+    """
+    Load bills collected offline. The body is NDJSON, one create_sale payload
+    per line, optionally with a `client_ref` the counter uses to match results.
+    Bills are committed in chunks of BULK_SALE_CHUNK_SIZE (or ?chunk_size=);
+    a chunk that fails rolls back alone. The response is NDJSON streamed as
+    chunks commit: {line, client_ref, status, sale_id, bill_no | error} per
+    bill, then a {summary} line.
+    """
+    try:
+        chunk_size = int(request.GET.get('chunk_size') or settings.BULK_SALE_CHUNK_SIZE)
+    except ValueError:
+        return JsonResponse({'error': 'chunk_size must be an integer'}, status=400)
+    chunk_size = max(1, min(chunk_size, 1000))
+
+    stream = request.stream
+    lines = iter(stream.readline, b'') if stream is not None else []
+    return StreamingHttpResponse(_bulk_sale_results(lines, chunk_size), content_type='application/x-ndjson')
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def sales_quote(request):
+    """
+    Price a cart without saving it.
+    Body: {items: [{titleId, quantity, rate?, exchangeRate?, discount?}],
+           bill_discount?, bill_discount_amount?, round_off?}
+    Rate and tax come from the title price cache unless a line gives its own
+    rate; round_off defaults to rounding the bill to the nearest rupee.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+        items = data.get('items')
+        if not isinstance(items, list) or not items:
+            return JsonResponse({'error': 'Items must be a non-empty list'}, status=400)
+
+        round_off = data.get('round_off')
+        with connection.cursor() as cursor:
+            lines, totals = quote(
+                cursor,
+                items,
+                data.get('bill_discount') or 0,
+                data.get('bill_discount_amount') or 0,
+                None if round_off in (None, '') else round_off,
+            )
+
+        return JsonResponse({
+            'items': [
+                {
+                    'titleId': line['titleId'],
+                    'itemName': line['itemName'],
+                    'language': line['language'],
+                    'quantity': float(line['quantity']),
+                    'rate': float(line['rate']),
+                    'exchangeRate': float(line['exchangeRate']),
+                    'discount': float(line['discount']),
+                    'tax': float(line['tax']),
+                    'value': float(line['value']),
+                    'allocatedBillDiscount': float(line['allocatedBillDiscount']),
+                    'taxAmount': float(line['taxAmount']),
+                }
+                for line in lines
+            ],
+            **{k: float(v) for k, v in totals.items()},
+        }, json_dumps_params={'ensure_ascii': False})
+    except (PricingError, ArithmeticError, ValueError, TypeError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Error in sales_quote: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+# All lines of an inward in one statement, in payload order, with sgst / cgst
+# and purchase_cost derived as on an edit (line_sync.PURCHASE_ITEM_DERIVED).
+# A new line's closing is its whole quantity.
+INSERT_PURCHASE_ITEMS_SQL = f"""
+    INSERT INTO purchase_items (purchase_id, title_id, rate, exchange_rate, discount_p, discount_a, quantity,
+                                closing, currency_id, sgst, cgst, isbn, purchase_cost)
+    SELECT %s, V.title_id, V.rate, V.exchange_rate, V.discount_p, V.discount_a, V.quantity,
+           V.quantity, V.currency_id,
+           {PURCHASE_ITEM_DERIVED['sgst']}, {PURCHASE_ITEM_DERIVED['cgst']},
+           V.isbn,
+           {PURCHASE_ITEM_DERIVED['purchase_cost']}
+      FROM unnest(%s::int4[], %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[], %s::numeric[],
+                  %s::int2[], %s::numeric[], %s::varchar[])
+           WITH ORDINALITY AS V(title_id, rate, exchange_rate, discount_p, discount_a, quantity,
+                                currency_id, tax, isbn, ord)
+     ORDER BY V.ord
+    RETURNING title_id, company_id, id, quantity
+"""
+
+
+def insert_purchase_items(cursor, purchase_id, items):
+    """Insert inward lines in one round trip; returns their (title_id, company_id, id, quantity)."""
+    if not items:
+        return []
+    cursor.execute(
+        INSERT_PURCHASE_ITEMS_SQL,
+        [
+            purchase_id,
+            [item['titleId'] for item in items],
+            [item['purchaseRate'] for item in items],
+            [item['exchangeRate'] for item in items],
+            [item['discount'] for item in items],
+            [item['discountAmount'] for item in items],
+            [item['quantity'] for item in items],
+            [item['currencyIndex'] for item in items],
+            [item['tax'] for item in items],
+            [item['isbn'] for item in items],
+        ],
+    )
+    return cursor.fetchall()
+
+
+GOODS_INWARD_TYPES = {'Purchase': 0, 'Return': 1, 'Consignment': 2}
+
+
+def save_new_goods_inward(cursor, header, items):
+    """
+    Write a new inward (purchase header + lines) and post its stock. `header`
+    carries the create_goods_inward fields with the amounts already numeric.
+    Returns (purchase_id, purchase_no).
+    """
+    # running number
+    purchase_no = next_number(cursor, 'PURCHASE', header.get('entry_date'))
+
+    cursor.execute(
+        """
+        INSERT INTO purchase (invoice_no, invoice_date, supplier_id, nett, inward_type, transaction_type, notes, gross, p_breakup_id1, p_breakup_amount1, 
+                            p_breakup_id2, p_breakup_amount2, p_breakup_id3, p_breakup_amount3, p_breakup_id4, p_breakup_amount4, user_id, branch_id,
+                            purchase_no)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id, company_id
+        """,
+        [
+            header['bill_no'],
+            header['bill_date'],
+            header['supplier_id'],
+            header['nett'],
+            1 if header.get('is_cash') == 'Yes' else 0,
+            GOODS_INWARD_TYPES.get(header.get('type'), -1),
+            header.get('notes'),
+            header['gross'],
+            header['p_breakup_id1'],
+            header['p_breakup_amt1'],
+            header['p_breakup_id2'],
+            header['p_breakup_amt2'],
+            header['p_breakup_id3'],
+            header['p_breakup_amt3'],
+            header['p_breakup_id4'],
+            header['p_breakup_amt4'],
+            header['user_id'],
+            header['branches_id'],
+            purchase_no
+        ]
+    )
+    purchase_id, company_id = cursor.fetchone()
+
+    # closing is written with the lines; the engine raises titles.stock
+    # and records the receipt in the ledger
+    lines = insert_purchase_items(cursor, purchase_id, items)
+    apply_movements(cursor, DOC_PURCHASE, purchase_id, net_movements(DOC_PURCHASE, (), lines), batches=False)
+    landed_cost.allocate_purchases(cursor, [purchase_id])
+    payables.post_supplier_document(cursor, payables.DOC_PURCHASE, company_id, purchase_id)
+    return purchase_id, purchase_no
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('create_goods_inward')
 def create_goods_inward(request):
     if request.method == 'POST':
         try:
@@ -529,66 +762,17 @@ def create_goods_inward(request):
                 logger.error(f"Invalid data type: {str(e)}")
                 return JsonResponse({'error': f'Invalid data type: {str(e)}'}, status=400)
 
-            type_mapping = {'Purchase': 0, 'Return': 1, 'Consignment': 2}
+            header = dict(
+                data,
+                gross=gross, nett=nett,
+                p_breakup_id1=p_breakup_id1, p_breakup_amt1=p_breakup_amt1,
+                p_breakup_id2=p_breakup_id2, p_breakup_amt2=p_breakup_amt2,
+                p_breakup_id3=p_breakup_id3, p_breakup_amt3=p_breakup_amt3,
+                p_breakup_id4=p_breakup_id4, p_breakup_amt4=p_breakup_amt4,
+            )
             with transaction.atomic():
-
-                # running number
-                purchase_no = get_next_value(1, '2526', 'PURCHASE')
-
                 with connection.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        INSERT INTO purchase (invoice_no, invoice_date, supplier_id, nett, inward_type, transaction_type, notes, gross, p_breakup_id1, p_breakup_amount1, 
-                                            p_breakup_id2, p_breakup_amount2, p_breakup_id3, p_breakup_amount3, p_breakup_id4, p_breakup_amount4, user_id, branch_id,
-                                            purchase_no)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                        """,
-                        [
-                            data['bill_no'],
-                            data['bill_date'],
-                            data['supplier_id'],
-                            nett,
-                            1 if data['is_cash'] == 'Yes' else 0,
-                            type_mapping.get(data['type'], -1),
-                            data['notes'],
-                            gross,
-                            p_breakup_id1,
-                            p_breakup_amt1,
-                            p_breakup_id2,
-                            p_breakup_amt2,
-                            p_breakup_id3,
-                            p_breakup_amt3,
-                            p_breakup_id4,
-                            p_breakup_amt4,
-                            data['user_id'],
-                            data['branches_id'],
-                            purchase_no
-                        ]
-                    )
-                    purchase_id = cursor.fetchone()[0]
-
-                    for item in data['items']:
-                        cursor.execute(
-                            """
-                            INSERT INTO purchase_items (purchase_id, title_id, rate, exchange_rate, discount_p, discount_a, quantity, closing, currency_id, sgst, cgst, isbn)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            """,
-                            [
-                                purchase_id,
-                                item['titleId'],				
-                                item['purchaseRate'],
-                                item['exchangeRate'],
-                                item['discount'],
-                                item['discountAmount'],
-                                item['quantity'],
-                                item['quantity'],
-                                item['currencyIndex'],				
-                                item['tax'] / 2,
-                                item['tax'] / 2,
-                                item['isbn']
-                            ]
-                        )
+                    purchase_id, purchase_no = save_new_goods_inward(cursor, header, data['items'])
 
             logger.info(f"Purchase created successfully with ID: {purchase_id}")
             return JsonResponse(
@@ -607,114 +791,278 @@ def create_goods_inward(request):
     return JsonResponse({'error': 'Invalid request method'}, status=405)
 
 
-@api_view(['GET', 'PUT'])
+# ---------- supplier invoice import ----------
+
+@api_view(['POST'])
 @permission_classes([IsAuthenticated])
-def get_sale_by_id(request, sale_id):
-    if request.method == 'GET':
-        try:
+def goods_inward_import(request):
+    """
+    Stage a supplier invoice file (multipart field 'file', CSV or XLSX) and
+    match its lines to titles by ISBN. Returns the import summary with the
+    lines that still need a title.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return JsonResponse({'error': 'No file uploaded'}, status=400)
+    try:
+        with transaction.atomic():
             with connection.cursor() as cursor:
-                cursor.execute(
-                    """
-                    SELECT S.id,
-                        S.customer_nm,
-                        S.billing_address,
-                        S.sale_date,
-                        S.mobile_number,
-                        S.type,
-                        S.mode,
-                        S.class,
-                        S.cancel,
-                        S.bill_discount,
-                        S.bill_discount_amount,
-                        S.gross,
-                        S.round_off,
-                        S.bill_amount,
-                        S.note_1,
-                        S.note_2,
-                        S.freight_postage,
-                        S.processing_charge,
-                        S.bill_no,
-                        S.agent_id,
-                        COALESCE(A.agent_nm, '') AS agent_nm,
-                        S.branch_id,
-                        S.cr_customer_id
-                    FROM sales S
-                    LEFT JOIN agents A ON A.id = S.agent_id
-                    WHERE S.id = %s
-                    """,
-                    [sale_id]
+                import_id = invoice_import.stage_file(
+                    cursor, upload.file, upload.name, getattr(request.user, 'id', 0)
                 )
-                sale = cursor.fetchone()
-                if not sale:
-                    logger.warning(f"Sale not found: ID {sale_id}")
-                    return JsonResponse({'error': 'Sale not found'}, status=404)
+                invoice_import.match_titles(cursor, import_id)
+                summary = invoice_import.import_summary(cursor, import_id)
+        logger.info(f"Invoice import {import_id}: {summary['lines']} lines, {summary['unmatched']} unmatched")
+        return JsonResponse(summary, status=201)
+    except Exception as e:
+        logger.error(f"Error in goods_inward_import: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=400)
 
-                sale_type_label = sale_type_mapping.get(sale[5], str(sale[5]))
-                payment_type_label = payment_type_mapping.get(sale[6], str(sale[6]))
-                class_type_label = class_type_mapping.get(sale[7], str(sale[7]))
-
-                sale_data = {
-                    'id': sale[0],
-                    'customer_nm': sale[1],
-                    'billing_address': sale[2],
-                    'sale_date': sale[3],
-                    'mobile_number': sale[4],
-                    'type': sale_type_label,
-                    'mode': payment_type_label,
-                    'class': class_type_label,
-                    'cancel': 'Yes' if sale[8] == 1 else 'No',
-                    'bill_discount': float(sale[9]) if sale[9] is not None else 0.0,
-                    'bill_discount_amount': float(sale[10]) if sale[10] is not None else 0.0,
-                    'gross': float(sale[11]) if sale[11] is not None else 0.0,
-                    'round_off': float(sale[12]) if sale[12] is not None else 0.0,
-                    'bill_amount': float(sale[13]) if sale[13] is not None else 0.0,
-                    'note_1': sale[14] or '',
-                    'note_2': sale[15] or '',
-                    'freight_postage': float(sale[16]) if sale[16] is not None else 0.0,
-                    'processing_charge': float(sale[17]) if sale[17] is not None else 0.0,
-                    'bill_no': sale[18],
-                    'agent_id': sale[19] or 0,
-                    'agent_nm': sale[20] or '',
-                    'branch_id': sale[21] or 0,
-                    'customer_id': sale[22] or 0,   # from cr_customer_id
-                    'items': [],
-                }
+
+@api_view(['GET', 'PATCH'])
+@permission_classes([IsAuthenticated])
+def goods_inward_import_detail(request, import_id):
+    """GET the summary of an import; PATCH {"lines": [...]} to correct or skip lines."""
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                if request.method == 'PATCH':
+                    cursor.execute(
+                        "SELECT purchase_id FROM purchase_imports WHERE id = %s FOR UPDATE",
+                        [import_id],
+                    )
+                    row = cursor.fetchone()
+                    if row and row[0] is not None:
+                        return JsonResponse({'error': 'Import already posted'}, status=400)
+                    if row:
+                        invoice_import.correct_lines(cursor, import_id, request.data.get('lines') or [])
+                summary = invoice_import.import_summary(cursor, import_id)
+        if summary is None:
+            return JsonResponse({'error': 'Import not found'}, status=404)
+        return JsonResponse(summary)
+    except Exception as e:
+        logger.error(f"Error in goods_inward_import_detail: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=400)
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def goods_inward_import_post(request, import_id):
+    """
+    Post a fully matched import as a goods inward. The body carries the
+    inward header (supplier_id, bill_no, bill_date, user_id, branches_id and
+    optionally currency_id, exchange_rate, type, is_cash, notes, gross, nett).
+    Posting an import twice returns the inward made the first time.
+    """
+    data = request.data
+    for field in ['supplier_id', 'bill_no', 'bill_date', 'user_id', 'branches_id']:
+        if data.get(field) in (None, ''):
+            return JsonResponse({'error': f'Missing or null field: {field}'}, status=400)
+    try:
+        currency_id = int(data.get('currency_id') or 1)
+        exchange_rate = float(data.get('exchange_rate') or 1)
+        with transaction.atomic():
+            with connection.cursor() as cursor:
                 cursor.execute(
-                    """
-                    SELECT CASE WHEN T.language_id = 1 THEN T.title_m ELSE T.title END AS item_name, SI.exchange_rate, SI.quantity, 
-                           SI.rate, SI.tax, SI.discount_p, SI.line_value, SI.currency_id, SI.title_id, T.language_id, C.currency_name,
-                           SI.allocated_bill_discount, SI.purchase_company_id, SI.purchase_id, SI.purchase_item_id
-                      FROM sale_items SI
-                      JOIN titles     T ON (SI.title_id   = T.id)
-                      JOIN currencies C ON (SI.currency_id = C.id)
-                     WHERE sale_id = %s
-                    """,
-                    [sale_id]
+                    "SELECT purchase_id, file_name FROM purchase_imports WHERE id = %s FOR UPDATE",
+                    [import_id],
                 )
-                items = cursor.fetchall()
-                for item in items:
-                    sale_data['items'].append({
-                        'itemName': item[0],
-                        'exchangeRate': float(item[1]) if item[1] is not None else 0.0,
-                        'quantity': float(item[2]),
-                        'rate': float(item[3]),
-                        'tax': float(item[4]) if item[4] is not None else 0.0,
-                        'discount': float(item[5]) if item[5] is not None else 0.0,
-                        'value': float(item[6]),
-                        'currencyIndex': int(item[7]),
-                        'titleId': int(item[8]),
-                        'language': int(item[9]),
-                        'currency': item[10],
-                        'allocatedBillDiscount': float(item[11]) if item[11] is not None else 0.0,
-                        'purchaseCompanyId': int(item[12]) if item[12] is not None else 0,
-                        'purchaseId': int(item[13]) if item[13] is not None else 0,
-                        'purchaseItemId': int(item[14]) if item[13] is not None else 0,
+                row = cursor.fetchone()
+                if not row:
+                    return JsonResponse({'error': 'Import not found'}, status=404)
+                if row[0] is not None:
+                    cursor.execute("SELECT purchase_no FROM purchase WHERE id = %s", [row[0]])
+                    posted = cursor.fetchone()
+                    return JsonResponse({
+                        'message': 'Import already posted',
+                        'purchase_id': row[0],
+                        'purchase_no': posted[0] if posted else None,
                     })
 
+                items = invoice_import.posting_items(cursor, import_id, currency_id, exchange_rate)
+                total = round(sum(item['value'] for item in items), 2)
+                header = {
+                    'supplier_id': int(data['supplier_id']),
+                    'bill_no': data['bill_no'],
+                    'bill_date': data['bill_date'],
+                    'entry_date': data.get('entry_date'),
+                    'user_id': int(data['user_id']),
+                    'branches_id': int(data['branches_id']),
+                    'type': data.get('type') or 'Purchase',
+                    'is_cash': data.get('is_cash') or 'No',
+                    'notes': data.get('notes') or f"Imported from {row[1]}",
+                    'gross': float(data.get('gross') or total),
+                    'nett': float(data.get('nett') or total),
+                }
+                for n in range(1, 5):
+                    header[f'p_breakup_id{n}'] = 0
+                    header[f'p_breakup_amt{n}'] = 0.0
+                purchase_id, purchase_no = save_new_goods_inward(cursor, header, items)
+                cursor.execute(
+                    "UPDATE purchase_imports SET purchase_id = %s, posted_at = now() WHERE id = %s",
+                    [purchase_id, import_id],
+                )
+        logger.info(f"Invoice import {import_id} posted as purchase {purchase_id}")
+        return JsonResponse(
+            {
+                'message': 'Purchase saved successfully',
+                'purchase_no': purchase_no,
+                'purchase_id': purchase_id,
+                'lines': len(items),
+            },
+            status=201
+        )
+    except Exception as e:
+        logger.error(f"Error in goods_inward_import_post: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+# The whole bill as JSON in one statement; labels for the coded columns come
+# in as arrays indexed by code. Names joined from agents / titles / currencies
+# are not part of the version, so the ETag is weak.
+SALE_BILL_JSON_SQL = """
+    SELECT json_build_object(
+               'id', S.id,
+               'customer_nm', S.customer_nm,
+               'billing_address', S.billing_address,
+               'sale_date', S.sale_date,
+               'mobile_number', S.mobile_number,
+               'type', COALESCE((%s::text[])[S.type + 1], S.type::text),
+               'mode', COALESCE((%s::text[])[S.mode + 1], S.mode::text),
+               'class', COALESCE((%s::text[])[S.class + 1], S.class::text),
+               'cancel', CASE WHEN S.cancel = 1 THEN 'Yes' ELSE 'No' END,
+               'bill_discount', COALESCE(S.bill_discount, 0)::float8,
+               'bill_discount_amount', COALESCE(S.bill_discount_amount, 0)::float8,
+               'gross', COALESCE(S.gross, 0)::float8,
+               'round_off', COALESCE(S.round_off, 0)::float8,
+               'bill_amount', COALESCE(S.bill_amount, 0)::float8,
+               'note_1', COALESCE(S.note_1, ''),
+               'note_2', COALESCE(S.note_2, ''),
+               'freight_postage', COALESCE(S.freight_postage, 0)::float8,
+               'processing_charge', COALESCE(S.processing_charge, 0)::float8,
+               'bill_no', S.bill_no,
+               'agent_id', S.agent_id,
+               'agent_nm', COALESCE(A.agent_nm, ''),
+               'branch_id', S.branch_id,
+               'customer_id', S.cr_customer_id,
+               'items', COALESCE(I.items, '[]'::json)
+           )::text,
+           S.row_version
+      FROM sales S
+      LEFT JOIN agents A ON A.id = S.agent_id
+      LEFT JOIN LATERAL (
+          SELECT json_agg(json_build_object(
+                     'itemName', CASE WHEN T.language_id = 1 THEN T.title_m ELSE T.title END,
+                     'title', T.title,
+                     'exchangeRate', SI.exchange_rate::float8,
+                     'quantity', SI.quantity::float8,
+                     'rate', SI.rate::float8,
+                     'tax', SI.tax::float8,
+                     'discount', SI.discount_p::float8,
+                     'value', SI.line_value::float8,
+                     'currencyIndex', SI.currency_id,
+                     'titleId', SI.title_id,
+                     'language', T.language_id,
+                     'currency', C.currency_name,
+                     'allocatedBillDiscount', SI.allocated_bill_discount::float8,
+                     'purchaseCompanyId', SI.purchase_company_id,
+                     'purchaseId', SI.purchase_id,
+                     'purchaseItemId', SI.purchase_item_id,
+                     'itemId', SI.id
+                 ) ORDER BY SI.id) AS items
+            FROM sale_items SI
+            JOIN titles     T ON (SI.title_id   = T.id)
+            JOIN currencies C ON (SI.currency_id = C.id)
+           WHERE SI.sale_id = S.id
+      ) I ON true
+     WHERE S.id = %s
+"""
+
+
+def _sale_bill_json(cursor, sale_id):
+    """(bill JSON text, row_version) of a sale, or None."""
+    cursor.execute(
+        SALE_BILL_JSON_SQL,
+        [
+            [sale_type_mapping.get(n, str(n)) for n in range(max(sale_type_mapping) + 1)],
+            [payment_type_mapping.get(n, str(n)) for n in range(max(payment_type_mapping) + 1)],
+            [class_type_mapping.get(n, str(n)) for n in range(max(class_type_mapping) + 1)],
+            sale_id,
+        ]
+    )
+    return cursor.fetchone()
+
+
+def _sale_etag(sale_id, row_version):
+    return f'W/"sale-{sale_id}-{row_version}"'
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def sale_receipt(request, sale_id):
+    """
+    Printable receipt of a bill: ?output=escpos (default, raw bytes for a
+    thermal printer) or pdf, ?width=48 (80 mm roll) or 32 (58 mm roll).
+    (DRF reserves ?format= for content negotiation.)
+    """
+    try:
+        fmt = request.GET.get('output') or receipts.FORMAT_ESCPOS
+        if fmt not in receipts.CONTENT_TYPES:
+            return JsonResponse({'error': f'Unknown output: {fmt}'}, status=400)
+        width = int(request.GET.get('width') or receipts.DEFAULT_WIDTH)
+        if width not in receipts.PAPER_WIDTHS:
+            return JsonResponse({'error': f'width must be one of {receipts.PAPER_WIDTHS}'}, status=400)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT row_version, company_id FROM sales WHERE id = %s", [sale_id])
+            row = cursor.fetchone()
+            if not row:
+                return JsonResponse({'error': 'Sale not found'}, status=404)
+            row_version, company_id = row
+
+            def load():
+                return (
+                    json.loads(_sale_bill_json(cursor, sale_id)[0]),
+                    receipts.company_header(cursor, company_id),
+                )
+
+            body = receipts.cached_render((sale_id, row_version), load, fmt, width)
+
+        response = HttpResponse(body, content_type=receipts.CONTENT_TYPES[fmt])
+        extension = 'pdf' if fmt == receipts.FORMAT_PDF else 'bin'
+        response['Content-Disposition'] = f'inline; filename="bill-{sale_id}.{extension}"'
+        return response
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Error in sale_receipt: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def get_sale_by_id(request, sale_id):
+    if request.method == 'GET':
+        try:
+            with connection.cursor() as cursor:
+                etag = request.headers.get('If-None-Match')
+                if etag:
+                    cursor.execute("SELECT row_version FROM sales WHERE id = %s", [sale_id])
+                    row = cursor.fetchone()
+                    if row and etag == _sale_etag(sale_id, row[0]):
+                        return HttpResponseNotModified(headers={'ETag': etag, 'Cache-Control': 'private, no-cache'})
+
+                sale = _sale_bill_json(cursor, sale_id)
+                if not sale:
+                    logger.warning(f"Sale not found: ID {sale_id}")
+                    return JsonResponse({'error': 'Sale not found'}, status=404)
+
             logger.info(f"Sale retrieved successfully: ID {sale_id}")
-            return JsonResponse(sale_data, safe=False)
+            return HttpResponse(
+                sale[0],
+                content_type='application/json',
+                headers={'ETag': _sale_etag(sale_id, sale[1]), 'Cache-Control': 'private, no-cache'},
+            )
 
         except Exception as e:
             logger.error(f"Error in get_sale_by_id (GET): {str(e)}")
@@ -821,17 +1169,18 @@ def get_sale_by_id(request, sale_id):
                 logger.error(f"Invalid data type: {str(e)}")
                 return JsonResponse({'error': f'Invalid data type: {str(e)}'}, status=400)
 
-            total_value = sum(item['value'] for item in data['items'])
-            for item in data['items']:
-                item['allocatedBillDiscount'] = 0.0
-                if not has_item_discount and total_value > 0:
-                    if bill_discount > 0:
-                        total_discount = gross * bill_discount / 100
-                        item['allocatedBillDiscount'] = (item['value'] / total_value) * total_discount
-                    elif bill_discount_amount > 0:
-                        item['allocatedBillDiscount'] = (item['value'] / total_value) * bill_discount_amount
-
-            with connection.cursor() as cursor:
+            # Reprice with the pricing engine: rejects totals that disagree with the
+            # lines and shares the bill discount out to the paisa
+            try:
+                shares = check_sale_totals(data['items'], gross, bill_discount, bill_discount_amount, round_off, bill_amount)
+            except PricingError as e:
+                logger.error(f"Validation failed: {str(e)}")
+                return JsonResponse({'error': str(e)}, status=400)
+            for item, share in zip(data['items'], shares):
+                item['allocatedBillDiscount'] = float(share)
+
+            with transaction.atomic(), connection.cursor() as cursor:
+                stock_before = document_lines(cursor, DOC_SALE, sale_id)
                 cursor.execute(
                     """
                     UPDATE sales
@@ -882,31 +1231,12 @@ def get_sale_by_id(request, sale_id):
                     ]
                 )
 
-                cursor.execute("DELETE FROM sale_items WHERE sale_id = %s", [sale_id])
+                data['items'] = allocate_fifo(cursor, data['items'], stock_before)
 
-                for item in data['items']:
-                    cursor.execute(
-                        """
-                        INSERT INTO sale_items (sale_id, exchange_rate, quantity, rate, tax, discount_p, line_value, currency_id, title_id, 
-                                                allocated_bill_discount, purchase_company_id, purchase_id, purchase_item_id)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """,
-                        [
-                            sale_id,
-                            item['exchangeRate'],
-                            item['quantity'],
-                            item['rate'],
-                            item['tax'],
-                            item['discount'],
-                            item['value'],
-                            item['currencyIndex'],
-                            item['titleId'],
-                            item['allocatedBillDiscount'],
-                            item['purchaseCompanyId'],
-                            item['purchaseId'],
-                            item['purchaseItemId'],
-                        ]
-                    )
+                # update / insert / delete only what changed, keeping line ids stable
+                sync_sale_items(cursor, sale_id, data['items'])
+                post_document(cursor, DOC_SALE, sale_id, stock_before)
+                transaction.on_commit(flush_sales_customers, robust=True)
 
             logger.info(f"Sale updated successfully: ID {sale_id}")
             return JsonResponse({'message': 'Sale updated successfully'}, status=200)
@@ -1096,7 +1426,7 @@ def get_goods_inward_by_id(request, goods_inward_purchase_no):
                 return JsonResponse({'error': f'Invalid data type: {str(e)}'}, status=400)
 
             type_mapping = {'Purchase': 0, 'Return': 1, 'Consignment': 2}
-            with connection.cursor() as cursor:
+            with transaction.atomic(), connection.cursor() as cursor:
                 goods_inward_id = int(data.get('id') or 0)
                 if goods_inward_id <= 0:
                     cursor.execute(
@@ -1130,6 +1460,7 @@ def get_goods_inward_by_id(request, goods_inward_purchase_no):
                         user_id = %s,
                         branch_id = %s
                     WHERE id = %s
+                    RETURNING company_id
                     """,
                     [
                         data['bill_no'],
@@ -1153,74 +1484,31 @@ def get_goods_inward_by_id(request, goods_inward_purchase_no):
                         goods_inward_id
                     ]
                 )
+                row = cursor.fetchone()
+                if not row:
+                    return JsonResponse({'error': 'Goods Inward not found'}, status=404)
+                payables.post_supplier_document(cursor, payables.DOC_PURCHASE, row[0], goods_inward_id)
 
-                cursor.execute("SELECT id FROM purchase_items WHERE purchase_id = %s", [goods_inward_id])
-                existing_rows = {row[0] for row in cursor.fetchall()}
-                payload_ids = set()
-
-                for item in data['items']:
-                    if item['itemId'] and item['itemId'] in existing_rows:
-                        payload_ids.add(item['itemId'])
-                        cursor.execute(
-                            """
-                            UPDATE purchase_items
-                               SET title_id = %s,
-                                   rate = %s,
-                                   exchange_rate = %s,
-                                   discount_p = %s,
-                                   discount_a = %s,
-                                   quantity = %s,
-                                   closing = %s,
-                                   currency_id = %s,
-                                   sgst = %s,
-                                   cgst = %s,
-                                   isbn = %s
-                             WHERE id = %s
-                            """,
-                            [
-                                item['titleId'],
-                                item['purchaseRate'],
-                                item['exchangeRate'],
-                                item['discount'],
-                                item['discountAmount'],
-                                item['quantity'],
-                                item['quantity'],
-                                item['currencyIndex'],
-                                item['tax'] / 2,
-                                item['tax'] / 2,
-                                item['isbn'],
-                                item['itemId']
-                            ]
-                        )
-                    else:
-                        cursor.execute(
-                            """
-                            INSERT INTO purchase_items (purchase_id, title_id, rate, exchange_rate, discount_p, discount_a, quantity, closing, currency_id, sgst, cgst, isbn)
-                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                            """,
-                            [
-                                goods_inward_id,
-                                item['titleId'],
-                                item['purchaseRate'],
-                                item['exchangeRate'],
-                                item['discount'],
-                                item['discountAmount'],
-                                item['quantity'],
-                                item['quantity'],
-                                item['currencyIndex'],
-                                item['tax'] / 2,
-                                item['tax'] / 2,
-                                item['isbn']
-                            ]
-                        )
+                lines = [
+                    {
+                        'id': item['itemId'],
+                        'title_id': item['titleId'],
+                        'rate': item['purchaseRate'],
+                        'exchange_rate': item['exchangeRate'],
+                        'discount_p': item['discount'],
+                        'discount_a': item['discountAmount'],
+                        'quantity': item['quantity'],
+                        'currency_id': item['currencyIndex'],
+                        'isbn': item['isbn'],
+                        'tax': item['tax'],
+                    }
+                    for item in data['items']
+                ]
+                before, after = sync_lines(cursor, 'purchase_items', {'purchase_id': goods_inward_id}, lines)
 
-                # delete only rows not present in payload
-                ids_to_delete = existing_rows - payload_ids
-                if ids_to_delete:
-                    cursor.execute(
-                        "DELETE FROM purchase_items WHERE purchase_id = %s AND id = ANY(%s)",
-                        [goods_inward_id, list(ids_to_delete)]
-                    )
+                # closing moves by the quantity change, not back to the received quantity
+                apply_movements(cursor, DOC_PURCHASE, goods_inward_id, net_movements(DOC_PURCHASE, before, after))
+                landed_cost.allocate_purchases(cursor, [goods_inward_id])
 
             logger.info(f"Goods Inward updated successfully: ID {goods_inward_id}")
             return JsonResponse({'message': 'Goods Inward updated successfully'}, status=200)
@@ -1296,8 +1584,7 @@ def batch_select(request):
             cursor.execute(
                 """
                 SELECT S.supplier_nm, P.entry_date, PD.rate, PD.exchange_rate, C.currency_name, PD.sgst + PD.cgst AS tax, PD.discount_p, PD.closing, 
-                       PD.origin_company_id AS purchase_company_id, PD.origin_purchase_id AS purchase_id, 
-                       PD.origin_purchase_items_id AS purchase_item_id
+                       PD.company_id AS purchase_company_id, PD.purchase_id, PD.id AS purchase_item_id
                   FROM titles T JOIN purchase_items PD ON (T.id = PD.title_id)
                                 JOIN purchase P ON (P.id = PD.purchase_id)
                                 JOIN suppliers S ON (S.id = P.supplier_id)
@@ -1912,6 +2199,7 @@ def title_update(request, id):
             )
             if cursor.rowcount == 0:
                 return JsonResponse({'error': f'Title with id {id} not found'}, status=404)
+        invalidate_titles([id])
         return JsonResponse({'message': 'Title updated successfully'}, status=200)
     except Exception as e:
         logger.error(f"Error in title_update: {str(e)}")
@@ -1933,6 +2221,7 @@ def title_delete(request, id):
             )
             if cursor.rowcount == 0:
                 return JsonResponse({'error': f'Title with id {id} not found'}, status=404)
+        invalidate_titles([id])
         return JsonResponse({'message': 'Title deleted successfully'}, status=200)
     except Exception as e:
         logger.error(f"Error in title_delete: {str(e)}")
@@ -2527,6 +2816,31 @@ def supplier_update(request, id):
         logger.error(f"Error in supplier_update: {str(e)}")
         return JsonResponse({'error': str(e)}, status=400)
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def supplier_aging(request):
+    """
+    What is owed to each supplier (or one, with supplier_id) and how overdue,
+    from the maintained payables ledger. as_of defaults to today.
+    """
+    try:
+        as_of = request.GET.get('as_of')
+        if as_of and parse_date(as_of) is None:
+            return JsonResponse({'error': 'Invalid as_of date'}, status=400)
+        try:
+            supplier_id = int(request.GET.get('supplier_id') or 0)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid supplier_id'}, status=400)
+
+        with connection.cursor() as cursor:
+            rows = payables.supplier_aging(cursor, parse_date(as_of) if as_of else None, supplier_id)
+
+        totals = {key: round(sum(r[key] for r in rows), 2) for key in ['balance', *payables.AGING_BUCKETS]}
+        return JsonResponse({'results': rows, 'totals': totals}, json_dumps_params={'ensure_ascii': False})
+    except Exception as e:
+        logger.error(f"Error in supplier_aging: {str(e)}")
+        return JsonResponse({'error': str(e)}, status=400)
+
 ################### CREDIT CUSTOMER MASTER ###################
 
 @api_view(['POST'])
@@ -4079,11 +4393,11 @@ def purchase_breakup_create(request):
         with connection.cursor() as cursor:
             cursor.execute(
                 """
-                INSERT INTO purchase_breakups (breakup_nm)
-                VALUES (%s)
+                INSERT INTO purchase_breakups (breakup_nm, allocate_by)
+                VALUES (%s, %s)
                 RETURNING id
                 """,
-                [data['breakup_nm']]
+                [data['breakup_nm'], data.get('allocate_by') or 'V']
             )
             new_id = cursor.fetchone()[0]
         return JsonResponse({'message': 'Purchase breakup created successfully', 'id': new_id}, status=201)
@@ -4128,7 +4442,7 @@ def purchase_breakups_master_search(request):
                 total = cursor.fetchone()[0] or 0
                 cursor.execute(
                     f"""
-                    SELECT id, breakup_nm
+                    SELECT id, breakup_nm, allocate_by
                       FROM purchase_breakups
                       {where_clause}
                   ORDER BY breakup_nm
@@ -4141,7 +4455,7 @@ def purchase_breakups_master_search(request):
             with connection.cursor() as cursor:
                 cursor.execute(
                     f"""
-                    SELECT id, breakup_nm
+                    SELECT id, breakup_nm, allocate_by
                       FROM purchase_breakups
                       {where_clause}
                   ORDER BY breakup_nm
@@ -4156,7 +4470,8 @@ def purchase_breakups_master_search(request):
         suggestions = [
             {
                 'id': row[0],
-                'breakup_nm': row[1] or ''
+                'breakup_nm': row[1] or '',
+                'allocate_by': row[2]
             }
             for row in results
         ]
@@ -4189,11 +4504,12 @@ def purchase_breakup_update(request, id):
             cursor.execute(
                 """
                 UPDATE purchase_breakups
-                SET breakup_nm = %s
+                SET breakup_nm = %s,
+                    allocate_by = COALESCE(%s, allocate_by)
                 WHERE id = %s
                 RETURNING id
                 """,
-                [data['breakup_nm'], id]
+                [data['breakup_nm'], data.get('allocate_by'), id]
             )
             if cursor.rowcount == 0:
                 return JsonResponse({'error': f'Purchase breakup with id {id} not found'}, status=404)
@@ -4451,7 +4767,8 @@ def purchase_search(request):
 @permission_classes([IsAuthenticated])
 def get_purchase_items_by_id(request, purchase_id):
     """
-    Retrieve purchase items by purchase ID for the popup.
+    Retrieve purchase items by purchase ID for the popup, with each batch's
+    received / sold / returned totals and the quantity still returnable.
     """
     print("purchase_id=", purchase_id)
     try:
@@ -4472,10 +4789,16 @@ def get_purchase_items_by_id(request, purchase_id):
                        T.language_id,
                        PI.company_id AS origin_company_id,
                        PI.purchase_id AS origin_purchase_id,
-                       PI.id AS origin_purchase_items_id
+                       PI.id AS origin_purchase_items_id,
+                       COALESCE(L.received, PI.quantity),
+                       COALESCE(L.sold, 0),
+                       COALESCE(L.sale_returned, 0),
+                       COALESCE(L.returned, 0),
+                       COALESCE(L.available, PI.closing)
                   FROM purchase_items PI
                   JOIN titles T ON (PI.title_id = T.id)
                   JOIN currencies C ON (PI.currency_id = C.id)
+                  LEFT JOIN purchase_batch_ledger L ON L.company_id = PI.company_id AND L.item_id = PI.id
                  WHERE PI.purchase_id = %s
                 """,
                 [purchase_id]
@@ -4499,6 +4822,12 @@ def get_purchase_items_by_id(request, purchase_id):
                     'origin_company_id': int(row[11]) if row[11] is not None else 0,
                     'origin_purchase_id': int(row[12]) if row[12] is not None else 0,
                     'origin_purchase_items_id': int(row[13]) if row[13] is not None else 0,
+                    # batch ledger (migration 0032): what the clerk can still send back
+                    'received': float(row[14]),
+                    'sold': float(row[15]),
+                    'sale_returned': float(row[16]),
+                    'returned': float(row[17]),
+                    'returnable': max(float(row[18]), 0.0),
                 }
                 for row in items
             ]
@@ -4539,18 +4868,64 @@ def resolve_supplier_id(cur, supplier_id=None, supplier_nm=None):
     except Exception:
         sid = None
 
-    if sid is not None:
-        row = _fetch_one(cur, "SELECT id FROM suppliers WHERE id=%s", [sid])
-        if row:
-            return sid
+    row = _fetch_one(
+        cur,
+        """
+        SELECT COALESCE(
+                   (SELECT id FROM suppliers WHERE id = %s),
+                   (SELECT id FROM suppliers WHERE supplier_nm = %s),
+                   0)
+        """,
+        [sid, _str(supplier_nm, '') or None],
+    )
+    return _int(row[0], 0)
+
+
+# Every line's title in one statement. COALESCE keeps the lookup order
+# (explicit id, isbn, title_m, title) and stops at the first hit, each step
+# an index probe (migration 0029); several titles sharing a name resolve to
+# the lowest id.
+RESOLVE_TITLE_IDS_SQL = """
+    SELECT K.ord,
+           COALESCE(
+               (SELECT T.id FROM titles T WHERE T.id = K.title_id),
+               (SELECT T.id FROM titles T WHERE T.isbn = K.isbn ORDER BY T.id LIMIT 1),
+               (SELECT T.id FROM titles T WHERE T.title_m = K.title_m ORDER BY T.id LIMIT 1),
+               (SELECT T.id FROM titles T WHERE T.title = K.title ORDER BY T.id LIMIT 1),
+               0)
+      FROM unnest(%s::int4[], %s::varchar[], %s::varchar[], %s::varchar[])
+           WITH ORDINALITY AS K(title_id, isbn, title_m, title, ord)
+     ORDER BY K.ord
+"""
+
+
+def _title_key(item):
+    """(title_id, isbn, title_m, title) an item can be resolved by; None where absent."""
+    try:
+        tid = int(item.get('title_id')) if item.get('title_id') not in (None, '') else None
+    except Exception:
+        tid = None
+    title_m = _str(item.get('title_m'))
+    if not title_m:
+        # some UIs carry the Malayalam title in 'itemName' or 'title'
+        title_m = _str(item.get('itemName')) if item.get('language_id') == 1 else ''
+    title = _str(item.get('title')) or _str(item.get('itemName'))
+    return (tid, _str(item.get('isbn')) or None, title_m or None, title or None)
+
 
-    name = _str(supplier_nm, '')
-    if name:
-        row = _fetch_one(cur, "SELECT id FROM suppliers WHERE supplier_nm = %s", [name])
-        if row:
-            return _int(row[0], 0)
+def resolve_title_ids(cur, items):
+    """
+    resolve_title_id() for every item in one round trip; lines repeating a
+    key are looked up once. Returns the ids in item order.
+    """
+    keys = [_title_key(item) for item in items]
+    distinct = list(dict.fromkeys(keys))
+    if not distinct:
+        return []
+    cur.execute(RESOLVE_TITLE_IDS_SQL, [list(col) for col in zip(*distinct)])
+    resolved = {key: _int(row[1], 0) for key, row in zip(distinct, cur.fetchall())}
+    return [resolved[key] for key in keys]
 
-    return 0
 
 def resolve_title_id(cur, item):
     """
@@ -4558,46 +4933,34 @@ def resolve_title_id(cur, item):
     Accepts any dict with keys: title_id, isbn, title_m, title, itemName.
     Returns 0 if not found.
     """
-    # explicit
-    try:
-        tid = int(item.get('title_id')) if item.get('title_id') not in (None, '') else None
-    except Exception:
-        tid = None
-    if tid is not None:
-        row = _fetch_one(cur, "SELECT id FROM titles WHERE id=%s", [tid])
-        if row:
-            return tid
-
-    # by isbn
-    isbn = _str(item.get('isbn'))
-    if isbn:
-        row = _fetch_one(cur, "SELECT id FROM titles WHERE isbn = %s", [isbn])
-        if row:
-            return _int(row[0], 0)
-
-    # by title_m
-    title_m = _str(item.get('title_m'))
-    if not title_m:
-        # some UIs carry the Malayalam title in 'itemName' or 'title'
-        title_m = _str(item.get('itemName')) if item.get('language_id') == 1 else ''
-    if title_m:
-        row = _fetch_one(cur, "SELECT id FROM titles WHERE title_m = %s", [title_m])
-        if row:
-            return _int(row[0], 0)
+    return resolve_title_ids(cur, [item])[0]
 
-    # by title
-    title = _str(item.get('title')) or _str(item.get('itemName'))
-    if title:
-        row = _fetch_one(cur, "SELECT id FROM titles WHERE title = %s", [title])
-        if row:
-            return _int(row[0], 0)
 
-    return 0
+def purchase_rt_lines(cur, rows):
+    """purchase_rt_items payload rows as line_sync lines, titles resolved in one query."""
+    return [
+        {
+            'id': _int(item.get('id') or item.get('row_id') or 0, 0),
+            'title_id': title_id,
+            'quantity': _num(item.get('quantity', 0.0)),
+            'rate': _num(item.get('rate', 0.0)),
+            'exchange_rate': _num(item.get('exchange_rate', 0.0)),
+            'adjusted_amount': _num(item.get('adjusted_amount', 0.0)),
+            'discount': _num(item.get('discount', 0.0)),
+            'line_value': _num(item.get('line_value', 0.0)),
+            'purchase_det_id': _int(item.get('purchase_det_id', 0), 0),
+            'currency_id': _int(item.get('currency_id', 0), 0),
+            'purchase_company_id': _int(item.get('purchase_company_id', 0), 0),
+            'purchase_id': _int(item.get('purchase_id', 0), 0),
+        }
+        for item, title_id in zip(rows, resolve_title_ids(cur, rows))
+    ]
 
 
 # ---------- endpoints ----------
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('goods_inward')
 def goods_inward(request):
     try:
         data = request.data or {}
@@ -4617,18 +4980,11 @@ def goods_inward(request):
                 company_id = _int(pr.get('company_id', 1))
                 entry_date = _str(pr.get('entry_date')) or None  # let DB default if empty
 
-                # lock for id allocation
-                cur.execute("SELECT pg_advisory_xact_lock(%s, %s)", [company_id, 9001])
-
                 # allocate next id per company
-                cur.execute(
-                    "SELECT COALESCE(MAX(id), 0) + 1 FROM purchase_rt WHERE company_id = %s",
-                    [company_id],
-                )
-                parent_id = _int(cur.fetchone()[0], 1)
+                parent_id = next_id(cur, 'purchase_rt', company_id)
 
                 # running number
-                purchase_rt_no = get_next_value(1, '2526', 'PURCHASE_RT')
+                purchase_rt_no = next_number(cur, 'PURCHASE_RT', entry_date)
 
                 # INSERT parent – note: NO bill_no here
                 cur.execute(
@@ -4654,38 +5010,13 @@ def goods_inward(request):
                     ],
                 )
 
-                # INSERT child rows
-                child_id = 0
-                for item in rows:
-                    child_id += 1
-                    title_id = resolve_title_id(cur, item)
-                    currency_id = _int(item.get('currency_id', 0), 0)
-                    purchase_company_id = _int(item.get('purchase_company_id', 0), 0)
-                    purchase_id = _int(item.get('purchase_id', 0), 0)
-                    purchase_det_id = _int(item.get('purchase_det_id', 0), 0)
-                    cur.execute(
-                        """
-                        INSERT INTO purchase_rt_items (company_id, parent_id, id, title_id, quantity, rate, exchange_rate, adjusted_amount, 
-                            discount, line_value, purchase_det_id, currency_id, purchase_company_id, purchase_id)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """,
-                        [
-                            company_id,
-                            parent_id,
-                            child_id,
-                            title_id,
-                            _num(item.get('quantity', 0.0)),
-                            _num(item.get('rate', 0.0)),
-                            _num(item.get('exchange_rate', 0.0)),
-                            _num(item.get('adjusted_amount', 0.0)),
-                            _num(item.get('discount', 0.0)),
-                            _num(item.get('line_value', 0.0)),
-                            purchase_det_id,
-                            currency_id,
-                            purchase_company_id,
-                            purchase_id,
-                        ],
-                    )
+                # child rows: one title lookup and one INSERT for the whole return
+                _, after = sync_lines(
+                    cur, 'purchase_rt_items', {'company_id': company_id, 'parent_id': parent_id},
+                    purchase_rt_lines(cur, rows),
+                )
+                apply_movements(cur, DOC_PURCHASE_RT, parent_id, net_movements(DOC_PURCHASE_RT, (), after))
+                payables.post_supplier_document(cur, payables.DOC_PURCHASE_RT, company_id, parent_id)
 
         return JsonResponse(
             {
@@ -4866,106 +5197,12 @@ def goods_inward_detail(request, id):
                         ],
                     )
 
-                    cur.execute(
-                        "SELECT id FROM purchase_rt_items WHERE parent_id = %s",
-                        [int(id)],
+                    lines = purchase_rt_lines(cur, rows)
+                    before, after = sync_lines(
+                        cur, 'purchase_rt_items', {'company_id': company_id, 'parent_id': int(id)}, lines
                     )
-                    existing_ids = {row[0] for row in cur.fetchall()}
-                    payload_ids = set()
-                    next_id = max(existing_ids) if existing_ids else 0
-
-                    for item in rows:
-                        row_id = _int(item.get('id') or item.get('row_id') or 0, 0)
-                        title_id = resolve_title_id(cur, item)
-                        currency_id = _int(item.get('currency_id', 0), 0)
-                        purchase_company_id = _int(item.get('purchase_company_id', 0), 0)
-                        purchase_id = _int(item.get('purchase_id', 0), 0)
-                        purchase_det_id = _int(item.get('purchase_det_id', 0), 0)
-
-                        if row_id in existing_ids:
-                            payload_ids.add(row_id)
-                            cur.execute(
-                                """
-                                UPDATE purchase_rt_items
-                                   SET title_id = %s,
-                                       quantity = %s,
-                                       rate = %s,
-                                       exchange_rate = %s,
-                                       adjusted_amount = %s,
-                                       discount = %s,
-                                       line_value = %s,
-                                       purchase_det_id = %s,
-                                       currency_id = %s,
-                                       purchase_company_id = %s,
-                                       purchase_id = %s
-                                 WHERE parent_id = %s AND id = %s
-                                """,
-                                [
-                                    title_id,
-                                    float(item.get('quantity', 0.0)),
-                                    float(item.get('rate', 0.0)),
-                                    float(item.get('exchange_rate', 0.0)),
-                                    float(item.get('adjusted_amount', 0.0)),
-                                    float(item.get('discount', 0.0)),
-                                    float(item.get('line_value', 0.0)),
-                                    purchase_det_id,
-                                    currency_id,
-                                    purchase_company_id,
-                                    purchase_id,
-                                    int(id),
-                                    row_id,
-                                ],
-                            )
-                        else:
-                            if row_id <= 0:
-                                next_id += 1
-                                row_id = next_id
-                            payload_ids.add(row_id)
-                            cur.execute(
-                                """
-                                INSERT INTO purchase_rt_items (
-                                    company_id,
-                                    parent_id,
-                                    id,
-                                    title_id,
-                                    quantity,
-                                    rate,
-                                    exchange_rate,
-                                    adjusted_amount,
-                                    discount,
-                                    line_value,
-                                    purchase_det_id,
-                                    currency_id,
-                                    purchase_company_id,
-                                    purchase_id
-                                )
-                                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                                """,
-                                [
-                                    company_id,
-                                    int(id),
-                                    row_id,
-                                    title_id,
-                                    float(item.get('quantity', 0.0)),
-                                    float(item.get('rate', 0.0)),
-                                    float(item.get('exchange_rate', 0.0)),
-                                    float(item.get('adjusted_amount', 0.0)),
-                                    float(item.get('discount', 0.0)),
-                                    float(item.get('line_value', 0.0)),
-                                    purchase_det_id,
-                                    currency_id,
-                                    purchase_company_id,
-                                    purchase_id,
-                                ],
-                            )
-
-                    # delete only rows that were removed
-                    to_delete = existing_ids - payload_ids
-                    if to_delete:
-                        cur.execute(
-                            "DELETE FROM purchase_rt_items WHERE parent_id = %s AND id = ANY(%s)",
-                            [int(id), list(to_delete)],
-                        )
+                    apply_movements(cur, DOC_PURCHASE_RT, int(id), net_movements(DOC_PURCHASE_RT, before, after))
+                    payables.post_supplier_document(cur, payables.DOC_PURCHASE_RT, company_id, int(id))
 
             return JsonResponse(
                 {
@@ -4985,24 +5222,79 @@ def goods_inward_detail(request, id):
 
 
 
+################### DOCUMENT FINDER ###################
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def find_documents(request):
+    """
+    Find documents by number, mobile, customer and date range.
+    Query: types (comma separated: sales, sales_rt, purchase, pp_receipts,
+    remittance, cr_realisation; default all), number, mobile, customer,
+    date_from, date_to, limit, cursor (next_cursor of the previous page).
+    """
+    try:
+        types = [t.strip() for t in (request.GET.get('types') or '').split(',') if t.strip()]
+        date_from = request.GET.get('date_from') or None
+        date_to = request.GET.get('date_to') or None
+        if date_from and not parse_date(date_from) or date_to and not parse_date(date_to):
+            return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
+
+        with connection.cursor() as cursor:
+            rows, next_cursor = document_finder.find_documents(
+                cursor,
+                types=types,
+                number=request.GET.get('number'),
+                mobile=request.GET.get('mobile'),
+                customer=request.GET.get('customer'),
+                date_from=date_from,
+                date_to=date_to,
+                cursor=request.GET.get('cursor'),
+                limit=request.GET.get('limit') or document_finder.DEFAULT_LIMIT,
+            )
+
+        results = [
+            {
+                'type': r[0],
+                'company_id': r[1],
+                'id': r[2],
+                'number': r[3] or '',
+                'date': r[4].isoformat() if r[4] else None,
+                'customer': r[5] or '',
+                'mobile': r[6] or '',
+                'amount': r[7] if r[7] is not None else 0.0,
+            }
+            for r in rows
+        ]
+        return JsonResponse(
+            {'results': results, 'next_cursor': next_cursor},
+            json_dumps_params={'ensure_ascii': False},
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.exception("Error in find_documents")
+        return JsonResponse({'error': str(e)}, status=400)
+
+
 ################### SALE BILL RETURN ###################
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def sales_rt_customers(request):
-    """Distinct customers from sales.customer_nm, return id (min) + customer_nm."""
-    q = (request.GET.get('q') or '').strip()
+    """Customer names from the sales_customers directory, with their latest bill id and mobile number."""
+    q = (request.GET.get('q') or '').strip().lower()
     try:
+        # names of bills written outside these views are still queued
+        flush_sales_customers()
         with connection.cursor() as cur:
             if q:
                 cur.execute(
                     """
-                    SELECT MIN(id) AS id, customer_nm
-                    FROM sales
-                    WHERE customer_nm IS NOT NULL
-                      AND customer_nm ILIKE %s
-                    GROUP BY customer_nm
-                    ORDER BY LOWER(customer_nm)
+                    SELECT last_bill_id, customer_nm, mobile_number
+                    FROM sales_customers
+                    WHERE name_key LIKE %s
+                    ORDER BY name_key
                     LIMIT 20
                     """,
                     [f"{q}%"],
@@ -5010,16 +5302,17 @@ def sales_rt_customers(request):
             else:
                 cur.execute(
                     """
-                    SELECT MIN(id) AS id, customer_nm
-                    FROM sales
-                    WHERE customer_nm IS NOT NULL
-                    GROUP BY customer_nm
-                    ORDER BY LOWER(customer_nm)
+                    SELECT last_bill_id, customer_nm, mobile_number
+                    FROM sales_customers
+                    ORDER BY name_key
                     LIMIT 20
                     """
                 )
             rows = cur.fetchall()
-        return JsonResponse([{'id': r[0], 'customer_nm': r[1]} for r in rows], safe=False)
+        return JsonResponse(
+            [{'id': r[0], 'customer_nm': r[1], 'mobile_number': r[2]} for r in rows],
+            safe=False,
+        )
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
@@ -5071,12 +5364,13 @@ def sales_rt_bill_items(request, sale_id: int):
     Items for a given sale id, including hidden IDs:
     - id (sale_items.id) => returned as 'id'
     - purchase_item_id
-    Also includes computed dis_a as required.
+    Also includes computed dis_a as required, and r_qty, the quantity already
+    returned on earlier sales returns.
     """
     try:
         with connection.cursor() as cur:
             cur.execute(
-                """
+                f"""
                 SELECT
                     si.id,
                     si.purchase_company_id,
@@ -5085,7 +5379,7 @@ def sales_rt_bill_items(request, sale_id: int):
                     si.title_id,
                     COALESCE(t.title, '') AS title,
                     si.quantity,
-                    0.0::numeric AS r_qty,
+                    R.returned AS r_qty,
                     si.rate,
                     COALESCE(c.currency_name, 'Indian Rupees') AS currency_name,
                     si.exchange_rate,
@@ -5095,6 +5389,7 @@ def sales_rt_bill_items(request, sale_id: int):
                       AS dis_a,
                     si.line_value
                 FROM sale_items si
+                CROSS JOIN LATERAL ({sale_returns.RETURNED_SQL}) R
                 LEFT JOIN titles t ON t.id = si.title_id
                 LEFT JOIN currencies c ON c.id = si.currency_id
                 WHERE si.sale_id = %s
@@ -5129,6 +5424,7 @@ def sales_rt_bill_items(request, sale_id: int):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('sales_rt_create')
 def sales_rt_create(request):
     from .views import sale_type_reverse_mapping, payment_type_reverse_mapping  # they already exist in your module
 
@@ -5164,11 +5460,11 @@ def sales_rt_create(request):
         
 
     cr_customer_id = _get_cr_customer_id()
-    sales_rt_no =  get_next_value(1, '2526', 'SALE_RT')
 
     try:
         with transaction.atomic():
             with connection.cursor() as cur:
+                sales_rt_no = next_number(cur, 'SALE_RT', entry_date)
                 # insert header
                 cur.execute(
                     """
@@ -5225,6 +5521,11 @@ def sales_rt_create(request):
                         ],
                     )
 
+                sale_returns.check_returnable(
+                    cur, [(_int(it.get('sale_det_id'), 0), _num(it.get('qty'), 0.0)) for it in rows]
+                )
+                post_document(cur, DOC_SALE_RT, parent_id)
+
         return JsonResponse({'id': parent_id, 'message': 'Sales return created successfully'}, status=201)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
@@ -5266,7 +5567,8 @@ def sales_rt_detail(request, id: int):
                         sri.purchase_company_id,
                         sri.purchase_id,
                         sri.purchase_det_id,
-                        COALESCE(c.currency_name, 'Indian Rupees') AS currency_name
+                        COALESCE(c.currency_name, 'Indian Rupees') AS currency_name,
+                        sri.id
                     FROM sale_rt_items sri
                     LEFT JOIN titles t ON t.id = sri.title_id
                     LEFT JOIN sale_items si ON si.id = sri.sale_det_id
@@ -5314,6 +5616,7 @@ def sales_rt_detail(request, id: int):
                         'purchase_id': int(r[10] or 0),
                         'purchase_det_id': int(r[11] or 0),
                         'currency_name': r[12] or 'Indian Rupees',
+                        'id': int(r[13]),
                     }
                     for r in rows
                 ],
@@ -5399,48 +5702,32 @@ def sales_rt_detail(request, id: int):
                         ],
                     )
 
-                    cur.execute("DELETE FROM sale_rt_items WHERE parent_id = %s", [int(id)])
-
-                    for it in rows:
-                        cur.execute(
-                            """
-                            INSERT INTO sale_rt_items (
-                                company_id,
-                                parent_id,
-                                title_id,
-                                quantity,
-                                rate,
-                                tax,
-                                exchange_rate,
-                                discount_p,
-                                discount_a,
-                                discount,
-                                sale_det_id,
-                                line_value,
-                                purchase_company_id,
-                                purchase_id,
-                                purchase_det_id
-                            )
-                            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-                            """,
-                            [
-                                0,
-                                int(id),
-                                _int(it.get('title_id'), 0),
-                                float(_num(it.get('qty'), 0.0)),
-                                float(_num(it.get('rate'), 0.0)),
-                                float(_num(it.get('tax'), 0.0)),
-                                float(_num(it.get('exchange_rate'), 1.0)),
-                                0.0,
-                                float(_num(it.get('discount_a'), 0.0)),
-                                0.0,
-                                _int(it.get('sale_det_id'), 0),
-                                float(_num(it.get('line_value'), 0.0)),
-                                _int(it.get('purchase_company_id'), 0),
-                                _int(it.get('purchase_id'), 0),
-                                _int(it.get('purchase_det_id'), 0),
-                            ],
-                        )
+                    lines = [
+                        {
+                            'id': _int(it.get('id'), 0),
+                            'company_id': 0,
+                            'title_id': _int(it.get('title_id'), 0),
+                            'quantity': float(_num(it.get('qty'), 0.0)),
+                            'rate': float(_num(it.get('rate'), 0.0)),
+                            'tax': float(_num(it.get('tax'), 0.0)),
+                            'exchange_rate': float(_num(it.get('exchange_rate'), 1.0)),
+                            'discount_p': 0.0,
+                            'discount_a': float(_num(it.get('discount_a'), 0.0)),
+                            'discount': 0.0,
+                            'sale_det_id': _int(it.get('sale_det_id'), 0),
+                            'line_value': float(_num(it.get('line_value'), 0.0)),
+                            'purchase_company_id': _int(it.get('purchase_company_id'), 0),
+                            'purchase_id': _int(it.get('purchase_id'), 0),
+                            'purchase_det_id': _int(it.get('purchase_det_id'), 0),
+                        }
+                        for it in rows
+                    ]
+                    returned_before = sale_returns.document_returns(cur, int(id))
+                    before, after = sync_lines(cur, 'sale_rt_items', {'parent_id': int(id)}, lines)
+                    sale_returns.check_returnable(
+                        cur, [(line['sale_det_id'], line['quantity']) for line in lines], returned_before
+                    )
+                    apply_movements(cur, DOC_SALE_RT, int(id), net_movements(DOC_SALE_RT, before, after))
 
             return JsonResponse({'id': int(id), 'message': 'Sales return updated successfully'}, status=200)
         except Exception as e:
@@ -5450,10 +5737,12 @@ def sales_rt_detail(request, id: int):
         try:
             with transaction.atomic():
                 with connection.cursor() as cur:
+                    stock_before = document_lines(cur, DOC_SALE_RT, int(id))
                     cur.execute("DELETE FROM sale_rt_items WHERE parent_id = %s", [int(id)])
                     cur.execute("DELETE FROM sales_rt WHERE id = %s", [int(id)])
                     if cur.rowcount == 0:
                         return JsonResponse({'error': 'Sales return not found'}, status=404)
+                    post_document(cur, DOC_SALE_RT, int(id), stock_before)
             return JsonResponse({'message': 'Sales return deleted successfully'}, status=200)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=400)
@@ -5464,6 +5753,7 @@ def sales_rt_detail(request, id: int):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('pp_receipts_iud')
 def pp_receipts_iud(request):
     try:
         d = request.data or {}
@@ -5485,8 +5775,8 @@ def pp_receipts_iud(request):
 
                 p_pp_customer_book_id = d.get('pp_customer_book_id')
                 if p_r_type in (0, 1):
-                    p_pp_customer_book_id = get_next_value(1, '0000', 'PP_CSBK_ID')
-                p_receipt_no = get_next_value(1, '2526', 'PP_RCPT_NO')
+                    p_pp_customer_book_id = next_number(cur, 'PP_CSBK_ID', per_year=False)
+                p_receipt_no = next_number(cur, 'PP_RCPT_NO', d.get('entry_date'))
                 if which == 'I' and pp_book_id:
                     # Atomically increment and fetch the *new* code & nos
                     cur.execute(
@@ -5690,7 +5980,11 @@ def pp_receipt_by_no(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def pp_installment_prefill(request):
-    
+    """
+    Subscription details for an installment receipt by PP Reg. No, from
+    pp_customer_book_ledger: copies, what has been paid so far, the balance
+    and the agent of the latest receipt.
+    """
     try:
         reg_no = (request.GET.get('reg_no') or '').strip()
         if not reg_no:
@@ -5701,23 +5995,28 @@ def pp_installment_prefill(request):
                 """
                 SELECT
                     t.title,
-                    pcb.copies,
+                    l.copies,
                     pc.pp_customer_nm,
                     pc.address1,
                     pc.address2,
                     pc.city,
                     pc.pin,
                     pc.telephone,
-                    pcb.pp_book_id,
-                    pc.id AS pp_customer_id,
-                    pr.agent_id AS agent_id,
-                    a.agent_nm
-                FROM pp_customers pc JOIN pp_customer_books pcb ON pc.id = pcb.pp_customer_id
-                                     JOIN pp_books pb ON pcb.pp_book_id = pb.id
-                                     JOIN titles t ON pb.product_id = t.id
-                                     JOIN pp_receipts pr ON pr.pp_customer_book_id = pcb.id
-                                     JOIN agents a on a.id = pr.agent_id                                     
-               WHERE pcb.reg_no = %s
+                    l.pp_book_id,
+                    l.pp_customer_id,
+                    l.last_agent_id,
+                    a.agent_nm,
+                    l.installments_paid,
+                    l.amount_paid,
+                    l.balance,
+                    l.pp_customer_book_id
+                FROM pp_customer_book_ledger l
+                JOIN pp_customers pc ON pc.id = l.pp_customer_id AND pc.company_id = l.company_id
+                LEFT JOIN pp_books pb ON pb.id = l.pp_book_id AND pb.company_id = l.company_id
+                LEFT JOIN titles t ON t.id = pb.product_id
+                LEFT JOIN agents a ON a.id = l.last_agent_id
+               WHERE l.reg_no = %s
+               ORDER BY l.company_id
                LIMIT 1
                 """,
                 [reg_no]
@@ -5738,6 +6037,12 @@ def pp_installment_prefill(request):
             'telephone': row[7] or '',
             'pp_book_id': row[8],
             'pp_customer_id': row[9],
+            'agent_id': row[10],
+            'agent_nm': row[11] or '',
+            'installments_paid': row[12],
+            'amount_paid': float(row[13]),
+            'balance': float(row[14]),
+            'pp_customer_book_id': row[15],
         }
         return JsonResponse(data, status=200)
     except Exception as e:
@@ -5764,6 +6069,65 @@ def sale_types_list(request):
         logger.exception("Error in sale_types_list")
         return JsonResponse({'error': str(e)}, status=400)
 
+def _mapping_list(mapping):
+    return [{'id': code, 'name': name} for code, name in sorted(mapping.items())]
+
+
+BOOTSTRAP_STATIC = {
+    'sale_types': _mapping_list(sale_type_mapping),
+    'payment_modes': _mapping_list(payment_type_mapping),
+    'class_types': _mapping_list(class_type_mapping),
+}
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def screen_bootstrap_view(request, screen):
+    """
+    Reference data for a transaction screen (sale_bill, goods_inward,
+    sale_bill_return) in one payload, with an ETag; send it back as
+    If-None-Match to get a 304 while nothing in the payload has changed.
+    """
+    try:
+        with connection.cursor() as cursor:
+            version = screen_bootstrap.screen_version(cursor, screen, BOOTSTRAP_STATIC)
+            etag = f'W/"boot-{screen}-{version}"'
+            headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+            if request.headers.get('If-None-Match') == etag:
+                return HttpResponseNotModified(headers=headers)
+            body = screen_bootstrap.screen_payload(cursor, screen, version, BOOTSTRAP_STATIC)
+        return HttpResponse(body, content_type='application/json', headers=headers)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.exception("Error in screen_bootstrap_view")
+        return JsonResponse({'error': str(e)}, status=400)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def master_changes(request):
+    """
+    Master data changed since a version token, for counter-side catalogues.
+    Query: since (token from the previous pull; empty for everything),
+    tables (comma separated, default all tracked tables), limit.
+    Returns {changes: [{table, id, version, deleted, row}], since, more};
+    keep pulling with the returned since while more is true.
+    """
+    try:
+        tables = [t.strip() for t in (request.GET.get('tables') or '').split(',') if t.strip()]
+        limit = int(request.GET.get('limit') or master_feed.DEFAULT_LIMIT)
+        with connection.cursor() as cursor:
+            changes, since, more = master_feed.changes_since(cursor, request.GET.get('since'), tables, limit)
+        return JsonResponse(
+            {'changes': changes, 'since': since, 'more': more},
+            json_dumps_params={'ensure_ascii': False},
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.exception("Error in master_changes")
+        return JsonResponse({'error': str(e)}, status=400)
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def bill_wise_sale_register_report(request):
@@ -6774,6 +7138,218 @@ def author_wise_title_sales_report(request):
         return JsonResponse({'error': str(e)}, status=400)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def supplier_wise_purchase_register_report(request):
+    """Generate supplier wise purchase register (all suppliers when supplier_id is 0 or absent)"""
+    try:
+        branch_id = request.GET.get('branch_id')
+        date_from = request.GET.get('date_from')
+        date_to = request.GET.get('date_to')
+        supplier_id = request.GET.get('supplier_id') or 0
+
+        if not branch_id:
+            return JsonResponse({'error': 'branch_id is required'}, status=400)
+        if not date_from:
+            return JsonResponse({'error': 'date_from is required'}, status=400)
+        if not date_to:
+            return JsonResponse({'error': 'date_to is required'}, status=400)
+
+        try:
+            branch_id_int = int(branch_id)
+            supplier_id_int = int(supplier_id)
+        except (ValueError, TypeError) as e:
+            return JsonResponse({'error': f'Invalid parameter format: {str(e)}'}, status=400)
+
+        # As with the sale registers, branch_id is passed as p_company_id
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT
+                    o_supplier_id,
+                    o_supplier,
+                    o_entry_date,
+                    o_purchase_no,
+                    o_invoice_no,
+                    o_invoice_date,
+                    CAST(o_quantity AS numeric(18,3)) AS o_quantity,
+                    CAST(o_goods_value AS numeric(18,2)) AS o_goods_value,
+                    CAST(o_tax AS numeric(18,2)) AS o_tax,
+                    CAST(o_gross AS numeric(18,2)) AS o_gross,
+                    CAST(o_nett AS numeric(18,2)) AS o_nett
+                FROM get_purchase_supplier_wise(%s, %s::date, %s::date, %s)
+                """,
+                [branch_id_int, date_from, date_to, supplier_id_int]
+            )
+            rows = cursor.fetchall()
+
+        report_data = []
+        for row in rows:
+            report_data.append({
+                'supplier_id': row[0],
+                'supplier': row[1] or '',
+                'entry_date': row[2].isoformat() if row[2] else None,
+                'purchase_no': row[3],
+                'invoice_no': row[4] or '',
+                'invoice_date': row[5].isoformat() if row[5] else None,
+                'quantity': float(row[6]) if row[6] else 0.0,
+                'goods_value': float(row[7]) if row[7] else 0.0,
+                'tax': float(row[8]) if row[8] else 0.0,
+                'gross': float(row[9]) if row[9] else 0.0,
+                'nett': float(row[10]) if row[10] else 0.0,
+            })
+
+        return JsonResponse({
+            'report_data': report_data,
+            'parameters': {
+                'branch_id': branch_id_int,
+                'supplier_id': supplier_id_int,
+                'date_from': date_from,
+                'date_to': date_to,
+            },
+            'total_records': len(report_data)
+        }, status=200)
+    except Exception as e:
+        logger.exception("Error in supplier_wise_purchase_register_report")
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def purchase_breakup_register_report(request):
+    """Generate purchase breakup wise register (p_breakup_id1..4; all breakups when breakup_id is 0 or absent)"""
+    try:
+        branch_id = request.GET.get('branch_id')
+        date_from = request.GET.get('date_from')
+        date_to = request.GET.get('date_to')
+        breakup_id = request.GET.get('breakup_id') or 0
+
+        if not branch_id:
+            return JsonResponse({'error': 'branch_id is required'}, status=400)
+        if not date_from:
+            return JsonResponse({'error': 'date_from is required'}, status=400)
+        if not date_to:
+            return JsonResponse({'error': 'date_to is required'}, status=400)
+
+        try:
+            branch_id_int = int(branch_id)
+            breakup_id_int = int(breakup_id)
+        except (ValueError, TypeError) as e:
+            return JsonResponse({'error': f'Invalid parameter format: {str(e)}'}, status=400)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT
+                    o_breakup_id,
+                    o_breakup,
+                    o_entry_date,
+                    o_purchase_no,
+                    o_invoice_no,
+                    o_supplier,
+                    CAST(o_amount AS numeric(18,2)) AS o_amount
+                FROM get_purchase_breakup_wise(%s, %s::date, %s::date, %s)
+                """,
+                [branch_id_int, date_from, date_to, breakup_id_int]
+            )
+            rows = cursor.fetchall()
+
+        report_data = []
+        for row in rows:
+            report_data.append({
+                'breakup_id': row[0],
+                'breakup': row[1] or '',
+                'entry_date': row[2].isoformat() if row[2] else None,
+                'purchase_no': row[3],
+                'invoice_no': row[4] or '',
+                'supplier': row[5] or '',
+                'amount': float(row[6]) if row[6] else 0.0,
+            })
+
+        return JsonResponse({
+            'report_data': report_data,
+            'parameters': {
+                'branch_id': branch_id_int,
+                'breakup_id': breakup_id_int,
+                'date_from': date_from,
+                'date_to': date_to,
+            },
+            'total_records': len(report_data)
+        }, status=200)
+    except Exception as e:
+        logger.exception("Error in purchase_breakup_register_report")
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def purchase_return_register_report(request):
+    """Generate purchase return register (all suppliers when supplier_id is 0 or absent)"""
+    try:
+        branch_id = request.GET.get('branch_id')
+        date_from = request.GET.get('date_from')
+        date_to = request.GET.get('date_to')
+        supplier_id = request.GET.get('supplier_id') or 0
+
+        if not branch_id:
+            return JsonResponse({'error': 'branch_id is required'}, status=400)
+        if not date_from:
+            return JsonResponse({'error': 'date_from is required'}, status=400)
+        if not date_to:
+            return JsonResponse({'error': 'date_to is required'}, status=400)
+
+        try:
+            branch_id_int = int(branch_id)
+            supplier_id_int = int(supplier_id)
+        except (ValueError, TypeError) as e:
+            return JsonResponse({'error': f'Invalid parameter format: {str(e)}'}, status=400)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT
+                    o_supplier_id,
+                    o_supplier,
+                    o_entry_date,
+                    o_purchase_rt_no,
+                    o_narration,
+                    CAST(o_quantity AS numeric(18,3)) AS o_quantity,
+                    CAST(o_gross AS numeric(18,2)) AS o_gross,
+                    CAST(o_nett AS numeric(18,2)) AS o_nett
+                FROM get_purchase_return_register(%s, %s::date, %s::date, %s)
+                """,
+                [branch_id_int, date_from, date_to, supplier_id_int]
+            )
+            rows = cursor.fetchall()
+
+        report_data = []
+        for row in rows:
+            report_data.append({
+                'supplier_id': row[0],
+                'supplier': row[1] or '',
+                'entry_date': row[2].isoformat() if row[2] else None,
+                'purchase_rt_no': row[3],
+                'narration': row[4] or '',
+                'quantity': float(row[5]) if row[5] else 0.0,
+                'gross': float(row[6]) if row[6] else 0.0,
+                'nett': float(row[7]) if row[7] else 0.0,
+            })
+
+        return JsonResponse({
+            'report_data': report_data,
+            'parameters': {
+                'branch_id': branch_id_int,
+                'supplier_id': supplier_id_int,
+                'date_from': date_from,
+                'date_to': date_to,
+            },
+            'total_records': len(report_data)
+        }, status=200)
+    except Exception as e:
+        logger.exception("Error in purchase_return_register_report")
+        return JsonResponse({'error': str(e)}, status=400)
+
+
 ################### REMITTANCE ENTRY ###################
 
 def dictfetchall(cursor):
@@ -6814,12 +7390,13 @@ def remittance_by_no(request):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('remittance_save')
 def remittance_save(request):
     """
     Insert into remittance per mapping:
       - company_id = 1
-      - id = MAX(id)+1 (per company)
-      - remittance_no = get_next_value(1, '2526', 'REMITTANCE')
+      - id = numbering.next_id('remittance') (per company sequence)
+      - remittance_no = numbering.next_number('REMITTANCE') for the entry_date's fin year
       - entry_date = payload.entry_date (YYYY-MM-DD)
       - a_type = payload.a_type (int)
       - bank_id = 0
@@ -6896,14 +7473,11 @@ def remittance_save(request):
     try:
         with transaction.atomic():
             with connection.cursor() as cur:
-                # Next internal id (per company)
-                cur.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM remittance WHERE company_id = %s", [company_id])
-                next_id = cur.fetchone()[0]
+                # Next internal id (per company sequence, see numbering.next_id)
+                remittance_id = next_id(cur, 'remittance', company_id)
 
-                # Next remittance_no via provided function
-                # Assuming get_next_value(company_id int, code text, series text) RETURNS int
-                # cur.execute("SELECT get_next_value(%s, %s, %s)", [company_id, '2526', 'REMITTANCE'])
-                next_remit_no = get_next_value(1, '2526', 'REMITTANCE')
+                # Next remittance_no (gapless: a printed money receipt number)
+                next_remit_no = next_number(cur, 'REMITTANCE', entry_date, company_id=company_id)
 
                 # Insert row
                 cur.execute("""
@@ -6918,7 +7492,7 @@ def remittance_save(request):
                         %s, %s
                     )
                 """, [
-                    company_id, next_id, next_remit_no, entry_date, a_type, bank_id, amount, ac_receipt_id,
+                    company_id, remittance_id, next_remit_no, entry_date, a_type, bank_id, amount, ac_receipt_id,
                     note1, cancelled, exhibition_id, c_name, account_id, customer_id, pp_customer_id,
                     user_id, printed
                 ])
@@ -6926,7 +7500,7 @@ def remittance_save(request):
         return JsonResponse({
             "message": "Remittance saved",
             "company_id": company_id,
-            "id": next_id,
+            "id": remittance_id,
             "remittance_no": next_remit_no,
         })
     except Exception as e:
@@ -6971,6 +7545,7 @@ def cr_realisation_by_customer_id(request):
 # SAVE
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent('cr_realisation_save')
 def cr_realisation_save(request):
     """
     POST /auth/cr-realisation-save/
@@ -6979,7 +7554,7 @@ def cr_realisation_save(request):
     Creates a row in cr_realisation with:
       company_id=1, exhibition_id=0, user_id=0, printed=0
       id = get_next_id(1, '2526', 'CR_REAL') -> dnextid
-      receipt_no = get_next_value(1, '2526', 'CR_REAL')
+      receipt_no = numbering.next_number('CR_REAL') for the entry_date's fin year
     """
     try:
         body = request.data
@@ -7003,7 +7578,7 @@ def cr_realisation_save(request):
 
         with transaction.atomic():
             with connection.cursor() as cursor:
-                receipt_no = get_next_value(1, '2526', 'CR_REAL')
+                receipt_no = next_number(cursor, 'CR_REAL', entry_date)
 
                 # Insert
                 cursor.execute(
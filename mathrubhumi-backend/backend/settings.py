@@ -92,10 +92,14 @@ CORS_ALLOWED_ORIGINS = [
     o.strip() for o in os.environ.get('DJANGO_CORS_ALLOWED_ORIGINS', '').split(',') if o.strip()
 ]
 
-# Allow custom header used by the frontend to carry selected branch id
+# Custom headers used by the frontend: selected branch id, retry-safe document POSTs,
+# revalidation of cached bills
 CORS_ALLOW_HEADERS = list(default_headers) + [
     "x-branch-id",
+    "idempotency-key",
+    "if-none-match",
 ]
+CORS_EXPOSE_HEADERS = ["etag"]
 
 
 # =============================================================================
@@ -183,6 +187,27 @@ DATABASES = {
     }
 }
 
+# Numbers cached per worker for block-allocated document series (accounts.numbering)
+DOCUMENT_NUMBER_BLOCK_SIZE = int(os.environ.get('DOCUMENT_NUMBER_BLOCK_SIZE', '50'))
+
+# How long a document POST can be replayed with the same Idempotency-Key (accounts.idempotency)
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+
+# After how long an unfinished claim on an Idempotency-Key (its request died) is taken over by a retry
+IDEMPOTENCY_IN_PROGRESS_SECONDS = int(os.environ.get('IDEMPOTENCY_IN_PROGRESS_SECONDS', '300'))
+
+# Seconds a worker keeps title rate / tax in its price cache (accounts.pricing)
+TITLE_PRICE_CACHE_SECONDS = int(os.environ.get('TITLE_PRICE_CACHE_SECONDS', '300'))
+
+# Seconds a worker keeps company receipt headers and rendered receipts (accounts.receipts)
+COMPANY_HEADER_CACHE_SECONDS = int(os.environ.get('COMPANY_HEADER_CACHE_SECONDS', '300'))
+
+# TrueType font embedded in receipt PDFs for Malayalam titles (accounts.pdf_font); Courier only when missing
+RECEIPT_PDF_FONT = os.environ.get('RECEIPT_PDF_FONT', '/usr/share/fonts/truetype/noto/NotoSansMalayalam-Regular.ttf')
+
+# Bills committed per transaction by the NDJSON bulk sale load (views.sales_bulk)
+BULK_SALE_CHUNK_SIZE = int(os.environ.get('BULK_SALE_CHUNK_SIZE', '200'))
+
 
 # =============================================================================
 # PASSWORD VALIDATION
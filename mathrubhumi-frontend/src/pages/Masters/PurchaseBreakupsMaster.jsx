@@ -4,10 +4,17 @@ import Modal from '../../components/Modal';
 import PageHeader from '../../components/PageHeader';
 import api from '../../utils/axiosInstance';
 
+// how a breakup is spread over the lines of an inward for their landed cost
+const allocationOptions = [
+  { value: 'V', label: 'By value' },
+  { value: 'Q', label: 'By quantity' }
+];
+
 export default function PurchaseBreakupsMaster() {
   const [items, setItems] = useState([]);
   const [formData, setFormData] = useState({
-    breakupName: ''
+    breakupName: '',
+    allocateBy: 'V'
   });
   const [page, setPage] = useState(1);
   const [pageSize, setPageSize] = useState(100);
@@ -64,7 +71,8 @@ export default function PurchaseBreakupsMaster() {
     console.log(`Updating purchase breakup: id=${id}, data=`, updatedItem);
 
     const payload = {
-      breakup_nm: updatedItem.breakupName || ''
+      breakup_nm: updatedItem.breakupName || '',
+      allocate_by: updatedItem.allocateBy || 'V'
     };
 
     console.log('Update payload:', payload);
@@ -102,7 +110,8 @@ export default function PurchaseBreakupsMaster() {
     }
 
     const payload = {
-      breakup_nm: formData.breakupName
+      breakup_nm: formData.breakupName,
+      allocate_by: formData.allocateBy
     };
 
     console.log('Form data on submit:', formData);
@@ -123,7 +132,8 @@ export default function PurchaseBreakupsMaster() {
         setPage(1);
       }
       setFormData({
-        breakupName: ''
+        breakupName: '',
+        allocateBy: 'V'
       });
     } catch (error) {
       console.error('Error creating purchase breakup:', error);
@@ -212,7 +222,8 @@ export default function PurchaseBreakupsMaster() {
 
       const fetchedItems = results.map((item) => ({
         id: item.id,
-        breakupName: item.breakup_nm || ''
+        breakupName: item.breakup_nm || '',
+        allocateBy: item.allocate_by || 'V'
       }));
       setItems(fetchedItems);
       console.log('Updated items state:', fetchedItems);
@@ -331,12 +342,15 @@ export default function PurchaseBreakupsMaster() {
             </div>
           </div>
           <div className="flex-1 min-h-0 overflow-y-auto overflow-x-auto rounded-lg border border-gray-200">
-            <table className="w-full max-w-md">
+            <table className="w-full max-w-xl">
               <thead>
                 <tr className="bg-gradient-to-r from-blue-500 to-indigo-600 text-white">
                   <th className="px-4 py-3 text-left text-sm font-semibold tracking-wide">
                     Breakup Name
                   </th>
+                  <th className="px-4 py-3 text-left text-sm font-semibold tracking-wide w-36">
+                    Spread By
+                  </th>
                   <th className="px-4 py-3 text-center text-sm font-semibold w-16">
                     Action
                   </th>
@@ -345,7 +359,7 @@ export default function PurchaseBreakupsMaster() {
               <tbody className="divide-y divide-gray-100">
                 {items.length === 0 ? (
                   <tr>
-                    <td colSpan="2" className="px-4 py-8 text-center text-gray-400">
+                    <td colSpan="3" className="px-4 py-8 text-center text-gray-400">
                       {isLoading ? 'Loading purchase breakups...' : 'No purchase breakups found. Add one below.'}
                     </td>
                   </tr>
@@ -368,6 +382,24 @@ export default function PurchaseBreakupsMaster() {
                           placeholder="Enter breakup name"
                         />
                       </td>
+                      <td className="px-4 py-2">
+                        <select
+                          value={item.allocateBy}
+                          onChange={(e) => {
+                            handleTableInputChange(item.id, 'allocateBy', e.target.value);
+                            handleTableUpdate(item.id, { ...item, allocateBy: e.target.value });
+                          }}
+                          className="w-full px-3 py-2 rounded-lg border border-gray-200 bg-gray-50 text-gray-700 text-sm
+                                     focus:outline-none focus:ring-2 focus:ring-blue-400/50 focus:border-blue-400 focus:bg-white
+                                     transition-all duration-200"
+                        >
+                          {allocationOptions.map((option) => (
+                            <option key={option.value} value={option.value}>
+                              {option.label}
+                            </option>
+                          ))}
+                        </select>
+                      </td>
                       <td className="px-4 py-2 text-center">
                         <button
                           onClick={() => handleDeletePurchaseBreakup(item.id)}
@@ -388,7 +420,7 @@ export default function PurchaseBreakupsMaster() {
 
         {/* Add Breakup Form */}
         <div className="border-t border-gray-200 bg-gray-50/50 px-4 py-4 flex-shrink-0">
-          <div className="flex flex-col sm:flex-row items-stretch sm:items-center gap-3 max-w-md">
+          <div className="flex flex-col sm:flex-row items-stretch sm:items-center gap-3 max-w-xl">
             <div className="flex-1">
               <input
                 type="text"
@@ -403,6 +435,20 @@ export default function PurchaseBreakupsMaster() {
                 onKeyDown={(e) => e.key === 'Enter' && handleAddPurchaseBreakup()}
               />
             </div>
+            <select
+              name="allocateBy"
+              value={formData.allocateBy}
+              onChange={handleInputChange}
+              className="px-4 py-2.5 rounded-lg border border-gray-200 bg-white text-gray-700 text-sm
+                         focus:outline-none focus:ring-2 focus:ring-blue-400/50 focus:border-blue-400
+                         transition-all duration-200"
+            >
+              {allocationOptions.map((option) => (
+                <option key={option.value} value={option.value}>
+                  {option.label}
+                </option>
+              ))}
+            </select>
             <button
               onClick={handleAddPurchaseBreakup}
               className="inline-flex items-center justify-center gap-2 px-5 py-2.5 rounded-lg bg-gradient-to-r from-blue-500 to-indigo-600 w-full sm:w-auto
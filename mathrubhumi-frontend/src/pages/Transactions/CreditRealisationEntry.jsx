@@ -1,6 +1,7 @@
 // src/pages/Transactions/CreditRealisationEntry.jsx
 import React, { useRef, useState } from "react";
 import api from "../../utils/axiosInstance";
+import { postIdempotent } from "../../utils/idempotency";
 import Modal from "../../components/Modal";
 import PageHeader from "../../components/PageHeader";
 
@@ -163,7 +164,7 @@ export default function CreditRealisationEntry() {
 
     try {
       setSaving(true);
-      const res = await api.post("/auth/cr-realisation-save/", payload);
+      const res = await postIdempotent("/auth/cr-realisation-save/", payload);
       const data = res?.data || {};
       setForm((p) => ({ ...p, receiptNo: String(data.receipt_no || p.receiptNo) }));
       showModal(data.message || "Credit realisation saved.", "success");
@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import api from '../../utils/axiosInstance';
+import { postIdempotent } from '../../utils/idempotency';
 import { TrashIcon, XMarkIcon } from '@heroicons/react/24/solid';
 import Modal from '../../components/Modal';
 
@@ -928,7 +929,7 @@ export default function GoodsInwardPage() {
         showModal('Goods Inward updated successfully', 'success');
         resetForm();
       } else {
-        const response = await api.post('/auth/goods_inward/', payload);
+        const response = await postIdempotent('/auth/goods_inward/', payload);
         const srlNo = response.data?.purchase_no ?? '';
         const purchaseId = response.data?.purchase_id ?? '';
         showModal(`Purchase submitted successfully with Srl No: ${srlNo}`, 'success');
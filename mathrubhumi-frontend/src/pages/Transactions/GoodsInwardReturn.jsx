@@ -1,5 +1,6 @@
 import React, { useState, useEffect, useRef } from 'react';
 import api from '../../utils/axiosInstance';
+import { postIdempotent } from '../../utils/idempotency';
 import { TrashIcon } from '@heroicons/react/24/solid';
 
 /* ---------- numeric helpers ---------- */
@@ -446,6 +447,7 @@ export default function GoodsInwardReturnPage() {
         origin_company_id: num(raw.origin_company_id),
         origin_purchase_id: num(raw.origin_purchase_id),
         origin_purchase_items_id: num(raw.origin_purchase_items_id),
+        returnable: num(raw.returnable ?? raw.quantity),
         isSelected: false,
         value: computeValue(raw.quantity, raw.rate, raw.exchange_rate, raw.discount_p),
       }));
@@ -469,7 +471,7 @@ export default function GoodsInwardReturnPage() {
   const togglePurchaseItemSelection = (rowIndex) => {
     setPurchaseItemsModal(prev => {
       const items = prev.items.map((it, idx) =>
-        idx === rowIndex ? { ...it, isSelected: !it.isSelected } : it
+        idx === rowIndex && it.returnable > 0 ? { ...it, isSelected: !it.isSelected } : it
       );
       return { ...prev, items };
     });
@@ -481,13 +483,13 @@ export default function GoodsInwardReturnPage() {
       .map(i => ({
         itemName: i.title,
         isbn: i.isbn || '',
-        quantity: num(i.quantity),
+        quantity: Math.min(num(i.quantity), i.returnable),
         purchaseRate: num(i.rate),
         exchangeRate: num(i.exchange_rate, 1),
         currency: i.currency_name || 'Indian Rupees',
         discount: num(i.discount_p),
         discountAmount: num(i.discount_a),
-        value: computeValue(i.quantity, i.rate, i.exchange_rate, i.discount_p),
+        value: computeValue(Math.min(num(i.quantity), i.returnable), i.rate, i.exchange_rate, i.discount_p),
         titleId: num(i.title_id),
         currencyIndex: num(i.currency_id),
         isMalayalam: i.language_id === 1,
@@ -629,7 +631,7 @@ export default function GoodsInwardReturnPage() {
       };
 
       const endpoint = isEditMode ? `/auth/goods-inward/${goodsInwardId}/` : '/auth/goods-inward/';
-      const method = isEditMode ? api.put : api.post;
+      const method = isEditMode ? api.put : postIdempotent;
       const response = await method(endpoint, payload);
 
       openToast(
@@ -828,6 +830,7 @@ export default function GoodsInwardReturnPage() {
                     <th className="w-[330px] text-left p-2 text-sm font-semibold border border-gray-300">Product</th>
                     <th className="w-[110px] text-left p-2 text-sm font-semibold border border-gray-300">ISBN</th>
                     <th className="w-[60px] text-right p-2 text-sm font-semibold border border-gray-300">Qty</th>
+                    <th className="w-[60px] text-right p-2 text-sm font-semibold border border-gray-300">Avl</th>
                     <th className="w-[70px] text-right p-2 text-sm font-semibold border border-gray-300">F Val</th>
                     <th className="w-[60px] text-left p-2 text-sm font-semibold border border-gray-300">Curr</th>
                     <th className="w-[70px] text-right p-2 text-sm font-semibold border border-gray-300">ExRt</th>
@@ -844,7 +847,8 @@ export default function GoodsInwardReturnPage() {
                           type="checkbox"
                           checked={!!item.isSelected}
                           onChange={() => togglePurchaseItemSelection(index)}
-                          className="cursor-pointer"
+                          disabled={item.returnable <= 0}
+                          className="cursor-pointer disabled:cursor-not-allowed"
                         />
                       </td>
                       <td
@@ -855,6 +859,7 @@ export default function GoodsInwardReturnPage() {
                       </td>
                       <td className="p-2 text-sm">{item.isbn || ''}</td>
                       <td className="p-2 text-sm text-right">{num(item.quantity)}</td>
+                      <td className="p-2 text-sm text-right">{num(item.returnable)}</td>
                       <td className="p-2 text-sm text-right">{tf(item.rate)}</td>
                       <td className="p-2 text-sm">{item.currency_name || 'Indian Rupees'}</td>
                       <td className="p-2 text-sm text-right">{tf(item.exchange_rate)}</td>
@@ -1,5 +1,6 @@
 import React, { useMemo, useRef, useState } from "react";
 import api from "../../utils/axiosInstance";
+import { postIdempotent } from "../../utils/idempotency";
 import Modal from "../../components/Modal";
 import PageHeader from "../../components/PageHeader";
 
@@ -240,7 +241,7 @@ export default function PPReceiptEntry() {
 
     try {
       setSaving(true);
-      const res = await api.post("/auth/pp-receipts-iud/", payload);
+      const res = await postIdempotent("/auth/pp-receipts-iud/", payload);
       showModal(res?.data?.message || "Receipt saved successfully.", "success");
       setForm((p) => ({ ...p, receiptNo: res?.data?.receipt_no ?? p.receiptNo }));
     } catch (e) {
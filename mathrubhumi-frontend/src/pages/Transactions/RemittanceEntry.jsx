@@ -2,6 +2,7 @@ import React, { useRef, useState, useMemo } from "react";
 import Modal from "../../components/Modal";
 import PageHeader from "../../components/PageHeader";
 import api from "../../utils/axiosInstance";
+import { postIdempotent } from "../../utils/idempotency";
 
 /* ---------- tiny helpers ---------- */
 const today = () => new Date().toISOString().split("T")[0];
@@ -277,7 +278,7 @@ export default function RemittanceEntry() {
 
     try {
       setSaving(true);
-      const res = await api.post("/auth/remittance-save/", payload);
+      const res = await postIdempotent("/auth/remittance-save/", payload);
       const msg =
         res?.data?.message ||
         `Remittance saved. No: ${res?.data?.remittance_no ?? "(auto)"}`;
@@ -1,8 +1,28 @@
 import React, { useState, useEffect, useRef } from 'react';
 import api from '../../utils/axiosInstance';
+import { postIdempotent } from '../../utils/idempotency';
 import Modal from '../../components/Modal';
 import { TrashIcon, XMarkIcon } from '@heroicons/react/24/solid';
 
+const SALE_TYPES = ['Credit Sale', 'Cash Sale', 'P P Sale', 'Stock Transfer', 'Approval', 'Gift Voucher', 'Gift Bill', 'Cash Memo'];
+const PAYMENT_MODES = ['Cash', 'Card', 'UPI', 'N.A.'];
+const CLASS_TYPES = [
+  'Individual',
+  'Educational Instt - School',
+  'Educational Instt - College',
+  'Local Library',
+  'Local Bodies',
+  'Commission Agents',
+  'Agents',
+  'Other Book Shops',
+  'Corporate Firms',
+  'Not Applicable',
+  'Staff',
+  'Freelancers',
+  'Authors',
+  'Section',
+];
+
 export default function SaleBillPage() {
   const [items, setItems] = useState([]);
   const [saleIdToLoad, setSaleIdToLoad] = useState('');
@@ -38,6 +58,9 @@ export default function SaleBillPage() {
   const [selectedProduct, setSelectedProduct] = useState(null);
   const [batchData, setBatchData] = useState([]);
   const [currencies, setCurrencies] = useState([]);
+  const [saleTypes, setSaleTypes] = useState(SALE_TYPES);
+  const [paymentModes, setPaymentModes] = useState(PAYMENT_MODES);
+  const [classTypes, setClassTypes] = useState(CLASS_TYPES);
   const [isItemSelected, setIsItemSelected] = useState(false);
   const [batchActionIndex, setBatchActionIndex] = useState(-1);
 
@@ -118,12 +141,18 @@ export default function SaleBillPage() {
   useEffect(() => {
     const fetchCurrencies = async () => {
       try {
-        const response = await api.get('/auth/currencies/');
-        if (Array.isArray(response.data) && response.data.every((cur) => cur.id !== undefined && cur.name)) {
-          setCurrencies(response.data);
+        // one request for every list on this screen; the browser revalidates it by ETag
+        const response = await api.get('/auth/bootstrap/sale_bill/');
+        const names = (list) => (Array.isArray(list) ? list.map((entry) => entry.name) : []);
+        if (names(response.data.sale_types).length) setSaleTypes(names(response.data.sale_types));
+        if (names(response.data.payment_modes).length) setPaymentModes(names(response.data.payment_modes));
+        if (names(response.data.class_types).length) setClassTypes(names(response.data.class_types));
+        const fetched = response.data.currencies;
+        if (Array.isArray(fetched) && fetched.every((cur) => cur.id !== undefined && cur.name)) {
+          setCurrencies(fetched);
           const defaultCurrency =
-            response.data.find((cur) => cur.name === 'Indian Rupees') ||
-            response.data[0] ||
+            fetched.find((cur) => cur.name === 'Indian Rupees') ||
+            fetched[0] ||
             { id: 0, name: 'Indian Rupees' };
           setFormData((prev) => ({
             ...prev,
@@ -874,6 +903,7 @@ export default function SaleBillPage() {
           purchaseCompanyId: parseInt(String(item.purchaseCompanyId || 0)),
           purchaseId: parseInt(String(item.purchaseId || 0)),
           purchaseItemId: parseInt(String(item.purchaseItemId || 0)),
+          itemId: parseInt(String(item.itemId || 0)),
         })),
       };
       console.log('Payload:', JSON.stringify(payload, null, 2));
@@ -882,7 +912,7 @@ export default function SaleBillPage() {
         await api.put(`/auth/sales/${saleId}/`, payload);
         showModal('Sale updated successfully', 'success');
       } else {
-        const response = await api.post('/auth/sales/', payload);
+        const response = await postIdempotent('/auth/sales/', payload);
         showModal(
           `Sale submitted successfully with ID: ${response.data.sale_id}`,
           'success',
@@ -960,6 +990,7 @@ export default function SaleBillPage() {
           purchaseCompanyId: item.purchaseCompanyId,
           purchaseId: item.purchaseId,
           purchaseItemId: item.purchaseItemId,
+          itemId: item.itemId,
         })),
       );
 
@@ -1131,7 +1162,7 @@ export default function SaleBillPage() {
               className={inputClasses}
             >
               <option value="" disabled>Type</option>
-              {['Credit Sale', 'Cash Sale', 'P P Sale', 'Stock Transfer', 'Approval', 'Gift Voucher', 'Gift Bill', 'Cash Memo'].map((opt) => (
+              {saleTypes.map((opt) => (
                 <option key={opt} value={opt}>{opt}</option>
               ))}
             </select>
@@ -1142,7 +1173,7 @@ export default function SaleBillPage() {
               className={inputClasses}
             >
               <option value="" disabled>Mode</option>
-              {['Cash', 'Card', 'UPI', 'N.A.'].map((opt) => (
+              {paymentModes.map((opt) => (
                 <option key={opt} value={opt}>{opt}</option>
               ))}
             </select>
@@ -1153,22 +1184,7 @@ export default function SaleBillPage() {
               className={inputClasses}
             >
               <option value="" disabled>Class</option>
-              {[
-                'Individual',
-                'Educational Instt - School',
-                'Educational Instt - College',
-                'Local Library',
-                'Local Bodies',
-                'Commission Agents',
-                'Agents',
-                'Other Book Shops',
-                'Corporate Firms',
-                'Not Applicable',
-                'Staff',
-                'Freelancers',
-                'Authors',
-                'Section',
-              ].map((opt) => (
+              {classTypes.map((opt) => (
                 <option key={opt} value={opt}>{opt}</option>
               ))}
             </select>
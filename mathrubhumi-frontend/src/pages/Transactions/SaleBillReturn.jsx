@@ -1,6 +1,7 @@
 // src/pages/Transactions/SaleBillReturn.jsx
 import React, { useEffect, useMemo, useState } from 'react';
 import api from '../../utils/axiosInstance';
+import { postIdempotent } from '../../utils/idempotency';
 import Modal from '../../components/Modal';
 import { TrashIcon } from '@heroicons/react/24/solid';
 
@@ -312,6 +313,7 @@ export default function SaleBillReturn() {
         purchase_company_id: asNum(r.purchase_company_id),
         purchase_id: asNum(r.purchase_id),
         purchase_det_id: asNum(r.purchase_det_id),
+        id: asNum(r.id),
       }));
       setItems(loaded);
       setSaleRtId(data.id);
@@ -364,6 +366,7 @@ export default function SaleBillReturn() {
         purchase_company_id: asNum(it.purchase_company_id),
         purchase_id: asNum(it.purchase_id),        
         purchase_det_id: asNum(it.purchase_det_id),
+        id: asNum(it.id),
       })),
     };
 
@@ -371,7 +374,7 @@ export default function SaleBillReturn() {
       setLoading(true);
       const isUpdate = isEditMode && saleRtId;
       const endpoint = isUpdate ? `/auth/sales-rt/${saleRtId}/` : '/auth/sales-rt/';
-      const method = isUpdate ? api.put : api.post;
+      const method = isUpdate ? api.put : postIdempotent;
       const res = await method(endpoint, payload);
 
       if (isUpdate) {
@@ -0,0 +1,24 @@
+import api from "./axiosInstance";
+
+// Idempotency keys for document-creating POSTs.
+// A submission keeps its key until the server confirms it, so re-sending the
+// same payload after a timeout or dropped connection is answered with the
+// original response instead of creating a second bill/receipt.
+const pendingKeys = new Map();
+
+function newKey() {
+  if (window.crypto?.randomUUID) return window.crypto.randomUUID();
+  return `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}${Math.random().toString(36).slice(2)}`;
+}
+
+export async function postIdempotent(url, payload, config = {}) {
+  const signature = `${url}|${JSON.stringify(payload)}`;
+  if (!pendingKeys.has(signature)) pendingKeys.set(signature, newKey());
+
+  const response = await api.post(url, payload, {
+    ...config,
+    headers: { ...(config.headers || {}), "Idempotency-Key": pendingKeys.get(signature) },
+  });
+  pendingKeys.delete(signature);
+  return response;
+}